@@ -0,0 +1,118 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, BinaryIO, Iterable, Iterator, Optional
+import json
+import sys
+from ..models.log_batch import LogBatch
+from ..models.log_entry import LogEntry
+from .compressed import open_binary_log
+
+# filter --format columns: записи столбцами LogBatch, чтобы следующая программа читала их без регулярки и
+# strptime. Файл -- COLUMNS_MAGIC, затем блоки по BLOCK_ROWS записей: 4 байта длины заголовка (little endian),
+# заголовок JSON и сырые байты столбцов в порядке header["columns"]. Числовые столбцы -- array как есть: ts (int64,
+# секунды epoch), tz (int32, смещение пояса в секундах), status (uint16), bytes_sent (int64, NO_BYTES для "-"),
+# request_time_s (float64, NaN -- нет); строки -- уникальные значения через "\n" и номера (uint32).
+# Пишется потоком: в памяти один блок. Столбцы читаются в array без разбора (numpy.frombuffer(batch.ts) -- без
+# копии), поэтому порядок байт должен совпадать с записавшей машиной. Arrow IPC не используется: формат файла
+# зависел бы от того, стоит ли pyarrow у записавшего, а read_log_columns должен читать его и без pyarrow.
+COLUMNS_MAGIC = b'LSCOLS\x00\x01'
+BLOCK_ROWS = 1 << 16
+
+NUMERIC_COLUMNS = ('ts', 'tz', 'status', 'bytes_sent', 'request_time_s')
+STRING_COLUMNS = ('ip', 'method', 'path')
+
+
+def batch_to_blobs(batch: LogBatch) -> dict[str, bytes]:
+    blobs = {name: getattr(batch, name).tobytes() for name in NUMERIC_COLUMNS}
+    for name in STRING_COLUMNS:
+        column = getattr(batch, name)
+        blobs[f'{name}.values'] = '\n'.join(column.values).encode()
+        blobs[f'{name}.codes'] = column.codes.tobytes()
+    return blobs
+
+
+def batch_from_blobs(header: dict[str, Any], blobs: dict[str, bytes]) -> Optional[LogBatch]:
+    # None -- столбцы разной длины или номера строк вне словаря
+    batch = LogBatch()
+    try:
+        for name in NUMERIC_COLUMNS:
+            getattr(batch, name).frombytes(blobs[name])
+        for name in STRING_COLUMNS:
+            column = getattr(batch, name)
+            if header['strings'][name]:
+                for value in blobs[f'{name}.values'].decode().split('\n'):
+                    column.pool.code(value)
+            column.codes.frombytes(blobs[f'{name}.codes'])
+    except (ValueError, KeyError):
+        return None
+    lengths = [len(getattr(batch, name)) for name in NUMERIC_COLUMNS]
+    lengths += [len(getattr(batch, name).codes) for name in STRING_COLUMNS]
+    if lengths != [header['rows']] * len(lengths):
+        return None
+    for name in STRING_COLUMNS:
+        column = getattr(batch, name)
+        if column.codes and max(column.codes) >= len(column.values):
+            return None
+    return batch
+
+
+def write_block(out: BinaryIO, batch: LogBatch) -> None:
+    blobs = batch_to_blobs(batch)
+    header = {
+        'rows': len(batch),
+        'byteorder': sys.byteorder,
+        'columns': [[name, len(blob)] for name, blob in blobs.items()],
+        'strings': {name: len(getattr(batch, name).values) for name in STRING_COLUMNS},
+    }
+    raw_header = json.dumps(header).encode()
+    out.write(len(raw_header).to_bytes(4, 'little') + raw_header)
+    for blob in blobs.values():
+        out.write(blob)
+
+
+def write_log_columns(log_entries: Iterable[LogEntry], out: BinaryIO, block_rows: int = BLOCK_ROWS) -> int:
+    out.write(COLUMNS_MAGIC)
+    batch = LogBatch()
+    written = 0
+    for log in log_entries:
+        try:
+            batch.append(log)
+        except OverflowError:
+            raise ValueError(f'bytes_sent {log.bytes_sent} does not fit the int64 column, '
+                             'use --format jsonl or text') from None
+        if len(batch) >= block_rows:
+            write_block(out, batch)
+            written += len(batch)
+            batch = LogBatch()
+    if len(batch):
+        write_block(out, batch)
+        written += len(batch)
+    return written
+
+
+def read_log_columns(path: str | Path) -> Iterator[LogBatch]:
+    # Блоки файла filter --format columns (можно сжатый) по одному; ValueError -- не такой файл или он обрезан
+    with open_binary_log(path) as f:
+        if f.read(len(COLUMNS_MAGIC)) != COLUMNS_MAGIC:
+            raise ValueError(f'{path}: not a logscoper columns file')
+        while size := f.read(4):
+            try:
+                header = json.loads(f.read(int.from_bytes(size, 'little')))
+                byteorder = header['byteorder']
+                blobs = {name: f.read(length) for name, length in header['columns']}
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f'{path}: corrupt block header') from e
+            if any(len(blobs[name]) != length for name, length in header['columns']):
+                raise ValueError(f'{path}: truncated block')
+            if byteorder != sys.byteorder:
+                raise ValueError(f'{path}: written with {byteorder} byte order')
+            batch = batch_from_blobs(header, blobs)
+            if batch is None:
+                raise ValueError(f'{path}: corrupt block')
+            yield batch
+
+
+def iter_log_columns(path: str | Path) -> Iterator[LogEntry]:
+    # записи файла columns -- такие же LogEntry, как при разборе лога
+    for batch in read_log_columns(path):
+        yield from batch
@@ -0,0 +1,190 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import BinaryIO, Optional, TextIO
+import bz2
+import gzip
+import io
+import queue
+import threading
+
+try:
+    import zstandard
+except ImportError:  # zstd -- необязательная зависимость
+    zstandard = None
+
+CHUNK_SIZE = 1 << 20
+QUEUE_CHUNKS = 8
+
+# Формат определяется по первым байтам, а не по имени: access.log.1 может оказаться сжатым,
+# а access.log.gz -- уже распакованным.
+BZ2_BLOCKS = (b'1AY&SY', b'\x17rE8P\x90')
+
+
+def detect_compression(path: str | Path) -> Optional[str]:
+    with open(path, 'rb') as f:
+        head = f.read(10)
+    if head.startswith(b'\x1f\x8b\x08'):
+        return 'gzip'
+    if head[:3] == b'BZh' and head[3:4].isdigit() and head[4:] in BZ2_BLOCKS:
+        return 'bz2'
+    if head.startswith(b'\x28\xb5\x2f\xfd'):
+        return 'zstd'
+    return None
+
+
+def open_decompressed(path: str | Path, kind: str) -> BinaryIO:
+    if kind == 'gzip':
+        return gzip.open(path, 'rb')
+    if kind == 'bz2':
+        return bz2.open(path, 'rb')
+    if zstandard is None:
+        raise ImportError(f"{path} is zstd-compressed, install 'zstandard' to read it", name='zstandard')
+    return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True, closefd=True)
+
+
+class QueueReader(io.RawIOBase):
+    # Сырой поток поверх очереди распакованных кусков. Распаковка идёт в фоновом потоке
+    # (zlib/bz2/zstd отпускают GIL), разбор -- в текущем; очередь ограничена, так что вперёд
+    # распаковывается не больше QUEUE_CHUNKS * CHUNK_SIZE байт.
+    def __init__(self, source: BinaryIO) -> None:
+        super().__init__()
+        self.queue: queue.Queue[bytes | Exception] = queue.Queue(QUEUE_CHUNKS)
+        self.stop = threading.Event()
+        self.buf = memoryview(b'')
+        self.eof = False
+        self.thread = threading.Thread(target=self.pump, args=(source,), daemon=True)
+        self.thread.start()
+
+    def pump(self, source: BinaryIO) -> None:
+        try:
+            with source:
+                while not self.stop.is_set():
+                    chunk = source.read(CHUNK_SIZE)
+                    self.put(chunk)
+                    if not chunk:
+                        return
+        except Exception as e:  # битый архив -- отдаём ошибку читателю
+            self.put(e)
+
+    def put(self, item: bytes | Exception) -> None:
+        while not self.stop.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        if not self.buf:
+            if self.eof:
+                return 0
+            item = self.queue.get()
+            if isinstance(item, Exception):
+                self.eof = True
+                raise item
+            if not item:
+                self.eof = True
+                return 0
+            self.buf = memoryview(item)
+        n = min(len(b), len(self.buf))
+        b[:n] = self.buf[:n]
+        self.buf = self.buf[n:]
+        return n
+
+    def close(self) -> None:
+        self.stop.set()
+        self.thread.join()
+        super().close()
+
+
+def open_log(path: str | Path) -> TextIO:
+    # То же, что open(path, 'r'), но gzip/bz2/zstd распаковываются на лету в фоновом потоке
+    kind = detect_compression(path)
+    if kind is None:
+        return open(path, 'r')
+    return io.TextIOWrapper(io.BufferedReader(QueueReader(open_decompressed(path, kind)), CHUNK_SIZE))
+
+
+def open_binary_log(path: str | Path) -> BinaryIO:
+    # то же для двоичных файлов (filter --format columns)
+    kind = detect_compression(path)
+    if kind is None:
+        return open(path, 'rb')
+    return io.BufferedReader(QueueReader(open_decompressed(path, kind)), CHUNK_SIZE)
+
+
+# Запись: формат -- по явному имени или по расширению файла
+OUTPUT_SUFFIXES = {'.gz': 'gzip', '.bz2': 'bz2', '.zst': 'zstd'}
+COMPRESSIONS = ('gzip', 'bz2', 'zstd')
+
+
+def output_compression(path: str | Path, compression: str = 'auto') -> Optional[str]:
+    if compression == 'auto':
+        return OUTPUT_SUFFIXES.get(Path(path).suffix)
+    return None if compression == 'none' else compression
+
+
+def open_compressor(path: str | Path, kind: str) -> BinaryIO:
+    if kind == 'gzip':
+        # 6, как у gzip(1): 9 заметно медленнее почти без выигрыша
+        return gzip.open(path, 'wb', compresslevel=6)
+    if kind == 'bz2':
+        return bz2.open(path, 'wb')
+    if zstandard is None:
+        raise ImportError(f"writing {path} needs 'zstandard' installed", name='zstandard')
+    return zstandard.ZstdCompressor().stream_writer(open(path, 'wb'), closefd=True)
+
+
+class QueueWriter(io.RawIOBase):
+    # Обратный к QueueReader: куски уходят в ограниченную очередь, сжатие и запись -- в фоновом
+    # потоке. Ошибка сжатия всплывает на следующем write() или на close().
+    def __init__(self, sink: BinaryIO) -> None:
+        super().__init__()
+        self.queue: queue.Queue[Optional[bytes]] = queue.Queue(QUEUE_CHUNKS)
+        self.error: Optional[BaseException] = None
+        self.thread = threading.Thread(target=self.drain, args=(sink,), daemon=True)
+        self.thread.start()
+
+    def drain(self, sink: BinaryIO) -> None:
+        try:
+            with sink:
+                while (chunk := self.queue.get()) is not None:
+                    sink.write(chunk)
+        except BaseException as e:
+            self.error = e
+            while self.queue.get() is not None:  # не держать пишущего
+                pass
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        if self.error is not None:
+            raise self.error
+        self.queue.put(bytes(b))
+        return len(b)
+
+    def close(self) -> None:
+        if not self.closed:
+            self.queue.put(None)
+            self.thread.join()
+            super().close()
+            if self.error is not None:
+                raise self.error
+
+
+def open_output(path: str | Path, compression: str = 'auto') -> TextIO:
+    # То же, что open(path, 'w'), но gzip/bz2/zstd сжимаются в фоновом потоке
+    if output_compression(path, compression) is None:
+        return open(path, 'w', buffering=CHUNK_SIZE)
+    return io.TextIOWrapper(open_binary_output(path, compression))
+
+
+def open_binary_output(path: str | Path, compression: str = 'auto') -> BinaryIO:
+    kind = output_compression(path, compression)
+    if kind is None:
+        return open(path, 'wb', buffering=CHUNK_SIZE)
+    return io.BufferedWriter(QueueWriter(open_compressor(path, kind)), CHUNK_SIZE)
@@ -0,0 +1,61 @@
+from __future__ import annotations
+import os
+from typing import Iterator
+
+READ_CHUNK = 1 << 20
+
+
+def decode_line(raw: bytes) -> str:
+    return raw.rstrip(b'\r').decode('utf-8', errors='ignore')
+
+
+class LogFollower:
+    # Растущий лог без повторного чтения: файл держится открытым, poll() отдаёт строки, дописанные после
+    # прошлого вызова; неполная последняя строка ждёт своего \n. Ротация (по пути уже другой inode) -- старый
+    # файл дочитывается до конца, дальше читается новый с начала. copytruncate (файл стал короче позиции) --
+    # чтение с начала.
+    def __init__(self, path: str, from_start: bool = False) -> None:
+        self.path = path
+        self.file = open(path, 'rb')
+        if not from_start:
+            self.file.seek(0, os.SEEK_END)
+        self.ino = os.fstat(self.file.fileno()).st_ino
+        self.partial = b''
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self) -> LogFollower:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def read_lines(self) -> Iterator[str]:
+        while True:
+            chunk = self.file.read(READ_CHUNK)
+            if not chunk:
+                return
+            lines = (self.partial + chunk).split(b'\n')
+            self.partial = lines.pop()
+            yield from map(decode_line, lines)
+
+    def poll(self) -> Iterator[str]:
+        yield from self.read_lines()
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return  # старый файл переименован, новый ещё не создан
+        if st.st_ino != self.ino:
+            yield from self.read_lines()  # то, что успели дописать в старый
+            if self.partial:
+                yield decode_line(self.partial)
+            self.file.close()
+            self.file = open(self.path, 'rb')
+            self.ino = os.fstat(self.file.fileno()).st_ino
+            self.partial = b''
+            yield from self.read_lines()
+        elif st.st_size < self.file.tell():
+            self.file.seek(0)
+            self.partial = b''
+            yield from self.read_lines()
@@ -1,8 +1,23 @@
 from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import Optional
+from functools import lru_cache
+from itertools import repeat
+from typing import Any, Callable, Iterable, Iterator, Optional, TypeVar
+import errno
+import glob
+import mmap
+import os
 import re
+from ..models.filters import parse_dt, status_codes
+from ..models.literals import grep_prefilter
+from ..models.log_batch import LogBatch, StringPool
 from ..models.log_entry import LogEntry
+from .compressed import detect_compression, open_log
+from .time_index import INDEX_EVERY, NO_TS_HI, NO_TS_LO, TimeIndex, load_time_index, save_time_index
+from .timestamp import parse_ts
+
+T = TypeVar('T')
 
 LOG_RE = re.compile(
     r'(?P<ip>\S+)\s+\S+\s+\S+\s+\[(?P<ts>[^\]]+)\]\s+'
@@ -14,38 +29,75 @@ LOG_RE = re.compile(
 
 RT_KV_RE = re.compile(r'(?:^|\s)rt=(?P<rt>\d+\.\d+)\b')
 
+# Строгий вариант LOG_RE для типовых строк: одиночные пробелы, без ленивых
+# групп, строка разбирается целиком. Всё, что он не принял, разбирает LOG_RE.
+FAST_LOG_RE = re.compile(
+    r'(\S+) \S+ \S+ \[([^\]]+)\] '
+    r'"([A-Z]+) ([^\s"][^"\n]*)" '
+    r'(\d{3}) (\S+)'
+    r'(?: "[^"]*" "[^"]*")?'
+    r'(?: (?:rt=)?(\d+\.\d+))?'
+)
+
+# (ip, ts, method, path, status, bytes, rt)
+LineFields = tuple[str, str, str, str, str, str, Optional[str]]
+
+
+def fast_line_fields(line: str) -> Optional[LineFields]:
+    match = FAST_LOG_RE.fullmatch(line)
+    if match is None:
+        return None
+    ip, ts_raw, method, path, status, bytes_raw, req_time_s = match.groups()
+    if (path[-8:-3] == 'HTTP/' and path[-9:-8].isspace() and path[-2] == '.'
+            and path[-3].isdecimal() and path[-1].isdecimal()):
+        path = path[:-8].rstrip()
+    return ip, ts_raw, method, path, status, bytes_raw, req_time_s
+
+
+def regex_line_fields(line: str) -> Optional[LineFields]:
+    match = LOG_RE.match(line)
+    if not match:
+        return None
+    return (match['ip'], match['ts'], match['method'], match['path'],
+            match['status'], match['bytes'], match['rt'] or match['rt_kv'])
+
+
+# ip, метод и путь повторяются из строки в строку: равные значения делят один объект str
+IPS = StringPool()
+METHODS = StringPool()
+PATHS = StringPool()
+
 
 def parse_log_line(line: str) -> Optional[LogEntry]:
     line = line.strip()
     if not line:
         return None
 
-    match = LOG_RE.match(line)
-    if not match:
+    fields = fast_line_fields(line) or regex_line_fields(line)
+    if fields is None:
         return None
 
-    data = match.groupdict()
+    ip, ts_raw, method, path, status, bytes_raw, req_time_s = fields
 
     try:
-        timestamp = datetime.strptime(data['ts'], '%d/%b/%Y:%H:%M:%S %z')
+        timestamp = parse_ts(ts_raw)
 
-        if data['bytes'] == '-':
+        if bytes_raw == '-':
             bytes_s = None
         else:
-            bytes_s = int(data['bytes'])
+            bytes_s = int(bytes_raw)
 
-        req_time_s = data.get('rt') or data.get('rt_kv')
         if req_time_s:
             req_time = float(req_time_s)
         else:
             req_time = None
 
         return LogEntry(
-            ip=data['ip'],
+            ip=IPS.intern(ip),
             ts=timestamp,
-            method=data['method'],
-            path=data['path'],
-            status=int(data['status']),
+            method=METHODS.intern(method),
+            path=PATHS.intern(path),
+            status=int(status),
             bytes_sent=bytes_s,
             request_time_s=req_time
         )
@@ -53,11 +105,281 @@ def parse_log_line(line: str) -> Optional[LogEntry]:
         return None
 
 
-def read_log_file(path: str) -> list[LogEntry]:
-    with open(path, 'r') as f:
-        parsed_lines = []
-        for line in f:
-            parsed_line = parse_log_line(line)
-            if parsed_line:
-                parsed_lines.append(parsed_line)
-        return parsed_lines
+# Голова типовой строки в байтах. Если она совпала с началом строки, LOG_RE и FAST_LOG_RE берут из неё
+# ровно этот ts и этот статус: первые три токена разделены одиночными пробелами, ts идёт до первой "]",
+# запрос -- до первой кавычки, после статуса есть непробельный символ. Такую строку можно отбросить
+# по статусу и времени, не декодируя и не разбирая. Остальные строки префильтр пропускает как есть.
+HEAD_B = rb'[!-~]+ [!-~]+ [!-~]+ \[(%s[^\]\r\n]+)\] "[A-Z]+ [!#-~][^"\r\n]*" '
+
+
+def status_bytes(codes: frozenset[int]) -> bytes:
+    # {200, 404, 500..599} -> (?:200|404|5\d\d)
+    parts = []
+    for hundred in range(10):
+        if all(hundred * 100 + i in codes for i in range(100)):
+            parts.append(b'%d\\d\\d' % hundred)
+            continue
+        for ten in range(hundred * 10, hundred * 10 + 10):
+            units = bytes(b'0123456789'[i] for i in range(10) if ten * 10 + i in codes)
+            if len(units) == 10:
+                parts.append(b'%02d\\d' % ten)
+            elif units:
+                parts.append(b'%02d[%s]' % (ten, units))
+    return b'(?:' + (b'|'.join(parts) or b'(?!)') + b')'
+
+
+@lru_cache(maxsize=16)
+def prefilter_re(codes: Optional[frozenset[int]]) -> re.Pattern[bytes]:
+    parts = {
+        b'ok': status_bytes(frozenset(range(1000)) if codes is None else codes),
+        b'head': HEAD_B % b'?:',
+        b'head_ts': HEAD_B % b'?P<ts>',
+    }
+    # Строки подряд с неподходящим статусом съедаются одним совпадением, чтобы не возвращаться
+    # в Python на каждую; группа "line" -- строка, которую надо разобрать.
+    return re.compile(
+        rb'(?<![^\r\n])'
+        rb'(?:%(head)s(?!%(ok)s)\d{3} [!-~][^\r\n]*(?:[\r\n]+|\Z))*'
+        rb'(?:(?P<line>%(head_ts)s%(ok)s [!-~][^\r\n]*'
+        rb'|(?!%(head)s\d{3} [!-~])[^\r\n]+)|\Z)' % parts
+    )
+
+
+def ts_in_range(ts_raw: bytes, since: Optional[datetime], until: Optional[datetime]) -> bool:
+    try:
+        timestamp = parse_ts(ts_raw.decode())
+    except (ValueError, KeyError):
+        return False  # parse_log_line такую строку всё равно отбросит
+    return not (since and timestamp < since) and not (until and timestamp >= until)
+
+
+def scan_log_lines(path: str,
+                   since: Optional[datetime] = None,
+                   until: Optional[datetime] = None,
+                   codes: Optional[frozenset[int]] = None,
+                   start: int = 0,
+                   end: Optional[int] = None) -> Iterator[str]:
+    # Строки (из байтов [start, end), start -- начало строки), которые могут пройти filter_log_entries
+    # с такими since/until/статусами. Отбрасывается только то, что фильтры отбросили бы наверняка,
+    # поэтому сами фильтры всё равно нужны.
+    if detect_compression(path) is not None:
+        # в сжатом файле байтам не по чему сканировать -- разбираем всё
+        with open_log(path) as text:
+            yield from text
+        return
+    regex = prefilter_re(codes)
+    with open(path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # пустой файл или не обычный файл (pipe) -- читаем как раньше
+            with open(path, 'r') as text:
+                yield from text
+            return
+        with mm:
+            # строки одной секунды идут подряд: решение по времени переиспользуется, пока ts не сменится
+            last_ts, in_range = None, True
+            for match in regex.finditer(mm, start, len(mm) if end is None else end):
+                line = match['line']
+                if line is None:
+                    continue
+                ts_raw = match['ts']
+                if ts_raw is not None and (since or until):
+                    if ts_raw != last_ts:
+                        last_ts = ts_raw
+                        in_range = ts_in_range(ts_raw, since, until)
+                    if not in_range:
+                        continue
+                yield line.decode()
+
+
+INDEX_HEAD_RE = re.compile(HEAD_B % b'?P<ts>' + rb'\d{3} [!-~]')
+
+
+def ts_epochs(ts_raw: bytes) -> tuple[int, ...]:
+    try:
+        return (int(parse_ts(ts_raw.decode()).timestamp()),)
+    except (ValueError, KeyError):
+        return ()  # parse_log_line такую строку отбросит
+
+
+def line_epochs(raw: bytes) -> Iterator[int]:
+    # ts записей двоичной строки с "\r" внутри: текстовый режим видит в ней несколько строк
+    text = raw.decode(errors='ignore')
+    for line in text.replace('\r\n', '\n').replace('\r', '\n').split('\n'):
+        log = parse_log_line(line)
+        if log:
+            yield int(log.ts.timestamp())
+
+
+def build_time_index(path: str, every: int = INDEX_EVERY) -> TimeIndex:
+    index = TimeIndex()
+    offset = block_start = lines = 0
+    lo, hi = NO_TS_LO, NO_TS_HI
+    last_ts = None
+    with open(path, 'rb') as f:
+        for raw in f:
+            if lines == every:
+                index.add_block(block_start, lo, hi)
+                block_start, lines, lo, hi = offset, 0, NO_TS_LO, NO_TS_HI
+                last_ts = None
+            lines += 1
+            offset += len(raw)
+            match = INDEX_HEAD_RE.match(raw)
+            if match is not None and raw.find(b'\r', match.end(), -2) < 0:
+                # типовая строка: ts из головы без разбора (см. HEAD_B); строки одной секунды идут
+                # подряд и lo/hi не меняют
+                if match['ts'] == last_ts:
+                    continue
+                last_ts = match['ts']
+                epochs: Iterable[int] = ts_epochs(last_ts)
+            else:
+                epochs = line_epochs(raw)
+            for epoch in epochs:
+                lo = min(lo, epoch)
+                hi = max(hi, epoch)
+    if lines:
+        index.add_block(block_start, lo, hi)
+    index.end = offset
+    return index.finish()
+
+
+def get_time_index(path: str) -> Optional[TimeIndex]:
+    # Индекс из <log>.lsindex или собранный заново; None -- файл по смещениям не читается
+    source = os.stat(path)
+    if not os.path.isfile(path) or detect_compression(path) is not None:
+        return None
+    index = load_time_index(path)
+    if index is None:
+        index = build_time_index(path)
+        if index.end != source.st_size:
+            return None  # файл дописали во время сборки
+        save_time_index(path, index, source)
+    return index
+
+
+def iter_log_file(path: str,
+                  since: Optional[str] = None,
+                  until: Optional[str] = None,
+                  status: Optional[str] = None,
+                  index: bool = False,
+                  grep: Optional[str] = None) -> Iterator[LogEntry]:
+    # since/until/status -- те же фильтры, что пойдут в filter_log_entries; по ним строки
+    # отсеиваются ещё до разбора. Ошибочные значения здесь пропускаются: про них скажет фильтр.
+    # index -- читать по индексу времени только блоки, которые пересекаются с [since, until).
+    # grep -- отсеять до разбора строки без подстрок, нужных регулярке (см. models.literals).
+    try:
+        since_dt = parse_dt(since) if since else None
+        until_dt = parse_dt(until) if until else None
+    except ValueError:
+        since_dt = until_dt = None
+    codes = status_codes(status) if status else None
+
+    time_index = get_time_index(path) if index and (since_dt or until_dt) else None
+    if time_index is not None:
+        ranges = time_index.ranges(since_dt and since_dt.timestamp(), until_dt and until_dt.timestamp())
+        for start, end in ranges:
+            yield from iter_log_lines(grep_prefilter(scan_log_lines(path, since_dt, until_dt, codes, start, end), grep))
+    elif since_dt or until_dt or codes is not None:
+        yield from iter_log_lines(grep_prefilter(scan_log_lines(path, since_dt, until_dt, codes), grep))
+    else:
+        with open_log(path) as f:
+            yield from iter_log_lines(grep_prefilter(f, grep))
+
+
+def iter_log_range(path: str,
+                   start: int,
+                   end: Optional[int],
+                   since: Optional[str] = None,
+                   until: Optional[str] = None,
+                   status: Optional[str] = None,
+                   grep: Optional[str] = None) -> Iterator[LogEntry]:
+    # iter_log_file по байтам [start, end) несжатого файла (start -- начало строки); end=None -- файл целиком
+    if end is None:
+        yield from iter_log_file(path, since, until, status, grep=grep)
+        return
+    try:
+        since_dt = parse_dt(since) if since else None
+        until_dt = parse_dt(until) if until else None
+    except ValueError:
+        since_dt = until_dt = None
+    codes = status_codes(status) if status else None
+    yield from iter_log_lines(grep_prefilter(scan_log_lines(path, since_dt, until_dt, codes, start, end), grep))
+
+
+def read_log_file(path: str,
+                  since: Optional[str] = None,
+                  until: Optional[str] = None,
+                  status: Optional[str] = None,
+                  index: bool = False) -> list[LogEntry]:
+    return list(iter_log_file(path, since, until, status, index))
+
+
+def read_log_batch(path: str,
+                   since: Optional[str] = None,
+                   until: Optional[str] = None,
+                   status: Optional[str] = None,
+                   index: bool = False) -> LogBatch:
+    # read_log_file столбцами: для больших файлов в несколько раз меньше памяти. bytes_sent в столбце -- int64;
+    # лог с большим значением так не читается (ValueError), только read_log_file
+    try:
+        return LogBatch.from_entries(iter_log_file(path, since, until, status, index))
+    except OverflowError as e:
+        raise ValueError(f'{path}: bytes_sent does not fit into int64, use read_log_file') from e
+
+
+def iter_log_lines(lines: Iterable[str]) -> Iterator[LogEntry]:
+    for line in lines:
+        parsed_line = parse_log_line(line)
+        if parsed_line:
+            yield parsed_line
+
+
+def parse_log_lines(lines: Iterable[str]) -> list[LogEntry]:
+    return list(iter_log_lines(lines))
+
+
+GLOB_CHARS = re.compile(r'[*?[]')
+
+
+def expand_paths(patterns: Iterable[str]) -> list[str]:
+    # --path можно повторять и передавать маски: "access.log*" раскрывается здесь, даже если shell
+    # этого не сделал. Дубликаты отбрасываются.
+    paths: dict[str, None] = {}
+    for pattern in patterns:
+        if os.path.exists(pattern) or not GLOB_CHARS.search(pattern):
+            paths[pattern] = None
+            continue
+        matches = sorted(glob.glob(pattern))
+        if not matches:
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), pattern)
+        paths.update(dict.fromkeys(matches))
+    return list(paths)
+
+
+def map_log_files(func: Callable[..., T], paths: list[str], jobs: int, *args: Any) -> list[T]:
+    # func(path, *args) для каждого файла; при jobs > 1 -- каждый файл в своём процессе. Результаты
+    # идут в порядке файлов, как при последовательном чтении.
+    if jobs > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(paths))) as pool:
+            return list(pool.map(func, paths, *(repeat(arg) for arg in args)))
+    return [func(path, *args) for path in paths]
+
+
+def read_log_files(paths: list[str],
+                   since: Optional[str] = None,
+                   until: Optional[str] = None,
+                   status: Optional[str] = None,
+                   jobs: int = 1,
+                   index: bool = False) -> list[LogEntry]:
+    parts = map_log_files(read_log_file, paths, jobs, since, until, status, index)
+    return [log for part in parts for log in part]
+
+
+def iter_log_files(paths: Iterable[str],
+                   since: Optional[str] = None,
+                   until: Optional[str] = None,
+                   status: Optional[str] = None,
+                   index: bool = False) -> Iterator[LogEntry]:
+    for path in paths:
+        yield from iter_log_file(path, since, until, status, index)
@@ -0,0 +1,126 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+import hashlib
+import json
+import os
+from .compressed import detect_compression
+
+# Состояние stats --state между запусками (например, из cron): до какого байта учтён каждый лог и накопленный
+# агрегат. Следующий запуск разбирает только дописанное и сливает его с сохранённым агрегатом.
+#
+# Логи узнаются по (st_dev, st_ino), а не по пути: после ротации переименованием access.log.1 -- тот же файл,
+# что был access.log, и его хвост дочитывается с прежнего места, а новый access.log читается с нуля. Вместе
+# со смещением хранится хэш первых HEAD_BYTES байт лога: если начало другое или байт перед смещением -- не
+# "\n", файл обрезан (copytruncate) и читается с нуля, даже если успел снова дорасти до прежнего смещения.
+# Сжатые логи по смещению не продолжить, они учитываются один раз целиком.
+#
+# options -- параметры запуска, влияющие на агрегат (фильтры, правила шаблонов...): если они другие,
+# состояние не годится и считается заново.
+STATE_VERSION = 2
+SCAN_BACK = 1 << 16
+HEAD_BYTES = 4096
+
+LogRange = tuple[str, int, Optional[int]]
+
+
+@dataclass
+class StatsState:
+    options: dict[str, Any]
+    offsets: dict[str, int] = field(default_factory=dict)
+    heads: dict[str, str] = field(default_factory=dict)
+    aggregate: Optional[dict[str, Any]] = None
+
+
+def file_key(st: os.stat_result) -> str:
+    return f'{st.st_dev}:{st.st_ino}'
+
+
+def load_state(path: str, options: dict[str, Any]) -> StatsState:
+    # Нет файла, он повреждён или от других options -- пустое состояние
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if data['version'] != STATE_VERSION or data['options'] != options:
+            return StatsState(options)
+        offsets = {str(key): int(offset) for key, offset in data['offsets'].items()}
+        heads = {str(key): str(head) for key, head in data['heads'].items()}
+        return StatsState(options, offsets, heads, data['aggregate'])
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return StatsState(options)
+
+
+def save_state(path: str, state: StatsState) -> None:
+    # через временный файл: прерванный запуск не оставит полсостояния
+    data = {
+        'version': STATE_VERSION,
+        'options': state.options,
+        'offsets': state.offsets,
+        'heads': state.heads,
+        'aggregate': state.aggregate,
+    }
+    tmp = Path(f'{path}.{os.getpid()}.tmp')
+    try:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def complete_end(path: str, start: int, size: int) -> int:
+    # Конец последней полной строки в [start, size): недописанная строка останется на следующий запуск
+    with open(path, 'rb') as f:
+        end = size
+        while end > start:
+            begin = max(start, end - SCAN_BACK)
+            f.seek(begin)
+            newline = f.read(end - begin).rfind(b'\n')
+            if newline >= 0:
+                return begin + newline + 1
+            end = begin
+    return start
+
+
+def head_digest(path: str, end: int) -> Optional[str]:
+    # Отпечаток учтённой части [0, end): хэш её первых HEAD_BYTES байт; None, если байт end-1 -- не конец
+    # строки или файл короче end
+    with open(path, 'rb') as f:
+        head = f.read(min(end, HEAD_BYTES))
+        f.seek(end - 1)
+        if f.read(1) != b'\n':
+            return None
+    return hashlib.blake2b(head, digest_size=16).hexdigest()
+
+
+def new_log_ranges(paths: list[str], state: StatsState) -> list[LogRange]:
+    # Непрочитанные диапазоны (path, start, end) логов; end=None -- файл целиком. state.offsets (и heads)
+    # сдвигаются на их концы, ключи исчезнувших файлов удаляются.
+    log_ranges: list[LogRange] = []
+    offsets: dict[str, int] = {}
+    heads: dict[str, str] = {}
+    for path in paths:
+        st = os.stat(path)
+        key = file_key(st)
+        if key in offsets:
+            continue  # тот же файл под вторым именем
+        if detect_compression(path) is not None:
+            if key not in state.offsets:
+                log_ranges.append((path, 0, None))
+            offsets[key] = st.st_size
+            continue
+        start = state.offsets.get(key, 0)
+        if start and head_digest(path, start) != state.heads.get(key):
+            start = 0
+        end = complete_end(path, start, st.st_size)
+        if end > start:
+            log_ranges.append((path, start, end))
+        offsets[key] = end
+        head = head_digest(path, end) if end else None
+        if head is not None:
+            heads[key] = head
+    state.offsets = offsets
+    state.heads = heads
+    return log_ranges
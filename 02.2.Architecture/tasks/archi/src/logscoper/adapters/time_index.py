@@ -0,0 +1,132 @@
+from __future__ import annotations
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+import json
+import os
+import sys
+
+# Разреженный индекс времени рядом с логом (<log>.lsindex): файл делится на блоки по INDEX_EVERY строк,
+# для блока хранятся смещение его начала и min/max ts записей (секунды epoch). Блок пропускается, только
+# если все его записи вне окна, поэтому строки не по порядку выборку не ломают -- лишь расширяют блоки.
+# Индекс действителен, пока у лога не изменились размер и mtime.
+#
+# Формат: MAGIC, 4 байта длины заголовка (little endian), заголовок JSON, затем подряд сырые байты
+# массивов offsets, lo, hi (int64).
+MAGIC = b'LSINDEX\x01'
+SUFFIX = '.lsindex'
+INDEX_EVERY = 1024
+
+NO_TS_LO = 2 ** 63 - 1  # пустой блок: lo больше любого until, hi меньше любого since
+NO_TS_HI = -2 ** 63
+
+COLUMNS = ('offsets', 'lo', 'hi')
+
+
+@dataclass
+class TimeIndex:
+    offsets: array = field(default_factory=lambda: array('q'))
+    lo: array = field(default_factory=lambda: array('q'))
+    hi: array = field(default_factory=lambda: array('q'))
+    end: int = 0
+    # running max(hi) и суффиксный min(lo) монотонны -- по ним бинарным поиском находятся первый
+    # и последний блоки, которые стоит читать
+    max_hi: list[int] = field(default_factory=list, repr=False)
+    min_lo: list[int] = field(default_factory=list, repr=False)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def add_block(self, offset: int, lo: int, hi: int) -> None:
+        self.offsets.append(offset)
+        self.lo.append(lo)
+        self.hi.append(hi)
+
+    def finish(self) -> TimeIndex:
+        self.max_hi, top = [], NO_TS_HI
+        for hi in self.hi:
+            top = max(top, hi)
+            self.max_hi.append(top)
+        self.min_lo, bottom = [], NO_TS_LO
+        for lo in reversed(self.lo):
+            bottom = min(bottom, lo)
+            self.min_lo.append(bottom)
+        self.min_lo.reverse()
+        return self
+
+    def ranges(self, since: Optional[float] = None, until: Optional[float] = None) -> list[tuple[int, int]]:
+        # Байтовые диапазоны [start, end) блоков, где могут быть записи с since <= ts < until;
+        # соседние блоки склеиваются.
+        first = 0 if since is None else bisect_left(self.max_hi, since)
+        last = len(self) if until is None else bisect_left(self.min_lo, until)
+        bounds = self.offsets[1:].tolist() + [self.end]
+        result: list[tuple[int, int]] = []
+        for i in range(first, last):
+            if since is not None and self.hi[i] < since:
+                continue
+            if until is not None and self.lo[i] >= until:
+                continue
+            start, stop = self.offsets[i], bounds[i]
+            if result and result[-1][1] == start:
+                result[-1] = (result[-1][0], stop)
+            else:
+                result.append((start, stop))
+        return result
+
+
+def index_path(log_path: str | Path) -> Path:
+    path = Path(log_path)
+    return path.with_name(path.name + SUFFIX)
+
+
+def save_time_index(log_path: str | Path, index: TimeIndex, source: os.stat_result) -> bool:
+    # source -- stat лога до сборки: если файл дописали во время неё, следующий запуск увидит другой
+    # размер и пересоберёт индекс
+    blobs = [getattr(index, name).tobytes() for name in COLUMNS]
+    header = json.dumps({
+        'size': source.st_size,
+        'mtime_ns': source.st_mtime_ns,
+        'byteorder': sys.byteorder,
+        'end': index.end,
+        'columns': [[name, len(blob)] for name, blob in zip(COLUMNS, blobs)],
+    }).encode()
+    path = index_path(log_path)
+    tmp = path.with_name(path.name + f'.{os.getpid()}.tmp')
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC + len(header).to_bytes(4, 'little') + header)
+            for blob in blobs:
+                f.write(blob)
+        os.replace(tmp, path)
+    except OSError:
+        return False  # каталог только для чтения -- работаем без индекса
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return True
+
+
+def load_time_index(log_path: str | Path) -> Optional[TimeIndex]:
+    # None -- индекса нет, он от другой версии лога или повреждён
+    source = os.stat(log_path)
+    try:
+        with open(index_path(log_path), 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            header = json.loads(f.read(int.from_bytes(f.read(4), 'little')))
+            if (header['size'] != source.st_size or header['mtime_ns'] != source.st_mtime_ns
+                    or header['byteorder'] != sys.byteorder or header['end'] != source.st_size):
+                return None
+            index = TimeIndex(end=header['end'])
+            for name, size in header['columns']:
+                blob = f.read(size)
+                if name not in COLUMNS or len(blob) != size:
+                    return None
+                getattr(index, name).frombytes(blob)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if not len(index.offsets) == len(index.lo) == len(index.hi):
+        return None
+    return index.finish()
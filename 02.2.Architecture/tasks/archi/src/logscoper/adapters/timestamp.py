@@ -0,0 +1,31 @@
+from __future__ import annotations
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+import re
+
+TS_FORMAT = '%d/%b/%Y:%H:%M:%S %z'
+TS_RE = re.compile(r'(\d\d)/(\w{3})/(\d{4}):(\d\d):(\d\d):(\d\d) ([+-]\d\d[0-5]\d)')
+MONTHS = {name: i for i, name in enumerate('Jan Feb Mar Apr May Jun Jul Aug Sep Oct Nov Dec'.split(), start=1)}
+
+
+@lru_cache(maxsize=64)
+def tz_offset(raw: str) -> timezone:
+    offset = timedelta(hours=int(raw[1:3]), minutes=int(raw[3:5]))
+    return timezone(-offset if raw[0] == '-' else offset)
+
+
+def decode_ts(ts_raw: str) -> datetime:
+    # "10/Oct/2000:13:55:36 +0000" разбираем срезами фиксированной ширины,
+    # на нестандартной записи откатываемся на strptime
+    match = TS_RE.fullmatch(ts_raw)
+    month = MONTHS.get(match[2]) if match else None
+    if month is None:
+        return datetime.strptime(ts_raw, TS_FORMAT)
+    day, _, year, hour, minute, second, tz = match.groups()
+    return datetime(int(year), month, int(day), int(hour), int(minute), int(second), tzinfo=tz_offset(tz))
+
+
+# строки одной секунды делят одну и ту же метку времени
+@lru_cache(maxsize=4096)
+def parse_ts(ts_raw: str) -> datetime:
+    return decode_ts(ts_raw)
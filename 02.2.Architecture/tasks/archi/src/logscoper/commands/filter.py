@@ -1,44 +1,111 @@
 from __future__ import annotations
-from typing import Optional
+from functools import lru_cache
+from operator import attrgetter
+from typing import Iterable, Iterator, Optional, TextIO
+import heapq
+import json
 from ..models.log_entry import LogEntry
-from ..models.filters import filter_by_status, filter_by_time, filter_by_reg
+from ..models.filters import make_log_filter
+from ..models.templates import PathTemplater
 
 
-def log_entries_to_txt(log_entries: list[LogEntry]) -> str:
-    lines = []
+def log_entry_to_txt(log: LogEntry) -> str:
+    ts_iso_output = log.ts.isoformat()
 
+    if log.bytes_sent is not None:
+        bytes_output = str(log.bytes_sent)
+    else:
+        bytes_output = "-"
+
+    if log.request_time_s:
+        rt_output = f"rt={log.request_time_s}"
+    else:
+        rt_output = ""
+
+    return f"{ts_iso_output} {log.ip} {log.method} {log.path} {log.status} {bytes_output} {rt_output}".strip()
+
+
+def log_entries_to_txt(log_entries: Iterable[LogEntry]) -> str:
+    return '\n'.join(map(log_entry_to_txt, log_entries))
+
+
+WRITE_CHUNK_LINES = 4096
+
+
+def write_log_entries(log_entries: Iterable[LogEntry], out: TextIO, chunk_lines: int = WRITE_CHUNK_LINES) -> int:
+    # То же, что out.write(log_entries_to_txt(log_entries) + '\n'), но пачками по chunk_lines строк:
+    # одна склейка и один write на пачку, в памяти -- только она. Записи одной секунды делят datetime,
+    # его isoformat считается раз.
+    parts: list[str] = []
+    last_ts, ts_iso_output = None, ''
+    written = 0
     for log in log_entries:
-        ts_iso_output = log.ts.isoformat()
+        if log.ts is not last_ts:
+            last_ts, ts_iso_output = log.ts, log.ts.isoformat()
+        bytes_output = '-' if log.bytes_sent is None else str(log.bytes_sent)
+        line = f"{ts_iso_output} {log.ip} {log.method} {log.path} {log.status} {bytes_output}"
+        parts.append(f"{line} rt={log.request_time_s}" if log.request_time_s else line)
+        if len(parts) >= chunk_lines:
+            out.write('\n'.join(parts) + '\n')
+            written += len(parts)
+            parts.clear()
+    if parts or not written:
+        out.write('\n'.join(parts) + '\n')
+        written += len(parts)
+    return written
+
+
+FORMATS = ('text', 'jsonl', 'columns')
+QUOTE_CACHE = 1 << 16
 
-        if log.bytes_sent is not None:
-            bytes_output = str(log.bytes_sent)
-        else:
-            bytes_output = "-"
 
-        if log.request_time_s:
-            rt_output = f"rt={log.request_time_s}"
-        else:
-            rt_output = ""
+def write_log_entries_jsonl(log_entries: Iterable[LogEntry], out: TextIO,
+                            chunk_lines: int = WRITE_CHUNK_LINES) -> int:
+    # filter --format jsonl: объект на строку, ts -- ISO 8601 со смещением, как в text. Строка собирается
+    # форматированием, без dict и json.dumps на запись: строки экранируются json-кодировщиком один раз на значение
+    # (LRU -- пути и ip повторяются), числа совпадают с тем, что выдал бы json.dumps.
+    quote = lru_cache(maxsize=QUOTE_CACHE)(json.JSONEncoder(ensure_ascii=False).encode)
+    parts: list[str] = []
+    last_ts, ts_iso_output = None, ''
+    written = 0
+    for log in log_entries:
+        if log.ts is not last_ts:
+            last_ts, ts_iso_output = log.ts, log.ts.isoformat()
+        bytes_output = 'null' if log.bytes_sent is None else log.bytes_sent
+        rt_output = 'null' if log.request_time_s is None else repr(log.request_time_s)
+        parts.append(f'{{"ts": "{ts_iso_output}", "ip": {quote(log.ip)}, "method": {quote(log.method)}, '
+                     f'"path": {quote(log.path)}, "status": {log.status}, "bytes_sent": {bytes_output}, '
+                     f'"request_time_s": {rt_output}}}\n')
+        if len(parts) >= chunk_lines:
+            out.write(''.join(parts))
+            written += len(parts)
+            parts.clear()
+    if parts:
+        out.write(''.join(parts))
+        written += len(parts)
+    return written
 
-        line = f"{ts_iso_output} {log.ip} {log.method} {log.path} {log.status} {bytes_output} {rt_output}".strip()
-        lines.append(line)
 
-    return '\n'.join(lines)
+def iter_filtered_log_entries(log_entries: Iterable[LogEntry],
+                              since: Optional[str] = None,
+                              until: Optional[str] = None,
+                              status: Optional[str] = None,
+                              grep: Optional[str] = None,
+                              templater: Optional[PathTemplater] = None) -> Iterator[LogEntry]:
+    # templater -- путь заменяется шаблоном до фильтров, так что grep и top путей работают с шаблонами
+    if templater is not None:
+        log_entries = map(templater.template_log_entry, log_entries)
+    return filter(make_log_filter(since, until, status, grep), log_entries)
 
 
-def filter_log_entries(log_entries: list[LogEntry],
+def filter_log_entries(log_entries: Iterable[LogEntry],
                        since: Optional[str] = None,
                        until: Optional[str] = None,
                        status: Optional[str] = None,
                        grep: Optional[str] = None) -> list[LogEntry]:
+    return list(iter_filtered_log_entries(log_entries, since, until, status, grep))
 
-    if since or until:
-        log_entries = filter_by_time(log_entries, since, until)
-
-    if status:
-        log_entries = filter_by_status(log_entries, status)
-
-    if grep:
-        log_entries = filter_by_reg(log_entries, grep)
 
-    return log_entries
+def merge_log_entries(streams: Iterable[Iterable[LogEntry]]) -> Iterator[LogEntry]:
+    # k-way слияние по ts: записи из разных файлов (ротаций, хостов) идут в общем порядке времени
+    return heapq.merge(*streams, key=attrgetter('ts'))
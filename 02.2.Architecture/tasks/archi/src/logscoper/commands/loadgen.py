@@ -0,0 +1,23 @@
+from __future__ import annotations
+import json
+
+
+def rate_to_txt(value: float | None) -> str:
+    return f"{value:.2f}" if value is not None else "n/a"
+
+
+def loadgen_to_txt(result: dict) -> str:
+    lines = [f"Sent: {result["lines"]} lines in {result["send_s"]:.3f} s",
+             f"Send rate: {rate_to_txt(result["send_lines_per_s"])} lines/s"]
+
+    if "ingest_s" in result:
+        lines.append(f"Ingested: {result["received"]} lines in {result["ingest_s"]:.3f} s")
+        lines.append(f"Ingest rate: {rate_to_txt(result["ingest_lines_per_s"])} lines/s")
+        lines.append(f"Lost: {result["lost"]}, dropped: {result["dropped"]}")
+
+    return "\n".join(lines)
+
+
+def loadgen_to_json(result: dict) -> str:
+    return (json.dumps(result,
+                       indent=2))
@@ -24,9 +24,30 @@ def stats_to_txt(stats: dict) -> str:
     for path, count in stats["top_paths"]:
         lines.append(f"{count} {path}")
 
+    if "grep" in stats:
+        lines.append("By grep:")
+        for pattern, count in stats["grep"].items():
+            lines.append(f"{count} {pattern}")
+
+    if "groups" in stats:
+        lines.extend(groups_to_txt(stats["groups"]))
+
     return "\n".join(lines)
 
 
+def groups_to_txt(rows: list[dict]) -> list[str]:
+    # колонки группы -- всё, что в строке до count
+    names = list(rows[0])[:list(rows[0]).index("count")] if rows else []
+    lines = [f"Groups ({", ".join(names)}):"]
+    for row in rows:
+        line = [str(row["count"])] + [str(row[name]) for name in names]
+        for name in ("avg", "p95", "p99"):
+            rt = row[f"rt_{name}_ms"]
+            line.append(f"{name}={rt:.2f}" if rt is not None else f"{name}=n/a")
+        lines.append(" ".join(line))
+    return lines
+
+
 def stats_to_json(stats: dict) -> str:
     return (json.dumps(stats,
                        indent=2))
@@ -0,0 +1,24 @@
+from __future__ import annotations
+import json
+from typing import Optional
+
+
+def ms_to_txt(value: Optional[float]) -> str:
+    return f"{value:.2f}" if value is not None else "n/a"
+
+
+def snapshot_to_txt(ts: str, snapshot: dict) -> str:
+    lines = [f"[{ts}]"]
+
+    for name, window in snapshot.items():
+        status = " ".join(f"{code}={count}" for code, count in window["status"].items())
+        lines.append(f"{name:>4}: total={window["total"]} rps={window["rps"]:.2f} "
+                     f"avg={ms_to_txt(window["rt_avg_ms"])} p95={ms_to_txt(window["rt_p95_ms"])} "
+                     f"p99={ms_to_txt(window["rt_p99_ms"])} ms  {status}".rstrip())
+
+    return "\n".join(lines)
+
+
+def snapshot_to_json(ts: str, snapshot: dict) -> str:
+    # одна строка на снимок, чтобы поток можно было читать построчно
+    return json.dumps({"ts": ts, "windows": snapshot})
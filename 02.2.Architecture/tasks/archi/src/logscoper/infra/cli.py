@@ -1,25 +1,202 @@
 from __future__ import annotations
 import argparse
+import asyncio
+import os
+import re
 import sys
-from typing import Optional
-from ..adapters.parser import read_log_file
-from ..commands.filter import filter_log_entries
+import time
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+from ..adapters.columns import write_log_columns
+from ..adapters.compressed import COMPRESSIONS, open_binary_output, open_output
+from ..adapters.follow import LogFollower
+from ..adapters.ingest import IngestServer, Ingestor, parse_address, require_aiohttp, run_server
+from ..adapters.loadgen import run_loadgen, sample_lines
+from ..adapters.parser import expand_paths, iter_log_file, iter_log_lines, iter_log_range, map_log_files
+from ..adapters.state import LogRange, StatsState, load_state, new_log_ranges, save_state
+from ..commands.filter import FORMATS, iter_filtered_log_entries
+from ..models.calculations import StatsAccumulator, accumulate_stats, build_hist, merge_hists
+from ..models.columnar import (EntryBatch, calculate_stats_numpy, fill_hist_numpy, grep_counts_numpy,
+                               require_numpy)
+from ..models.grep import counted_grep
+from ..models.groups import GroupBy, parse_group_by
+from ..models.histogram import HDR_SUB_BITS, LatencyHistogram
+from ..models.log_entry import LogEntry
+from ..models.sketch import TOP_CAPACITY
+from ..models.templates import DEFAULT_RULES, PathTemplater, parse_rule
+from ..models.windows import BUCKET_UNITS, RollingWindows, parse_duration, parse_windows
 
 
-def cmd_stats(args: argparse.Namespace) -> int:
-    from ..models.calculations import calculate_stats
-    from ..commands.stats import stats_to_txt, stats_to_json
+def path_templater(args: argparse.Namespace) -> Optional[PathTemplater]:
+    # --path-rule добавляет правила перед стандартными и сам включает шаблоны
+    if not args.path_templates and not args.path_rule:
+        return None
+    return PathTemplater([parse_rule(text) for text in args.path_rule] + list(DEFAULT_RULES))
+
+
+def group_by(args: argparse.Namespace) -> Optional[GroupBy]:
+    # --group-by/--bucket; path_template -- по тем же правилам, что и --path-templates
+    if args.group_by is None and args.bucket is None:
+        return None
+    dims = parse_group_by(args.group_by) if args.group_by is not None else ()
+    bucket_s = parse_duration(args.bucket, 'bucket', BUCKET_UNITS) if args.bucket is not None else None
+    templater = path_templater(args)
+    return GroupBy(dims, bucket_s, templater.rules if templater is not None else None)
+
+
+def line_grep(args: argparse.Namespace) -> Optional[list[str]]:
+    # --grep для отсева строк до разбора; с шаблонами он проверяется по шаблону, которого в строке лога нет
+    if args.path_templates or args.path_rule:
+        return None
+    return args.grep
+
+
+def stats_for_file(path: str, args: argparse.Namespace) -> StatsAccumulator:
+    # чтение, фильтры и подсчёт одним потоком: список записей файла не собирается
+    log_entries = iter_log_file(path, args.since, args.until, args.status, args.index, line_grep(args))
+    filtered_log_entries = iter_filtered_log_entries(
+        log_entries,
+        since=args.since,
+        until=args.until,
+        status=args.status,
+        grep=args.grep,
+        templater=path_templater(args)
+    )
+    return accumulate_stats(filtered_log_entries, args.approx_percentiles, args.approx_top, args.grep, group_by(args))
+
+
+def stats_for_range(log_range: LogRange, args: argparse.Namespace) -> StatsAccumulator:
+    # stats_for_file по непрочитанному куску лога для --state; времена ответа всегда идут в скетч
+    log_entries = iter_log_range(*log_range, args.since, args.until, args.status, line_grep(args))
+    filtered_log_entries = iter_filtered_log_entries(
+        log_entries,
+        since=args.since,
+        until=args.until,
+        status=args.status,
+        grep=args.grep,
+        templater=path_templater(args)
+    )
+    return accumulate_stats(filtered_log_entries, True, args.approx_top, args.grep, group_by(args))
+
+
+def incremental_stats(paths: list[str], args: argparse.Namespace) -> StatsAccumulator:
+    # Агрегат по всем запускам с одним --state: разбираются только байты, дописанные с прошлого запуска.
+    # Времена ответа хранятся скетчем -- список рос бы в файле состояния вместе с логом.
+    options = {
+        'since': args.since,
+        'until': args.until,
+        'status': args.status,
+        'grep': args.grep,
+        'path_templates': args.path_templates,
+        'path_rule': args.path_rule,
+        'approx_top': args.approx_top,
+        'group_by': args.group_by,
+        'bucket': args.bucket,
+    }
+    state = load_state(args.state, options)
+    acc = StatsAccumulator(True, None, counted_grep(args.grep), group_by(args))
+    if state.aggregate is not None:
+        try:
+            acc = StatsAccumulator.from_dict(state.aggregate)
+        except (KeyError, TypeError, ValueError):
+            state = StatsState(options)  # испорченный агрегат -- с нуля
+    for part in map_log_files(stats_for_range, new_log_ranges(paths, state), args.jobs, args):
+        acc.merge(part)
+    state.aggregate = acc.to_dict()
+    save_state(args.state, state)
+    return acc
+
 
-    all_log_entries = read_log_file(args.path)
-    filtered_log_entries = filter_log_entries(
-        all_log_entries,
+def batch_for_file(path: str, args: argparse.Namespace) -> EntryBatch:
+    # то же, что stats_for_file, но записи собираются столбцами для --engine numpy
+    log_entries = iter_log_file(path, args.since, args.until, args.status, args.index, line_grep(args))
+    filtered_log_entries = iter_filtered_log_entries(
+        log_entries,
         since=args.since,
         until=args.until,
         status=args.status,
-        grep=args.grep
+        grep=args.grep,
+        templater=path_templater(args)
     )
+    return EntryBatch.from_entries(filtered_log_entries)
 
-    stats = calculate_stats(filtered_log_entries, args.top)
+
+def hist_for_file(path: str, args: argparse.Namespace) -> tuple[LatencyHistogram, bool]:
+    # гистограмма по отфильтрованным записям и флаг "в файле вообще есть время ответа" для --strict;
+    # --strict смотрит на время ответа до фильтров, поэтому файл тогда читается без префильтра
+    has_req_time = False
+
+    def seen(log: LogEntry) -> LogEntry:
+        nonlocal has_req_time
+        has_req_time = has_req_time or log.request_time_s is not None
+        return log
+
+    if args.strict:
+        log_entries: Iterable[LogEntry] = map(seen, iter_log_file(path))
+    else:
+        log_entries = iter_log_file(path, args.since, args.until, args.status, args.index, line_grep(args))
+    filtered_log_entries = iter_filtered_log_entries(
+        log_entries,
+        since=args.since,
+        until=args.until,
+        status=args.status,
+        grep=args.grep,
+        templater=path_templater(args)
+    )
+    if args.engine == 'numpy':
+        req_time_ms = EntryBatch.from_entries(filtered_log_entries).req_time_ms
+        hist = fill_hist_numpy(LatencyHistogram(args.bucket_ms, args.hdr), req_time_ms)
+    else:
+        hist = build_hist(filtered_log_entries, args.bucket_ms, args.hdr)
+    return hist, has_req_time
+
+
+def check_path_rules(args: argparse.Namespace) -> bool:
+    try:
+        path_templater(args)
+    except (ValueError, re.error) as e:
+        print(f"Error! Invalid --path-rule: {e}", file=sys.stderr)
+        return False
+    return True
+
+
+def cmd_stats(args: argparse.Namespace) -> int:
+    from ..commands.stats import stats_to_txt, stats_to_json
+
+    if not check_path_rules(args):
+        return 1
+    if args.approx_top is not None and args.approx_top < 1:
+        print("Error! --approx-top capacity must be positive", file=sys.stderr)
+        return 1
+    try:
+        groups = group_by(args)
+    except ValueError as e:
+        print(f"Error! Invalid --group-by/--bucket: {e}", file=sys.stderr)
+        return 1
+    if groups is not None and args.engine == 'numpy':
+        print("Error! --group-by/--bucket work only with --engine python", file=sys.stderr)
+        return 1
+    if args.approx_top is not None and args.engine == 'numpy':
+        print("Error! --approx-top works only with --engine python", file=sys.stderr)
+        return 1
+    if args.state and (args.engine == 'numpy' or args.index):
+        print("Error! --state works only with --engine python and without --index", file=sys.stderr)
+        return 1
+    paths = expand_paths(args.path)
+    if args.state:
+        stats = incremental_stats(paths, args).result(args.top)
+    elif args.engine == 'numpy':
+        require_numpy()
+        batch = EntryBatch.concat(map_log_files(batch_for_file, paths, args.jobs, args))
+        stats = calculate_stats_numpy(batch, args.top, args.approx_percentiles)
+        grep = counted_grep(args.grep)
+        if grep is not None:
+            stats['grep'] = grep_counts_numpy(batch, grep)
+    else:
+        acc = StatsAccumulator(args.approx_percentiles, args.approx_top, counted_grep(args.grep), groups)
+        for part in map_log_files(stats_for_file, paths, args.jobs, args):
+            acc.merge(part)
+        stats = acc.result(args.top)
 
     if args.json:
         print(stats_to_json(stats))
@@ -30,57 +207,191 @@ def cmd_stats(args: argparse.Namespace) -> int:
 
 
 def cmd_filter(args: argparse.Namespace) -> int:
-    from ..commands.filter import log_entries_to_txt
+    from ..commands.filter import merge_log_entries, write_log_entries, write_log_entries_jsonl
 
-    all_log_entries = read_log_file(args.path)
-    filtered_log_entries = filter_log_entries(
-        all_log_entries,
-        since=args.since,
-        until=args.until,
-        status=args.status,
-        grep=args.grep
+    filtered_log_entries = merge_log_entries(
+        iter_filtered_log_entries(
+            iter_log_file(path, args.since, args.until, args.status, args.index, args.grep),
+            since=args.since,
+            until=args.until,
+            status=args.status,
+            grep=args.grep
+        )
+        for path in expand_paths(args.path)
     )
 
-    output_text = log_entries_to_txt(filtered_log_entries)
+    if not args.out and args.compress != 'auto':
+        print("Error! --compress needs --out", file=sys.stderr)
+        return 1
+    if args.format == 'columns':
+        try:
+            if args.out:
+                with open_binary_output(args.out, args.compress) as binary:
+                    write_log_columns(filtered_log_entries, binary)
+            else:
+                write_log_columns(filtered_log_entries, sys.stdout.buffer)
+                sys.stdout.buffer.flush()
+        except ValueError as e:
+            print(f"Error! --format columns: {e}", file=sys.stderr)
+            return 1
+        return 0
 
+    write = write_log_entries_jsonl if args.format == 'jsonl' else write_log_entries
     if args.out:
-        with open(args.out, 'w') as f:
-            f.write(output_text + '\n')
+        with open_output(args.out, args.compress) as f:
+            write(filtered_log_entries, f)
     else:
-        print(output_text)
+        write(filtered_log_entries, sys.stdout)
 
     return 0
 
 
 def cmd_hist(args: argparse.Namespace) -> int:
-    from ..models.calculations import calculate_hist
     from ..commands.hist import hist_to_txt, hist_to_json
 
-    all_log_entries = read_log_file(args.path)
-    if args.strict:
-        all_req_time = [log.request_time_s for log in all_log_entries if log.request_time_s is not None]
-        if len(all_req_time) == 0:
-            print("Error! No request time data found while --strict flag", file=sys.stderr)
-            return 1
+    if not check_path_rules(args):
+        return 1
+    try:
+        hist = LatencyHistogram(args.bucket_ms, args.hdr)
+    except ValueError as e:
+        print(f"Error! Invalid --bucket-ms/--hdr: {e}", file=sys.stderr)
+        return 1
+    if args.engine == 'numpy':
+        require_numpy()
+    parts = map_log_files(hist_for_file, expand_paths(args.path), args.jobs, args)
+    if args.strict and not any(has_req_time for _, has_req_time in parts):
+        print("Error! No request time data found while --strict flag", file=sys.stderr)
+        return 1
 
-    filtered_log_entries = filter_log_entries(
-        all_log_entries,
-        since=args.since,
-        until=args.until,
-        status=args.status,
-        grep=args.grep
-    )
+    hist = merge_hists([hist, *(part for part, _ in parts)])
+
+    if args.json:
+        print(hist_to_json(hist.labels()))
+    else:
+        print(hist_to_txt(hist.labels()))
+
+    return 0
+
+
+def cmd_tail(args: argparse.Namespace) -> int:
+    from ..commands.tail import snapshot_to_txt, snapshot_to_json
+
+    # Живой лог: каждая новая строка -- O(1) в кольцо окон, файл не перечитывается.
+    # Без --follow -- один проход с начала и один снимок.
+    try:
+        windows = parse_windows(args.windows)
+    except ValueError as e:
+        print(f"Error! Invalid --windows: {e}", file=sys.stderr)
+        return 1
+    if args.interval <= 0 or args.poll <= 0:
+        print("Error! --interval and --poll must be positive", file=sys.stderr)
+        return 1
+    rolling = RollingWindows(windows)
+    # "сейчас" -- время самой новой записи плюс сколько прошло с её чтения: окна пустеют, когда лог
+    # замолкает, и не зависят от часов хоста
+    last_epoch: Optional[float] = None
+    last_seen = time.monotonic()
 
-    hist = calculate_hist(filtered_log_entries, args.bucket_ms)
+    def consume(follower: LogFollower) -> None:
+        nonlocal last_epoch, last_seen
+        for log in iter_filtered_log_entries(iter_log_lines(follower.poll()), status=args.status, grep=args.grep):
+            epoch = log.ts.timestamp()
+            req_time_ms = None if log.request_time_s is None else log.request_time_s * 1000
+            rolling.add(epoch, log.status, req_time_ms)
+            if last_epoch is None or epoch >= last_epoch:
+                last_epoch = epoch
+                last_seen = time.monotonic()
+
+    def emit() -> None:
+        now = (time.time() if last_epoch is None else last_epoch) + time.monotonic() - last_seen
+        ts = datetime.fromtimestamp(now, timezone.utc).isoformat()
+        if args.json:
+            print(snapshot_to_json(ts, rolling.snapshot(now)), flush=True)
+        else:
+            print(snapshot_to_txt(ts, rolling.snapshot(now)), flush=True)
+
+    with LogFollower(args.path, from_start=args.from_start or not args.follow) as follower:
+        consume(follower)
+        if not args.follow:
+            last_seen = time.monotonic()
+            emit()
+            return 0
+        deadline = time.monotonic() + args.interval
+        while True:
+            time.sleep(min(args.poll, args.interval))
+            consume(follower)
+            if time.monotonic() >= deadline:
+                emit()
+                deadline += args.interval
+
+
+def socket_address(text: Optional[str], flag: str) -> Optional[tuple[str, int]]:
+    # None -- адреса нет; ValueError -- адрес ошибочный
+    if text is None:
+        return None
+    try:
+        return parse_address(text)
+    except ValueError as e:
+        raise ValueError(f'Invalid {flag}: {e}') from e
+
+
+def cmd_serve(args: argparse.Namespace) -> int:
+    require_aiohttp()
+    if not check_path_rules(args):
+        return 1
+    try:
+        udp, tcp = socket_address(args.udp, '--udp'), socket_address(args.tcp, '--tcp')
+        http = socket_address(args.http, '--http')
+    except ValueError as e:
+        print(f"Error! {e}", file=sys.stderr)
+        return 1
+    if not (udp or tcp or args.unix):
+        print("Error! serve needs at least one of --udp, --tcp, --unix", file=sys.stderr)
+        return 1
+    if args.batch_size < 1 or args.queue < 1:
+        print("Error! --batch-size and --queue must be positive", file=sys.stderr)
+        return 1
+    if args.approx_top is not None and args.approx_top < 1:
+        print("Error! --approx-top capacity must be positive", file=sys.stderr)
+        return 1
+    ingestor = Ingestor(args.jobs, args.batch_size, args.queue, args.status, args.grep, args.approx_top,
+                        path_templater(args))
+    asyncio.run(run_server(IngestServer(ingestor, http, udp, tcp, args.unix)))
+    return 0
+
+
+def cmd_loadgen(args: argparse.Namespace) -> int:
+    from ..commands.loadgen import loadgen_to_txt, loadgen_to_json
+
+    try:
+        udp, tcp = socket_address(args.udp, '--udp'), socket_address(args.tcp, '--tcp')
+    except ValueError as e:
+        print(f"Error! {e}", file=sys.stderr)
+        return 1
+    if args.lines < 1 or args.connections < 1:
+        print("Error! --lines and --connections must be positive", file=sys.stderr)
+        return 1
+    lines = sample_lines(args.lines, args.seed)
+    result = asyncio.run(run_loadgen(lines, tcp, udp, args.unix, args.connections, args.http))
 
     if args.json:
-        print(hist_to_json(hist))
+        print(loadgen_to_json(result))
     else:
-        print(hist_to_txt(hist))
+        print(loadgen_to_txt(result))
 
     return 0
 
 
+def grep_file(path: str) -> list[str]:
+    # шаблон на строку; пустые строки и строки с "#" в начале пропускаются
+    try:
+        with open(path, encoding='utf-8') as f:
+            lines = [line.rstrip('\r\n') for line in f]
+    except OSError as e:
+        raise argparse.ArgumentTypeError(f'cannot read {path}: {e.strerror}')
+    return [line for line in lines if line.strip() and not line.startswith('#')]
+
+
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         prog="logscoper",
@@ -90,37 +401,104 @@ def build_parser() -> argparse.ArgumentParser:
 
     # stats
     ps = sub.add_parser("stats", help="Show aggregated stats")
-    ps.add_argument("--path", required=True)
+    ps.add_argument("--path", required=True, nargs="+", action="extend")
     ps.add_argument("--top", type=int, default=10)
     ps.add_argument("--since")
     ps.add_argument("--until")
     ps.add_argument("--status")
-    ps.add_argument("--grep")
+    ps.add_argument("--grep", action="append")
+    ps.add_argument("--grep-file", type=grep_file, action="extend", dest="grep")
+    ps.add_argument("--path-templates", action="store_true", dest="path_templates")
+    ps.add_argument("--path-rule", action="append", default=[], dest="path_rule")
+    ps.add_argument("--index", action="store_true")
+    ps.add_argument("--state", metavar="FILE")
     ps.add_argument("--json", action="store_true")
+    ps.add_argument("--approx-percentiles", action="store_true", dest="approx_percentiles")
+    ps.add_argument("--approx-top", type=int, nargs="?", const=TOP_CAPACITY, metavar="CAPACITY", dest="approx_top")
+    ps.add_argument("--jobs", type=int, default=1)
+    ps.add_argument("--engine", choices=["python", "numpy"], default="python")
+    ps.add_argument("--group-by", metavar="DIMS", dest="group_by")
+    ps.add_argument("--bucket", metavar="DURATION")
     ps.set_defaults(func=cmd_stats)
 
     # filter
     pf = sub.add_parser("filter", help="Filter and print normalized lines")
-    pf.add_argument("--path", required=True)
+    pf.add_argument("--path", required=True, nargs="+", action="extend")
     pf.add_argument("--since")
     pf.add_argument("--until")
     pf.add_argument("--status")
-    pf.add_argument("--grep")
+    pf.add_argument("--grep", action="append")
+    pf.add_argument("--grep-file", type=grep_file, action="extend", dest="grep")
+    pf.add_argument("--index", action="store_true")
     pf.add_argument("--out")
+    pf.add_argument("--format", choices=FORMATS, default="text")
+    pf.add_argument("--compress", choices=["auto", "none", *COMPRESSIONS], default="auto")
     pf.set_defaults(func=cmd_filter)
 
     # hist
     ph = sub.add_parser("hist", help="Request time histogram")
-    ph.add_argument("--path", required=True)
+    ph.add_argument("--path", required=True, nargs="+", action="extend")
     ph.add_argument("--bucket-ms", type=int, default=100, dest="bucket_ms")
+    # log-linear корзины: 2**BITS на удвоение, --bucket-ms -- ширина самых узких
+    ph.add_argument("--hdr", type=int, nargs="?", const=HDR_SUB_BITS, metavar="BITS")
     ph.add_argument("--since")
     ph.add_argument("--until")
     ph.add_argument("--status")
-    ph.add_argument("--grep")
+    ph.add_argument("--grep", action="append")
+    ph.add_argument("--grep-file", type=grep_file, action="extend", dest="grep")
+    ph.add_argument("--path-templates", action="store_true", dest="path_templates")
+    ph.add_argument("--path-rule", action="append", default=[], dest="path_rule")
+    ph.add_argument("--index", action="store_true")
     ph.add_argument("--json", action="store_true")
     ph.add_argument("--strict", action="store_true")
+    ph.add_argument("--jobs", type=int, default=1)
+    ph.add_argument("--engine", choices=["python", "numpy"], default="python")
     ph.set_defaults(func=cmd_hist)
 
+    # tail
+    pt = sub.add_parser("tail", help="Rolling window stats of a growing log")
+    pt.add_argument("--path", required=True)
+    pt.add_argument("--follow", "-f", action="store_true")
+    pt.add_argument("--from-start", action="store_true", dest="from_start")
+    pt.add_argument("--interval", type=float, default=5.0)
+    pt.add_argument("--poll", type=float, default=0.25)
+    pt.add_argument("--windows", default="1m,5m,15m")
+    pt.add_argument("--status")
+    pt.add_argument("--grep", action="append")
+    pt.add_argument("--grep-file", type=grep_file, action="extend", dest="grep")
+    pt.add_argument("--json", action="store_true")
+    pt.set_defaults(func=cmd_tail)
+
+    # serve
+    pv = sub.add_parser("serve", help="Ingest log lines from sockets, serve stats over HTTP")
+    pv.add_argument("--udp", metavar="HOST:PORT")
+    pv.add_argument("--tcp", metavar="HOST:PORT")
+    pv.add_argument("--unix", metavar="PATH")
+    pv.add_argument("--http", metavar="HOST:PORT", default="127.0.0.1:8080")
+    pv.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    pv.add_argument("--batch-size", type=int, default=1000, dest="batch_size")
+    pv.add_argument("--queue", type=int, default=64)
+    pv.add_argument("--status")
+    pv.add_argument("--grep", action="append")
+    pv.add_argument("--grep-file", type=grep_file, action="extend", dest="grep")
+    pv.add_argument("--path-templates", action="store_true", dest="path_templates")
+    pv.add_argument("--path-rule", action="append", default=[], dest="path_rule")
+    pv.add_argument("--approx-top", type=int, nargs="?", const=TOP_CAPACITY, metavar="CAPACITY", dest="approx_top")
+    pv.set_defaults(func=cmd_serve)
+
+    # loadgen
+    pl = sub.add_parser("loadgen", help="Send synthetic log lines to serve")
+    target = pl.add_mutually_exclusive_group(required=True)
+    target.add_argument("--udp", metavar="HOST:PORT")
+    target.add_argument("--tcp", metavar="HOST:PORT")
+    target.add_argument("--unix", metavar="PATH")
+    pl.add_argument("--http", metavar="URL")
+    pl.add_argument("--lines", type=int, default=100_000)
+    pl.add_argument("--connections", type=int, default=4)
+    pl.add_argument("--seed", type=int, default=0)
+    pl.add_argument("--json", action="store_true")
+    pl.set_defaults(func=cmd_loadgen)
+
     return parser
 
 
@@ -132,6 +510,12 @@ def main(argv: Optional[list[str]] = None) -> int:
     except FileNotFoundError as e:
         print(f"Error! File '{e.filename}' is not found", file=sys.stderr)
         return 2
+    except ImportError as e:
+        # например .zst без установленного zstandard
+        print(f"Error! {e}", file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        return 130
     except ValueError:
         print("Error! Invalid date format", file=sys.stderr)
         sys.exit(1)
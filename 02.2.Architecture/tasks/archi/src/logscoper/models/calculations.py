@@ -1,63 +1,200 @@
 from __future__ import annotations
+from operator import itemgetter
+from typing import Any, Iterable, Optional
+import heapq
+from .grep import Grep, GrepSet, counted_grep, grep_set
+from .groups import GroupBy, GroupedSeries
+from .histogram import LatencyHistogram
 from .log_entry import LogEntry
+from .sketch import QuantileSketch, SpaceSaving
 
 
-def calculate_stats(log_entries: list[LogEntry], top_number: int = 10) -> dict:
-    if not log_entries:
+class StatsAccumulator:
+    # Все метрики stats за один проход по записям; память не зависит от числа записей, кроме времён
+    # ответа для точных перцентилей (с approx_percentiles -- только скетч). Части, посчитанные по
+    # отдельным файлам, складываются через merge() в порядке файлов. approx_top -- считать пути скетчем
+    # Space-Saving на столько счётчиков вместо словаря по всем путям.
+    # grep -- при нескольких --grep ещё и сколько записей подошло под каждый шаблон.
+    # group_by -- ещё и ряды по группам и интервалам времени (--group-by/--bucket).
+    def __init__(self,
+                 approx_percentiles: bool = False,
+                 approx_top: Optional[int] = None,
+                 grep: Optional[GrepSet] = None,
+                 group_by: Optional[GroupBy] = None) -> None:
+        self.total = 0
+        self.grep = grep
+        self.grep_counts = [0] * len(grep) if grep is not None else []
+        self.dist_status: dict[int, int] = {}
+        self.path_counts: dict[str, int] = {}
+        self.sketch: Optional[QuantileSketch] = QuantileSketch() if approx_percentiles else None
+        self.path_sketch: Optional[SpaceSaving] = SpaceSaving(approx_top) if approx_top is not None else None
+        self.req_time: list[float] = []
+        self.groups: Optional[GroupedSeries] = GroupedSeries(group_by) if group_by is not None else None
+
+    def add(self, log: LogEntry) -> None:
+        self.total += 1
+        self.dist_status[log.status] = self.dist_status.get(log.status, 0) + 1
+        if self.groups is not None:
+            self.groups.add(log)
+        if self.grep is not None:
+            for i in self.grep.matches(log.path):
+                self.grep_counts[i] += 1
+        if self.path_sketch is not None:
+            self.path_sketch.add(log.path)
+        else:
+            self.path_counts[log.path] = self.path_counts.get(log.path, 0) + 1
+        if log.request_time_s is not None:
+            if self.sketch is not None:
+                self.sketch.add(log.request_time_s * 1000)
+            else:
+                self.req_time.append(log.request_time_s * 1000)
+
+    def merge(self, other: StatsAccumulator) -> StatsAccumulator:
+        self.total += other.total
+        for status, count in other.dist_status.items():
+            self.dist_status[status] = self.dist_status.get(status, 0) + count
+        if other.grep is not None:
+            if self.grep is None:
+                self.grep, self.grep_counts = other.grep, [0] * len(other.grep)
+            for i, count in enumerate(other.grep_counts):
+                self.grep_counts[i] += count
+        if other.groups is not None:
+            if self.groups is None:
+                self.groups = GroupedSeries(other.groups.spec)
+            self.groups.merge(other.groups)
+        if other.path_sketch is not None and self.path_sketch is None:
+            self.path_sketch = SpaceSaving(other.path_sketch.capacity).update(self.path_counts.items())
+            self.path_counts = {}
+        if self.path_sketch is not None:
+            self.path_sketch.update(other.path_counts.items())
+            if other.path_sketch is not None:
+                self.path_sketch.merge(other.path_sketch)
+        else:
+            for path, count in other.path_counts.items():
+                self.path_counts[path] = self.path_counts.get(path, 0) + count
+        if self.sketch is not None and other.sketch is not None:
+            self.sketch.merge(other.sketch)
+        self.req_time.extend(other.req_time)
+        return self
+
+    def to_dict(self) -> dict[str, Any]:
+        # для JSON (stats --state): ключи статусов -- строки, скетчи -- словари
         return {
-            "total": 0,
-            "status": {},
-            "rt_avg_ms": None,
-            "rt_p95_ms": None,
-            "rt_p99_ms": None,
-            "top_paths": []
+            'total': self.total,
+            'dist_status': {str(status): count for status, count in self.dist_status.items()},
+            'path_counts': self.path_counts,
+            'req_time': self.req_time,
+            'sketch': self.sketch.to_dict() if self.sketch is not None else None,
+            'path_sketch': self.path_sketch.to_dict() if self.path_sketch is not None else None,
+            'grep': list(self.grep.patterns) if self.grep is not None else None,
+            'grep_counts': self.grep_counts,
+            'groups': self.groups.to_dict() if self.groups is not None else None,
         }
 
-    total_log_entries = len(log_entries)
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> StatsAccumulator:
+        acc = cls()
+        acc.total = data['total']
+        acc.dist_status = {int(status): count for status, count in data['dist_status'].items()}
+        acc.path_counts = dict(data['path_counts'])
+        acc.req_time = list(data['req_time'])
+        if data['sketch'] is not None:
+            acc.sketch = QuantileSketch.from_dict(data['sketch'])
+        if data['path_sketch'] is not None:
+            acc.path_sketch = SpaceSaving.from_dict(data['path_sketch'])
+        acc.grep = grep_set(data['grep'])
+        acc.grep_counts = list(data['grep_counts'])
+        if data['groups'] is not None:
+            acc.groups = GroupedSeries.from_dict(data['groups'])
+        return acc
 
-    dist_status: dict[int, int] = {}
-    for log in log_entries:
-        dist_status[log.status] = dist_status.get(log.status, 0) + 1
-
-    req_time = [log.request_time_s * 1000 for log in log_entries if log.request_time_s is not None]
-
-    if req_time:
-        avg_req_time = round(sum(req_time) / len(req_time), 2)
-        sorted_time = sorted(req_time)
-        p95_ind = min(len(sorted_time) - 1, int(len(sorted_time) * 0.95))
-        p99_ind = min(len(sorted_time) - 1, int(len(sorted_time) * 0.99))
-        p95_req_time = sorted_time[p95_ind]
-        p99_req_time = sorted_time[p99_ind]
-    else:
-        avg_req_time = None
-        p95_req_time = None
-        p99_req_time = None
-
-    path_counts: dict[str, int] = {}
+    def result(self, top_number: int = 10) -> dict:
+        stats = self.calculate_result(top_number)
+        if self.grep is not None:
+            stats['grep'] = dict(zip(self.grep.patterns, self.grep_counts))
+        if self.groups is not None:
+            stats['groups'] = self.groups.rows()
+        return stats
+
+    def calculate_result(self, top_number: int) -> dict:
+        if not self.total:
+            return {
+                "total": 0,
+                "status": {},
+                "rt_avg_ms": None,
+                "rt_p95_ms": None,
+                "rt_p99_ms": None,
+                "top_paths": []
+            }
+
+        if self.sketch is not None:
+            sketch = self.sketch
+            avg_req_time = round(sketch.sum / sketch.count, 2) if sketch.count else None
+            p95_req_time = sketch.quantile(0.95)
+            p99_req_time = sketch.quantile(0.99)
+        elif self.req_time:
+            req_time = self.req_time
+            avg_req_time = round(sum(req_time) / len(req_time), 2)
+            sorted_time = sorted(req_time)
+            p95_ind = min(len(sorted_time) - 1, int(len(sorted_time) * 0.95))
+            p99_ind = min(len(sorted_time) - 1, int(len(sorted_time) * 0.99))
+            p95_req_time = sorted_time[p95_ind]
+            p99_req_time = sorted_time[p99_ind]
+        else:
+            avg_req_time = None
+            p95_req_time = None
+            p99_req_time = None
+
+        path_counts = self.path_sketch.counts if self.path_sketch is not None else self.path_counts
+        if top_number >= 0:
+            # куча на top_number путей вместо сортировки всех; порядок тот же, что у sorted(...)[:top_number]
+            top_paths = heapq.nlargest(top_number, path_counts.items(), key=itemgetter(1))
+        else:
+            top_paths = sorted(path_counts.items(), key=lambda i: i[1], reverse=True)[:top_number]
+
+        return {
+            "total": self.total,
+            "status": self.dist_status,
+            "rt_avg_ms": avg_req_time,
+            "rt_p95_ms": p95_req_time,
+            "rt_p99_ms": p99_req_time,
+            "top_paths": top_paths
+        }
+
+
+def accumulate_stats(log_entries: Iterable[LogEntry],
+                     approx_percentiles: bool = False,
+                     approx_top: Optional[int] = None,
+                     grep: Optional[Grep] = None,
+                     group_by: Optional[GroupBy] = None) -> StatsAccumulator:
+    acc = StatsAccumulator(approx_percentiles, approx_top, counted_grep(grep), group_by)
     for log in log_entries:
-        path_counts[log.path] = path_counts.get(log.path, 0) + 1
+        acc.add(log)
+    return acc
+
 
-    top_paths = sorted(path_counts.items(), key=lambda i: i[1], reverse=True)[:top_number]
+def calculate_stats(log_entries: Iterable[LogEntry],
+                    top_number: int = 10,
+                    approx_percentiles: bool = False,
+                    approx_top: Optional[int] = None,
+                    grep: Optional[Grep] = None,
+                    group_by: Optional[GroupBy] = None) -> dict:
+    return accumulate_stats(log_entries, approx_percentiles, approx_top, grep, group_by).result(top_number)
 
-    return {
-        "total": total_log_entries,
-        "status": dist_status,
-        "rt_avg_ms": avg_req_time,
-        "rt_p95_ms": p95_req_time,
-        "rt_p99_ms": p99_req_time,
-        "top_paths": top_paths
-    }
 
+def build_hist(log_entries: Iterable[LogEntry], bucket_ms: int, sub_bits: Optional[int] = None) -> LatencyHistogram:
+    req_time = (log.request_time_s * 1000 for log in log_entries if log.request_time_s is not None)
+    return LatencyHistogram(bucket_ms, sub_bits).update(req_time)
 
-def calculate_hist(log_entries: list[LogEntry], bucket_ms: int) -> dict:
 
-    req_time = [log.request_time_s * 1000 for log in log_entries if log.request_time_s is not None]
-    hist: dict[str, float] = {}
+def calculate_hist(log_entries: Iterable[LogEntry], bucket_ms: int) -> dict:
+    return build_hist(log_entries, bucket_ms).labels()
 
-    for rt in req_time:
-        buck_start = (rt // bucket_ms) * bucket_ms
-        buck_end = buck_start + bucket_ms
-        buck_key = f"{int(buck_start)}-{int(buck_end)}"
-        hist[buck_key] = hist.get(buck_key, 0) + 1
 
-    return dict(sorted(hist.items()))
+def merge_hists(parts: Iterable[LatencyHistogram]) -> LatencyHistogram:
+    # части по файлам -- массивы счётчиков, без строк
+    parts = iter(parts)
+    hist = next(parts)
+    for part in parts:
+        hist.merge(part)
+    return hist
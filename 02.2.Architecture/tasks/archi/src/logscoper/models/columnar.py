@@ -0,0 +1,150 @@
+from __future__ import annotations
+from array import array
+from dataclasses import dataclass
+from typing import Any, Iterable
+from .grep import GrepSet
+from .histogram import LatencyHistogram
+from .log_batch import StringPool
+from .log_entry import LogEntry
+from .sketch import QuantileSketch
+
+try:
+    import numpy as np
+except ImportError:  # numpy -- необязательная зависимость, нужна только --engine numpy
+    np = None
+
+
+def require_numpy() -> None:
+    if np is None:
+        raise ImportError("--engine numpy needs 'numpy' installed", name='numpy')
+
+
+# Пакет записей столбцами NumPy для --engine numpy: статус, код пути в словаре paths и время ответа в мс
+# (только у записей, где оно есть). Результаты совпадают с calculate_stats/calculate_hist до бита: сумма
+# времён идёт последовательно (cumsum, а не попарный np.sum), статусы и равные по счёту пути упорядочены
+# по первому появлению, как в словарях чистого Python.
+@dataclass
+class EntryBatch:
+    status: Any
+    path_codes: Any
+    paths: list[str]
+    req_time_ms: Any
+
+    def __len__(self) -> int:
+        return len(self.status)
+
+    @classmethod
+    def from_entries(cls, log_entries: Iterable[LogEntry]) -> EntryBatch:
+        require_numpy()
+        status, codes, req_time = array('q'), array('q'), array('d')
+        paths = StringPool(limit=None)
+        for log in log_entries:
+            status.append(log.status)
+            codes.append(paths.code(log.path))
+            if log.request_time_s is not None:
+                req_time.append(log.request_time_s)
+        return cls(np.array(status, np.int64), np.array(codes, np.int64), paths.values,
+                   np.array(req_time, np.float64) * 1000)
+
+    @classmethod
+    def concat(cls, batches: list[EntryBatch]) -> EntryBatch:
+        # Слияние в порядке batches (то есть файлов); словари путей объединяются
+        if not batches:
+            return cls.from_entries(())
+        index: dict[str, int] = {}
+        codes = []
+        for batch in batches:
+            remap = [index.setdefault(path, len(index)) for path in batch.paths]
+            codes.append(np.array(remap, np.int64)[batch.path_codes])
+        return cls(np.concatenate([batch.status for batch in batches]), np.concatenate(codes), list(index),
+                   np.concatenate([batch.req_time_ms for batch in batches]))
+
+
+def first_seen_counts(values: Any) -> tuple[list[int], list[int]]:
+    # Уникальные значения и их счётчики в порядке первого появления
+    uniq, first, counts = np.unique(values, return_index=True, return_counts=True)
+    order = np.argsort(first)
+    return uniq[order].tolist(), counts[order].tolist()
+
+
+def calculate_stats_numpy(batch: EntryBatch, top_number: int = 10, approx_percentiles: bool = False) -> dict:
+    if not len(batch):
+        return {
+            "total": 0,
+            "status": {},
+            "rt_avg_ms": None,
+            "rt_p95_ms": None,
+            "rt_p99_ms": None,
+            "top_paths": []
+        }
+
+    dist_status = dict(zip(*first_seen_counts(batch.status)))
+
+    req_time = batch.req_time_ms
+    if approx_percentiles:
+        sketch = QuantileSketch().update(req_time.tolist())
+        avg_req_time = round(sketch.sum / sketch.count, 2) if sketch.count else None
+        p95_req_time = sketch.quantile(0.95)
+        p99_req_time = sketch.quantile(0.99)
+    elif len(req_time):
+        avg_req_time = round(float(np.cumsum(req_time)[-1]) / len(req_time), 2)
+        p95_ind = min(len(req_time) - 1, int(len(req_time) * 0.95))
+        p99_ind = min(len(req_time) - 1, int(len(req_time) * 0.99))
+        part = np.partition(req_time, (p95_ind, p99_ind))
+        p95_req_time = float(part[p95_ind])
+        p99_req_time = float(part[p99_ind])
+    else:
+        avg_req_time = None
+        p95_req_time = None
+        p99_req_time = None
+
+    codes, counts = first_seen_counts(batch.path_codes)
+    counts_arr = np.array(counts, np.int64)
+    candidates = np.arange(len(counts))
+    if 0 < top_number < len(counts):
+        # сортируются только пути со счётом не меньше top_number-го по величине (равные ему тоже)
+        nth = np.partition(counts_arr, len(counts) - top_number)[len(counts) - top_number]
+        candidates = np.flatnonzero(counts_arr >= nth)
+    # сортировка устойчивая: равные по счёту пути остаются в порядке первого появления
+    order = candidates[np.argsort(-counts_arr[candidates], kind='stable')][:top_number]
+    top_paths = [(batch.paths[codes[i]], counts[i]) for i in order.tolist()]
+
+    return {
+        "total": len(batch),
+        "status": dist_status,
+        "rt_avg_ms": avg_req_time,
+        "rt_p95_ms": p95_req_time,
+        "rt_p99_ms": p99_req_time,
+        "top_paths": top_paths
+    }
+
+
+def grep_counts_numpy(batch: EntryBatch, grep: GrepSet) -> dict[str, int]:
+    # счётчики шаблонов -- по словарю путей, с весом числа записей пути
+    grep_counts = [0] * len(grep)
+    per_path = np.bincount(batch.path_codes, minlength=len(batch.paths))
+    for path, count in zip(batch.paths, per_path.tolist()):
+        if count:
+            for i in grep.matches(path):
+                grep_counts[i] += count
+    return dict(zip(grep.patterns, grep_counts))
+
+
+def fill_hist_numpy(hist: LatencyHistogram, req_time_ms: Any) -> LatencyHistogram:
+    # то же, что hist.update: номера корзин -- столбцом, счёт -- np.unique
+    if not len(req_time_ms):
+        return hist
+    quotients = np.floor_divide(req_time_ms, hist.bucket_ms).astype(np.int64)
+    if hist.sub_bits is not None:
+        # bit_length(q) -- показатель из frexp, для q < 2**53 точный
+        shift = np.maximum(np.frexp(quotients)[1] - hist.sub_bits - 1, 0)
+        quotients = (shift << hist.sub_bits) + (quotients >> shift)
+    indices, counts = np.unique(quotients, return_counts=True)
+    for index, count in zip(indices.tolist(), counts.tolist()):
+        hist.add_index(index, count)
+    return hist
+
+
+def calculate_hist_numpy(req_time_ms: Any, bucket_ms: int) -> dict:
+    # то же, что calculate_hist
+    return fill_hist_numpy(LatencyHistogram(bucket_ms), req_time_ms).labels()
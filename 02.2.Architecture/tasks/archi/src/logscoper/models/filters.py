@@ -1,26 +1,63 @@
 from __future__ import annotations
 from datetime import datetime
-from typing import Optional
+from typing import Callable, Optional
 import re
+from .grep import Grep, grep_set
 from .log_entry import LogEntry
 
 
+# Все коды, которые даёт (?P<status>\d{3})
+CODES = 1000
+INVALID = 2
+
+
+def match_status(code: int, status_patterns: list[str]) -> bool:
+    # Шаблоны проверяются по порядку; ошибочный шаблон даёт ValueError, если до него ничего не совпало
+    for pat in status_patterns:
+        if pat.endswith('xx'):
+            status_type = int(pat[0]) * 100
+            if status_type <= code < status_type + 100:
+                return True
+        elif code == int(pat):
+            return True
+    return False
+
+
+class StatusSelector:
+    # --status, разобранный один раз в таблицу по всем трёхзначным кодам: проверка записи -- один
+    # индекс вместо разбора шаблонов. В table 1 -- код проходит, 0 -- нет, INVALID -- на этом коде
+    # фильтр падает с ValueError (например, "404,abc" для кода 200).
+    def __init__(self, status_filter: str) -> None:
+        self.patterns = [s.strip() for s in status_filter.split(',')]
+        table = bytearray(CODES)
+        for code in range(CODES):
+            try:
+                table[code] = match_status(code, self.patterns)
+            except ValueError:
+                table[code] = INVALID
+        self.table = bytes(table)
+
+    @property
+    def codes(self) -> Optional[frozenset[int]]:
+        # Все коды, которые пропустит фильтр; None -- если фильтр с ошибкой и сузить набор заранее нельзя
+        if INVALID in self.table:
+            return None
+        return frozenset(code for code in range(CODES) if self.table[code])
+
+    def matches(self, code: int) -> bool:
+        verdict = self.table[code] if 0 <= code < CODES else INVALID
+        if verdict == INVALID:
+            return match_status(code, self.patterns)  # поднимет ту же ValueError, что и раньше
+        return verdict == 1
+
+
 def filter_by_status(log_entries: list[LogEntry], status_filter: str) -> list[LogEntry]:
-    filtered = []
-    status_patterns = [s.strip() for s in status_filter.split(',')]
-    for log in log_entries:
-        for pat in status_patterns:
-            if pat.endswith('xx'):
-                status_type = int(pat[0]) * 100
-                if status_type <= log.status < status_type + 100:
-                    filtered.append(log)
-                    break
-            else:
-                if log.status == int(pat):
-                    filtered.append(log)
-                    break
+    selector = StatusSelector(status_filter)
+    return [log for log in log_entries if selector.matches(log.status)]
 
-    return filtered
+
+def status_codes(status_filter: str) -> Optional[frozenset[int]]:
+    return StatusSelector(status_filter).codes
 
 
 def filter_by_time(
@@ -52,6 +89,29 @@ def filter_by_reg(log_entries: list[LogEntry], pattern: str) -> list[LogEntry]:
     return [log for log in log_entries if reg.search(log.path)]
 
 
+def make_log_filter(since: Optional[str] = None,
+                    until: Optional[str] = None,
+                    status: Optional[str] = None,
+                    grep: Optional[Grep] = None) -> Callable[[LogEntry], bool]:
+    # filter_by_time, filter_by_status и filter_by_reg одним предикатом: запись проверяется за один
+    # проход, без промежуточных списков. Даты, селектор статусов и регулярка разбираются один раз.
+    since_dt = parse_dt(since) if since else None
+    until_dt = parse_dt(until) if until else None
+    selector = StatusSelector(status) if status else None
+    matcher = grep_set(grep)
+
+    def accept(log: LogEntry) -> bool:
+        if since_dt and log.ts < since_dt:
+            return False
+        if until_dt and log.ts >= until_dt:
+            return False
+        if selector and not selector.matches(log.status):
+            return False
+        return matcher is None or matcher(log.path)
+
+    return accept
+
+
 def parse_dt(s_entry: str) -> datetime:
     if s_entry.endswith('Z'):
         s_entry = s_entry[:-1] + '+00:00'
@@ -0,0 +1,77 @@
+from __future__ import annotations
+from functools import lru_cache
+from typing import Optional, Sequence, Union
+import re
+
+# --grep: один шаблон строкой или несколько (--grep повторяется, --grep-file)
+Grep = Union[str, Sequence[str]]
+CACHE_SIZE = 1 << 16
+
+# обратные ссылки после склейки указывали бы на чужие группы
+GROUP_REF_RE = re.compile(r'\\[1-9]|\(\?P=|\(\?\(')
+
+
+def grep_patterns(grep: Optional[Grep]) -> tuple[str, ...]:
+    if not grep:
+        return ()
+    # повторы убираются: счётчики stats -- словарь по шаблону
+    return (grep,) if isinstance(grep, str) else tuple(dict.fromkeys(grep))
+
+
+def combine_patterns(patterns: tuple[str, ...]) -> Optional[re.Pattern[str]]:
+    if len(patterns) == 1:
+        return re.compile(patterns[0])
+    if any(GROUP_REF_RE.search(pattern) for pattern in patterns):
+        return None
+    try:
+        return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns))
+    except re.error:
+        return None  # повтор имени группы, (?i) не в начале и т.п.
+
+
+class GrepSet:
+    # Несколько --grep за один проход: запись проходит, если путь подходит хоть под один шаблон. Для отбора
+    # шаблоны склеены в одну альтернативу (?:p1)|(?:p2)|..., и путь проверяется одним search. Какие именно
+    # шаблоны подошли (счётчики stats) -- отдельно по каждому, но один раз на путь: результат кэшируется
+    # (LRU). Если склеить нельзя, отбор идёт по шаблонам по очереди. В процессы --jobs уходят только шаблоны.
+    def __init__(self, patterns: Sequence[str], cache_size: int = CACHE_SIZE) -> None:
+        self.patterns = tuple(patterns)
+        self.cache_size = cache_size
+        # ошибка в шаблоне -- re.error, как у одиночного --grep
+        self.regexes = [re.compile(pattern) for pattern in self.patterns]
+        self.combined = combine_patterns(self.patterns)
+        self.matches = lru_cache(maxsize=cache_size)(self.find_matches)
+
+    def __reduce__(self) -> tuple[type, tuple[object, ...]]:
+        return GrepSet, (self.patterns, self.cache_size)
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def __call__(self, path: str) -> bool:
+        if self.combined is not None:
+            return self.combined.search(path) is not None
+        return any(regex.search(path) for regex in self.regexes)
+
+    def find_matches(self, path: str) -> tuple[int, ...]:
+        # номера подошедших шаблонов
+        if self.combined is not None and not self.combined.search(path):
+            return ()
+        return tuple(i for i, regex in enumerate(self.regexes) if regex.search(path))
+
+
+@lru_cache(maxsize=16)
+def cached_grep_set(patterns: tuple[str, ...]) -> GrepSet:
+    return GrepSet(patterns)
+
+
+def grep_set(grep: Optional[Grep]) -> Optional[GrepSet]:
+    # один объект на набор шаблонов: фильтр и счётчики делят кэш matches
+    patterns = grep_patterns(grep)
+    return cached_grep_set(patterns) if patterns else None
+
+
+def counted_grep(grep: Optional[Grep]) -> Optional[GrepSet]:
+    # счётчики по шаблонам нужны, только если шаблонов несколько
+    matcher = grep_set(grep)
+    return matcher if matcher is not None and len(matcher) > 1 else None
@@ -0,0 +1,142 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from operator import attrgetter
+from typing import Any, Callable, Hashable, Optional
+from .log_entry import LogEntry
+from .sketch import QuantileSketch
+from .templates import PathTemplater
+
+# stats --group-by/--bucket: счёт и времена ответа по группам и интервалам времени за тот же проход, что и общие
+# агрегаты. Ячейка на пару (начало интервала, значения измерений) заводится при первой записи и дальше только
+# пополняется (хэш-агрегация); времена ответа в ячейке -- скетчем, так что память зависит от числа ячеек, а не записей.
+DIMENSIONS = ('status', 'method', 'path', 'path_template', 'ip')
+
+Key = tuple[Hashable, ...]
+
+
+def parse_group_by(spec: str) -> tuple[str, ...]:
+    # "status,method" -> ("status", "method"); повторы убираются
+    dims = tuple(dict.fromkeys(dim.strip() for dim in spec.split(',') if dim.strip()))
+    unknown = [dim for dim in dims if dim not in DIMENSIONS]
+    if unknown or not dims:
+        raise ValueError(f"unknown dimension {', '.join(unknown) or spec!r}, "
+                         f"expected some of: {', '.join(DIMENSIONS)}")
+    return dims
+
+
+@dataclass(frozen=True)
+class GroupBy:
+    dims: tuple[str, ...] = ()
+    bucket_s: Optional[int] = None  # None -- без разбивки по времени
+    rules: Optional[tuple[tuple[str, str], ...]] = None  # правила для path_template; None -- стандартные
+
+
+class GroupCell:
+    __slots__ = ('count', 'sketch')
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.sketch = QuantileSketch()
+
+
+def path_template_getter(templater: PathTemplater) -> Callable[[LogEntry], Hashable]:
+    return lambda log: templater(log.path)
+
+
+def make_group_key(spec: GroupBy) -> Callable[[LogEntry], Key]:
+    getters: list[Callable[[LogEntry], Hashable]] = []
+    for dim in spec.dims:
+        if dim == 'path_template':
+            templater = PathTemplater(spec.rules) if spec.rules else PathTemplater()
+            getters.append(path_template_getter(templater))
+        else:
+            getters.append(attrgetter(dim))
+    if not getters:
+        return lambda log: ()  # только --bucket
+    if len(getters) == 1:
+        (getter,) = getters
+        return lambda log: (getter(log),)
+    return lambda log: tuple(getter(log) for getter in getters)
+
+
+class GroupedSeries:
+    # Замыкания не пиклятся: в процессы --jobs и обратно едут spec и ячейки
+    def __init__(self, spec: GroupBy) -> None:
+        self.spec = spec
+        self.cells: dict[tuple[Optional[int], Key], GroupCell] = {}
+        self.key = make_group_key(spec)
+        self.last_ts: Optional[datetime] = None
+        self.last_bucket: Optional[int] = None
+
+    def __reduce__(self) -> tuple[Callable[..., GroupedSeries], tuple[dict[str, Any]]]:
+        return GroupedSeries.from_dict, (self.to_dict(),)
+
+    def add(self, log: LogEntry) -> None:
+        bucket_s = self.spec.bucket_s
+        if bucket_s is not None and log.ts is not self.last_ts:
+            # записи одной секунды делят datetime
+            self.last_ts = log.ts
+            self.last_bucket = int(log.ts.timestamp()) // bucket_s * bucket_s
+        key = (self.last_bucket, self.key(log))
+        cell = self.cells.get(key)
+        if cell is None:
+            cell = self.cells[key] = GroupCell()
+        cell.count += 1
+        if log.request_time_s is not None:
+            cell.sketch.add(log.request_time_s * 1000)
+
+    def merge(self, other: GroupedSeries) -> GroupedSeries:
+        for key, part in other.cells.items():
+            cell = self.cells.get(key)
+            if cell is None:
+                cell = self.cells[key] = GroupCell()
+            cell.count += part.count
+            cell.sketch.merge(part.sketch)
+        return self
+
+    def rows(self) -> list[dict]:
+        # по времени, внутри интервала -- по убыванию счёта
+        items = sorted(self.cells.items(),
+                       key=lambda item: (item[0][0] or 0, -item[1].count, tuple(map(str, item[0][1]))))
+        rows = []
+        for (bucket, key), cell in items:
+            row: dict[str, Any] = {}
+            if bucket is not None:
+                row['bucket'] = datetime.fromtimestamp(bucket, timezone.utc).isoformat()
+            row.update(zip(self.spec.dims, key))
+            sketch = cell.sketch
+            row['count'] = cell.count
+            row['rt_avg_ms'] = round(sketch.sum / sketch.count, 2) if sketch.count else None
+            row['rt_p95_ms'] = sketch.quantile(0.95)
+            row['rt_p99_ms'] = sketch.quantile(0.99)
+            rows.append(row)
+        return rows
+
+    def to_dict(self) -> dict[str, Any]:
+        # для JSON (stats --state)
+        return {
+            'dims': list(self.spec.dims),
+            'bucket_s': self.spec.bucket_s,
+            'rules': [list(rule) for rule in self.spec.rules] if self.spec.rules is not None else None,
+            'cells': [[bucket, list(key), cell.count, cell.sketch.to_dict()]
+                      for (bucket, key), cell in self.cells.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> GroupedSeries:
+        series = cls(group_by_from_dict(data))
+        series.load_cells(data['cells'])
+        return series
+
+    def load_cells(self, cells: list[Any]) -> None:
+        for bucket, key, count, sketch in cells:
+            cell = self.cells[(bucket, tuple(key))] = GroupCell()
+            cell.count = count
+            cell.sketch = QuantileSketch.from_dict(sketch)
+
+
+def group_by_from_dict(data: dict[str, Any]) -> GroupBy:
+    rules = data['rules']
+    return GroupBy(tuple(data['dims']), data['bucket_s'],
+                   tuple(tuple(rule) for rule in rules) if rules is not None else None)
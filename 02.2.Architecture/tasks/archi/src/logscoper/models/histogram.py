@@ -0,0 +1,98 @@
+from __future__ import annotations
+from array import array
+from collections import Counter
+from typing import Iterable, Iterator, Optional
+
+# hist: счётчики корзин в array по номеру корзины, без строк на каждое значение. Номер считается от
+# q = rt // bucket_ms:
+# - fixed: номер = q, корзины по bucket_ms;
+# - log-linear (HDR, sub_bits задан): первые 2 * 2**sub_bits корзин -- по одному q, дальше на каждое удвоение q --
+#   2**sub_bits корзин вдвое шире предыдущих. Ширина корзины -- не больше 1/2**sub_bits от её начала, а число корзин
+#   растёт как логарифм от максимума, а не линейно.
+# Подписи "от-до" строятся только при выводе. Гистограммы с одной разметкой складываются (merge) -- по файлам и
+# процессам --jobs.
+HDR_SUB_BITS = 4
+# дальше массива номера идут в словарь: одно огромное время ответа при fixed-корзинах не должно раздувать массив
+DENSE_LIMIT = 1 << 20
+
+
+class LatencyHistogram:
+    __slots__ = ('bucket_ms', 'sub_bits', 'counts', 'overflow')
+
+    def __init__(self, bucket_ms: int = 100, sub_bits: Optional[int] = None) -> None:
+        if bucket_ms <= 0:
+            raise ValueError(f'bucket width must be > 0, got {bucket_ms}')
+        if sub_bits is not None and not 0 <= sub_bits <= 16:
+            raise ValueError(f'sub-bucket bits must be in 0..16, got {sub_bits}')
+        self.bucket_ms = bucket_ms
+        self.sub_bits = sub_bits
+        self.counts = array('q')
+        self.overflow: dict[int, int] = {}
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts) + sum(self.overflow.values())
+
+    def __bool__(self) -> bool:
+        return any(self.counts) or bool(self.overflow)
+
+    def index(self, quotient: int) -> int:
+        # номер корзины по q = rt // bucket_ms
+        if self.sub_bits is None:
+            return quotient
+        shift = max(0, quotient.bit_length() - self.sub_bits - 1)
+        return (shift << self.sub_bits) + (quotient >> shift)
+
+    def bounds(self, index: int) -> tuple[int, int]:
+        # корзина index в мс: [от, до)
+        if self.sub_bits is None:
+            start, width = index, 1
+        else:
+            shift = max(0, (index >> self.sub_bits) - 1)
+            start, width = (index - (shift << self.sub_bits)) << shift, 1 << shift
+        return start * self.bucket_ms, (start + width) * self.bucket_ms
+
+    def update(self, values_ms: Iterable[float]) -> LatencyHistogram:
+        # частные считаются и подсчитываются в Counter на уровне C; номер корзины и сложение в массив -- по разу
+        # на частное, а не на значение
+        quotients = map(int, map(float(self.bucket_ms).__rfloordiv__, values_ms))
+        for quotient, count in Counter(quotients).items():
+            self.add_index(self.index(quotient), count)
+        return self
+
+    def add_index(self, index: int, count: int = 1) -> None:
+        counts = self.counts
+        if index < len(counts):
+            counts[index] += count
+        elif index < DENSE_LIMIT:
+            counts.frombytes(bytes(counts.itemsize * (index + 1 - len(counts))))
+            counts[index] += count
+        else:
+            self.overflow[index] = self.overflow.get(index, 0) + count
+
+    def merge(self, other: LatencyHistogram) -> LatencyHistogram:
+        if (other.bucket_ms, other.sub_bits) != (self.bucket_ms, self.sub_bits):
+            raise ValueError('cannot merge histograms with different buckets')
+        counts = self.counts
+        if len(other.counts) > len(counts):
+            counts.frombytes(bytes(counts.itemsize * (len(other.counts) - len(counts))))
+        for index, count in enumerate(other.counts):
+            if count:
+                counts[index] += count
+        for index, count in other.overflow.items():
+            self.overflow[index] = self.overflow.get(index, 0) + count
+        return self
+
+    def items(self) -> Iterator[tuple[int, int]]:
+        # (номер, счёт) непустых корзин по возрастанию
+        for index, count in enumerate(self.counts):
+            if count:
+                yield index, count
+        yield from sorted(self.overflow.items())
+
+    def labels(self) -> dict[str, int]:
+        hist: dict[str, int] = {}
+        for index, count in self.items():
+            buck_start, buck_end = self.bounds(index)
+            hist[f'{buck_start}-{buck_end}'] = count
+        return hist
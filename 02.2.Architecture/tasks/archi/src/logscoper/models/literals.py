@@ -0,0 +1,109 @@
+from __future__ import annotations
+from functools import lru_cache
+from typing import Any, Iterable, Iterator, Optional
+import re
+from .grep import Grep, grep_patterns
+
+# Разбор регулярки -- внутренний парсер re (до 3.11 -- sre_parse). Это не публичный API: если его устройство в
+# другой версии CPython не совпадёт с ожидаемым, grep_literals отвечает None и префильтр просто выключается.
+try:
+    from re import _constants as sre_constants, _parser as sre_parse  # type: ignore[attr-defined]
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+# Префильтр --grep по сырой строке. Путь записи -- подстрока строки лога, так что если каждое совпадение
+# регулярки содержит одну из подстрок literals, строку без них можно не разбирать: reg.search(path) на ней
+# заведомо ложен. Сама регулярка после разбора проверяется как раньше.
+#
+# Требование к последовательности -- лучшее из требований её частей: подряд идущих литералов, групп,
+# альтернатив (объединение требований всех веток) и повторов с min >= 1. Где вывести нельзя (классы
+# символов, (?i), необязательные части) -- требования нет, строки идут как есть.
+REPEATS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT}
+if hasattr(sre_constants, 'POSSESSIVE_REPEAT'):
+    REPEATS.add(sre_constants.POSSESSIVE_REPEAT)
+
+Requirement = frozenset[str]
+
+
+def better_requirement(a: Optional[Requirement], b: Optional[Requirement]) -> Optional[Requirement]:
+    # лучше то, чья самая короткая подстрока длиннее, затем -- где их меньше
+    if a is None or b is None:
+        return a if b is None else b
+    return max(a, b, key=lambda r: (min(map(len, r)), -len(r)))
+
+
+def pattern_requirement(items: Iterable[tuple[Any, Any]]) -> Optional[Requirement]:
+    best: Optional[Requirement] = None
+    run: list[str] = []
+    for op, av in items:
+        if op == sre_constants.LITERAL:
+            run.append(chr(av))
+            continue
+        if run:
+            best = better_requirement(best, frozenset([''.join(run)]))
+            run = []
+        if op == sre_constants.SUBPATTERN:
+            _, add_flags, _, sub = av
+            if not add_flags & re.IGNORECASE:
+                best = better_requirement(best, pattern_requirement(sub))
+        elif op == sre_constants.BRANCH:
+            branches = [pattern_requirement(branch) for branch in av[1]]
+            known = [requirement for requirement in branches if requirement]
+            if len(known) == len(branches):
+                best = better_requirement(best, frozenset().union(*known))
+        elif op in REPEATS:
+            lo, _, sub = av
+            if lo >= 1:
+                best = better_requirement(best, pattern_requirement(sub))
+    if run:
+        best = better_requirement(best, frozenset([''.join(run)]))
+    return best
+
+
+@lru_cache(maxsize=16)
+def grep_literals(pattern: str) -> Optional[tuple[str, ...]]:
+    # Подстроки, одна из которых есть в любом совпадении pattern; None -- вывести не удалось.
+    # Неверную регулярку оставляем re.compile в фильтре.
+    try:
+        parsed = sre_parse.parse(pattern)
+        if parsed.state.flags & re.IGNORECASE:
+            return None
+        required = pattern_requirement(parsed)
+    except re.error:
+        return None
+    except (AttributeError, TypeError, ValueError):
+        return None  # парсер re устроен иначе, чем ожидается
+    if not required or '' in required:
+        return None
+    return tuple(sorted(required))
+
+
+@lru_cache(maxsize=16)
+def grep_set_literals(patterns: tuple[str, ...]) -> Optional[tuple[str, ...]]:
+    # несколько --grep: строка нужна, если в ней подстрока любого шаблона
+    literals: set[str] = set()
+    for pattern in patterns:
+        own = grep_literals(pattern)
+        if own is None:
+            return None
+        literals.update(own)
+    return tuple(sorted(literals)) if literals else None
+
+
+def grep_prefilter(lines: Iterable[str], grep: Optional[Grep]) -> Iterable[str]:
+    literals = grep_set_literals(grep_patterns(grep))
+    if literals is None:
+        return lines
+    if len(literals) == 1:
+        (literal,) = literals
+        return (line for line in lines if literal in line)
+    return any_literal_lines(lines, literals)
+
+
+def any_literal_lines(lines: Iterable[str], literals: tuple[str, ...]) -> Iterator[str]:
+    for line in lines:
+        for literal in literals:
+            if literal in line:
+                yield line
+                break
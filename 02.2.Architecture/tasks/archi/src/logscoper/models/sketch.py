@@ -0,0 +1,214 @@
+from __future__ import annotations
+from operator import itemgetter
+from typing import Any, Iterable, Optional
+import heapq
+import math
+
+
+# Квантильный скетч в духе DDSketch: значения раскладываются по
+# логарифмическим корзинам (gamma^(k-1), gamma^k], gamma = (1 + a) / (1 - a).
+#
+# Гарантия точности: для неотрицательных значений quantile(q) отличается от
+# точного значения выборки с рангом floor(q * (n - 1)) не больше чем на
+# relative_accuracy (по умолчанию 1%) в относительных единицах. Память --
+# не больше max_bins корзин независимо от числа значений: на диапазон
+# 1 мкс .. 1000 с при 1% нужно около 1050 корзин. Если корзин всё же больше,
+# склеиваются самые младшие, и гарантия остаётся только для квантилей выше
+# склеенного хвоста (для p95/p99 это не важно).
+#
+# Скетчи с одинаковой точностью сливаются через merge() без потерь:
+# merge(a, b) == скетч, построенный по объединению данных.
+class QuantileSketch:
+    def __init__(self, relative_accuracy: float = 0.01, max_bins: int = 2048) -> None:
+        if not 0.0 < relative_accuracy < 1.0:
+            raise ValueError('relative_accuracy must be in (0, 1)')
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        gamma = (1.0 + relative_accuracy) / (1.0 - relative_accuracy)
+        self._log_gamma = math.log(gamma)
+        self._mid = 2.0 / (1.0 + gamma)
+        self.bins: dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if value <= 0.0:
+            self.zeros += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        bins = self.bins
+        bins[key] = bins.get(key, 0) + 1
+        if len(bins) > self.max_bins:
+            self._collapse()
+
+    def update(self, values: Iterable[float]) -> QuantileSketch:
+        for v in values:
+            self.add(v)
+        return self
+
+    def merge(self, other: QuantileSketch) -> QuantileSketch:
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError('Cannot merge sketches with different accuracy')
+        bins = self.bins
+        for key, n in other.bins.items():
+            bins[key] = bins.get(key, 0) + n
+        self.zeros += other.zeros
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if len(bins) > self.max_bins:
+            self._collapse()
+        return self
+
+    def to_dict(self) -> dict[str, Any]:
+        # для JSON: ключи корзин -- парами, пустой скетч без бесконечностей
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'max_bins': self.max_bins,
+            'bins': sorted(self.bins.items()),
+            'zeros': self.zeros,
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> QuantileSketch:
+        sketch = cls(data['relative_accuracy'], data['max_bins'])
+        sketch.bins = {int(key): int(n) for key, n in data['bins']}
+        sketch.zeros = data['zeros']
+        sketch.count = data['count']
+        sketch.sum = data['sum']
+        if sketch.count:
+            sketch.min = data['min']
+            sketch.max = data['max']
+        return sketch
+
+    def _collapse(self) -> None:
+        keys = sorted(self.bins)
+        extra = len(keys) - self.max_bins
+        tail = sum(self.bins.pop(k) for k in keys[:extra])
+        self.bins[keys[extra]] += tail
+
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = math.floor(q * (self.count - 1))
+        if rank < self.zeros:
+            return max(self.min, 0.0)
+        seen = self.zeros
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                value = math.exp(key * self._log_gamma) * self._mid
+                return min(max(value, self.min), self.max)
+        return self.max
+
+
+TOP_CAPACITY = 4096
+
+
+# Частые пути по алгоритму Space-Saving: не больше capacity счётчиков, сколько бы разных ключей ни было.
+#
+# Гарантия: counts[key] завышает истинное число вхождений не больше чем на errors[key] <= total / capacity,
+# так что ключ, встретившийся чаще total / capacity раз, в скетче обязательно есть. Новый ключ при полном
+# скетче вытесняет ключ с наименьшим счётчиком и наследует этот счётчик как погрешность. Пока разных
+# ключей не больше capacity, счёт точный.
+#
+# merge() сливает скетчи частей (--jobs): ключу, которого в скетче нет, достаётся верхняя оценка --
+# наименьший счётчик полного скетча (или 0), так что гарантия сохраняется.
+class SpaceSaving:
+    def __init__(self, capacity: int = TOP_CAPACITY) -> None:
+        if capacity < 1:
+            raise ValueError('capacity must be positive')
+        self.capacity = capacity
+        self.counts: dict[str, int] = {}
+        self.errors: dict[str, int] = {}
+        self.total = 0
+        # (счётчик на момент добавления, порядковый номер, ключ): счётчики только растут, поэтому
+        # устаревшая запись лишь занижена и обновляется, когда доходит до вершины кучи
+        self.heap: list[tuple[int, int, str]] = []
+        self.seq = 0
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def add(self, key: str, count: int = 1) -> None:
+        self.total += count
+        if key in self.counts:
+            self.counts[key] += count
+            return
+        error = self.evict() if len(self.counts) >= self.capacity else 0
+        self.counts[key] = error + count
+        self.errors[key] = error
+        self.push(key)
+
+    def update(self, items: Iterable[tuple[str, int]]) -> SpaceSaving:
+        for key, count in items:
+            self.add(key, count)
+        return self
+
+    def push(self, key: str) -> None:
+        self.seq += 1
+        heapq.heappush(self.heap, (self.counts[key], self.seq, key))
+
+    def evict(self) -> int:
+        while True:
+            count, _, key = heapq.heappop(self.heap)
+            if self.counts[key] == count:
+                del self.counts[key]
+                del self.errors[key]
+                return count
+            self.push(key)
+
+    def floor(self) -> int:
+        # верхняя оценка счёта ключа, которого в скетче нет
+        return min(self.counts.values()) if len(self) >= self.capacity else 0
+
+    def merge(self, other: SpaceSaving) -> SpaceSaving:
+        floor, other_floor = self.floor(), other.floor()
+        keys = list(dict.fromkeys([*self.counts, *other.counts]))
+        counts = {key: self.counts.get(key, floor) + other.counts.get(key, other_floor) for key in keys}
+        errors = {key: self.errors.get(key, floor) + other.errors.get(key, other_floor) for key in keys}
+        keep = {key for key, _ in heapq.nlargest(self.capacity, counts.items(), key=itemgetter(1))}
+        self.counts = {key: counts[key] for key in keys if key in keep}
+        self.errors = {key: errors[key] for key in self.counts}
+        self.total += other.total
+        self.rebuild_heap()
+        return self
+
+    def rebuild_heap(self) -> None:
+        self.heap = [(count, i, key) for i, (key, count) in enumerate(self.counts.items())]
+        self.seq = len(self.heap)
+        heapq.heapify(self.heap)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'capacity': self.capacity,
+            'total': self.total,
+            'counts': [[key, count, self.errors[key]] for key, count in self.counts.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> SpaceSaving:
+        sketch = cls(data['capacity'])
+        sketch.total = data['total']
+        for key, count, error in data['counts']:
+            sketch.counts[key] = count
+            sketch.errors[key] = error
+        sketch.rebuild_heap()
+        return sketch
@@ -0,0 +1,55 @@
+from __future__ import annotations
+from functools import lru_cache
+from typing import Sequence
+import re
+from .log_batch import StringPool
+from .log_entry import LogEntry
+
+# (регулярка на сегмент пути целиком, заглушка); проверяются по порядку
+DEFAULT_RULES: tuple[tuple[str, str], ...] = (
+    (r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}', '{uuid}'),
+    (r'\d+', '{id}'),
+    (r'(?=[a-fA-F]*\d)[0-9a-fA-F]{8,}', '{hex}'),
+)
+CACHE_SIZE = 1 << 16
+
+
+def parse_rule(text: str) -> tuple[str, str]:
+    # "REGEX=PLACEHOLDER"; "=" внутри регулярки допустим, делим по последнему
+    pattern, sep, placeholder = text.rpartition('=')
+    if not sep or not pattern:
+        raise ValueError(f'expected REGEX=PLACEHOLDER, got {text!r}')
+    re.compile(pattern)
+    return pattern, placeholder
+
+
+class PathTemplater:
+    # Шаблон пути для группировки: query и fragment отрезаются, сегменты, целиком подходящие под правило,
+    # заменяются заглушкой: /users/123/orders?page=2 -> /users/{id}/orders. Сырой путь -> шаблон кэшируется
+    # (LRU), равные шаблоны делят один объект str, неизменённый путь возвращается как есть.
+    def __init__(self, rules: Sequence[tuple[str, str]] = DEFAULT_RULES, cache_size: int = CACHE_SIZE) -> None:
+        self.rules = tuple(rules)
+        self.compiled = [(re.compile(pattern), placeholder) for pattern, placeholder in self.rules]
+        self.templates = StringPool()
+        self.template = lru_cache(maxsize=cache_size)(self.make_template)
+
+    def __call__(self, path: str) -> str:
+        return self.template(path)
+
+    def template_segment(self, segment: str) -> str:
+        if segment:
+            for regex, placeholder in self.compiled:
+                if regex.fullmatch(segment):
+                    return placeholder
+        return segment
+
+    def make_template(self, path: str) -> str:
+        base = path.partition('?')[0].partition('#')[0]
+        result = '/'.join(map(self.template_segment, base.split('/')))
+        return path if result == path else self.templates.intern(result)
+
+    def template_log_entry(self, log: LogEntry) -> LogEntry:
+        template = self.template(log.path)
+        if template is log.path:
+            return log
+        return LogEntry(log.ip, log.ts, log.method, template, log.status, log.bytes_sent, log.request_time_s)
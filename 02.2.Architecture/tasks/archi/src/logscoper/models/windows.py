@@ -0,0 +1,92 @@
+from __future__ import annotations
+import math
+import re
+from typing import Optional
+from .sketch import QuantileSketch
+
+# Окна tail по умолчанию
+WINDOWS = {'1m': 60, '5m': 300, '15m': 900}
+
+WINDOW_RE = re.compile(r'(\d+)([a-z])')
+UNITS = {'s': 1, 'm': 60, 'h': 3600}
+# интервалы stats --bucket бывают и в сутки; окна tail -- не длиннее часов
+BUCKET_UNITS = {**UNITS, 'd': 86400}
+
+
+def parse_duration(text: str, what: str = 'window', units: dict[str, int] = UNITS) -> int:
+    # "30s", "5m", "1h" -> секунды
+    m = WINDOW_RE.fullmatch(text.strip())
+    if m is None or m[2] not in units or int(m[1]) == 0:
+        raise ValueError(f'invalid {what} {text.strip()!r}, expected e.g. 30s, 5m, 1h')
+    return int(m[1]) * units[m[2]]
+
+
+def parse_windows(spec: str) -> dict[str, int]:
+    # "1m,5m,15m" -> {"1m": 60, "5m": 300, "15m": 900}
+    return {part.strip(): parse_duration(part) for part in spec.split(',')}
+
+
+class WindowSlot:
+    __slots__ = ('number', 'total', 'status', 'sketch')
+
+    def __init__(self, number: int) -> None:
+        self.number = number
+        self.total = 0
+        self.status: dict[int, int] = {}
+        self.sketch = QuantileSketch()
+
+
+class RollingWindows:
+    # Скользящие окна по времени записей: кольцо слотов по slot секунд, в слоте -- счётчики статусов и скетч
+    # времён ответа. Запись -- O(1): она идёт в слот своей секунды, а слот, который кольцо уже обошло,
+    # переиспользуется по номеру без отдельной чистки. Снимок окна сливает его слоты. Записи старше самого
+    # длинного окна отбрасываются.
+    def __init__(self, windows: Optional[dict[str, int]] = None, slot: int = 1) -> None:
+        self.windows = dict(windows or WINDOWS)
+        self.slot = slot
+        self.size = math.ceil(max(self.windows.values()) / slot)
+        self.slots: list[Optional[WindowSlot]] = [None] * self.size
+        self.latest: Optional[int] = None  # номер самого нового слота
+
+    def add(self, epoch: float, status: int, req_time_ms: Optional[float]) -> None:
+        number = int(epoch // self.slot)
+        if self.latest is None or number > self.latest:
+            self.latest = number
+        elif number <= self.latest - self.size:
+            return
+        i = number % self.size
+        s = self.slots[i]
+        if s is None or s.number != number:
+            s = self.slots[i] = WindowSlot(number)
+        s.total += 1
+        s.status[status] = s.status.get(status, 0) + 1
+        if req_time_ms is not None:
+            s.sketch.add(req_time_ms)
+
+    def snapshot(self, now: Optional[float] = None) -> dict[str, dict]:
+        # Окна отсчитываются от самой новой записи; now (epoch) сдвигает их дальше, когда лог молчит
+        latest = self.latest
+        if now is not None:
+            latest = max(latest if latest is not None else -math.inf, now // self.slot)
+        result = {}
+        for name, seconds in self.windows.items():
+            total = 0
+            status: dict[int, int] = {}
+            sketch = QuantileSketch()
+            oldest = -math.inf if latest is None else latest - seconds // self.slot
+            for s in self.slots:
+                if s is None or not oldest < s.number <= latest:
+                    continue
+                total += s.total
+                for code, count in s.status.items():
+                    status[code] = status.get(code, 0) + count
+                sketch.merge(s.sketch)
+            result[name] = {
+                'total': total,
+                'rps': total / seconds,
+                'status': dict(sorted(status.items())),
+                'rt_avg_ms': sketch.mean(),
+                'rt_p95_ms': sketch.quantile(0.95),
+                'rt_p99_ms': sketch.quantile(0.99),
+            }
+        return result
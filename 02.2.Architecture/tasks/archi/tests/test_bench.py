@@ -0,0 +1,347 @@
+from __future__ import annotations
+import os
+import random
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from operator import attrgetter
+from typing import Optional
+from ..src.logscoper.adapters.parser import (fast_line_fields, iter_log_file, read_log_batch, read_log_file,
+                                             regex_line_fields)
+from ..src.logscoper.commands.filter import (filter_log_entries, iter_filtered_log_entries, log_entry_to_txt,
+                                             write_log_entries)
+from ..src.logscoper.models.calculations import calculate_stats
+from ..src.logscoper.models.filters import filter_by_reg, filter_by_status, filter_by_time
+from ..src.logscoper.models.log_entry import LogEntry
+from ..src.logscoper.adapters.timestamp import parse_ts
+
+# размер бенчмарка можно поднять: LOGSCOPER_BENCH_LINES=1000000 pytest -s tests/test_bench.py
+BENCH_LINES = int(os.environ.get("LOGSCOPER_BENCH_LINES", "20000"))
+
+
+def make_lines(n: int, seed: int = 0) -> list[str]:
+    rnd = random.Random(seed)
+    base = datetime(2000, 10, 10, 10, 0, 0)
+    paths = ["/", "/api/v1/users/12345/orders?include=items&page=2", "/login", "/static/app.js"]
+    agent = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+    lines = []
+    for i in range(n):
+        ts = (base + timedelta(seconds=i // 50)).strftime("%d/%b/%Y:%H:%M:%S +0000")
+        tail = rnd.choice(
+            [f' "https://example.com/" "{agent}" 0.120', f' "-" "{agent}" rt=0.250', ' "-" "UA"', " 0.5", ""]
+        )
+        lines.append(
+            f'10.0.{i % 7}.{i % 255} - - [{ts}] "{rnd.choice(["GET", "POST"])} {rnd.choice(paths)} HTTP/1.1" '
+            f"{rnd.choice([200, 201, 302, 404, 500])} {rnd.choice(['-', '512', '0'])}{tail}"
+        )
+    return lines
+
+
+def _lines_per_sec(func, lines: list[str]) -> tuple[list, float]:
+    start = time.perf_counter()
+    out = [func(line) for line in lines]
+    return out, len(lines) / (time.perf_counter() - start)
+
+
+def test_bench_tokenizer_vs_regex():
+    lines = make_lines(BENCH_LINES)
+    regex_out, regex_lps = _lines_per_sec(regex_line_fields, lines)
+    fast_out, fast_lps = _lines_per_sec(lambda line: fast_line_fields(line) or regex_line_fields(line), lines)
+    print(f"\nregex: {regex_lps:,.0f} lines/s, tokenizer: {fast_lps:,.0f} lines/s")
+    assert fast_out == regex_out
+
+
+def test_bench_cached_timestamps():
+    raws = [fields[1] for fields in map(regex_line_fields, make_lines(BENCH_LINES))]
+    parse_ts.cache_clear()
+    slow_out, slow_lps = _lines_per_sec(lambda raw: datetime.strptime(raw, "%d/%b/%Y:%H:%M:%S %z"), raws)
+    fast_out, fast_lps = _lines_per_sec(parse_ts, raws)
+    print(f"\nstrptime: {slow_lps:,.0f} ts/s, cached: {fast_lps:,.0f} ts/s")
+    assert fast_out == slow_out
+
+
+def test_bench_mmap_prefilter(tmp_path):
+    log = tmp_path / "bench.log"
+    log.write_text("\n".join(make_lines(BENCH_LINES)) + "\n")
+    # make_lines пишет 50 строк в секунду: since отрезает первую половину
+    since = (datetime(2000, 10, 10, 10) + timedelta(seconds=BENCH_LINES // 100)).isoformat()
+    for status, since in (("5xx", None), (None, since)):
+        start = time.perf_counter()
+        full = filter_log_entries(read_log_file(str(log)), since=since, status=status)
+        full_lps = BENCH_LINES / (time.perf_counter() - start)
+        start = time.perf_counter()
+        scanned = filter_log_entries(read_log_file(str(log), since, None, status), since=since, status=status)
+        scan_lps = BENCH_LINES / (time.perf_counter() - start)
+        print(f"\nstatus={status} since={since}: full parse: {full_lps:,.0f} lines/s, "
+              f"mmap prefilter: {scan_lps:,.0f} lines/s")
+        assert scanned == full
+
+
+def test_bench_time_index(tmp_path):
+    log = str(tmp_path / "bench.log")
+    with open(log, "w") as f:
+        f.write("\n".join(make_lines(BENCH_LINES)) + "\n")
+    # окно в 1% файла из середины
+    since_dt = datetime(2000, 10, 10, 10) + timedelta(seconds=BENCH_LINES // 100)
+    since = since_dt.isoformat()
+    until = (since_dt + timedelta(seconds=max(1, BENCH_LINES // 5000))).isoformat()
+    start = time.perf_counter()
+    scanned = filter_log_entries(read_log_file(log, since, until), since, until)
+    scan_s = time.perf_counter() - start
+    start = time.perf_counter()
+    read_log_file(log, since, until, index=True)  # сборка индекса
+    build_s = time.perf_counter() - start
+    start = time.perf_counter()
+    indexed = filter_log_entries(read_log_file(log, since, until, index=True), since, until)
+    index_s = time.perf_counter() - start
+    print(f"\nmmap prefilter: {scan_s * 1000:.1f} ms, index build: {build_s * 1000:.1f} ms, "
+          f"indexed query: {index_s * 1000:.1f} ms")
+    assert indexed == scanned
+
+
+def _peak(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func()
+        return result, time.perf_counter() - start, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_bench_streaming_stats(tmp_path):
+    log = str(tmp_path / "bench.log")
+    with open(log, "w") as f:
+        f.write("\n".join(make_lines(BENCH_LINES)) + "\n")
+    since, status, grep = "2000-10-10T10:00:10", "2xx,404", "/api|/login"
+
+    def lists():
+        log_entries = filter_by_time(read_log_file(log), since)
+        return calculate_stats(filter_by_reg(filter_by_status(log_entries, status), grep), approx_percentiles=True)
+
+    def stream():
+        filtered = iter_filtered_log_entries(iter_log_file(log), since, status=status, grep=grep)
+        return calculate_stats(filtered, approx_percentiles=True)
+
+    expected, lists_s, lists_peak = _peak(lists)
+    got, stream_s, stream_peak = _peak(stream)
+    print(f"\nlists: {lists_s:.2f} s, peak {lists_peak / 2 ** 10:,.0f} KiB; "
+          f"stream: {stream_s:.2f} s, peak {stream_peak / 2 ** 10:,.0f} KiB")
+    assert got == expected
+
+
+def _retained(func):
+    # память, которую занимает результат func (а не пик во время работы)
+    tracemalloc.start()
+    try:
+        result = func()
+        return result, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+@dataclass(frozen=True)
+class OriginalLogEntry:
+    # LogEntry до __slots__ и интернирования: свои str и datetime у каждой записи
+    ip: str
+    ts: datetime
+    method: str
+    path: str
+    status: int
+    bytes_sent: Optional[int]
+    request_time_s: Optional[float]
+
+
+def original_log_entry(line: str) -> OriginalLogEntry:
+    ip, ts, method, path, status, size, rt = regex_line_fields(line)
+    return OriginalLogEntry(ip, datetime.strptime(ts, "%d/%b/%Y:%H:%M:%S %z"), method, path, int(status),
+                            None if size == "-" else int(size), None if rt is None else float(rt))
+
+
+def test_bench_log_batch_memory(tmp_path):
+    log = str(tmp_path / "bench.log")
+    lines = make_lines(BENCH_LINES)
+    with open(log, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    log_entries, list_bytes = _retained(lambda: [original_log_entry(line) for line in lines])
+    parse_ts.cache_clear()
+    batch, batch_bytes = _retained(lambda: read_log_batch(log))
+    print(f"\noriginal list[LogEntry]: {list_bytes / len(log_entries):.0f} B/entry, "
+          f"LogBatch: {batch_bytes / len(batch):.0f} B/entry ({list_bytes / batch_bytes:.1f}x)")
+    fields = attrgetter(*LogEntry.__slots__)
+    assert list(map(fields, batch)) == list(map(fields, log_entries))
+    # запрос -- сокращение на порядок; столбцы дают ~6x против исходного списка
+    assert batch_bytes * 5 < list_bytes
+
+
+def test_bench_top_paths_high_cardinality():
+    from ..src.logscoper.models.calculations import StatsAccumulator
+    from ..src.logscoper.models.log_entry import LogEntry
+
+    rnd = random.Random(7)
+    # пути с id: почти каждый уникален, и несколько частых
+    hot = [f"/api/hot/{k}" for k in range(10)]
+    paths = [rnd.choice(hot) if rnd.random() < 0.3 else f"/api/users/{rnd.randrange(10 ** 9)}"
+             for _ in range(BENCH_LINES * 5)]
+    exact, approx = StatsAccumulator(), StatsAccumulator(approx_top=1024)
+    for path in paths:
+        log = LogEntry("1.1.1.1", None, "GET", path, 200, None, None)
+        exact.add(log)
+        approx.add(log)
+    start = time.perf_counter()
+    full = sorted(exact.path_counts.items(), key=lambda i: i[1], reverse=True)[:10]
+    sort_s = time.perf_counter() - start
+    start = time.perf_counter()
+    heap = exact.result(10)["top_paths"]
+    heap_s = time.perf_counter() - start
+    print(f"\n{len(exact.path_counts):,} paths: full sort {sort_s * 1000:.1f} ms, heap top-10 {heap_s * 1000:.1f} ms, "
+          f"space-saving keeps {len(approx.path_sketch):,} counters")
+    assert heap == full
+    assert {path for path, _ in approx.result(10)["top_paths"]} == set(hot)
+
+
+def test_bench_filter_writer(tmp_path):
+    log = str(tmp_path / "bench.log")
+    with open(log, "w") as f:
+        f.write("\n".join(make_lines(BENCH_LINES)) + "\n")
+    log_entries = read_log_file(log)
+    out = tmp_path / "out.txt"
+
+    def per_line():
+        with open(out, "w") as f:
+            for log in log_entries:
+                f.write(log_entry_to_txt(log) + "\n")
+
+    def chunked():
+        with open(out, "w") as f:
+            write_log_entries(iter(log_entries), f)
+
+    start = time.perf_counter()
+    per_line()
+    line_s = time.perf_counter() - start
+    expected = out.read_text()
+    start = time.perf_counter()
+    chunked()
+    chunk_s = time.perf_counter() - start
+    assert out.read_text() == expected
+    _, _, peak = _peak(chunked)
+    print(f"\nwrite per line: {len(log_entries) / line_s:,.0f} lines/s, "
+          f"chunked: {len(log_entries) / chunk_s:,.0f} lines/s, peak {peak / 2 ** 10:,.0f} KiB")
+    # память -- одна пачка строк, а не весь вывод
+    assert peak < 4 << 20
+
+
+def test_bench_grep_prefilter(tmp_path, monkeypatch):
+    from ..src.logscoper.adapters import parser
+
+    log = str(tmp_path / "bench.log")
+    with open(log, "w") as f:
+        f.write("\n".join(make_lines(BENCH_LINES)) + "\n")
+    grep = "^/login$"
+    start = time.perf_counter()
+    prefiltered = list(iter_filtered_log_entries(iter_log_file(log, grep=grep), grep=grep))
+    prefilter_s = time.perf_counter() - start
+    monkeypatch.setattr(parser, "grep_prefilter", lambda lines, grep: lines)
+    start = time.perf_counter()
+    full = list(iter_filtered_log_entries(iter_log_file(log), grep=grep))
+    full_s = time.perf_counter() - start
+    print(f"\n--grep {grep}: full parse: {BENCH_LINES / full_s:,.0f} lines/s, "
+          f"literal prefilter: {BENCH_LINES / prefilter_s:,.0f} lines/s")
+    assert prefiltered == full
+
+
+def test_bench_multi_grep(tmp_path):
+    log = str(tmp_path / "bench.log")
+    with open(log, "w") as f:
+        f.write("\n".join(make_lines(BENCH_LINES)) + "\n")
+    patterns = ["^/$", "^/login", r"\.js$", "orders", r"users/\d+"] + [f"^/api/v{i}/" for i in range(1, 16)]
+
+    def run(grep):
+        return calculate_stats(iter_filtered_log_entries(iter_log_file(log, grep=grep), grep=grep), grep=grep)
+
+    start = time.perf_counter()
+    separate = {pattern: run(pattern)["total"] for pattern in patterns}
+    separate_s = time.perf_counter() - start
+    start = time.perf_counter()
+    combined = run(patterns)
+    combined_s = time.perf_counter() - start
+    print(f"\n{len(patterns)} patterns: one run each {separate_s:.2f} s, one combined pass {combined_s:.2f} s")
+    assert combined["grep"] == separate
+
+
+def test_bench_group_by(tmp_path):
+    from ..src.logscoper.models.groups import GroupBy
+
+    log = str(tmp_path / "bench.log")
+    with open(log, "w") as f:
+        f.write("\n".join(make_lines(BENCH_LINES)) + "\n")
+    statuses = ["200", "201", "302", "404", "500"]
+
+    start = time.perf_counter()
+    separate = {}
+    for status in statuses:
+        separate[int(status)] = calculate_stats(iter_filtered_log_entries(iter_log_file(log), status=status))["total"]
+    separate_s = time.perf_counter() - start
+    start = time.perf_counter()
+    stats = calculate_stats(iter_log_file(log), group_by=GroupBy(("status",), 60))
+    grouped_s = time.perf_counter() - start
+    print(f"\n{len(statuses)} groups: one run each {separate_s:.2f} s, "
+          f"one grouped pass with 1m buckets {grouped_s:.2f} s")
+    grouped: dict[int, int] = {}
+    for row in stats["groups"]:
+        grouped[row["status"]] = grouped.get(row["status"], 0) + row["count"]
+    assert grouped == separate
+
+
+def test_bench_latency_histogram():
+    from ..src.logscoper.models.histogram import LatencyHistogram
+    from .test_histogram import random_times, string_hist
+
+    values = random_times(BENCH_LINES * 5)
+    start = time.perf_counter()
+    by_string = string_hist(values, 10)
+    string_s = time.perf_counter() - start
+    start = time.perf_counter()
+    labels = LatencyHistogram(10).update(values).labels()
+    fixed_s = time.perf_counter() - start
+    start = time.perf_counter()
+    hdr = LatencyHistogram(1, 4).update(values)
+    hdr_s = time.perf_counter() - start
+    print(f"\n{len(values)} values: string keys {string_s:.2f} s, array fixed {fixed_s:.2f} s, "
+          f"array log-linear {hdr_s:.2f} s ({len(labels)} vs {len(hdr.labels())} buckets)")
+    assert labels == by_string
+
+
+def test_bench_filter_formats(tmp_path):
+    import json
+    from ..src.logscoper.adapters.columns import iter_log_columns, read_log_columns, write_log_columns
+    from ..src.logscoper.adapters.parser import parse_log_line
+    from ..src.logscoper.commands.filter import write_log_entries_jsonl
+
+    lines = make_lines(BENCH_LINES)
+    log_entries = [parse_log_line(line) for line in lines]
+    outputs = {}
+    for name, write, mode in [("text", write_log_entries, "w"), ("jsonl", write_log_entries_jsonl, "w"),
+                              ("columns", write_log_columns, "wb")]:
+        outputs[name] = tmp_path / f"out.{name}"
+        start = time.perf_counter()
+        with open(outputs[name], mode) as out:
+            write(log_entries, out)
+        write_s = time.perf_counter() - start
+        print(f"\n{name}: write {len(log_entries) / write_s:,.0f} entries/s, "
+              f"{outputs[name].stat().st_size / len(log_entries):.0f} bytes/entry")
+    # что стоит прочитать отобранное заново: разбор лога против чтения выгрузки
+    readers = {
+        "parse log lines": lambda: [parse_log_line(line) for line in lines],
+        "jsonl": lambda: [json.loads(line) for line in open(outputs["jsonl"])],
+        "columns": lambda: list(iter_log_columns(outputs["columns"])),
+        "columns as arrays": lambda: [rt for batch in read_log_columns(outputs["columns"])
+                                      for rt in batch.request_time_s],
+    }
+    for name, read in readers.items():
+        start = time.perf_counter()
+        got = read()
+        read_s = time.perf_counter() - start
+        print(f"read {name}: {len(got) / read_s:,.0f} entries/s")
+    assert list(iter_log_columns(outputs["columns"])) == log_entries
@@ -0,0 +1,72 @@
+from __future__ import annotations
+import random
+import pytest
+from ..src.logscoper.adapters.parser import read_log_file
+from ..src.logscoper.infra.cli import main
+from ..src.logscoper.models import columnar
+from ..src.logscoper.models.calculations import calculate_hist, calculate_stats
+from ..src.logscoper.models.log_entry import LogEntry
+from .test_bench import make_lines
+
+np = pytest.importorskip("numpy")
+
+
+@pytest.fixture
+def logs(tmp_path):
+    paths = []
+    for seed in range(2):
+        path = tmp_path / f"access.log.{seed}"
+        path.write_text("\n".join(make_lines(1500, seed=seed)) + "\ngarbage\n")
+        paths.append(str(path))
+    return paths
+
+
+COMMANDS = [
+    ["stats", "--json"],
+    ["stats", "--top", "3", "--status", "2xx,404", "--grep", "api|login"],
+    ["stats", "--json", "--approx-percentiles", "--since", "2000-10-10T10:00:20Z"],
+    ["stats", "--json", "--jobs", "2", "--until", "2000-10-10T10:00:20Z"],
+    ["hist", "--json", "--bucket-ms", "7"],
+    ["hist", "--bucket-ms", "100", "--jobs", "2", "--grep", "static"],
+    ["hist", "--json", "--bucket-ms", "3", "--strict", "--status", "5xx"],
+]
+
+
+@pytest.mark.parametrize("command", COMMANDS)
+def test_numpy_engine_matches_python(logs, capsys, command):
+    args = [command[0], "--path", *logs] + command[1:]
+    assert main(args) == 0
+    expected = capsys.readouterr().out
+    assert main(args + ["--engine", "numpy"]) == 0
+    assert capsys.readouterr().out == expected
+
+
+def test_numpy_stats_keeps_first_seen_order(logs):
+    log_entries = read_log_file(logs[0]) + read_log_file(logs[1])
+    parts = [columnar.EntryBatch.from_entries(read_log_file(path)) for path in logs]
+    for top in (0, 1, 2, 3, 100):
+        expected = calculate_stats(log_entries, top)
+        got = columnar.calculate_stats_numpy(columnar.EntryBatch.concat(parts), top)
+        assert list(got["status"].items()) == list(expected["status"].items())
+        assert got == expected
+    assert columnar.calculate_stats_numpy(columnar.EntryBatch.from_entries([])) == calculate_stats([])
+
+
+def test_numpy_hist_bit_exact():
+    rnd = random.Random(5)
+    values = [rnd.random() * rnd.choice([1, 1000, 10 ** 6]) for _ in range(5000)] + [0.0, 0.1, 2.675]
+    log_entries = [LogEntry("1.1.1.1", None, "GET", "/", 200, None, v) for v in values]
+    req_time_ms = columnar.EntryBatch.from_entries(log_entries).req_time_ms
+    for bucket in (1, 3, 100, 1000):
+        assert columnar.calculate_hist_numpy(req_time_ms, bucket) == calculate_hist(log_entries, bucket)
+
+
+def test_engine_numpy_without_numpy(logs, monkeypatch, capsys):
+    monkeypatch.setattr(columnar, "np", None)
+    assert main(["stats", "--path", logs[0], "--engine", "numpy"]) == 2
+    assert "numpy" in capsys.readouterr().err
+
+
+def test_engine_numpy_rejects_approx_top(logs, capsys):
+    assert main(["stats", "--path", logs[0], "--engine", "numpy", "--approx-top", "50"]) == 1
+    assert "--approx-top works only with --engine python" in capsys.readouterr().err
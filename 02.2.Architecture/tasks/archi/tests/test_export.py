@@ -0,0 +1,101 @@
+from __future__ import annotations
+import io
+import json
+from dataclasses import replace
+from datetime import datetime
+import pytest
+from ..src.logscoper.adapters.columns import COLUMNS_MAGIC, iter_log_columns, read_log_columns, write_log_columns
+from ..src.logscoper.adapters.parser import parse_log_line
+from ..src.logscoper.commands.filter import write_log_entries_jsonl
+from ..src.logscoper.infra.cli import main
+from .test_bench import make_lines
+
+
+@pytest.fixture
+def log_entries():
+    return [parse_log_line(line) for line in make_lines(3000, seed=4)]
+
+
+def test_jsonl_round_trip(log_entries):
+    log_entries.append(replace(log_entries[0], path='/a"b\\c/ü\x01', bytes_sent=None))
+    out = io.StringIO()
+    assert write_log_entries_jsonl(log_entries, out, chunk_lines=7) == 3001
+    lines = out.getvalue().splitlines()
+    assert len(lines) == 3001
+    for log, line in zip(log_entries, lines):
+        record = json.loads(line)
+        assert datetime.fromisoformat(record.pop("ts")) == log.ts
+        assert record == {
+            "ip": log.ip,
+            "method": log.method,
+            "path": log.path,
+            "status": log.status,
+            "bytes_sent": log.bytes_sent,
+            "request_time_s": log.request_time_s,
+        }
+
+
+def test_columns_round_trip_in_blocks(tmp_path, log_entries):
+    path = tmp_path / "out.cols"
+    with open(path, "wb") as f:
+        assert write_log_columns(log_entries, f, block_rows=1000) == 3000
+    assert [len(batch) for batch in read_log_columns(path)] == [1000, 1000, 1000]
+    restored = list(iter_log_columns(path))
+    assert restored == log_entries
+    assert [log.ts.utcoffset() for log in restored] == [log.ts.utcoffset() for log in log_entries]
+    empty = tmp_path / "empty.cols"
+    with open(empty, "wb") as f:
+        assert write_log_columns([], f) == 0
+    assert list(read_log_columns(empty)) == []
+
+
+def test_columns_reader_rejects_bad_files(tmp_path, log_entries):
+    path = tmp_path / "out.cols"
+    with open(path, "wb") as f:
+        write_log_columns(log_entries[:100], f)
+    path.write_bytes(path.read_bytes()[:-10])
+    with pytest.raises(ValueError, match="truncated"):
+        list(read_log_columns(path))
+    path.write_bytes(COLUMNS_MAGIC + b"\x05\x00\x00\x00{oops")
+    with pytest.raises(ValueError, match="corrupt"):
+        list(read_log_columns(path))
+    path.write_text("not columns\n")
+    with pytest.raises(ValueError, match="not a logscoper columns file"):
+        list(read_log_columns(path))
+
+
+@pytest.fixture
+def log(tmp_path):
+    path = tmp_path / "access.log"
+    path.write_text("\n".join(make_lines(3000, seed=4)) + "\ngarbage\n")
+    return str(path)
+
+
+@pytest.mark.parametrize("out", ["out.cols", "out.cols.gz", "out.cols.bz2"])
+def test_filter_format_columns(log, tmp_path, out, log_entries):
+    args = ["filter", "--path", log, "--status", "2xx", "--format", "columns"]
+    assert main(args + ["--out", str(tmp_path / out)]) == 0
+    assert list(iter_log_columns(tmp_path / out)) == [log for log in log_entries if 200 <= log.status < 300]
+
+
+def test_filter_format_jsonl(log, capsys, log_entries):
+    assert main(["filter", "--path", log, "--format", "jsonl", "--grep", "^/$"]) == 0
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [record["path"] for record in records] == [log.path for log in log_entries if log.path == "/"]
+
+
+def test_filter_format_columns_to_stdout(log, capsysbinary):
+    assert main(["filter", "--path", log, "--format", "columns"]) == 0
+    assert capsysbinary.readouterr().out.startswith(COLUMNS_MAGIC)
+
+
+def test_filter_format_columns_rejects_bytes_beyond_int64(tmp_path, capsys):
+    log = tmp_path / "huge.log"
+    log.write_text('1.1.1.1 - - [10/Oct/2000:13:55:36 +0000] "GET / HTTP/1.1" 200 99999999999999999999\n')
+    args = ["filter", "--path", str(log), "--format"]
+    assert main(args + ["jsonl"]) == 0
+    assert json.loads(capsys.readouterr().out)["bytes_sent"] == 99999999999999999999
+    assert main(args + ["columns", "--out", str(tmp_path / "out.cols")]) == 1
+    assert "Error! --format columns: bytes_sent 99999999999999999999 does not fit" in capsys.readouterr().err
+    with pytest.raises(ValueError, match="does not fit"):
+        write_log_columns([parse_log_line(log.read_text())], io.BytesIO())
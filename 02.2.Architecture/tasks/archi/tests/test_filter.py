@@ -1,6 +1,7 @@
 from __future__ import annotations
 import pytest
 from ..src.logscoper.infra.cli import main
+from ..src.logscoper.models.filters import StatusSelector, match_status
 from .conftest import collect_lines
 import re
 
@@ -102,3 +103,40 @@ def test_filter_out_file(sample_log, tmp_path, capsys):
     assert capsys.readouterr().out.strip() == ""
     content = out_file.read_text().strip()
     assert "/boom" in content and " 500 " in content
+
+
+@pytest.mark.parametrize("selector", ["200", " 2xx , 404 ", "404, abc", "xx", "5xx,", "+301,1000"])
+def test_status_selector_matches_patterns(selector):
+    compiled = StatusSelector(selector)
+    patterns = [s.strip() for s in selector.split(",")]
+    for code in range(-5, 1005):
+        try:
+            expected = match_status(code, patterns)
+        except ValueError:
+            with pytest.raises(ValueError):
+                compiled.matches(code)
+            continue
+        assert compiled.matches(code) == expected
+
+
+def test_write_log_entries_chunks(sample_log, capsys):
+    import io
+    from ..src.logscoper.adapters.parser import read_log_file
+    from ..src.logscoper.commands.filter import log_entries_to_txt, write_log_entries
+
+    log_entries = read_log_file(str(sample_log))
+
+    class Out(io.StringIO):
+        writes = 0
+
+        def write(self, s):
+            self.writes += 1
+            return super().write(s)
+
+    out = Out()
+    assert write_log_entries(log_entries, out, chunk_lines=2) == len(log_entries)
+    assert out.getvalue() == log_entries_to_txt(log_entries) + "\n"
+    assert out.writes == (len(log_entries) + 1) // 2
+    empty = io.StringIO()
+    assert write_log_entries([], empty) == 0
+    assert empty.getvalue() == "\n"
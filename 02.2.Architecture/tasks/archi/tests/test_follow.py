@@ -0,0 +1,137 @@
+from __future__ import annotations
+import json
+import os
+import pytest
+from ..src.logscoper.infra import cli
+from ..src.logscoper.infra.cli import main
+from ..src.logscoper.adapters.follow import LogFollower
+from ..src.logscoper.models.windows import RollingWindows, parse_windows
+
+
+def line(sec: int, status: int = 200, rt: str = "0.100") -> str:
+    return (
+        f"10.0.0.1 - - [10/Oct/2000:10:{sec // 60:02d}:{sec % 60:02d} +0000] "
+        f'"GET /a HTTP/1.1" {status} 10 "-" "UA" {rt}\n'
+    )
+
+
+def test_follower_reads_only_appended_complete_lines(tmp_path):
+    p = tmp_path / "access.log"
+    p.write_text("old\n")
+    with LogFollower(str(p)) as f:
+        assert list(f.poll()) == []
+        with open(p, "a") as out:
+            out.write("one\ntw")
+        assert list(f.poll()) == ["one"]
+        with open(p, "a") as out:
+            out.write("o\r\nthree\n")
+        assert list(f.poll()) == ["two", "three"]
+        assert list(f.poll()) == []
+
+
+def test_follower_from_start(tmp_path):
+    p = tmp_path / "access.log"
+    p.write_text("a\nb\n")
+    with LogFollower(str(p), from_start=True) as f:
+        assert list(f.poll()) == ["a", "b"]
+
+
+def test_follower_survives_rename_rotation(tmp_path):
+    p = tmp_path / "access.log"
+    p.write_text("")
+    with LogFollower(str(p)) as f:
+        with open(p, "a") as out:
+            out.write("before\n")
+        os.rename(p, tmp_path / "access.log.1")
+        with open(tmp_path / "access.log.1", "a") as out:
+            out.write("late\nunterminated")
+        assert list(f.poll()) == ["before", "late"]  # нового файла ещё нет
+        p.write_text("fresh\n")
+        assert list(f.poll()) == ["unterminated", "fresh"]
+        with open(p, "a") as out:
+            out.write("next\n")
+        assert list(f.poll()) == ["next"]
+
+
+def test_follower_copytruncate(tmp_path):
+    p = tmp_path / "access.log"
+    p.write_text("x" * 100 + "\n")
+    with LogFollower(str(p)) as f:
+        p.write_text("new\n")
+        assert list(f.poll()) == ["new"]
+
+
+def test_rolling_windows():
+    w = RollingWindows({"10s": 10, "1m": 60})
+    for sec in range(120):
+        w.add(1000 + sec, 500 if sec % 10 == 0 else 200, float(sec))
+    snap = w.snapshot()
+    assert snap["10s"]["total"] == 10
+    assert snap["10s"]["status"] == {200: 9, 500: 1}
+    assert snap["10s"]["rt_avg_ms"] == pytest.approx(114.5, rel=0.01)
+    assert snap["1m"]["total"] == 60
+    assert snap["1m"]["rps"] == 1.0
+    assert snap["1m"]["rt_p99_ms"] == pytest.approx(118, rel=0.02)
+    # запись старше кольца отброшена, запоздавшая внутри окна -- учтена
+    w.add(1000, 200, 1.0)
+    w.add(1115, 404, None)
+    assert w.snapshot()["10s"]["status"] == {200: 9, 404: 1, 500: 1}
+    # тишина в логе: окна сдвигаются вместе с now
+    assert w.snapshot(now=1119 + 30)["10s"]["total"] == 0
+    assert w.snapshot(now=1119 + 30)["1m"]["total"] == 31
+    assert RollingWindows().snapshot()["1m"]["rt_p95_ms"] is None
+
+
+def test_parse_windows():
+    assert parse_windows("30s, 5m,1h") == {"30s": 30, "5m": 300, "1h": 3600}
+    for bad in ("", "5", "0m", "5d"):
+        with pytest.raises(ValueError):
+            parse_windows(bad)
+
+
+def test_tail_once(tmp_path, capsys):
+    p = tmp_path / "access.log"
+    p.write_text("".join(line(s, 404 if s == 100 else 200) for s in range(120)))
+    args = ["tail", "--path", str(p), "--json", "--windows", "1m,15m"]
+    assert main(args) == 0
+    data = json.loads(capsys.readouterr().out)
+    assert data["ts"].startswith("2000-10-10T10:01:59")
+    assert data["windows"]["1m"]["total"] == 60
+    assert data["windows"]["1m"]["status"] == {"200": 59, "404": 1}
+    assert data["windows"]["15m"]["total"] == 120
+    assert main(args + ["--status", "4xx"]) == 0
+    assert json.loads(capsys.readouterr().out)["windows"]["15m"]["total"] == 1
+    assert main(["tail", "--path", str(p), "--windows", "1m"]) == 0
+    assert "1m: total=60 rps=1.00 avg=100.00" in capsys.readouterr().out
+
+
+def test_tail_follow_emits_snapshots(tmp_path, capsys, monkeypatch):
+    p = tmp_path / "access.log"
+    p.write_text(line(0))
+    steps = iter(range(1, 4))
+    clock = [0.0]
+
+    def sleep(seconds):
+        # вместо ожидания дописываем в лог; после трёх шагов -- Ctrl+C
+        clock[0] += seconds
+        step = next(steps, None)
+        if step is None:
+            raise KeyboardInterrupt
+        with open(p, "a") as out:
+            out.write(line(step) * step)
+
+    monkeypatch.setattr(cli.time, "sleep", sleep)
+    monkeypatch.setattr(cli.time, "monotonic", lambda: clock[0])
+    args = ["tail", "--path", str(p), "-f", "--json", "--interval", "1", "--poll", "1"]
+    assert main(args) == 130
+    snaps = [json.loads(s) for s in capsys.readouterr().out.splitlines()]
+    # строка, записанная до запуска, не читается
+    assert [s["windows"]["1m"]["total"] for s in snaps] == [1, 3, 6]
+    assert snaps[-1]["ts"].startswith("2000-10-10T10:00:03")
+
+
+def test_tail_invalid_windows(tmp_path):
+    p = tmp_path / "access.log"
+    p.write_text("")
+    assert main(["tail", "--path", str(p), "--windows", "1d"]) == 1
+    assert main(["tail", "--path", str(p), "--interval", "0"]) == 1
@@ -0,0 +1,94 @@
+from __future__ import annotations
+import json
+import pickle
+import pytest
+from ..src.logscoper.infra.cli import main
+from ..src.logscoper.models.grep import GrepSet, grep_set
+from .test_bench import make_lines
+
+PATTERNS = ["^/login$", r"users/\d+", "app", "/$"]
+
+
+def test_grep_set_matches():
+    grep = GrepSet(PATTERNS)
+    assert grep("/static/app.js") and not grep("/nope")
+    assert grep.matches("/api/v1/users/12345/orders") == (1,)
+    assert grep.matches("/app/") == (2, 3)
+    assert grep.matches("/nope") == ()
+    copy = pickle.loads(pickle.dumps(grep))
+    assert copy.patterns == grep.patterns and copy.matches("/app/") == (2, 3)
+    assert grep_set(["a", "b", "a"]).patterns == ("a", "b")
+    assert grep_set(None) is None and grep_set([]) is None
+
+
+def test_uncombinable_patterns_fall_back():
+    # обратная ссылка и повтор имени группы не склеиваются в одну альтернативу
+    backref = GrepSet(["(a)\\1", "b"])
+    assert backref("aa") and backref("b") and not backref("a")
+    named = GrepSet(["(?P<x>a)", "(?P<x>b)"])
+    assert named("a") and named("b") and not named("c")
+    assert named.matches("ab") == (0, 1)
+
+
+@pytest.fixture
+def bench_log(tmp_path):
+    log = tmp_path / "bench.log"
+    log.write_text("\n".join(make_lines(3000)) + "\n")
+    return str(log)
+
+
+def stats(capsys, *args):
+    assert main(["stats", "--json", *args]) == 0
+    return json.loads(capsys.readouterr().out)
+
+
+@pytest.mark.parametrize("extra", [
+    [],
+    ["--jobs", "2"],
+    ["--since", "2000-10-10T10:00:10", "--index"],
+    ["--status", "2xx", "--approx-top", "2"],
+    ["--path-templates"],
+])
+def test_stats_counts_each_pattern(bench_log, capsys, extra):
+    args = ["--path", bench_log, *extra]
+    data = stats(capsys, *args, *(x for p in PATTERNS for x in ("--grep", p)))
+    union = stats(capsys, *args, "--grep", "|".join(f"(?:{p})" for p in PATTERNS))
+    assert data["total"] == union["total"]
+    assert data["status"] == union["status"]
+    for pattern in PATTERNS:
+        assert data["grep"][pattern] == stats(capsys, *args, "--grep", pattern)["total"]
+    assert "grep" not in stats(capsys, *args, "--grep", "app")
+
+
+def test_numpy_counts_each_pattern(bench_log, capsys):
+    pytest.importorskip("numpy")
+    args = ["--path", bench_log, *(x for p in PATTERNS for x in ("--grep", p))]
+    assert stats(capsys, *args, "--engine", "numpy")["grep"] == stats(capsys, *args)["grep"]
+
+
+def test_state_keeps_counts(tmp_path, bench_log, capsys):
+    lines = open(bench_log).read().splitlines(keepends=True)
+    log, state = tmp_path / "grow.log", str(tmp_path / "st")
+    log.write_text("".join(lines[:1000]))
+    args = ["--path", str(log), "--grep", "app", "--grep", "/$", "--state", state]
+    stats(capsys, *args)
+    with open(log, "a") as f:
+        f.write("".join(lines[1000:]))
+    data = stats(capsys, *args)
+    expected = stats(capsys, "--path", bench_log, "--grep", "app", "--grep", "/$")
+    assert data["grep"] == expected["grep"]
+    assert data["total"] == expected["total"]
+
+
+def test_grep_file_and_text_output(tmp_path, bench_log, capsys):
+    patterns = tmp_path / "patterns.txt"
+    patterns.write_text("# endpoints\n^/login$\n\napp\n")
+    assert main(["stats", "--path", bench_log, "--grep-file", str(patterns), "--grep", "/$"]) == 0
+    out = capsys.readouterr().out
+    assert "By grep:" in out and " ^/login$" in out and " /$" in out
+    assert main(["filter", "--path", bench_log, "--grep-file", str(patterns)]) == 0
+    shown = capsys.readouterr().out.splitlines()
+    assert shown and all(" /login " in s or "app" in s for s in shown)
+    with pytest.raises(SystemExit):
+        main(["filter", "--path", bench_log, "--grep-file", str(tmp_path / "nope")])
+    assert "cannot read" in capsys.readouterr().err
@@ -0,0 +1,106 @@
+from __future__ import annotations
+import json
+import pickle
+from collections import Counter
+import pytest
+from ..src.logscoper.adapters.parser import parse_log_line
+from ..src.logscoper.infra.cli import main
+from ..src.logscoper.models.groups import GroupBy, GroupedSeries, parse_group_by
+from ..src.logscoper.models.windows import BUCKET_UNITS, parse_duration
+from .test_bench import make_lines
+
+
+def test_parse_group_by_and_duration():
+    assert parse_group_by("status, method,status") == ("status", "method")
+    with pytest.raises(ValueError, match="nope"):
+        parse_group_by("status,nope")
+    with pytest.raises(ValueError):
+        parse_group_by(",")
+    assert parse_duration("90s") == 90
+    assert parse_duration("1d", "bucket", BUCKET_UNITS) == 86400
+    with pytest.raises(ValueError, match="invalid bucket"):
+        parse_duration("0m", "bucket")
+    with pytest.raises(ValueError):
+        parse_duration("1d")
+
+
+def test_series_counts_buckets_and_round_trips():
+    log_entries = [parse_log_line(line) for line in make_lines(1000)]  # 50 записей в секунду
+    series = GroupedSeries(GroupBy(("method", "path_template"), 5))
+    for log in log_entries:
+        series.add(log)
+    rows = series.rows()
+    assert sum(row["count"] for row in rows) == 1000
+    assert {row["bucket"] for row in rows} == {f"2000-10-10T10:00:{s:02d}+00:00" for s in range(0, 20, 5)}
+    expected = Counter((log.method, "/api/v1/users/{id}/orders" if "users" in log.path else log.path)
+                       for log in log_entries)
+    got: Counter[tuple[str, str]] = Counter()
+    for row in rows:
+        got[(row["method"], row["path_template"])] += row["count"]
+    assert got == expected
+    assert pickle.loads(pickle.dumps(series)).rows() == rows
+    assert GroupedSeries.from_dict(json.loads(json.dumps(series.to_dict()))).rows() == rows
+
+
+def test_merge_equals_single_pass():
+    log_entries = [parse_log_line(line) for line in make_lines(2000, seed=3)]
+    spec = GroupBy(("status",), 10)
+    whole, first, second = GroupedSeries(spec), GroupedSeries(spec), GroupedSeries(spec)
+    for i, log in enumerate(log_entries):
+        whole.add(log)
+        (first if i < 700 else second).add(log)
+    merged = first.merge(second).rows()
+    assert [(r["bucket"], r["status"], r["count"]) for r in merged] == [
+        (r["bucket"], r["status"], r["count"]) for r in whole.rows()
+    ]
+
+
+@pytest.fixture
+def bench_log(tmp_path):
+    log = tmp_path / "bench.log"
+    log.write_text("\n".join(make_lines(3000)) + "\n")
+    return str(log)
+
+
+def stats(capsys, *args):
+    assert main(["stats", "--json", *args]) == 0
+    return json.loads(capsys.readouterr().out)
+
+
+@pytest.mark.parametrize("extra", [["--jobs", "2"], ["--index"], ["--approx-percentiles"]])
+def test_stats_groups_same_for_every_source(bench_log, capsys, extra):
+    args = ["--path", bench_log, "--group-by", "status,ip", "--bucket", "10s"]
+    plain = stats(capsys, *args)["groups"]
+    other = stats(capsys, *args, *extra)["groups"]
+    assert [(r["bucket"], r["status"], r["ip"], r["count"]) for r in other] == [
+        (r["bucket"], r["status"], r["ip"], r["count"]) for r in plain
+    ]
+
+
+def test_stats_groups_follow_filters_and_state(bench_log, tmp_path, capsys):
+    args = ["--path", bench_log, "--group-by", "status", "--status", "5xx", "--approx-percentiles"]
+    data = stats(capsys, *args)
+    assert data["groups"] == [{
+        "status": 500,
+        "count": data["total"],
+        "rt_avg_ms": data["rt_avg_ms"],
+        "rt_p95_ms": data["rt_p95_ms"],
+        "rt_p99_ms": data["rt_p99_ms"],
+    }]
+    state = str(tmp_path / "state.json")
+    assert stats(capsys, *args, "--state", state)["groups"] == data["groups"]
+    assert stats(capsys, *args, "--state", state)["groups"] == data["groups"]
+
+
+def test_stats_groups_text_and_errors(bench_log, capsys):
+    args = ["stats", "--path", bench_log, "--group-by", "method", "--bucket", "1m"]
+    assert main(args) == 0
+    out = capsys.readouterr().out
+    assert "Groups (bucket, method):" in out
+    assert " 2000-10-10T10:00:00+00:00 GET avg=" in out
+    assert main(["stats", "--path", bench_log, "--group-by", "host"]) == 1
+    assert "--group-by" in capsys.readouterr().err
+    assert main(["stats", "--path", bench_log, "--bucket", "soon"]) == 1
+    assert "invalid bucket" in capsys.readouterr().err
+    assert main(args + ["--engine", "numpy"]) == 1
+    assert "--engine python" in capsys.readouterr().err
@@ -0,0 +1,120 @@
+from __future__ import annotations
+import os
+from datetime import datetime, timedelta, timezone
+import pytest
+from ..src.logscoper.adapters.parser import build_time_index, read_log_file
+from ..src.logscoper.adapters.time_index import TimeIndex, index_path, load_time_index, save_time_index
+from ..src.logscoper.commands.filter import filter_log_entries
+from ..src.logscoper.infra.cli import main
+from .test_parser import _write_fuzz_log
+
+BASE = datetime(2000, 10, 10, 10, tzinfo=timezone.utc)
+
+
+def _line(i: int, seconds: int) -> str:
+    ts = (BASE + timedelta(seconds=seconds)).strftime("%d/%b/%Y:%H:%M:%S +0000")
+    return f'10.0.0.{i % 9} - - [{ts}] "GET /p{i % 5} HTTP/1.1" {(200, 404, 500)[i % 3]} {i} 0.{i % 97:03d}'
+
+
+def _iso(seconds: int) -> str:
+    return (BASE + timedelta(seconds=seconds)).isoformat()
+
+
+@pytest.fixture
+def log(tmp_path):
+    # по строке в секунду, но с опозданиями до 30 с, мусором и переводами \r
+    lines = []
+    for i in range(3000):
+        lines.append(_line(i, i - 30 * (i % 17 == 0)))
+        if i % 250 == 0:
+            lines.append("garbage")
+    lines[1500] += "\r" + _line(1, 5)  # одна запись из начала посреди файла
+    path = tmp_path / "access.log"
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+@pytest.mark.parametrize("since, until", [(None, 60), (100, 400), (5, 6), (1490, 1520), (2900, None), (None, -10)])
+def test_indexed_read_matches_full_read(log, since, until):
+    since = None if since is None else _iso(since)
+    until = None if until is None else _iso(until)
+    expected = filter_log_entries(read_log_file(log), since, until, "2xx,5xx")
+    for _ in range(2):  # сборка индекса, затем чтение
+        got = read_log_file(log, since, until, "2xx,5xx", index=True)
+        assert filter_log_entries(got, since, until, "2xx,5xx") == expected
+    assert index_path(log).exists()
+
+
+def test_index_blocks(log):
+    index = build_time_index(log, every=100)
+    assert len(index) == 31
+    assert index.offsets[0] == 0 and index.end == os.path.getsize(log)
+    epoch = int(BASE.timestamp())
+    assert index.lo[15] == epoch + 5
+    (start, end), late = index.ranges(epoch + 1000, epoch + 1100)
+    assert 0 < start and end < index.end
+    # опоздавшая запись с ts=5 затягивает свой блок в любое окно после 5 с
+    assert late == (index.offsets[15], index.offsets[16])
+    assert index.ranges(epoch + 10 ** 6) == []
+
+
+def test_empty_blocks_are_skipped():
+    index = TimeIndex(end=30)
+    index.add_block(0, 100, 200)
+    index.add_block(10, 2 ** 63 - 1, -2 ** 63)
+    index.add_block(20, 300, 400)
+    index.finish()
+    assert index.ranges(150, 350) == [(0, 10), (20, 30)]
+    assert index.ranges() == [(0, 30)]
+
+
+def test_index_rebuilt_when_log_changes(log, capsys):
+    args = ["stats", "--path", log, "--since", "2000-10-10T10:50:00Z"]
+    assert main(args + ["--index"]) == 0
+    capsys.readouterr()
+    assert load_time_index(log) is not None
+    with open(log, "a") as f:
+        f.write(_line(0, 3600) + "\n")
+    assert load_time_index(log) is None
+    assert main(args) == 0
+    expected = capsys.readouterr().out
+    assert main(args + ["--index"]) == 0
+    assert capsys.readouterr().out == expected
+    assert load_time_index(log).end == os.path.getsize(log)
+
+
+@pytest.mark.parametrize("command", [
+    ["stats", "--json"],
+    ["filter", "--grep", "p[12]"],
+    ["hist", "--json", "--bucket-ms", "100"],
+])
+def test_cli_index_matches_plain(log, capsys, command):
+    window = ["--since", "2000-10-10T10:10:00Z", "--until", "2000-10-10T10:20:00Z"]
+    args = [command[0], "--path", log] + command[1:] + window
+    assert main(args) == 0
+    expected = capsys.readouterr().out
+    assert main(args + ["--index"]) == 0
+    assert capsys.readouterr().out == expected
+
+
+def test_corrupt_index_is_ignored(log):
+    since = _iso(700)
+    expected = filter_log_entries(read_log_file(log), since)
+    assert filter_log_entries(read_log_file(log, since, index=True), since) == expected
+    data = index_path(log).read_bytes()
+    index_path(log).write_bytes(data[:-5])
+    assert load_time_index(log) is None
+    assert filter_log_entries(read_log_file(log, since, index=True), since) == expected
+
+
+@pytest.mark.parametrize("since, until", [
+    ("2000-10-10T13:10:00Z", "2000-10-10T13:40:00Z"),
+    (None, "2000-10-10T13:40:00Z"),
+    ("2000-10-10T13:10:00Z", None),
+])
+@pytest.mark.parametrize("every", [1, 7, 64])
+def test_fuzz_index_parity(tmp_path, since, until, every):
+    log = str(_write_fuzz_log(tmp_path / "fuzz.log"))
+    assert save_time_index(log, build_time_index(log, every), os.stat(log))
+    expected = filter_log_entries(read_log_file(log), since, until, "2xx")
+    assert filter_log_entries(read_log_file(log, since, until, "2xx", index=True), since, until, "2xx") == expected
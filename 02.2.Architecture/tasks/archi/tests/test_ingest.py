@@ -0,0 +1,130 @@
+from __future__ import annotations
+import asyncio
+import json
+import threading
+import urllib.error
+import urllib.request
+import pytest
+from ..src.logscoper.infra.cli import main
+from ..src.logscoper.adapters.loadgen import run_loadgen, sample_lines
+from ..src.logscoper.adapters.ingest import IngestServer, Ingestor, parse_batch, strip_syslog
+
+pytest.importorskip("aiohttp")
+
+LINE = (
+    '10.0.0.1 - - [10/Oct/2000:13:55:36 +0000] "GET /a HTTP/1.1" 200 5 "-" "UA" 0.120'
+)
+
+
+def test_strip_syslog():
+    assert strip_syslog(LINE) == LINE
+    assert strip_syslog(f"<190>{LINE}") == LINE
+    assert strip_syslog(f"<190>Oct  9 13:55:36 web-1 nginx: {LINE}") == LINE
+    assert strip_syslog(f"<190>Oct 10 13:55:36 web-1 nginx[42]: {LINE}") == LINE
+
+
+def test_parse_batch():
+    lines = [LINE, "garbage", LINE.replace(" 200 ", " 404 "), f"<13>{LINE}"]
+    acc = parse_batch(lines, "2xx", None, None, None)
+    assert acc.total == 2
+    assert acc.sketch is not None and acc.sketch.count == 2
+    assert acc.result()["top_paths"] == [("/a", 2)]
+
+
+def test_backpressure_and_udp_drops():
+    async def scenario():
+        # обработчики не запущены: очередь на один пакет сразу полна
+        ingestor = Ingestor(batch_size=2, queue_size=1)
+        await ingestor.put([LINE])
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(ingestor.put([LINE]), 0.05)
+        ingestor.offer([LINE])
+        assert ingestor.counters.dropped == 0  # ещё копится до пакета
+        ingestor.offer([LINE, LINE])
+        assert ingestor.counters.dropped == 3
+        await ingestor.start()
+        await ingestor.drain()
+        await ingestor.close()
+        return ingestor
+
+    ingestor = asyncio.run(scenario())
+    assert ingestor.acc.total == 1
+    assert ingestor.snapshot()["ingest"] == {
+        "received": 5,
+        "dropped": 3,
+        "batches": 1,
+        "queued": 0,
+    }
+
+
+def test_server_ingests_from_all_sources(tmp_path):
+    lines = sample_lines(3000, seed=1)
+
+    async def scenario():
+        server = IngestServer(
+            Ingestor(jobs=2, batch_size=100, queue_size=2),
+            ("127.0.0.1", 0),
+            udp=("127.0.0.1", 0),
+            tcp=("127.0.0.1", 0),
+            unix=str(tmp_path / "ingest.sock"),
+        )
+        await server.start()
+        host, port = server.addresses["http"]
+        http = f"http://{host}:{port}"
+        try:
+            by_tcp = await run_loadgen(
+                lines, tcp=server.addresses["tcp"], connections=3, http=http
+            )
+            by_unix = await run_loadgen(
+                lines[:500], unix=server.addresses["unix"], http=http
+            )
+            by_udp = await run_loadgen(
+                lines[:200], udp=server.addresses["udp"], http=http
+            )
+            snapshot = server.ingestor.snapshot(3)
+        finally:
+            await server.close()
+        return by_tcp, by_unix, by_udp, snapshot
+
+    by_tcp, by_unix, by_udp, snapshot = asyncio.run(scenario())
+    assert by_tcp["total"] == by_tcp["received"] == 3000
+    assert by_tcp["ingest_lines_per_s"] > 0
+    assert by_unix["total"] == 500
+    assert by_udp["received"] + by_udp["lost"] == 200
+    assert by_udp["dropped"] <= by_udp["received"]
+    assert snapshot["total"] == 3500 + by_udp["total"]
+    assert len(snapshot["top_paths"]) == 3
+    assert snapshot["rt_p99_ms"] is not None
+
+
+def test_loadgen_cli_against_running_server(capsys):
+    loop = asyncio.new_event_loop()
+    server = IngestServer(Ingestor(), ("127.0.0.1", 0), tcp=("127.0.0.1", 0))
+    loop.run_until_complete(server.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        tcp = "%s:%d" % server.addresses["tcp"]
+        http = "http://%s:%d" % server.addresses["http"]
+        args = ["loadgen", "--tcp", tcp, "--http", http, "--lines", "1500"]
+        assert main(args + ["--json"]) == 0
+        result = json.loads(capsys.readouterr().out)
+        assert result["total"] == 1500
+        assert main(args) == 0
+        assert "Ingest rate:" in capsys.readouterr().out
+        with urllib.request.urlopen(f"{http}/health") as response:
+            assert response.read() == b"ok"
+        with pytest.raises(urllib.error.HTTPError, match="400"):
+            urllib.request.urlopen(f"{http}/stats?top=-1")
+    finally:
+        asyncio.run_coroutine_threadsafe(server.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def test_serve_needs_a_source(capsys):
+    assert main(["serve", "--http", "127.0.0.1:0"]) == 1
+    assert "at least one" in capsys.readouterr().err
+    assert main(["serve", "--tcp", "nope"]) == 1
+    assert "--tcp" in capsys.readouterr().err
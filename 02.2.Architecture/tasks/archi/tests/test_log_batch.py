@@ -0,0 +1,103 @@
+from __future__ import annotations
+import dataclasses
+import pytest
+from ..src.logscoper.adapters.parser import parse_log_line, read_log_batch, read_log_file
+from ..src.logscoper.models.log_batch import LogBatch, StringPool
+from ..src.logscoper.models.log_entry import LogEntry
+
+LINES = [
+    '127.0.0.1 - - [10/Oct/2000:13:55:36 +0000] "GET /index.html HTTP/1.1" 200 - "-" "UA" 0.120',
+    '127.0.0.1 - - [10/Oct/2000:13:55:37 -0700] "POST /login HTTP/1.1" 302 0',
+    '10.0.0.2 - - [10/Oct/2000:13:55:38 +0530] "GET /привет HTTP/1.1" 404 5 rt=0.333',
+    'garbage',
+    '10.0.0.2 - - [10/Oct/2000:13:55:39 +0000] "GET /index.html HTTP/1.1" 500 12 "-" "UA" 1.5',
+    '10.0.0.3 - - [10/Oct/2000:13:55:39 +0000] "DELETE / HTTP/1.1" 204 0 0.001',
+]
+
+
+@pytest.fixture
+def log(tmp_path):
+    path = tmp_path / 'access.log'
+    path.write_text('\n'.join(LINES * 3) + '\n', encoding='utf-8')
+    return str(path)
+
+
+def test_log_entry_is_slotted(log):
+    log_entry = read_log_file(log)[0]
+    assert '__slots__' in vars(LogEntry)
+    assert not hasattr(log_entry, '__dict__')
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        log_entry.status = 200
+
+
+def test_batch_matches_read_log_file(log):
+    log_entries = read_log_file(log)
+    batch = read_log_batch(log)
+    assert len(batch) == len(log_entries)
+    assert list(batch) == log_entries
+    assert [batch[i] for i in range(len(batch))] == log_entries
+    # исходный часовой пояс сохраняется, а не только момент времени
+    assert [log.ts.utcoffset() for log in batch] == [log.ts.utcoffset() for log in log_entries]
+
+
+def test_batch_filters_like_read_log_file(log):
+    args = ('2000-10-10T13:55:38', None, '4xx,5xx')
+    assert list(read_log_batch(log, *args)) == read_log_file(log, *args)
+
+
+def test_batch_stores_strings_once(log):
+    batch = read_log_batch(log)
+    assert len(batch.path.values) == 4
+    assert len(batch.ip.values) == 3
+    log_entries = list(batch)
+    assert log_entries[0].path is log_entries[3].path
+
+
+def test_batch_overflow_keeps_columns_aligned(log):
+    log_entries = read_log_file(log)
+    batch = LogBatch.from_entries(log_entries[:2])
+    with pytest.raises(OverflowError):
+        batch.append(dataclasses.replace(log_entries[0], bytes_sent=2 ** 63))
+    assert list(batch) == log_entries[:2]
+
+
+def test_read_log_batch_rejects_bytes_beyond_int64(tmp_path):
+    path = tmp_path / 'huge.log'
+    path.write_text(LINES[0].replace(' 200 - ', ' 200 99999999999999999999 ') + '\n', encoding='utf-8')
+    assert read_log_file(str(path))[0].bytes_sent == 99999999999999999999
+    with pytest.raises(ValueError, match='int64'):
+        read_log_batch(str(path))
+
+
+def test_empty_batch(tmp_path):
+    path = tmp_path / 'empty.log'
+    path.write_text('')
+    assert len(read_log_batch(str(path))) == 0
+    assert list(LogBatch()) == []
+
+
+def test_string_pool_codes_and_interning():
+    pool = StringPool()
+    first, second = ''.join(['/lo', 'gin']), ''.join(['/log', 'in'])
+    assert first is not second
+    assert pool.intern(first) is pool.intern(second) is first
+    assert [pool.code(value) for value in ('/login', '/', '/login')] == [0, 1, 0]
+    assert pool.values == ['/login', '/']
+
+
+def test_string_pool_limit():
+    pool = StringPool(limit=2)
+    pool.intern('/a')
+    pool.intern('/b')
+    fresh = ''.join(['/', 'c'])
+    assert pool.intern(fresh) is fresh
+    assert len(pool) == 2
+    assert pool.intern(''.join(['/', 'a'])) is pool.values[0]
+
+
+def test_parse_log_line_interns_fields():
+    first = parse_log_line(LINES[0])
+    second = parse_log_line(LINES[0].replace('13:55:36', '13:55:40'))
+    assert first.path is second.path
+    assert first.ip is second.ip
+    assert first.method is second.method
@@ -0,0 +1,152 @@
+from __future__ import annotations
+import random
+from datetime import datetime
+import pytest
+from ..src.logscoper.adapters.timestamp import parse_ts
+from ..src.logscoper.adapters.parser import (
+    fast_line_fields as _fast_fields,
+    regex_line_fields as _regex_fields,
+    parse_log_line as parse_line,
+    read_log_file,
+)
+from ..src.logscoper.commands.filter import filter_log_entries
+
+CANONICAL = [
+    '127.0.0.1 - - [10/Oct/2000:13:55:36 +0000] "GET /index.html HTTP/1.1" 200 - "-" "UA" 0.120',
+    '127.0.0.1 - - [10/Oct/2000:13:55:36 +0000] "GET /a HTTP/1.1" 200 100 "-" "UA"',
+    '127.0.0.1 - - [10/Oct/2000:13:55:36 +0000] "GET /y HTTP/1.1" 200 1 "-" "UA" rt=0.250',
+    '127.0.0.1 - frank [10/Oct/2000:13:55:36 -0700] "POST /login HTTP/2.0" 302 0',
+    '127.0.0.1 - - [10/Oct/2000:13:55:36 +0000] "GET /spaces and tabs HTTP/1.1" 200 1 "-" "UA" 0.050',
+    '127.0.0.1 - - [10/Oct/2000:13:55:36 +0000] "GET /no-proto" 200 1 0.3',
+    '1.1.1.1 - - [10/Oct/2000:09:00:03 +0000] "GET /regex-specials.^$+*?[](){}| HTTP/1.1" 500 1 "-" "UA" 0.040',
+    '1.1.1.1 - - [10/Oct/2000:09:00:03 +0000] "GET /a HTTP/1.1" 200 1 "http://x/?q=1" "Mozilla/5.0 (X11)" 1.5',
+    '127.0.0.1 - - [10/Oct/2000:13:55:36 +0000] "GET /привет HTTP/1.1" 200 1 0.5',
+]
+
+# строки, на которых быстрый путь обязан уступить регулярке
+IRREGULAR = [
+    '',
+    'garbage',
+    '127.0.0.1 - - [10/Oct/2000:13:55:36 +0000]  "GET /a HTTP/1.1" 200 1',
+    '127.0.0.1 - - [10/Oct/2000:13:55:36 +0000] "GET  /a HTTP/1.1" 200 1',
+    '127.0.0.1 - - [10/Oct/2000:13:55:36 +0000] "GET /a"b HTTP/1.1" 200 1 "-" "UA" 0.1',
+    '127.0.0.1 - - [10/Oct/2000:13:55:36 +0000] "GET /a HTTP/1.1" 2000 1',
+    '127.0.0.1 - - [10/Oct/2000:13:55:36 +0000] "GET /a HTTP/1.1"  200 1',
+    '127.0.0.1 - - [10/Oct/2000:13:55:36 +0000] "GET /a HTTP/1.1" 200 1  0.5',
+    '127.0.0.1 - - [10/Oct/2000:13:55:36 +0000] "GET /a HTTP/1.1" 200 1 "-" 0.5',
+    '127.0.0.1 - - [10/Oct/2000:13:55:36 +0000] "GET /a HTTP/1.1" 200 1 0.5abc',
+    '127.0.0.1 - - [10/Oct/2000:13:55:36 +0000] "GET /a HTTP/1.1" 200 1 rt=x',
+    '127.0.0.1 - - [10/Oct/2000:13:55:36 +0000] "GET /a HTTP/1.1" 200 1\t0.5',
+    'x 127.0.0.1 - - [10/Oct/2000:13:55:36 +0000] "GET /a HTTP/1.1" 200 1 0.5',
+    '127.0.0.1 - - [] "GET /a HTTP/1.1" 200 1',
+    '127.0.0.1 - - [10/Oct/2000:13:55:36 +0000] "GET /a HTTP/1.1" 200 1 0.5 extra',
+    '127.0.0.1 - - [10/Oct/2000:13:55:36 +0000] "get /a HTTP/1.1" 200 1',
+]
+
+
+@pytest.mark.parametrize("line", CANONICAL)
+def test_fast_path_accepts_canonical(line):
+    fields = _fast_fields(line)
+    assert fields is not None
+    assert fields == _regex_fields(line)
+
+
+@pytest.mark.parametrize("line", IRREGULAR)
+def test_fast_path_defers_irregular(line):
+    assert _fast_fields(line) is None
+
+
+@pytest.mark.parametrize("line", CANONICAL + IRREGULAR)
+def test_parse_line_matches_regex(line):
+    fields = _regex_fields(line)
+    entry = parse_line(line)
+    if fields is None:
+        assert entry is None
+    else:
+        assert entry is not None
+        assert (entry.ip, entry.method, entry.path) == (fields[0], fields[2], fields[3])
+
+
+def test_fast_path_agrees_with_regex_on_mutations():
+    rnd = random.Random(7)
+    alphabet = [" ", "  ", '"', "[", "]", "\t", "rt=", "0", ".", " HTTP/1.1", "\xa0", "x"]
+    for _ in range(5000):
+        line = rnd.choice(CANONICAL)
+        for _ in range(rnd.randint(1, 3)):
+            pos = rnd.randrange(len(line) + 1)
+            line = line[:pos] + rnd.choice(alphabet) + line[pos + rnd.randint(0, 1):]
+        fields = _fast_fields(line)
+        if fields is not None:
+            assert fields == _regex_fields(line), line
+
+
+TS_CASES = [
+    "10/Oct/2000:13:55:36 +0000",
+    "10/Oct/2000:13:55:36 -0700",
+    "01/Jan/2024:00:00:00 +0530",
+    "29/Feb/2024:23:59:59 +1400",
+    "1/Oct/2000:13:55:36 +0000",  # однозначный день -- через strptime
+    "10/oct/2000:13:55:36 +0000",
+    "10/Oct/2000:13:55:36 +00:00",
+]
+
+BAD_TS = [
+    "31/Feb/2000:00:00:00 +0000",
+    "10/Foo/2000:13:55:36 +0000",
+    "10/Oct/2000:24:00:00 +0000",
+    "10/Oct/2000:13:55:36 +0070",
+    "10/Oct/2000:13:55:36",
+]
+
+
+@pytest.mark.parametrize("raw", TS_CASES)
+def test_parse_ts_matches_strptime(raw):
+    expected = datetime.strptime(raw, "%d/%b/%Y:%H:%M:%S %z")
+    assert parse_ts(raw) == expected
+    assert parse_ts(raw).utcoffset() == expected.utcoffset()
+
+
+@pytest.mark.parametrize("raw", BAD_TS)
+def test_parse_ts_rejects_like_strptime(raw):
+    with pytest.raises(ValueError):
+        parse_ts(raw)
+
+
+def _write_fuzz_log(path, n=3000):
+    # канонические и битые строки вперемешку, с \r\n и \r
+    rnd = random.Random(11)
+    alphabet = [" ", '"', "]", "\t", "\r", "\r\n", "\x1c", "\xa0", "5", "404", "x"]
+    lines = []
+    for i in range(n):
+        line = rnd.choice(CANONICAL + IRREGULAR)
+        line = line.replace("200", rnd.choice(["200", "302", "404", "500"]))
+        line = line.replace("13:55:36", f"13:{i // 60 % 60:02d}:{i % 60:02d}")
+        for _ in range(rnd.randint(0, 2)):
+            pos = rnd.randrange(len(line) + 1)
+            line = line[:pos] + rnd.choice(alphabet) + line[pos + rnd.randint(0, 1):]
+        lines.append(line)
+    path.write_bytes("\n".join(lines).encode())
+    return path
+
+
+@pytest.mark.parametrize("status", [None, "200", "5xx", "404,2xx", "404, abc"])
+@pytest.mark.parametrize("since, until", [
+    (None, None),
+    ("2000-10-10T13:10:00", None),
+    ("2000-10-10T13:10:00Z", "2000-10-10T13:40:00+00:00"),
+])
+def test_prefiltered_read_matches_full_read(tmp_path, status, since, until):
+    log = str(_write_fuzz_log(tmp_path / "fuzz.log"))
+    try:
+        expected = filter_log_entries(read_log_file(log), since, until, status)
+    except ValueError:
+        with pytest.raises(ValueError):
+            filter_log_entries(read_log_file(log, since, until, status), since, until, status)
+        return
+    assert filter_log_entries(read_log_file(log, since, until, status), since, until, status) == expected
+
+
+def test_prefiltered_read_empty_file(tmp_path):
+    log = tmp_path / "empty.log"
+    log.write_bytes(b"")
+    assert read_log_file(str(log), status="200") == []
@@ -0,0 +1,76 @@
+from __future__ import annotations
+import gzip
+import json
+import pytest
+from ..src.logscoper.adapters.parser import expand_paths
+from ..src.logscoper.infra.cli import main
+from .conftest import collect_lines
+
+
+def _line(i: int, host: int) -> str:
+    ts = f"10/Oct/2000:10:{i // 60 % 60:02d}:{i % 60:02d} +0000"
+    status = (200, 404, 500)[(i + host) % 3]
+    return f'10.0.0.{host} - - [{ts}] "GET /p{i % 7} HTTP/1.1" {status} {i} "-" "UA" 0.{i % 97:03d}'
+
+
+@pytest.fixture
+def rotated_logs(tmp_path):
+    # три «хоста» с перемешанными по времени строками; одна ротация сжата
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    lines = {host: [_line(i, host) for i in range(host, 600, 3)] for host in range(3)}
+    (logs / "access.log").write_text("\n".join(lines[0]) + "\n")
+    (logs / "access.log.1").write_text("\n".join(lines[1]) + "\n")
+    (logs / "access.log.2.gz").write_bytes(gzip.compress("\n".join(lines[2]).encode()))
+    merged = tmp_path / "all.log"
+    merged.write_text("\n".join(sum(lines.values(), [])) + "\n")
+    return logs, merged
+
+
+def test_expand_paths(rotated_logs):
+    logs, merged = rotated_logs
+    got = expand_paths([str(logs / "access.log*"), str(logs / "access.log"), str(merged)])
+    assert got == [
+        str(logs / "access.log"),
+        str(logs / "access.log.1"),
+        str(logs / "access.log.2.gz"),
+        str(merged),
+    ]
+    assert expand_paths(["no-such.log"]) == ["no-such.log"]
+    with pytest.raises(FileNotFoundError):
+        expand_paths([str(logs / "*.nope")])
+
+
+@pytest.mark.parametrize("jobs", ["1", "2", "5"])
+def test_stats_over_rotations(rotated_logs, capsys, jobs):
+    logs, merged = rotated_logs
+    base = ["stats", "--json", "--status", "2xx,5xx", "--jobs", jobs, "--path"]
+    assert main(base + [str(merged)]) == 0
+    expected = json.loads(capsys.readouterr().out)
+    assert main(base + [str(logs / "access.log*")]) == 0
+    assert json.loads(capsys.readouterr().out) == expected
+
+
+@pytest.mark.parametrize("jobs", ["1", "3"])
+def test_hist_over_rotations(rotated_logs, capsys, jobs):
+    logs, merged = rotated_logs
+    base = ["hist", "--json", "--bucket-ms", "10", "--jobs", jobs]
+    assert main(base + ["--path", str(merged)]) == 0
+    expected = json.loads(capsys.readouterr().out)
+    paths = [str(logs / "access.log"), str(logs / "access.log.1")]
+    assert main(base + ["--path", *paths, "--path", str(logs / "*.gz")]) == 0
+    got = json.loads(capsys.readouterr().out)
+    assert list(got.items()) == list(expected.items())
+
+
+def test_filter_merges_by_timestamp(rotated_logs, capsys):
+    logs, merged = rotated_logs
+    assert main(["filter", "--path", str(merged), "--grep", "p[0-3]"]) == 0
+    expected = collect_lines(capsys)
+    assert main(["filter", "--path", str(logs / "access.log*"), "--grep", "p[0-3]"]) == 0
+    got = collect_lines(capsys)
+    assert got == sorted(expected, key=lambda line: line.split()[0])
+
+
+def test_unmatched_glob_returns_code(tmp_path):
+    assert main(["stats", "--path", str(tmp_path / "access.log*")]) == 2
@@ -0,0 +1,123 @@
+from __future__ import annotations
+import json
+import math
+import random
+from collections import Counter
+import pytest
+from ..src.logscoper.models.sketch import QuantileSketch, SpaceSaving
+
+
+def _exact_rank_value(values, q):
+    return sorted(values)[math.floor(q * (len(values) - 1))]
+
+
+@pytest.mark.parametrize("q", [0.0, 0.5, 0.9, 0.95, 0.99, 1.0])
+def test_quantile_relative_error_bound(q):
+    rnd = random.Random(1)
+    values = [rnd.lognormvariate(4, 1.5) for _ in range(20000)] + [0.0] * 50
+    sketch = QuantileSketch(0.01).update(values)
+    exact = _exact_rank_value(values, q)
+    got = sketch.quantile(q)
+    assert abs(got - exact) <= 0.01 * exact + 1e-12
+
+
+def test_merge_equals_single_pass():
+    rnd = random.Random(2)
+    values = [rnd.expovariate(1 / 120) for _ in range(5000)]
+    whole = QuantileSketch().update(values)
+    parts = [QuantileSketch().update(values[i::3]) for i in range(3)]
+    merged = parts[0].merge(parts[1]).merge(parts[2])
+    assert merged.bins == whole.bins
+    assert merged.count == whole.count
+    for q in (0.5, 0.95, 0.99):
+        assert merged.quantile(q) == whole.quantile(q)
+
+
+def test_memory_is_bounded():
+    sketch = QuantileSketch(0.01, max_bins=64)
+    sketch.update(10 ** (i / 100) for i in range(-600, 900))
+    assert len(sketch.bins) <= 64
+    assert sketch.quantile(1.0) == pytest.approx(sketch.max, rel=0.01)
+
+
+def test_empty_and_mismatched():
+    assert QuantileSketch().quantile(0.5) is None
+    assert QuantileSketch().mean() is None
+    with pytest.raises(ValueError):
+        QuantileSketch(0.01).merge(QuantileSketch(0.02))
+
+
+def _zipf_stream(n, keys, seed):
+    rnd = random.Random(seed)
+    weights = [1 / (k + 1) for k in range(keys)]
+    return rnd.choices([f"/item/{k}" for k in range(keys)], weights, k=n)
+
+
+def test_space_saving_exact_below_capacity():
+    stream = _zipf_stream(5000, 50, seed=1)
+    sketch = SpaceSaving(64)
+    for key in stream:
+        sketch.add(key)
+    assert sketch.counts == dict(Counter(stream))
+    assert set(sketch.errors.values()) == {0}
+
+
+@pytest.mark.parametrize("capacity", [16, 100])
+def test_space_saving_error_bound(capacity):
+    stream = _zipf_stream(20000, 5000, seed=2)
+    exact = Counter(stream)
+    sketch = SpaceSaving(capacity)
+    for key in stream:
+        sketch.add(key)
+    assert len(sketch) == capacity
+    bound = len(stream) / capacity
+    for key, count in sketch.counts.items():
+        assert count - sketch.errors[key] <= exact[key] <= count
+        assert sketch.errors[key] <= bound
+    assert all(key in sketch.counts for key, count in exact.items() if count > bound)
+
+
+def test_space_saving_merge_keeps_bound():
+    stream = _zipf_stream(20000, 3000, seed=3)
+    exact = Counter(stream)
+    parts = [SpaceSaving(200) for _ in range(3)]
+    for i, key in enumerate(stream):
+        parts[i % 3].add(key)
+    merged = parts[0].merge(parts[1]).merge(parts[2])
+    assert merged.total == len(stream) and len(merged) <= 200
+    for key, count in merged.counts.items():
+        assert count - merged.errors[key] <= exact[key] <= count
+    top = sorted(merged.counts, key=merged.counts.get, reverse=True)[:5]
+    assert top == [key for key, _ in exact.most_common(5)]
+
+
+def test_space_saving_weighted_and_invalid():
+    sketch = SpaceSaving(2).update([("/a", 5), ("/b", 3), ("/c", 1)])
+    assert sketch.counts == {"/a": 5, "/c": 4}
+    assert sketch.errors["/c"] == 3
+    with pytest.raises(ValueError):
+        SpaceSaving(0)
+
+
+def test_sketches_round_trip_through_json():
+    values = [0.0, 0.5] + [random.Random(4).lognormvariate(3, 1) for _ in range(500)]
+    sketch = QuantileSketch().update(values)
+    clone = QuantileSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+    assert clone.bins == sketch.bins
+    assert clone.quantile(0.99) == sketch.quantile(0.99)
+    assert clone.merge(sketch).count == 2 * len(values)
+    empty = QuantileSketch.from_dict(json.loads(json.dumps(QuantileSketch().to_dict())))
+    assert empty.quantile(0.5) is None
+    assert empty.merge(sketch).min == 0.0
+
+    top = SpaceSaving(8).update((f"/p{i % 20}", i) for i in range(100))
+    clone = SpaceSaving.from_dict(json.loads(json.dumps(top.to_dict())))
+    assert (clone.counts, clone.errors, clone.total) == (
+        top.counts,
+        top.errors,
+        top.total,
+    )
+    for key in ("/new", "/p1", "/other"):
+        clone.add(key)
+        top.add(key)
+    assert (clone.counts, clone.errors) == (top.counts, top.errors)
@@ -1,6 +1,9 @@
 from __future__ import annotations
 import json
+import pytest
+from ..src.logscoper.adapters.parser import iter_log_file, read_log_file
 from ..src.logscoper.infra.cli import main
+from ..src.logscoper.models.calculations import StatsAccumulator, accumulate_stats, calculate_stats
 
 
 def test_stats_text(sample_log, capsys):
@@ -172,3 +175,89 @@ def test_stats_big_log_sanity(tmp_path, capsys):
     assert isinstance(data["status"], dict)
     assert len(data["top_paths"]) <= 5
     assert (data["rt_avg_ms"] is None) or isinstance(data["rt_avg_ms"], (int, float))
+
+
+def test_stats_approx_percentiles_within_bound(tmp_path, capsys):
+    log = tmp_path / "many.log"
+    log.write_text(
+        "".join(
+            f'1.1.1.1 - - [10/Oct/2000:10:00:{i % 60:02d} +0000] "GET /p{i % 5} HTTP/1.1" 200 1 "-" "UA" 0.{i:03d}\n'
+            for i in range(1000)
+        )
+    )
+    assert main(["stats", "--path", str(log), "--json"]) == 0
+    exact = json.loads(capsys.readouterr().out)
+    assert main(["stats", "--path", str(log), "--json", "--approx-percentiles"]) == 0
+    approx = json.loads(capsys.readouterr().out)
+    assert approx["total"] == exact["total"] and approx["top_paths"] == exact["top_paths"]
+    assert approx["rt_avg_ms"] == exact["rt_avg_ms"]
+    for key in ("rt_p95_ms", "rt_p99_ms"):
+        assert abs(approx[key] - exact[key]) <= 0.02 * exact[key]
+
+
+def test_stats_approx_percentiles_no_rt(no_rt_log, capsys):
+    assert main(["stats", "--path", str(no_rt_log), "--json", "--approx-percentiles"]) == 0
+    data = json.loads(capsys.readouterr().out)
+    assert data["rt_p95_ms"] is None and data["rt_avg_ms"] is None
+
+
+@pytest.mark.parametrize("approx", [False, True])
+def test_stats_accumulator_merge_matches_single_pass(freq_log, rt_kv_mixed_log, status_log, approx):
+    logs = [read_log_file(str(p)) for p in (freq_log, rt_kv_mixed_log, status_log)]
+    expected = calculate_stats(sum(logs, []), 3, approx)
+    acc = StatsAccumulator(approx)
+    for part in logs:
+        acc.merge(accumulate_stats(part, approx))
+    assert acc.result(3) == expected
+    assert StatsAccumulator(approx).result() == calculate_stats([])
+
+
+def test_stats_consumes_stream_once(freq_log):
+    # calculate_stats берёт итератор: записи не нужно собирать в список
+    assert calculate_stats(iter_log_file(str(freq_log))) == calculate_stats(read_log_file(str(freq_log)))
+
+
+def test_stats_top_matches_full_sort(tmp_path):
+    log = tmp_path / "ties.log"
+    log.write_text(
+        "".join(
+            f'1.1.1.1 - - [10/Oct/2000:10:00:00 +0000] "GET /p{i % 13 % 7} HTTP/1.1" 200 1\n' for i in range(300)
+        )
+    )
+    log_entries = read_log_file(str(log))
+    everything = calculate_stats(log_entries, 100)["top_paths"]
+    for top in (0, 1, 3, 7, 50, -1):
+        # равные счета на границе -- в порядке первого появления, как у sorted(...)[:top]
+        assert calculate_stats(log_entries, top)["top_paths"] == everything[:top]
+
+
+@pytest.mark.parametrize("extra", [[], ["--jobs", "2"], ["5"]])
+def test_stats_approx_top(tmp_path, capsys, extra):
+    paths = []
+    for part in range(2):
+        log = tmp_path / f"paths.log.{part}"
+        log.write_text(
+            "".join(
+                f'1.1.1.1 - - [10/Oct/2000:10:00:00 +0000] "GET /p{i % (i % 17 + 1)} HTTP/1.1" 200 1\n'
+                for i in range(part, 1000, 2)
+            )
+        )
+        paths.append(str(log))
+    args = ["stats", "--path", *paths, "--json", "--top", "3"]
+    assert main(args) == 0
+    exact = json.loads(capsys.readouterr().out)
+    assert main(args + ["--approx-top"] + extra) == 0
+    approx = json.loads(capsys.readouterr().out)
+    assert approx["total"] == exact["total"]
+    if extra == ["5"]:
+        # 17 путей в 5 счётчиках: оценки только сверху
+        counts = dict(map(tuple, exact["top_paths"]))
+        assert len(approx["top_paths"]) == 3
+        assert all(n >= counts.get(path, 0) for path, n in approx["top_paths"])
+    else:
+        assert approx == exact
+
+
+def test_stats_approx_top_invalid(sample_log, capsys):
+    assert main(["stats", "--path", str(sample_log), "--approx-top", "0"]) == 1
+    assert "--approx-top" in capsys.readouterr().err
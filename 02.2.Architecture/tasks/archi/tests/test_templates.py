@@ -0,0 +1,86 @@
+from __future__ import annotations
+import json
+import shutil
+import pytest
+from ..src.logscoper.commands.filter import iter_filtered_log_entries
+from ..src.logscoper.adapters.parser import read_log_file
+from ..src.logscoper.infra.cli import main
+from ..src.logscoper.models.templates import DEFAULT_RULES, PathTemplater, parse_rule
+
+
+@pytest.mark.parametrize(
+    "raw, template",
+    [
+        ("/users/123", "/users/{id}"),
+        ("/users/124/orders?page=2&x=1", "/users/{id}/orders"),
+        ("/o/3f2504e0-4f89-11d3-9a0c-0305e82c3301/items", "/o/{uuid}/items"),
+        ("/blob/deadbeef00c0ffee", "/blob/{hex}"),
+        ("/blob/deadbeef", "/blob/deadbeef"),  # без цифр -- обычное слово
+        ("/v1/static/app.js#top", "/v1/static/app.js"),
+        ("/", "/"),
+        ("", ""),
+    ],
+)
+def test_default_rules(raw, template):
+    assert PathTemplater()(raw) == template
+
+
+def test_unchanged_path_is_returned_as_is():
+    templater = PathTemplater()
+    path = "".join(["/lo", "gin"])
+    assert templater(path) is path
+    assert templater("/users/1") is templater("/users/2")
+
+
+def test_custom_rule_first():
+    templater = PathTemplater([parse_rule(r"[a-z]+@[a-z.]+=<email>")] + list(DEFAULT_RULES), cache_size=4)
+    assert templater("/u/bob@example.com/7") == "/u/<email>/{id}"
+    assert templater.template.cache_info().maxsize == 4
+    assert parse_rule(r"(?=\d)\w+=X") == (r"(?=\d)\w+", "X")
+    for bad in ("nothing", "=X"):
+        with pytest.raises(ValueError):
+            parse_rule(bad)
+
+
+@pytest.fixture
+def ids_log(tmp_path):
+    lines = [
+        f'10.0.0.{i % 5} - - [10/Oct/2000:10:00:{i % 60:02d} +0000] "GET /users/{i}/orders?page={i % 3} HTTP/1.1" '
+        f'{(200, 404)[i % 2]} 10 "-" "UA" 0.{i % 900 + 100}'
+        for i in range(300)
+    ]
+    lines += [f'10.0.0.9 - - [10/Oct/2000:10:01:00 +0000] "GET /health HTTP/1.1" 200 1 0.00{i}' for i in range(1, 10)]
+    path = tmp_path / "ids.log"
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def test_filtered_entries_carry_templates(ids_log):
+    log_entries = list(iter_filtered_log_entries(read_log_file(ids_log), status="404", templater=PathTemplater()))
+    assert len(log_entries) == 150
+    assert {log.path for log in log_entries} == {"/users/{id}/orders"}
+
+
+@pytest.mark.parametrize("extra", [[], ["--jobs", "2"], ["--engine", "numpy"]])
+def test_stats_groups_by_template(ids_log, capsys, extra):
+    if "numpy" in extra:
+        pytest.importorskip("numpy")
+    rotated = ids_log + ".1"
+    shutil.copy(ids_log, rotated)
+    assert main(["stats", "--path", ids_log, rotated, "--json", "--path-templates"] + extra) == 0
+    data = json.loads(capsys.readouterr().out)
+    assert data["total"] == 618
+    assert data["top_paths"] == [["/users/{id}/orders", 600], ["/health", 18]]
+
+
+def test_hist_selects_template_with_grep(ids_log, capsys):
+    args = ["hist", "--path", ids_log, "--json", "--bucket-ms", "1000"]
+    assert main(args + ["--path-templates", "--grep", r"^/users/\{id\}/orders$"]) == 0
+    assert json.loads(capsys.readouterr().out) == {"0-1000": 300}
+    assert main(args + ["--path-rule", "health=probe", "--grep", "^/probe$"]) == 0
+    assert json.loads(capsys.readouterr().out) == {"0-1000": 9}
+
+
+def test_invalid_path_rule(ids_log, capsys):
+    assert main(["stats", "--path", ids_log, "--path-rule", "[=x"]) == 1
+    assert "--path-rule" in capsys.readouterr().err
@@ -0,0 +1,257 @@
+from __future__ import annotations
+import json
+import os
+import sys
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+from .model import LogBatch, StringColumn
+
+
+# Кэш разобранного лога: столбцы фиксированных типов рядом с исходным файлом
+# (<log>.lscache). Строковые поля хранятся словарём: список уникальных
+# значений + номера в нём, так что повторяющиеся пути/ip почти не занимают
+# места. Кэш действителен, пока у лога не изменились размер и mtime.
+#
+# Формат: MAGIC, 4 байта длины заголовка (little endian), заголовок JSON,
+# затем подряд сырые байты столбцов в порядке header["columns"]. Так же
+# устроен и индекс времени ниже.
+MAGIC = b"LSCACHE\x01"
+SUFFIX = ".lscache"
+
+NUMERIC = ("ts", "status", "bytes_sent", "rt")
+STRINGS = ("ip", "method", "path")
+
+
+class LogColumns(LogBatch):
+    # LogBatch с чтением и записью файла кэша (и блоков filter --format columns)
+    def blobs(self) -> dict[str, bytes]:
+        blobs = {name: getattr(self, name).tobytes() for name in NUMERIC}
+        for name in STRINGS:
+            column: StringColumn = getattr(self, name)
+            blobs[f"{name}.values"] = "\n".join(column.values).encode()
+            blobs[f"{name}.codes"] = column.codes.tobytes()
+        return blobs
+
+    def write(self, path: Path, source: os.stat_result) -> None:
+        strings = {name: len(getattr(self, name).values) for name in STRINGS}
+        _write_sidecar(
+            path, MAGIC, source, self.blobs(), rows=len(self), strings=strings
+        )
+
+    @classmethod
+    def read(cls, path: Path, source: os.stat_result) -> Optional[LogColumns]:
+        # None -- кэша нет, он от другой версии лога или повреждён
+        loaded = _read_sidecar(path, MAGIC, source)
+        if loaded is None:
+            return None
+        return cls.from_blobs(*loaded)
+
+    @classmethod
+    def from_blobs(
+        cls, header: dict[str, Any], blobs: dict[str, bytes]
+    ) -> Optional[LogColumns]:
+        # None -- столбцы разной длины или номера строк вне словаря
+        cols = cls()
+        try:
+            for name in NUMERIC:
+                getattr(cols, name).frombytes(blobs[name])
+            for name in STRINGS:
+                column: StringColumn = getattr(cols, name)
+                if header["strings"][name]:
+                    for value in blobs[f"{name}.values"].decode().split("\n"):
+                        column.pool.code(value)
+                column.codes.frombytes(blobs[f"{name}.codes"])
+        except (ValueError, KeyError):
+            return None
+        lengths = [len(getattr(cols, n)) for n in NUMERIC]
+        lengths += [len(getattr(cols, n).codes) for n in STRINGS]
+        if lengths != [header["rows"]] * len(lengths):
+            return None
+        for name in STRINGS:
+            column = getattr(cols, name)
+            if column.codes and max(column.codes) >= len(column.values):
+                return None
+        return cols
+
+
+# Разреженный индекс времени (<log>.lsindex): файл делится на блоки по
+# INDEX_EVERY строк, для блока хранятся смещение его начала и min/max ts
+# записей (epoch). Блок пропускается, только если все его записи вне окна,
+# поэтому строки не по порядку выборку не ломают -- лишь расширяют блоки.
+INDEX_MAGIC = b"LSINDEX\x01"
+INDEX_SUFFIX = ".lsindex"
+INDEX_EVERY = 1024
+
+NO_TS_LO = 2**63 - 1  # пустой блок: lo > любого until, hi < любого since
+NO_TS_HI = -(2**63)
+
+
+@dataclass
+class TimeIndex:
+    offsets: array[int] = field(default_factory=lambda: array("q"))
+    lo: array[int] = field(default_factory=lambda: array("q"))
+    hi: array[int] = field(default_factory=lambda: array("q"))
+    end: int = 0
+    # running max(hi) и суффиксный min(lo) монотонны -- по ним бинарным
+    # поиском находятся первый и последний блоки, которые стоит читать
+    _max_hi: list[int] = field(default_factory=list, repr=False)
+    _min_lo: list[int] = field(default_factory=list, repr=False)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def add_block(self, offset: int, lo: int, hi: int) -> None:
+        self.offsets.append(offset)
+        self.lo.append(lo)
+        self.hi.append(hi)
+
+    def finish(self) -> TimeIndex:
+        self._max_hi, top = [], NO_TS_HI
+        for hi in self.hi:
+            top = max(top, hi)
+            self._max_hi.append(top)
+        self._min_lo, bottom = [], NO_TS_LO
+        for lo in reversed(self.lo):
+            bottom = min(bottom, lo)
+            self._min_lo.append(bottom)
+        self._min_lo.reverse()
+        return self
+
+    def ranges(
+        self, since: Optional[float] = None, until: Optional[float] = None
+    ) -> list[tuple[int, int]]:
+        # Байтовые диапазоны [start, end) блоков, где могут быть записи с
+        # since <= ts < until; соседние блоки склеиваются.
+        first = 0 if since is None else bisect_left(self._max_hi, since)
+        last = len(self) if until is None else bisect_left(self._min_lo, until)
+        bounds = self.offsets[1:].tolist() + [self.end]
+        result: list[tuple[int, int]] = []
+        for i in range(first, last):
+            if since is not None and self.hi[i] < since:
+                continue
+            if until is not None and self.lo[i] >= until:
+                continue
+            start, stop = self.offsets[i], bounds[i]
+            if result and result[-1][1] == start:
+                result[-1] = (result[-1][0], stop)
+            else:
+                result.append((start, stop))
+        return result
+
+    def write(self, path: Path, source: os.stat_result) -> None:
+        blobs = {
+            name: getattr(self, name).tobytes() for name in ("offsets", "lo", "hi")
+        }
+        _write_sidecar(path, INDEX_MAGIC, source, blobs, end=self.end)
+
+    @classmethod
+    def read(cls, path: Path, source: os.stat_result) -> Optional[TimeIndex]:
+        loaded = _read_sidecar(path, INDEX_MAGIC, source)
+        if loaded is None:
+            return None
+        header, blobs = loaded
+        index = cls(end=header.get("end", -1))
+        try:
+            for name in ("offsets", "lo", "hi"):
+                getattr(index, name).frombytes(blobs[name])
+        except (ValueError, KeyError):
+            return None
+        if not len(index.offsets) == len(index.lo) == len(index.hi):
+            return None
+        if index.end != source.st_size:
+            return None
+        return index.finish()
+
+
+def _write_sidecar(
+    path: Path,
+    magic: bytes,
+    source: os.stat_result,
+    blobs: dict[str, bytes],
+    **extra: object,
+) -> None:
+    # MAGIC, 4 байта длины заголовка, заголовок JSON, столбцы подряд
+    header = {
+        "size": source.st_size,
+        "mtime_ns": source.st_mtime_ns,
+        "byteorder": sys.byteorder,
+        "columns": [[name, len(blob)] for name, blob in blobs.items()],
+        **extra,
+    }
+    raw_header = json.dumps(header).encode()
+    tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            f.write(magic + len(raw_header).to_bytes(4, "little") + raw_header)
+            for blob in blobs.values():
+                f.write(blob)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def _read_sidecar(
+    path: Path, magic: bytes, source: os.stat_result
+) -> Optional[tuple[dict[str, Any], dict[str, bytes]]]:
+    # None -- файла нет, он от другой версии лога или повреждён
+    try:
+        with open(path, "rb") as f:
+            if f.read(len(magic)) != magic:
+                return None
+            header = json.loads(f.read(int.from_bytes(f.read(4), "little")))
+            if (
+                header["size"] != source.st_size
+                or header["mtime_ns"] != source.st_mtime_ns
+                or header["byteorder"] != sys.byteorder
+            ):
+                return None
+            blobs = {name: f.read(size) for name, size in header["columns"]}
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if any(len(blobs[name]) != size for name, size in header["columns"]):
+        return None
+    return header, blobs
+
+
+def sidecar_path(log_path: str | Path) -> Path:
+    p = Path(log_path)
+    return p.with_name(p.name + SUFFIX)
+
+
+def load_columns(log_path: str | Path) -> Optional[LogColumns]:
+    return LogColumns.read(sidecar_path(log_path), os.stat(log_path))
+
+
+def save_columns(
+    log_path: str | Path, cols: LogColumns, source: os.stat_result
+) -> bool:
+    # source -- stat лога до разбора: если файл дописали во время разбора,
+    # следующий запуск увидит другой размер и пересоберёт кэш
+    try:
+        cols.write(sidecar_path(log_path), source)
+    except OSError:
+        return False  # каталог только для чтения -- работаем без кэша
+    return True
+
+
+def index_path(log_path: str | Path) -> Path:
+    p = Path(log_path)
+    return p.with_name(p.name + INDEX_SUFFIX)
+
+
+def load_time_index(log_path: str | Path) -> Optional[TimeIndex]:
+    return TimeIndex.read(index_path(log_path), os.stat(log_path))
+
+
+def save_time_index(
+    log_path: str | Path, index: TimeIndex, source: os.stat_result
+) -> bool:
+    try:
+        index.write(index_path(log_path), source)
+    except OSError:
+        return False
+    return True
@@ -1,25 +1,58 @@
 from __future__ import annotations
 import argparse
+import glob
+import heapq
 import json
+import mmap
+import os
 import sys
 import re
-from datetime import datetime, timezone
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from operator import attrgetter
 from pathlib import Path
-from typing import Optional, Iterable, Iterator, Pattern
+from typing import Any, Callable, Optional, Iterable, Iterator, Pattern, TextIO
 from collections import Counter
 import math
-from dataclasses import dataclass
-
-
-@dataclass(frozen=True)
-class LogEntry:
-    ip: str
-    ts: datetime
-    method: str
-    path: str
-    status: int
-    bytes_sent: Optional[int]
-    request_time_s: Optional[float]
+from dataclasses import dataclass, field
+from .cache import (
+    INDEX_EVERY,
+    NO_TS_HI,
+    NO_TS_LO,
+    LogColumns,
+    TimeIndex,
+    load_columns,
+    load_time_index,
+    save_columns,
+    save_time_index,
+)
+from .columnar import EntryBatch, aggregate, fill_histogram, require_numpy
+from .compressed import (
+    COMPRESSIONS,
+    detect_compression,
+    open_binary_output,
+    open_log,
+    open_output,
+)
+from .export import FORMATS, write_columns, write_jsonl
+from .follow import (
+    BUCKET_UNITS,
+    LogFollower,
+    RollingWindows,
+    parse_duration,
+    parse_windows,
+)
+from .grep import Grep, GrepSet, grep_patterns, grep_set, read_grep_file
+from .groups import GroupBy, GroupedSeries, parse_group_by
+from .histogram import HDR_SUB_BITS, LatencyHistogram
+from .literals import grep_prefilter
+from .model import NO_BYTES, LogEntry, StringPool
+from .sketch import TOP_CAPACITY, QuantileSketch, SpaceSaving
+from .state import StatsState, load_state, new_ranges, save_state
+from .status import status_selector
+from .templates import DEFAULT_RULES, PathTemplater, parse_rule
 
 
 # =====================
@@ -36,31 +69,129 @@ LOG_RE = re.compile(
 
 RT_KV_RE = re.compile(r"(?:^|\s)rt=(?P<rt>\d+\.\d+)\b")
 
+# Строгий вариант LOG_RE для типовых строк combined/common формата:
+# одиночные пробелы, без ленивых групп, строка разбирается целиком.
+# На строках, которые он принимает, поля совпадают с LOG_RE.
+FAST_LOG_RE = re.compile(
+    r"(\S+) \S+ \S+ \[([^\]]+)\] "
+    r'"([A-Z]+) ([^\s"][^"\n]*)" '
+    r"(\d{3}) (\S+)"
+    r'(?: "[^"]*" "[^"]*")?'
+    r"(?: (?:rt=)?(\d+\.\d+))?"
+)
 
-def _parse_ts(ts_raw: str) -> datetime:
-    return datetime.strptime(ts_raw, "%d/%b/%Y:%H:%M:%S %z").astimezone(timezone.utc)
+# (ip, ts, method, path, status, bytes, rt)
+LineFields = tuple[str, str, str, str, str, str, Optional[str]]
 
 
-def parse_line(line: str) -> Optional[LogEntry]:
+def _fast_fields(line: str) -> Optional[LineFields]:
+    m = FAST_LOG_RE.fullmatch(line)
+    if m is None:
+        return None
+    ip, ts_raw, method, path, status, bytes_raw, rt = m.groups()
+    # хвост " HTTP/x.y" отрезаем по индексам, а не ленивой группой
+    if (
+        path[-8:-3] == "HTTP/"
+        and path[-9:-8].isspace()
+        and path[-2] == "."
+        and path[-3].isdecimal()
+        and path[-1].isdecimal()
+    ):
+        path = path[:-8].rstrip()
+    return ip, ts_raw, method, path, status, bytes_raw, rt
+
+
+def _regex_fields(line: str) -> Optional[LineFields]:
     m = LOG_RE.search(line)
     if not m:
         return None
-    gd = m.groupdict()
+    return (
+        m["ip"],
+        m["ts"],
+        m["method"],
+        m["path"],
+        m["status"],
+        m["bytes"],
+        m["rt"] or m["rt_kv"],
+    )
+
+
+def _line_fields(line: str) -> Optional[LineFields]:
+    return _fast_fields(line) or _regex_fields(line)
+
+
+# =====================
+# Время
+# =====================
+
+TS_FORMAT = "%d/%b/%Y:%H:%M:%S %z"
+TS_RE = re.compile(r"(\d\d)/(\w{3})/(\d{4}):(\d\d):(\d\d):(\d\d) ([+-]\d\d[0-5]\d)")
+MONTHS = {
+    name: i
+    for i, name in enumerate(
+        "Jan Feb Mar Apr May Jun Jul Aug Sep Oct Nov Dec".split(), start=1
+    )
+}
+
+
+@lru_cache(maxsize=64)
+def _tz_offset(raw: str) -> timezone:
+    offset = timedelta(hours=int(raw[1:3]), minutes=int(raw[3:5]))
+    return timezone(-offset if raw[0] == "-" else offset)
+
+
+def _decode_ts(ts_raw: str) -> datetime:
+    # "10/Oct/2000:13:55:36 +0000" -- фиксированная ширина, strptime нужен
+    # только для нестандартной записи (однозначный день, "oct", "+00:00"...)
+    m = TS_RE.fullmatch(ts_raw)
+    month = MONTHS.get(m[2]) if m else None
+    if m is None or month is None:
+        return datetime.strptime(ts_raw, TS_FORMAT)
+    day, _, year, hour, minute, second, tz = m.groups()
+    return datetime(
+        int(year),
+        month,
+        int(day),
+        int(hour),
+        int(minute),
+        int(second),
+        tzinfo=_tz_offset(tz),
+    )
+
+
+# В одной секунде лога тысячи строк с одинаковым [ts], поэтому разбор
+# кэшируется по сырой строке.
+@lru_cache(maxsize=4096)
+def _parse_ts(ts_raw: str) -> datetime:
+    return _decode_ts(ts_raw).astimezone(timezone.utc)
+
+
+# ip, метод и путь повторяются из строки в строку: равные значения делят
+# один объект str вместо нового на каждую запись
+_IPS = StringPool()
+_METHODS = StringPool()
+_PATHS = StringPool()
+
+
+def parse_line(line: str) -> Optional[LogEntry]:
+    fields = _line_fields(line)
+    if fields is None:
+        return None
+    ip, ts_raw, method, path, status, bytes_raw, srt = fields
     try:
-        ts = _parse_ts(gd["ts"])
+        ts = _parse_ts(ts_raw)
     except Exception:
         return None
 
-    if gd["bytes"] == "-":
+    if bytes_raw == "-":
         bytes_sent = None
     else:
         try:
-            bytes_sent = int(gd["bytes"])
+            bytes_sent = int(bytes_raw)
         except ValueError:
             bytes_sent = None
 
     rt = None
-    srt = gd.get("rt") or gd.get("rt_kv")
     if srt:
         try:
             rt = float(srt)
@@ -68,11 +199,11 @@ def parse_line(line: str) -> Optional[LogEntry]:
             rt = None
 
     return LogEntry(
-        ip=gd["ip"],
+        ip=_IPS.intern(ip),
         ts=ts,
-        method=gd["method"],
-        path=gd["path"],
-        status=int(gd["status"]),
+        method=_METHODS.intern(method),
+        path=_PATHS.intern(path),
+        status=int(status),
         bytes_sent=bytes_sent,
         request_time_s=rt,
     )
@@ -82,34 +213,206 @@ def read_lines(path: str | Path) -> Iterable[str]:
     p = Path(path)
     if not p.exists():
         raise FileNotFoundError(p)
-    with p.open("rt", encoding="utf-8", errors="ignore") as f:
+    with open_log(p, encoding="utf-8", errors="ignore") as f:
         for line in f:
             yield line.rstrip("\n")
 
 
-def _iter_entries(path: str) -> Iterator[LogEntry]:
-    for line in read_lines(path):
+def read_line_range(path: str | Path, start: int, end: int) -> Iterator[str]:
+    # Строки, начинающиеся в байтах [start, end); start -- начало строки.
+    # Переводы строк как в текстовом режиме read_lines: \n, \r\n и \r.
+    with open(path, "rb") as f:
+        f.seek(start)
+        pos = start
+        for raw in f:
+            if pos >= end:
+                break
+            pos += len(raw)
+            line = raw.decode("utf-8", errors="ignore")
+            if "\r" in line:
+                line = line.replace("\r\n", "\n").replace("\r", "\n")
+                yield from line.removesuffix("\n").split("\n")
+            else:
+                yield line.rstrip("\n")
+
+
+GLOB_CHARS = re.compile(r"[*?[]")
+
+
+def expand_paths(patterns: Iterable[str]) -> list[str]:
+    # --path можно повторять и передавать маски: "access.log*" раскрывается
+    # здесь, даже если shell этого не сделал. Дубликаты отбрасываются.
+    paths: dict[str, None] = {}
+    for pattern in patterns:
+        if os.path.exists(pattern) or not GLOB_CHARS.search(pattern):
+            paths[pattern] = None
+            continue
+        matches = sorted(glob.glob(pattern))
+        if not matches:
+            raise FileNotFoundError(pattern)
+        paths.update(dict.fromkeys(matches))
+    return list(paths)
+
+
+def split_ranges(path: str | Path, parts: int) -> list[tuple[int, int]]:
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as f:
+        for i in range(1, parts):
+            offset = size * i // parts
+            if offset <= bounds[-1]:
+                continue
+            f.seek(offset - 1)
+            f.readline()
+            bounds.append(f.tell())
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if a < b]
+
+
+# =====================
+# mmap и байтовые префильтры
+# =====================
+
+# Голова типовой строки в байтах. Если она совпала с началом строки, LOG_RE и
+# FAST_LOG_RE берут из строки ровно этот ts и этот статус: первые три токена
+# разделены одиночными пробелами, ts идёт до первой "]", запрос -- до первой
+# кавычки, а после статуса есть непробельный символ для (?P<bytes>\S+).
+# Значит, строку с такой головой можно отбросить по статусу и времени, не
+# декодируя и не разбирая её. Остальные строки префильтр пропускает как есть.
+_HEAD_B = rb'[!-~]+ [!-~]+ [!-~]+ \[(%s[^\]\r\n]+)\] "[A-Z]+ [!#-~][^"\r\n]*" '
+
+
+def _status_bytes(codes: frozenset[int]) -> bytes:
+    # {200, 404, 500..599} -> (?:200|404|5\d\d)
+    parts = []
+    for hundred in range(10):
+        if all(hundred * 100 + i in codes for i in range(100)):
+            parts.append(b"%d\\d\\d" % hundred)
+            continue
+        for ten in range(hundred * 10, hundred * 10 + 10):
+            units = bytes(b"0123456789"[i] for i in range(10) if ten * 10 + i in codes)
+            if len(units) == 10:
+                parts.append(b"%02d\\d" % ten)
+            elif units:
+                parts.append(b"%02d[%s]" % (ten, units))
+    return b"(?:" + (b"|".join(parts) or b"(?!)") + b")"
+
+
+@lru_cache(maxsize=16)
+def _prefilter_re(status: Optional[str]) -> Pattern[bytes]:
+    codes = status_selector(status).codes
+    parts = {
+        b"ok": _status_bytes(codes),
+        b"head": _HEAD_B % b"?:",
+        b"head_ts": _HEAD_B % b"?P<ts>",
+    }
+    # Строки подряд с неподходящим статусом съедаются одним совпадением,
+    # чтобы не возвращаться в Python на каждую; group "line" -- строка,
+    # которую надо разобрать.
+    return re.compile(
+        rb"(?<![^\r\n])"
+        rb"(?:%(head)s(?!%(ok)s)\d{3} [!-~][^\r\n]*(?:[\r\n]+|\Z))*"
+        rb"(?:(?P<line>%(head_ts)s%(ok)s [!-~][^\r\n]*"
+        rb"|(?!%(head)s\d{3} [!-~])[^\r\n]+)|\Z)" % parts
+    )
+
+
+def _ts_in_range(
+    ts_raw: bytes, since: Optional[datetime], until: Optional[datetime]
+) -> bool:
+    try:
+        ts = _parse_ts(ts_raw.decode("utf-8", errors="ignore"))
+    except Exception:
+        return False  # parse_line такую строку всё равно отбросит
+    return not (since and ts < since) and not (until and ts >= until)
+
+
+def scan_lines(
+    path: str | Path,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    status: Optional[str] = None,
+    start: int = 0,
+    end: Optional[int] = None,
+) -> Iterator[str]:
+    # Строки файла (или диапазона [start, end)), которые могут пройти
+    # apply_filters с такими since/until/status. Отбрасывает только то, что
+    # фильтры отбросили бы наверняка, поэтому apply_filters всё равно нужен.
+    p = Path(path)
+    if not p.exists():
+        raise FileNotFoundError(p)
+    if detect_compression(p) is not None:
+        # в сжатом файле байтам не по чему сканировать -- разбираем всё
+        yield from read_lines(p)
+        return
+    regex = _prefilter_re(status)
+    with open(p, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # пустой файл или не обычный файл (pipe) -- читаем как раньше
+            mm = None
+        if mm is None:
+            if end is None:
+                yield from read_lines(p)
+            else:
+                yield from read_line_range(p, start, end)
+            return
+        with mm:
+            # строки одной секунды идут подряд: решение по времени
+            # переиспользуется, пока сырой ts не сменится
+            last_ts, in_range = None, True
+            for m in regex.finditer(mm, start, len(mm) if end is None else end):
+                line = m["line"]
+                if line is None:
+                    continue
+                ts_raw = m["ts"]
+                if ts_raw is not None and (since or until):
+                    if ts_raw != last_ts:
+                        last_ts = ts_raw
+                        in_range = _ts_in_range(ts_raw, since, until)
+                    if not in_range:
+                        continue
+                yield line.decode("utf-8", errors="ignore")
+
+
+def _iter_entries(
+    path: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    status: Optional[str] = None,
+    grep: Optional[Grep] = None,
+) -> Iterator[LogEntry]:
+    # grep здесь только отсеивает строки без нужных подстрок до разбора
+    # (см. literals), сама регулярка -- в apply_filters
+    lines: Iterable[str]
+    if since or until or status:
+        lines = scan_lines(path, since, until, status)
+    else:
+        lines = read_lines(path)
+    for line in grep_prefilter(lines, grep):
         e = parse_line(line)
         if e:
             yield e
 
 
-def _status_matches(code: int, selector: Optional[str]) -> bool:
-    if selector is None:
-        return True
-    filters = [part.strip().lower() for part in selector.split(",") if part.strip()]
-    for f in filters:
-        if len(f) == 3 and f.endswith("xx") and f[0].isdigit():
-            base = int(f[0]) * 100
-            if base <= code < base + 100:
-                return True
-        else:
-            try:
-                if int(f) == code:
-                    return True
-            except ValueError:
-                continue
-    return False
+def _iter_range_entries(
+    path: str,
+    start: int,
+    end: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    status: Optional[str] = None,
+    grep: Optional[Grep] = None,
+) -> Iterator[LogEntry]:
+    if since or until or status:
+        lines = scan_lines(path, since, until, status, start, end)
+    else:
+        lines = read_line_range(path, start, end)
+    for line in grep_prefilter(lines, grep):
+        e = parse_line(line)
+        if e:
+            yield e
 
 
 def apply_filters(
@@ -117,21 +420,267 @@ def apply_filters(
     since: Optional[datetime] = None,
     until: Optional[datetime] = None,
     status: Optional[str] = None,
-    grep: Optional[str] = None,
+    grep: Optional[Grep] = None,
+    templater: Optional[PathTemplater] = None,
 ) -> Iterator[LogEntry]:
-    regex: Optional[Pattern[str]] = re.compile(grep) if grep else None
+    # templater -- путь заменяется шаблоном до --grep, так что grep и top
+    # путей работают с шаблонами
+    matcher = grep_set(grep)
+    selector = None if status is None else status_selector(status)
     for e in entries:
         if since and e.ts < since:
             continue
         if until and e.ts >= until:
             continue
-        if not _status_matches(e.status, status):
+        if selector is not None and e.status not in selector:
             continue
-        if regex and not regex.search(e.path):
+        if templater is not None:
+            template = templater(e.path)
+            if template is not e.path:
+                e = LogEntry(
+                    e.ip,
+                    e.ts,
+                    e.method,
+                    template,
+                    e.status,
+                    e.bytes_sent,
+                    e.request_time_s,
+                )
+        if matcher is not None and not matcher(e.path):
             continue
         yield e
 
 
+def _line_grep(
+    grep: Optional[Grep], templater: Optional[PathTemplater]
+) -> Optional[Grep]:
+    # С шаблонами grep проверяется по шаблону, которого в строке лога нет --
+    # отсеивать строки по подстрокам нельзя
+    return grep if templater is None else None
+
+
+def _filtered_entries(
+    paths: Iterable[str],
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    status: Optional[str] = None,
+    grep: Optional[Grep] = None,
+    cache: bool = False,
+    index: bool = False,
+    templater: Optional[PathTemplater] = None,
+) -> Iterator[LogEntry]:
+    for path in paths:
+        if cache:
+            yield from _iter_cached_entries(path, since, until, status, grep, templater)
+        elif index and (since or until):
+            entries = _iter_indexed_entries(
+                path, since, until, status, _line_grep(grep, templater)
+            )
+            yield from apply_filters(entries, since, until, status, grep, templater)
+        else:
+            entries = _iter_entries(
+                path, since, until, status, _line_grep(grep, templater)
+            )
+            yield from apply_filters(entries, since, until, status, grep, templater)
+
+
+# =====================
+# Кэш разобранных логов
+# =====================
+
+
+def _cached_columns(path: str) -> Optional[LogColumns]:
+    p = Path(path)
+    if not p.exists():
+        raise FileNotFoundError(p)
+    cols = load_columns(p)
+    if cols is not None:
+        return cols
+    source = p.stat()
+    try:
+        built = LogColumns.from_entries(_iter_entries(path))
+    except OverflowError:
+        return None  # bytes_sent вне int64 -- такой лог не кэшируется
+    save_columns(p, built, source)
+    return built
+
+
+def _iter_cached_entries(
+    path: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    status: Optional[str] = None,
+    grep: Optional[Grep] = None,
+    templater: Optional[PathTemplater] = None,
+) -> Iterator[LogEntry]:
+    # То же, что apply_filters(_iter_entries(path), ...), но из столбцов кэша:
+    # фильтры проверяются по массивам, шаблон и grep -- один раз на
+    # уникальный путь, LogEntry собираются только для прошедших строк.
+    cols = _cached_columns(path)
+    if cols is None:
+        entries = _iter_entries(path, since, until, status, _line_grep(grep, templater))
+        yield from apply_filters(entries, since, until, status, grep, templater)
+        return
+    paths = cols.path.values
+    if templater is not None:
+        paths = [templater(p) for p in paths]
+    matcher = grep_set(grep)
+    path_ok = [matcher is None or matcher(p) for p in paths]
+    status_ok = status_selector(status).table
+    lo = since.timestamp() if since else -math.inf
+    hi = until.timestamp() if until else math.inf
+    ips, methods = cols.ip.values, cols.method.values
+    ip_codes, method_codes, path_codes = (
+        cols.ip.codes,
+        cols.method.codes,
+        cols.path.codes,
+    )
+    statuses, bytes_sent, rts = cols.status, cols.bytes_sent, cols.rt
+    datetimes: dict[int, datetime] = {}
+    for i, epoch in enumerate(cols.ts):
+        if epoch < lo or epoch >= hi:
+            continue
+        code = statuses[i]
+        path_code = path_codes[i]
+        if not status_ok[code] or not path_ok[path_code]:
+            continue
+        ts = datetimes.get(epoch)
+        if ts is None:
+            ts = datetimes[epoch] = datetime.fromtimestamp(epoch, timezone.utc)
+        b = bytes_sent[i]
+        rt = rts[i]
+        yield LogEntry(
+            ip=ips[ip_codes[i]],
+            ts=ts,
+            method=methods[method_codes[i]],
+            path=paths[path_code],
+            status=code,
+            bytes_sent=None if b == NO_BYTES else b,
+            request_time_s=None if math.isnan(rt) else rt,
+        )
+
+
+def _cached_batch(
+    path: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    status: Optional[str] = None,
+    grep: Optional[Grep] = None,
+    templater: Optional[PathTemplater] = None,
+) -> EntryBatch:
+    # --cache с --engine numpy: фильтры -- маской по столбцам кэша
+    cols = _cached_columns(path)
+    if cols is None:
+        entries = _iter_entries(path, since, until, status, _line_grep(grep, templater))
+        return EntryBatch.from_entries(
+            apply_filters(entries, since, until, status, grep, templater)
+        )
+    paths = cols.path.values
+    if templater is not None:
+        paths = [templater(p) for p in paths]
+    matcher = grep_set(grep)
+    batch = EntryBatch.from_columns(
+        cols,
+        since.timestamp() if since else -math.inf,
+        until.timestamp() if until else math.inf,
+        status_selector(status).table,
+        None if matcher is None else [matcher(p) for p in paths],
+    )
+    return batch if templater is None else batch.with_paths(paths)
+
+
+# =====================
+# Индекс времени
+# =====================
+
+_INDEX_HEAD_RE = re.compile(_HEAD_B % b"?P<ts>" + rb"\d{3} [!-~]")
+
+
+def _ts_epochs(ts_raw: bytes) -> tuple[int, ...]:
+    try:
+        return (int(_parse_ts(ts_raw.decode("utf-8", errors="ignore")).timestamp()),)
+    except Exception:
+        return ()  # parse_line такую строку отбросит
+
+
+def _line_epochs(raw: bytes) -> Iterator[int]:
+    # ts записей двоичной строки с "\r" внутри: read_lines видит в ней
+    # несколько строк, поэтому она разбирается как есть
+    text = raw.decode("utf-8", errors="ignore")
+    for line in text.replace("\r\n", "\n").replace("\r", "\n").split("\n"):
+        e = parse_line(line)
+        if e:
+            yield int(e.ts.timestamp())
+
+
+def build_time_index(path: str | Path, every: int = INDEX_EVERY) -> TimeIndex:
+    # Блоки по every строк в тех же границах, что у split_ranges/read_line_range
+    index = TimeIndex()
+    offset = block_start = lines = 0
+    lo, hi = NO_TS_LO, NO_TS_HI
+    last_ts = None
+    with open(path, "rb") as f:
+        for raw in f:
+            if lines == every:
+                index.add_block(block_start, lo, hi)
+                block_start, lines, lo, hi = offset, 0, NO_TS_LO, NO_TS_HI
+                last_ts = None
+            lines += 1
+            offset += len(raw)
+            m = _INDEX_HEAD_RE.match(raw)
+            if m is not None and raw.find(b"\r", m.end(), -2) < 0:
+                # типовая строка: ts из головы без разбора (см. _HEAD_B);
+                # строки одной секунды идут подряд и lo/hi не меняют
+                if m["ts"] == last_ts:
+                    continue
+                last_ts = m["ts"]
+                epochs: Iterable[int] = _ts_epochs(last_ts)
+            else:
+                epochs = _line_epochs(raw)
+            for epoch in epochs:
+                lo = min(lo, epoch)
+                hi = max(hi, epoch)
+    if lines:
+        index.add_block(block_start, lo, hi)
+    index.end = offset
+    return index.finish()
+
+
+def _time_index(path: str) -> Optional[TimeIndex]:
+    p = Path(path)
+    if not p.exists():
+        raise FileNotFoundError(p)
+    if not p.is_file() or detect_compression(p) is not None:
+        return None  # по смещениям читаются только обычные несжатые файлы
+    index = load_time_index(p)
+    if index is None:
+        source = p.stat()
+        index = build_time_index(p)
+        if index.end != source.st_size:
+            return None  # файл дописали во время сборки
+        save_time_index(p, index, source)
+    return index
+
+
+def _iter_indexed_entries(
+    path: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    status: Optional[str] = None,
+    grep: Optional[Grep] = None,
+) -> Iterator[LogEntry]:
+    # То же, что _iter_entries, но читаются только блоки, пересекающиеся с
+    # [since, until): до окна -- seek, после последнего такого блока -- стоп.
+    index = _time_index(path)
+    if index is None:
+        yield from _iter_entries(path, since, until, status, grep)
+        return
+    lo = since.timestamp() if since else None
+    hi = until.timestamp() if until else None
+    for start, end in index.ranges(lo, hi):
+        yield from _iter_range_entries(path, start, end, since, until, status, grep)
+
+
 def cast_to_percentile(values: list[float], p: float) -> Optional[float]:
     if not values:
         return None
@@ -144,41 +693,409 @@ def cast_to_percentile(values: list[float], p: float) -> Optional[float]:
     return values[f] * (c - k) + values[c] * (k - f)
 
 
-def collect_request_times_ms(entries: Iterable[LogEntry]) -> list[float]:
-    return [e.request_time_s * 1000.0 for e in entries if e.request_time_s is not None]
+def request_times_ms(entries: Iterable[LogEntry]) -> Iterator[float]:
+    return (e.request_time_s * 1000.0 for e in entries if e.request_time_s is not None)
 
 
 def histogram_ms(values_ms: Iterable[float], bucket_ms: int) -> dict[str, int]:
-    buckets: dict[str, int] = {}
-    for v in values_ms:
-        b = int(v // bucket_ms) * bucket_ms
-        key = f"{b}-{b + bucket_ms}"
-        buckets[key] = buckets.get(key, 0) + 1
-    return dict(sorted(buckets.items(), key=lambda kv: int(kv[0].split("-")[0])))
-
-
-def cast_to_aggregate(entries: Iterable[LogEntry]) -> dict[str, object]:
-    total = 0
-    by_status: Counter[int] = Counter()
-    by_path: Counter[str] = Counter()
-    rts_ms: list[float] = []
-    for e in entries:
-        total += 1
-        by_status[e.status] += 1
-        by_path[e.path] += 1
+    return LatencyHistogram(bucket_ms).update(values_ms).labels()
+
+
+@dataclass
+class StatsAccumulator:
+    total: int = 0
+    by_status: Counter[int] = field(default_factory=Counter)
+    by_path: Counter[str] = field(default_factory=Counter)
+    rts_ms: list[float] = field(default_factory=list)
+    # при --approx-percentiles времена идут в скетч вместо списка
+    rt_sketch: Optional[QuantileSketch] = None
+    # при --approx-top пути считаются скетчем фиксированного размера
+    path_sketch: Optional[SpaceSaving] = None
+    # при нескольких --grep: сколько записей подошло под каждый шаблон
+    grep: Optional[GrepSet] = None
+    grep_counts: list[int] = field(default_factory=list)
+    # при --group-by/--bucket: ряды по группам и интервалам времени
+    groups: Optional[GroupedSeries] = None
+
+    def add(self, e: LogEntry) -> None:
+        self.total += 1
+        self.by_status[e.status] += 1
+        if self.groups is not None:
+            self.groups.add(e)
+        if self.grep is not None:
+            for i in self.grep.matches(e.path):
+                self.grep_counts[i] += 1
+        if self.path_sketch is not None:
+            self.path_sketch.add(e.path)
+        else:
+            self.by_path[e.path] += 1
         if e.request_time_s is not None:
-            rts_ms.append(e.request_time_s * 1000.0)
-    avg_ms = sum(rts_ms) / len(rts_ms) if rts_ms else None
-    p95 = cast_to_percentile(rts_ms, 95.0)
-    p99 = cast_to_percentile(rts_ms, 99.0)
-    return {
-        "total": total,
-        "status": dict(sorted(by_status.items())),
-        "top_paths": by_path.most_common(),
-        "rt_avg_ms": avg_ms,
-        "rt_p95_ms": p95,
-        "rt_p99_ms": p99,
+            if self.rt_sketch is not None:
+                self.rt_sketch.add(e.request_time_s * 1000.0)
+            else:
+                self.rts_ms.append(e.request_time_s * 1000.0)
+
+    def merge(self, other: StatsAccumulator) -> StatsAccumulator:
+        self.total += other.total
+        self.by_status.update(other.by_status)
+        if other.grep is not None:
+            if self.grep is None:
+                self.grep, self.grep_counts = other.grep, [0] * len(other.grep)
+            for i, n in enumerate(other.grep_counts):
+                self.grep_counts[i] += n
+        if other.groups is not None:
+            if self.groups is None:
+                self.groups = GroupedSeries(other.groups.spec)
+            self.groups.merge(other.groups)
+        if other.path_sketch is not None and self.path_sketch is None:
+            capacity = other.path_sketch.capacity
+            self.path_sketch = SpaceSaving(capacity).update(self.by_path.items())
+            self.by_path = Counter()
+        if self.path_sketch is not None:
+            self.path_sketch.update(other.by_path.items())
+            if other.path_sketch is not None:
+                self.path_sketch.merge(other.path_sketch)
+        else:
+            self.by_path.update(other.by_path)
+        if other.rt_sketch is not None and self.rt_sketch is None:
+            accuracy = other.rt_sketch.relative_accuracy
+            self.rt_sketch = QuantileSketch(accuracy).update(self.rts_ms)
+            self.rts_ms = []
+        if self.rt_sketch is not None:
+            self.rt_sketch.update(other.rts_ms)
+            if other.rt_sketch is not None:
+                self.rt_sketch.merge(other.rt_sketch)
+        else:
+            self.rts_ms.extend(other.rts_ms)
+        return self
+
+    def to_dict(self) -> dict[str, Any]:
+        # для JSON (stats --state): ключи статусов -- строки, скетчи -- словари
+        return {
+            "total": self.total,
+            "by_status": {str(k): n for k, n in self.by_status.items()},
+            "by_path": dict(self.by_path),
+            "rts_ms": self.rts_ms,
+            "rt_sketch": None if self.rt_sketch is None else self.rt_sketch.to_dict(),
+            "path_sketch": (
+                None if self.path_sketch is None else self.path_sketch.to_dict()
+            ),
+            "grep": None if self.grep is None else list(self.grep.patterns),
+            "grep_counts": self.grep_counts,
+            "groups": None if self.groups is None else self.groups.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> StatsAccumulator:
+        rt_sketch, path_sketch = data["rt_sketch"], data["path_sketch"]
+        groups = data["groups"]
+        return cls(
+            total=data["total"],
+            by_status=Counter({int(k): n for k, n in data["by_status"].items()}),
+            by_path=Counter(data["by_path"]),
+            rts_ms=list(data["rts_ms"]),
+            rt_sketch=(
+                None if rt_sketch is None else QuantileSketch.from_dict(rt_sketch)
+            ),
+            path_sketch=(
+                None if path_sketch is None else SpaceSaving.from_dict(path_sketch)
+            ),
+            grep=grep_set(data["grep"]),
+            grep_counts=list(data["grep_counts"]),
+            groups=None if groups is None else GroupedSeries.from_dict(groups),
+        )
+
+    def result(self, top: Optional[int] = None) -> dict[str, object]:
+        # top -- сколько путей отдать; выбираются кучей, без сортировки всех
+        if self.rt_sketch is not None:
+            avg_ms = self.rt_sketch.mean()
+            p95 = self.rt_sketch.quantile(0.95)
+            p99 = self.rt_sketch.quantile(0.99)
+        else:
+            rts_ms = self.rts_ms
+            avg_ms = sum(rts_ms) / len(rts_ms) if rts_ms else None
+            p95 = cast_to_percentile(rts_ms, 95.0)
+            p99 = cast_to_percentile(rts_ms, 99.0)
+        if self.path_sketch is not None:
+            top_paths = self.path_sketch.top(top)
+        else:
+            top_paths = self.by_path.most_common(top)
+        data: dict[str, object] = {
+            "total": self.total,
+            "status": dict(sorted(self.by_status.items())),
+            "top_paths": top_paths,
+            "rt_avg_ms": avg_ms,
+            "rt_p95_ms": p95,
+            "rt_p99_ms": p99,
+        }
+        if self.grep is not None:
+            data["grep"] = dict(zip(self.grep.patterns, self.grep_counts))
+        if self.groups is not None:
+            data["groups"] = self.groups.rows()
+        return data
+
+
+def counted_grep(grep: Optional[Grep]) -> Optional[GrepSet]:
+    # счётчики по шаблонам нужны, только если шаблонов несколько
+    matcher = grep_set(grep)
+    return matcher if matcher is not None and len(matcher) > 1 else None
+
+
+def accumulate(
+    entries: Iterable[LogEntry],
+    approx_percentiles: bool = False,
+    approx_top: Optional[int] = None,
+    grep: Optional[Grep] = None,
+    group_by: Optional[GroupBy] = None,
+) -> StatsAccumulator:
+    matcher = counted_grep(grep)
+    acc = StatsAccumulator(
+        rt_sketch=QuantileSketch() if approx_percentiles else None,
+        path_sketch=None if approx_top is None else SpaceSaving(approx_top),
+        grep=matcher,
+        grep_counts=[0] * len(matcher) if matcher is not None else [],
+        groups=None if group_by is None else GroupedSeries(group_by),
+    )
+    for e in entries:
+        acc.add(e)
+    return acc
+
+
+def cast_to_aggregate(
+    entries: Iterable[LogEntry],
+    approx_percentiles: bool = False,
+    top: Optional[int] = None,
+    approx_top: Optional[int] = None,
+    grep: Optional[Grep] = None,
+    group_by: Optional[GroupBy] = None,
+) -> dict[str, object]:
+    acc = accumulate(entries, approx_percentiles, approx_top, grep, group_by)
+    return acc.result(top)
+
+
+# (path, start, end): end=None -- файл целиком
+WorkUnit = tuple[str, int, Optional[int]]
+
+
+def _work_units(paths: list[str], jobs: int) -> list[WorkUnit]:
+    # Каждый файл считается в своём процессе. Если файлов меньше, чем jobs,
+    # несжатые ещё и режутся на диапазоны по границам строк (сжатый файл по
+    # байтовым смещениям не режется).
+    parts = max(1, jobs // max(1, len(paths)))
+    units: list[WorkUnit] = []
+    for path in paths:
+        if parts > 1 and detect_compression(path) is None:
+            units.extend((path, a, b) for a, b in split_ranges(path, parts))
+        else:
+            units.append((path, 0, None))
+    return units
+
+
+def _unit_entries(
+    path: str,
+    start: int,
+    end: Optional[int],
+    since: Optional[datetime],
+    until: Optional[datetime],
+    status: Optional[str],
+    grep: Optional[Grep] = None,
+) -> Iterator[LogEntry]:
+    if end is None:
+        return _iter_entries(path, since, until, status, grep)
+    return _iter_range_entries(path, start, end, since, until, status, grep)
+
+
+def _map_units(
+    func: Callable[..., Any], units: list[WorkUnit], jobs: int, *args: Any
+) -> list[Any]:
+    # Результаты возвращаются в порядке units: слияние в этом порядке даёт
+    # то же, что последовательный проход по файлам.
+    if not units:
+        return []
+    with ProcessPoolExecutor(max_workers=min(jobs, len(units))) as pool:
+        futures = [pool.submit(func, *unit, *args) for unit in units]
+        return [future.result() for future in futures]
+
+
+def _accumulate_range(
+    path: str,
+    start: int,
+    end: Optional[int],
+    since: Optional[datetime],
+    until: Optional[datetime],
+    status: Optional[str],
+    grep: Optional[Grep],
+    approx_percentiles: bool,
+    approx_top: Optional[int],
+    templater: Optional[PathTemplater],
+    group_by: Optional[GroupBy] = None,
+) -> StatsAccumulator:
+    entries = _unit_entries(
+        path, start, end, since, until, status, _line_grep(grep, templater)
+    )
+    filtered = apply_filters(entries, since, until, status, grep, templater)
+    return accumulate(filtered, approx_percentiles, approx_top, grep, group_by)
+
+
+def parallel_aggregate(
+    paths: list[str],
+    jobs: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    status: Optional[str] = None,
+    grep: Optional[Grep] = None,
+    approx_percentiles: bool = False,
+    top: Optional[int] = None,
+    approx_top: Optional[int] = None,
+    templater: Optional[PathTemplater] = None,
+    group_by: Optional[GroupBy] = None,
+) -> dict[str, object]:
+    units = _work_units(paths, jobs)
+    args = (
+        since,
+        until,
+        status,
+        grep,
+        approx_percentiles,
+        approx_top,
+        templater,
+        group_by,
+    )
+    acc = accumulate((), grep=grep, group_by=group_by)
+    for part in _map_units(_accumulate_range, units, jobs, *args):
+        acc.merge(part)
+    return acc.result(top)
+
+
+def incremental_aggregate(
+    state_path: str,
+    paths: list[str],
+    jobs: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    status: Optional[str] = None,
+    grep: Optional[Grep] = None,
+    approx_top: Optional[int] = None,
+    templater: Optional[PathTemplater] = None,
+    group_by: Optional[GroupBy] = None,
+) -> StatsAccumulator:
+    # Агрегат по всем запускам с одним state_path: разбираются только байты,
+    # дописанные с прошлого запуска. Времена ответа всегда идут в скетч --
+    # список рос бы в файле состояния вместе с логом.
+    options = {
+        "since": since and since.isoformat(),
+        "until": until and until.isoformat(),
+        "status": status,
+        "grep": list(grep_patterns(grep)),
+        "path_rules": None if templater is None else [list(r) for r in templater.rules],
+        "approx_top": approx_top,
+        "group_by": None if group_by is None else list(group_by.dims),
+        "bucket_s": None if group_by is None else group_by.bucket_s,
     }
+    state = load_state(state_path, options)
+    acc = accumulate((), True, None, grep, group_by)
+    if state.aggregate is not None:
+        try:
+            acc = StatsAccumulator.from_dict(state.aggregate)
+        except (KeyError, TypeError, ValueError):
+            state = StatsState(options)  # испорченный агрегат -- с нуля
+    units = new_ranges(paths, state)
+    if jobs > 1 and len(units) > 1:
+        args = (since, until, status, grep, True, approx_top, templater, group_by)
+        parts = _map_units(_accumulate_range, units, jobs, *args)
+    else:
+        parts = [
+            _accumulate_range(
+                path,
+                start,
+                end,
+                since=since,
+                until=until,
+                status=status,
+                grep=grep,
+                approx_percentiles=True,
+                approx_top=approx_top,
+                templater=templater,
+                group_by=group_by,
+            )
+            for path, start, end in units
+        ]
+    for part in parts:
+        acc.merge(part)
+    state.aggregate = acc.to_dict()
+    save_state(state_path, state)
+    return acc
+
+
+def _hist_range(
+    path: str,
+    start: int,
+    end: Optional[int],
+    since: Optional[datetime],
+    until: Optional[datetime],
+    status: Optional[str],
+    grep: Optional[Grep],
+    bucket_ms: int,
+    templater: Optional[PathTemplater],
+    sub_bits: Optional[int] = None,
+) -> LatencyHistogram:
+    entries = _unit_entries(
+        path, start, end, since, until, status, _line_grep(grep, templater)
+    )
+    filtered = apply_filters(entries, since, until, status, grep, templater)
+    return LatencyHistogram(bucket_ms, sub_bits).update(request_times_ms(filtered))
+
+
+def merge_histograms(parts: Iterable[LatencyHistogram]) -> LatencyHistogram:
+    # части по файлам и диапазонам в процессах -- массивы счётчиков, без строк
+    parts = iter(parts)
+    hist = next(parts)
+    for part in parts:
+        hist.merge(part)
+    return hist
+
+
+def _batch_range(
+    path: str,
+    start: int,
+    end: Optional[int],
+    since: Optional[datetime],
+    until: Optional[datetime],
+    status: Optional[str],
+    grep: Optional[Grep],
+    templater: Optional[PathTemplater],
+) -> EntryBatch:
+    entries = _unit_entries(
+        path, start, end, since, until, status, _line_grep(grep, templater)
+    )
+    filtered = apply_filters(entries, since, until, status, grep, templater)
+    return EntryBatch.from_entries(filtered)
+
+
+def collect_batch(
+    paths: list[str],
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    status: Optional[str] = None,
+    grep: Optional[Grep] = None,
+    jobs: int = 1,
+    cache: bool = False,
+    index: bool = False,
+    templater: Optional[PathTemplater] = None,
+) -> EntryBatch:
+    # Отфильтрованные записи столбцами для --engine numpy; источник тот же,
+    # что у чистого Python: кэш, индекс, процессы или один поток.
+    require_numpy()
+    args = (since, until, status, grep, templater)
+    if cache:
+        return EntryBatch.concat([_cached_batch(path, *args) for path in paths])
+    if jobs > 1 and not index:
+        units = _work_units(paths, jobs)
+        return EntryBatch.concat(_map_units(_batch_range, units, jobs, *args))
+    entries = _filtered_entries(
+        paths, since, until, status, grep, index=index, templater=templater
+    )
+    return EntryBatch.from_entries(entries)
 
 
 def _parse_iso(s: Optional[str]) -> Optional[datetime]:
@@ -197,14 +1114,134 @@ def _fmt_num(x: Optional[float]) -> str:
     return f"{x:.2f}" if x is not None else "n/a"
 
 
+def _path_templater(args: argparse.Namespace) -> Optional[PathTemplater]:
+    # --path-rule добавляет правила перед стандартными и сам включает шаблоны
+    if not args.path_templates and not args.path_rule:
+        return None
+    try:
+        rules = [parse_rule(text) for text in args.path_rule]
+    except (ValueError, re.error) as e:
+        raise SystemExit(f"Invalid --path-rule: {e}") from e
+    return PathTemplater(rules + list(DEFAULT_RULES))
+
+
+def _group_by(
+    args: argparse.Namespace, templater: Optional[PathTemplater]
+) -> Optional[GroupBy]:
+    if args.group_by is None and args.bucket is None:
+        return None
+    try:
+        dims = parse_group_by(args.group_by) if args.group_by is not None else ()
+        bucket_s = (
+            parse_duration(args.bucket, "bucket", BUCKET_UNITS) if args.bucket else None
+        )
+    except ValueError as e:
+        raise SystemExit(f"Invalid --group-by/--bucket: {e}") from e
+    # path_template -- по тем же правилам, что и --path-templates
+    rules = None if templater is None else templater.rules
+    return GroupBy(dims, bucket_s, rules)
+
+
+def _print_groups(rows: list[dict[str, object]], group_by: GroupBy) -> None:
+    names = list(group_by.dims)
+    if group_by.bucket_s is not None:
+        names.insert(0, "bucket")
+    print(f"Groups ({', '.join(names)}):")
+    for row in rows:
+        key = "  ".join(str(row[name]) for name in names)
+        print(
+            f"{row['count']:>7}  {key}  avg={_fmt_num(row['rt_avg_ms'])}"  # type: ignore
+            f" p95={_fmt_num(row['rt_p95_ms'])}"  # type: ignore
+            f" p99={_fmt_num(row['rt_p99_ms'])}"  # type: ignore
+        )
+
+
+def _use_pool(args: argparse.Namespace) -> bool:
+    # кэш и индекс читают файл не подряд -- их путь однопроцессный; индекс
+    # работает только с --since/--until, без окна он ничего не пропускает
+    indexed = args.index and (args.since or args.until)
+    return args.jobs > 1 and not args.cache and not indexed
+
+
 def cmd_stats(args: argparse.Namespace) -> int:
     since = _parse_iso(args.since)
     until = _parse_iso(args.until)
-    entries = apply_filters(
-        _iter_entries(args.path), since, until, args.status, args.grep
-    )
-    data = cast_to_aggregate(entries)
+    paths = expand_paths(args.path)
     top_n = args.top or 10
+    # отрицательный --top режется срезом ниже, как раньше
+    top = top_n if top_n > 0 else None
+    if args.approx_top is not None and args.approx_top < 1:
+        raise SystemExit(f"Invalid --approx-top capacity: {args.approx_top}")
+    templater = _path_templater(args)
+    group_by = _group_by(args, templater)
+    if group_by is not None and args.engine == "numpy":
+        raise SystemExit("--group-by/--bucket work only with --engine python")
+    if args.approx_top is not None and args.engine == "numpy":
+        raise SystemExit("--approx-top works only with --engine python")
+    if args.state and (args.engine == "numpy" or args.cache or args.index):
+        raise SystemExit(
+            "--state works only with --engine python, without --cache/--index"
+        )
+    if args.state:
+        acc = incremental_aggregate(
+            args.state,
+            paths,
+            args.jobs,
+            since,
+            until,
+            args.status,
+            args.grep,
+            args.approx_top,
+            templater,
+            group_by,
+        )
+        data = acc.result(top)
+    elif args.engine == "numpy":
+        batch = collect_batch(
+            paths,
+            since,
+            until,
+            args.status,
+            args.grep,
+            args.jobs,
+            args.cache,
+            args.index,
+            templater,
+        )
+        data = aggregate(batch, args.approx_percentiles, top, counted_grep(args.grep))
+    elif _use_pool(args):
+        data = parallel_aggregate(
+            paths,
+            args.jobs,
+            since,
+            until,
+            args.status,
+            args.grep,
+            args.approx_percentiles,
+            top,
+            args.approx_top,
+            templater,
+            group_by,
+        )
+    else:
+        entries = _filtered_entries(
+            paths,
+            since,
+            until,
+            args.status,
+            args.grep,
+            args.cache,
+            args.index,
+            templater,
+        )
+        data = cast_to_aggregate(
+            entries,
+            args.approx_percentiles,
+            top,
+            args.approx_top,
+            args.grep,
+            group_by,
+        )
     if args.json:
         ser = dict(data)
         ser["status"] = {str(k): v for k, v in ser["status"].items()}  # type: ignore
@@ -221,57 +1258,285 @@ def cmd_stats(args: argparse.Namespace) -> int:
         print("Top paths:")
         for path, cnt in data["top_paths"][:top_n]:  # type: ignore
             print(f"{cnt:>7}  {path}")
+        if "grep" in data:
+            print("By grep:")
+            for pattern, cnt in data["grep"].items():  # type: ignore
+                print(f"{cnt:>7}  {pattern}")
+        if group_by is not None:
+            _print_groups(data["groups"], group_by)  # type: ignore
     return 0
 
 
+WRITE_CHUNK_LINES = 4096
+
+
+def write_entries(
+    entries: Iterable[LogEntry], out: TextIO, chunk_lines: int = WRITE_CHUNK_LINES
+) -> int:
+    # Строки filter пачками: chunk_lines строк форматируются в один список,
+    # склеиваются и уходят одним write -- вместо print (и форматирования,
+    # записи, а у терминала и flush) на каждую. Память -- одна пачка.
+    # Записи одной секунды делят datetime, его isoformat считается раз.
+    parts: list[str] = []
+    last_ts: Optional[datetime] = None
+    iso = ""
+    n = 0
+    for e in entries:
+        if e.ts is not last_ts:
+            last_ts, iso = e.ts, e.ts.isoformat()
+        bytes_str = "-" if e.bytes_sent is None else str(e.bytes_sent)
+        if e.request_time_s is None:
+            parts.append(f"{iso} {e.ip} {e.method} {e.path} {e.status} {bytes_str}\n")
+        else:
+            parts.append(
+                f"{iso} {e.ip} {e.method} {e.path} {e.status} {bytes_str} "
+                f"rt={e.request_time_s}\n"
+            )
+        if len(parts) >= chunk_lines:
+            out.write("".join(parts))
+            n += len(parts)
+            parts.clear()
+    if parts:
+        out.write("".join(parts))
+        n += len(parts)
+    return n
+
+
 def cmd_filter(args: argparse.Namespace) -> int:
     since = _parse_iso(args.since)
     until = _parse_iso(args.until)
-    entries = apply_filters(
-        _iter_entries(args.path), since, until, args.status, args.grep
-    )
-    out = sys.stdout
-    if args.out:
-        out = open(args.out, "w", encoding="utf-8")
-    try:
-        for e in entries:
-            bytes_str = str(e.bytes_sent) if e.bytes_sent is not None else "-"
-            rt_str = "" if e.request_time_s is None else f" rt={e.request_time_s}"
-            print(
-                f"{e.ts.isoformat()} {e.ip} {e.method} {e.path} {e.status} {bytes_str}{rt_str}",
-                file=out,
-            )
-    finally:
-        if out is not sys.stdout:
-            out.close()
+    # Каждый файл фильтруется своим потоком, а потоки сливаются кучей по ts:
+    # ротации и логи разных хостов выходят в общем порядке времени, целиком
+    # в памяти ничего не держится.
+    streams = [
+        _filtered_entries(
+            [path], since, until, args.status, args.grep, args.cache, args.index
+        )
+        for path in expand_paths(args.path)
+    ]
+    entries = heapq.merge(*streams, key=attrgetter("ts"))
+    if not args.out and args.compress != "auto":
+        raise SystemExit("--compress needs --out")
+    if args.format == "columns":
+        try:
+            if not args.out:
+                write_columns(entries, sys.stdout.buffer)
+                sys.stdout.buffer.flush()
+                return 0
+            with open_binary_output(args.out, args.compress) as bout:
+                write_columns(entries, bout)
+        except ValueError as e:
+            raise SystemExit(f"--format columns: {e}") from e
+        return 0
+    write = write_jsonl if args.format == "jsonl" else write_entries
+    if not args.out:
+        write(entries, sys.stdout)
+        return 0
+    with open_output(args.out, args.compress) as out:
+        write(entries, out)
     return 0
 
 
 def cmd_hist(args: argparse.Namespace) -> int:
     since = _parse_iso(args.since)
     until = _parse_iso(args.until)
-    entries = apply_filters(
-        _iter_entries(args.path), since, until, args.status, args.grep
-    )
-    values = collect_request_times_ms(entries)
-    if not values:
+    paths = expand_paths(args.path)
+    templater = _path_templater(args)
+    try:
+        hist = LatencyHistogram(args.bucket_ms, args.hdr)
+    except ValueError as e:
+        raise SystemExit(f"Invalid --bucket-ms/--hdr: {e}") from e
+    if args.engine == "numpy":
+        batch = collect_batch(
+            paths,
+            since,
+            until,
+            args.status,
+            args.grep,
+            args.jobs,
+            args.cache,
+            args.index,
+            templater,
+        )
+        fill_histogram(hist, batch.rt_ms)
+    elif _use_pool(args):
+        parts = _map_units(
+            _hist_range,
+            _work_units(paths, args.jobs),
+            args.jobs,
+            since,
+            until,
+            args.status,
+            args.grep,
+            args.bucket_ms,
+            templater,
+            args.hdr,
+        )
+        hist = merge_histograms([hist, *parts])
+    else:
+        entries = _filtered_entries(
+            paths,
+            since,
+            until,
+            args.status,
+            args.grep,
+            args.cache,
+            args.index,
+            templater,
+        )
+        hist.update(request_times_ms(entries))
+    if not hist:
         print("No request_time data found.", file=sys.stderr)
         return 1 if args.strict else 0
-    hist = histogram_ms(values, args.bucket_ms)
+    buckets = hist.labels()
     if args.json:
-        print(json.dumps(hist, indent=2, ensure_ascii=False))
+        print(json.dumps(buckets, indent=2, ensure_ascii=False))
     else:
-        for k, v in hist.items():
+        for k, v in buckets.items():
             hashes = "#" * min(v, 60)
             print(f"{k:>12}: {hashes} {v}")
     return 0
 
 
+def _print_snapshot(snapshot: dict[str, dict[str, Any]], now: float) -> None:
+    ts = datetime.fromtimestamp(now, timezone.utc).isoformat()
+    print(f"[{ts}]")
+    for name, w in snapshot.items():
+        status = " ".join(f"{k}={v}" for k, v in w["status"].items())
+        print(
+            f"{name:>4}: total={w['total']} rps={w['rps']:.2f} "
+            f"avg={_fmt_num(w['rt_avg_ms'])} p95={_fmt_num(w['rt_p95_ms'])} "
+            f"p99={_fmt_num(w['rt_p99_ms'])} ms  {status}".rstrip()
+        )
+
+
+def cmd_tail(args: argparse.Namespace) -> int:
+    # Живой лог: каждая новая строка -- O(1) в кольцо окон, файл не
+    # перечитывается. Без --follow -- один проход с начала и один снимок.
+    try:
+        windows = parse_windows(args.windows)
+    except ValueError as e:
+        raise SystemExit(f"Invalid --windows: {e}") from e
+    if args.interval <= 0 or args.poll <= 0:
+        raise SystemExit("--interval and --poll must be > 0")
+    rolling = RollingWindows(windows)
+    # "сейчас" -- время самой новой записи плюс сколько прошло с её чтения:
+    # окна пустеют, когда лог замолкает, и не зависят от часов хоста
+    last_epoch: Optional[float] = None
+    last_seen = time.monotonic()
+
+    def consume(follower: LogFollower) -> None:
+        nonlocal last_epoch, last_seen
+        entries = (e for e in map(parse_line, follower.poll()) if e is not None)
+        for e in apply_filters(entries, status=args.status, grep=args.grep):
+            epoch = e.ts.timestamp()
+            rt = None if e.request_time_s is None else e.request_time_s * 1000.0
+            rolling.add(epoch, e.status, rt)
+            if last_epoch is None or epoch >= last_epoch:
+                last_epoch = epoch
+                last_seen = time.monotonic()
+
+    def emit() -> None:
+        now = time.time() if last_epoch is None else last_epoch
+        now += time.monotonic() - last_seen
+        snapshot = rolling.snapshot(now)
+        if args.json:
+            ts = datetime.fromtimestamp(now, timezone.utc).isoformat()
+            print(json.dumps({"ts": ts, "windows": snapshot}, ensure_ascii=False))
+        else:
+            _print_snapshot(snapshot, now)
+        sys.stdout.flush()
+
+    with LogFollower(args.path, from_start=args.from_start or not args.follow) as f:
+        consume(f)
+        if not args.follow:
+            last_seen = time.monotonic()
+            emit()
+            return 0
+        deadline = time.monotonic() + args.interval
+        while True:
+            time.sleep(min(args.poll, args.interval))
+            consume(f)
+            if time.monotonic() >= deadline:
+                emit()
+                deadline += args.interval
+
+
+def _parse_address(text: str, flag: str) -> tuple[str, int]:
+    from .server import parse_address
+
+    try:
+        return parse_address(text)
+    except ValueError as e:
+        raise SystemExit(f"Invalid {flag}: {e}") from e
+
+
+def _address(text: Optional[str], flag: str) -> Optional[tuple[str, int]]:
+    return None if text is None else _parse_address(text, flag)
+
+
+def cmd_serve(args: argparse.Namespace) -> int:
+    # server сам импортирует cli (разбор и агрегат) -- поэтому импорт здесь
+    import asyncio
+    from .server import IngestServer, Ingestor, require_aiohttp, run_server
+
+    require_aiohttp()
+    udp, tcp = _address(args.udp, "--udp"), _address(args.tcp, "--tcp")
+    http = _parse_address(args.http, "--http")  # у --http есть значение по умолчанию
+    if not (udp or tcp or args.unix):
+        raise SystemExit("serve needs at least one of --udp, --tcp, --unix")
+    if args.batch_size < 1 or args.queue < 1:
+        raise SystemExit("--batch-size and --queue must be positive")
+    if args.approx_top is not None and args.approx_top < 1:
+        raise SystemExit(f"Invalid --approx-top capacity: {args.approx_top}")
+    ingestor = Ingestor(
+        args.jobs,
+        args.batch_size,
+        args.queue,
+        args.status,
+        args.grep,
+        args.approx_top,
+        _path_templater(args),
+    )
+    asyncio.run(run_server(IngestServer(ingestor, http, udp, tcp, args.unix)))
+    return 0
+
+
+def cmd_loadgen(args: argparse.Namespace) -> int:
+    import asyncio
+    from .loadgen import run_loadgen, sample_lines
+
+    udp, tcp = _address(args.udp, "--udp"), _address(args.tcp, "--tcp")
+    if args.lines < 1 or args.connections < 1:
+        raise SystemExit("--lines and --connections must be positive")
+    lines = sample_lines(args.lines, args.seed)
+    result = asyncio.run(
+        run_loadgen(lines, tcp, udp, args.unix, args.connections, args.http)
+    )
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return 0
+    print(f"Sent: {result['lines']} lines in {result['send_s']:.3f} s")
+    print(f"Send rate: {_fmt_num(result['send_lines_per_s'])} lines/s")
+    if "ingest_s" in result:
+        print(f"Ingested: {result['received']} lines in {result['ingest_s']:.3f} s")
+        print(f"Ingest rate: {_fmt_num(result['ingest_lines_per_s'])} lines/s")
+        print(f"Lost: {result['lost']}, dropped: {result['dropped']}")
+    return 0
+
+
 # =====================
 # CLI Bootstrap
 # =====================
 
 
+def _grep_file(path: str) -> list[str]:
+    try:
+        return read_grep_file(path)
+    except OSError as e:
+        raise argparse.ArgumentTypeError(f"cannot read {path}: {e.strerror}")
+
+
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         prog="logscoper",
@@ -280,35 +1545,122 @@ def build_parser() -> argparse.ArgumentParser:
     sub = parser.add_subparsers(dest="cmd", required=True)
 
     ps = sub.add_parser("stats", help="Show aggregated stats")
-    ps.add_argument("--path", required=True)
+    ps.add_argument("--path", required=True, nargs="+", action="extend")
     ps.add_argument("--top", type=int, default=10)
     ps.add_argument("--since")
     ps.add_argument("--until")
     ps.add_argument("--status")
-    ps.add_argument("--grep")
+    ps.add_argument("--grep", action="append")
+    ps.add_argument("--grep-file", type=_grep_file, action="extend", dest="grep")
+    ps.add_argument("--path-templates", action="store_true", dest="path_templates")
+    ps.add_argument("--path-rule", action="append", default=[], dest="path_rule")
+    ps.add_argument("--cache", action="store_true")
+    ps.add_argument("--index", action="store_true")
+    ps.add_argument("--state", metavar="FILE")
     ps.add_argument("--json", action="store_true")
+    ps.add_argument("--jobs", type=int, default=1)
+    ps.add_argument("--engine", choices=["python", "numpy"], default="python")
+    ps.add_argument(
+        "--approx-percentiles", action="store_true", dest="approx_percentiles"
+    )
+    ps.add_argument(
+        "--approx-top",
+        type=int,
+        nargs="?",
+        const=TOP_CAPACITY,
+        metavar="CAPACITY",
+        dest="approx_top",
+    )
+    ps.add_argument("--group-by", metavar="DIMS", dest="group_by")
+    ps.add_argument("--bucket", metavar="DURATION")
     ps.set_defaults(func=cmd_stats)
 
     pf = sub.add_parser("filter", help="Filter and print normalized lines")
-    pf.add_argument("--path", required=True)
+    pf.add_argument("--path", required=True, nargs="+", action="extend")
     pf.add_argument("--since")
     pf.add_argument("--until")
     pf.add_argument("--status")
-    pf.add_argument("--grep")
+    pf.add_argument("--grep", action="append")
+    pf.add_argument("--grep-file", type=_grep_file, action="extend", dest="grep")
+    pf.add_argument("--cache", action="store_true")
+    pf.add_argument("--index", action="store_true")
     pf.add_argument("--out")
+    pf.add_argument("--format", choices=FORMATS, default="text")
+    pf.add_argument(
+        "--compress", choices=["auto", "none", *COMPRESSIONS], default="auto"
+    )
     pf.set_defaults(func=cmd_filter)
 
     ph = sub.add_parser("hist", help="Request time histogram")
-    ph.add_argument("--path", required=True)
+    ph.add_argument("--path", required=True, nargs="+", action="extend")
     ph.add_argument("--bucket-ms", type=int, default=100, dest="bucket_ms")
+    # log-linear корзины: 2**BITS на удвоение, --bucket-ms -- ширина самых узких
+    ph.add_argument("--hdr", type=int, nargs="?", const=HDR_SUB_BITS, metavar="BITS")
     ph.add_argument("--since")
     ph.add_argument("--until")
     ph.add_argument("--status")
-    ph.add_argument("--grep")
+    ph.add_argument("--grep", action="append")
+    ph.add_argument("--grep-file", type=_grep_file, action="extend", dest="grep")
+    ph.add_argument("--path-templates", action="store_true", dest="path_templates")
+    ph.add_argument("--path-rule", action="append", default=[], dest="path_rule")
+    ph.add_argument("--cache", action="store_true")
+    ph.add_argument("--index", action="store_true")
     ph.add_argument("--json", action="store_true")
     ph.add_argument("--strict", action="store_true")
+    ph.add_argument("--jobs", type=int, default=1)
+    ph.add_argument("--engine", choices=["python", "numpy"], default="python")
     ph.set_defaults(func=cmd_hist)
 
+    pt = sub.add_parser("tail", help="Rolling window stats of a growing log")
+    pt.add_argument("--path", required=True)
+    pt.add_argument("--follow", "-f", action="store_true")
+    pt.add_argument("--from-start", action="store_true", dest="from_start")
+    pt.add_argument("--interval", type=float, default=5.0)
+    pt.add_argument("--poll", type=float, default=0.25)
+    pt.add_argument("--windows", default="1m,5m,15m")
+    pt.add_argument("--status")
+    pt.add_argument("--grep", action="append")
+    pt.add_argument("--grep-file", type=_grep_file, action="extend", dest="grep")
+    pt.add_argument("--json", action="store_true")
+    pt.set_defaults(func=cmd_tail)
+
+    pv = sub.add_parser(
+        "serve", help="Ingest log lines from sockets, serve stats over HTTP"
+    )
+    pv.add_argument("--udp", metavar="HOST:PORT")
+    pv.add_argument("--tcp", metavar="HOST:PORT")
+    pv.add_argument("--unix", metavar="PATH")
+    pv.add_argument("--http", metavar="HOST:PORT", default="127.0.0.1:8080")
+    pv.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    pv.add_argument("--batch-size", type=int, default=1000, dest="batch_size")
+    pv.add_argument("--queue", type=int, default=64)
+    pv.add_argument("--status")
+    pv.add_argument("--grep", action="append")
+    pv.add_argument("--grep-file", type=_grep_file, action="extend", dest="grep")
+    pv.add_argument("--path-templates", action="store_true", dest="path_templates")
+    pv.add_argument("--path-rule", action="append", default=[], dest="path_rule")
+    pv.add_argument(
+        "--approx-top",
+        type=int,
+        nargs="?",
+        const=TOP_CAPACITY,
+        metavar="CAPACITY",
+        dest="approx_top",
+    )
+    pv.set_defaults(func=cmd_serve)
+
+    pl = sub.add_parser("loadgen", help="Send synthetic log lines to serve")
+    target = pl.add_mutually_exclusive_group(required=True)
+    target.add_argument("--udp", metavar="HOST:PORT")
+    target.add_argument("--tcp", metavar="HOST:PORT")
+    target.add_argument("--unix", metavar="PATH")
+    pl.add_argument("--http", metavar="URL")
+    pl.add_argument("--lines", type=int, default=100_000)
+    pl.add_argument("--connections", type=int, default=4)
+    pl.add_argument("--seed", type=int, default=0)
+    pl.add_argument("--json", action="store_true")
+    pl.set_defaults(func=cmd_loadgen)
+
     return parser
 
 
@@ -320,5 +1672,9 @@ def main(argv: Optional[list[str]] = None) -> int:
     except FileNotFoundError as e:
         print(f"File not found: {e}", file=sys.stderr)
         return 2
+    except ImportError as e:
+        # например .zst без установленного zstandard
+        print(f"Missing dependency: {e}", file=sys.stderr)
+        return 2
     except KeyboardInterrupt:
         return 130
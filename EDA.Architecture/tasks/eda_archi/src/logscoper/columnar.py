@@ -0,0 +1,198 @@
+from __future__ import annotations
+import importlib
+import math
+from array import array
+from dataclasses import dataclass
+from types import ModuleType
+from typing import Any, Iterable, Optional
+from .cache import LogColumns
+from .grep import GrepSet
+from .histogram import LatencyHistogram
+from .model import StringPool
+from .sketch import QuantileSketch
+
+np: Optional[ModuleType]
+try:
+    np = importlib.import_module("numpy")
+except ImportError:  # numpy -- необязательная зависимость, нужна только --engine numpy
+    np = None
+
+
+def require_numpy() -> ModuleType:
+    if np is None:
+        raise ImportError("--engine numpy needs 'numpy' installed", name="numpy")
+    return np
+
+
+# Пакет записей столбцами NumPy для --engine numpy: статус, код пути в словаре
+# paths и время ответа в мс (только у записей, где оно есть). Агрегаты
+# совпадают с StatsAccumulator/histogram_ms до бита: сумма времён идёт
+# последовательно (cumsum, а не попарный np.sum), равные по счёту пути
+# упорядочены по первому появлению, как в Counter.most_common().
+@dataclass
+class EntryBatch:
+    status: Any
+    path_codes: Any
+    paths: list[str]
+    rt_ms: Any
+
+    def __len__(self) -> int:
+        return len(self.status)
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Any]) -> EntryBatch:
+        np = require_numpy()
+        status, codes, rts = array("q"), array("q"), array("d")
+        paths = StringPool(limit=None)
+        for e in entries:
+            status.append(e.status)
+            codes.append(paths.code(e.path))
+            if e.request_time_s is not None:
+                rts.append(e.request_time_s)
+        return cls(
+            np.array(status, np.int64),
+            np.array(codes, np.int64),
+            paths.values,
+            np.array(rts, np.float64) * 1000.0,
+        )
+
+    @classmethod
+    def from_columns(
+        cls,
+        cols: LogColumns,
+        since: float = -math.inf,
+        until: float = math.inf,
+        status_ok: Optional[bytes] = None,
+        path_ok: Optional[list[bool]] = None,
+    ) -> EntryBatch:
+        # Столбцы кэша с фильтрами маской: LogEntry не создаются вовсе.
+        # status_ok -- таблица StatusSelector, path_ok -- grep по словарю путей.
+        np = require_numpy()
+        ts = np.array(cols.ts, np.int64)
+        status = np.array(cols.status, np.int64)
+        codes = np.array(cols.path.codes, np.int64)
+        rt = np.array(cols.rt, np.float64)
+        mask = (ts >= since) & (ts < until)
+        if status_ok is not None:
+            mask &= np.frombuffer(status_ok, np.uint8).astype(bool)[status]
+        if path_ok is not None and len(codes):
+            mask &= np.array(path_ok, bool)[codes]
+        rt = rt[mask]
+        return cls(
+            status[mask], codes[mask], cols.path.values, rt[~np.isnan(rt)] * 1000.0
+        )
+
+    def with_paths(self, paths: list[str]) -> EntryBatch:
+        # тот же пакет с другим словарём путей той же длины (шаблоны):
+        # совпавшие значения получают один код, порядок первого появления
+        # сохраняется
+        np = require_numpy()
+        index = StringPool(limit=None)
+        remap = np.array([index.code(p) for p in paths], np.int64)
+        return EntryBatch(self.status, remap[self.path_codes], index.values, self.rt_ms)
+
+    @classmethod
+    def concat(cls, batches: list[EntryBatch]) -> EntryBatch:
+        # Слияние в порядке batches; словари путей объединяются
+        if not batches:
+            return cls.from_entries(())
+        np = require_numpy()
+        index: dict[str, int] = {}
+        codes = []
+        for batch in batches:
+            remap = [index.setdefault(p, len(index)) for p in batch.paths]
+            codes.append(np.array(remap, np.int64)[batch.path_codes])
+        return cls(
+            np.concatenate([batch.status for batch in batches]),
+            np.concatenate(codes),
+            list(index),
+            np.concatenate([batch.rt_ms for batch in batches]),
+        )
+
+
+def percentile(values: Any, p: float) -> Optional[float]:
+    # cast_to_percentile без полной сортировки: нужны два порядковых элемента
+    if not len(values):
+        return None
+    np = require_numpy()
+    k = (len(values) - 1) * (p / 100.0)
+    f = math.floor(k)
+    c = math.ceil(k)
+    part = np.partition(values, (f, c))
+    if f == c:
+        return float(part[int(k)])
+    return float(part[f]) * (c - k) + float(part[c]) * (k - f)
+
+
+def aggregate(
+    batch: EntryBatch,
+    approx_percentiles: bool = False,
+    top: Optional[int] = None,
+    grep: Optional[GrepSet] = None,
+) -> dict[str, object]:
+    # то же, что cast_to_aggregate
+    np = require_numpy()
+    codes, counts = np.unique(batch.status, return_counts=True)
+    by_status = dict(zip(codes.tolist(), counts.tolist()))
+    codes, first, counts = np.unique(
+        batch.path_codes, return_index=True, return_counts=True
+    )
+    if top is not None and 0 < top < len(counts):
+        # сортируются только пути со счётом не меньше top-го по величине
+        # (равные ему на границе тоже, чтобы порядок был как у most_common)
+        keep = counts >= np.partition(counts, len(counts) - top)[len(counts) - top]
+        codes, first, counts = codes[keep], first[keep], counts[keep]
+    order = np.lexsort((first, -counts))[:top]
+    top_paths = [
+        (batch.paths[code], n)
+        for code, n in zip(codes[order].tolist(), counts[order].tolist())
+    ]
+    rt_ms = batch.rt_ms
+    if approx_percentiles:
+        sketch = QuantileSketch().update(rt_ms.tolist())
+        avg_ms = sketch.mean()
+        p95 = sketch.quantile(0.95)
+        p99 = sketch.quantile(0.99)
+    else:
+        avg_ms = float(np.cumsum(rt_ms)[-1]) / len(rt_ms) if len(rt_ms) else None
+        p95 = percentile(rt_ms, 95.0)
+        p99 = percentile(rt_ms, 99.0)
+    data: dict[str, object] = {
+        "total": len(batch),
+        "status": by_status,
+        "top_paths": top_paths,
+        "rt_avg_ms": avg_ms,
+        "rt_p95_ms": p95,
+        "rt_p99_ms": p99,
+    }
+    if grep is not None:
+        # счётчики шаблонов -- по словарю путей, с весом числа записей пути
+        grep_counts = [0] * len(grep)
+        per_path = np.bincount(batch.path_codes, minlength=len(batch.paths))
+        for path, n in zip(batch.paths, per_path.tolist()):
+            if n:
+                for i in grep.matches(path):
+                    grep_counts[i] += n
+        data["grep"] = dict(zip(grep.patterns, grep_counts))
+    return data
+
+
+def fill_histogram(hist: LatencyHistogram, rt_ms: Any) -> LatencyHistogram:
+    # то же, что hist.update: номера корзин -- столбцом, счёт -- np.unique
+    if not len(rt_ms):
+        return hist
+    np = require_numpy()
+    quotients = np.floor_divide(rt_ms, hist.bucket_ms).astype(np.int64)
+    if hist.sub_bits is not None:
+        # bit_length(q) -- показатель из frexp, для q < 2**53 точный
+        shift = np.maximum(np.frexp(quotients)[1] - hist.sub_bits - 1, 0)
+        quotients = (shift << hist.sub_bits) + (quotients >> shift)
+    indices, counts = np.unique(quotients, return_counts=True)
+    for i, n in zip(indices.tolist(), counts.tolist()):
+        hist.add_index(i, n)
+    return hist
+
+
+def histogram(rt_ms: Any, bucket_ms: int) -> dict[str, int]:
+    # то же, что histogram_ms
+    return fill_histogram(LatencyHistogram(bucket_ms), rt_ms).labels()
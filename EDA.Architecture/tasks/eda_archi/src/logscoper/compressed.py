@@ -0,0 +1,215 @@
+from __future__ import annotations
+import bz2
+import gzip
+import importlib
+import io
+import queue
+import threading
+from pathlib import Path
+from types import ModuleType
+from typing import TYPE_CHECKING, BinaryIO, Optional, TextIO
+
+if TYPE_CHECKING:
+    from _typeshed import ReadableBuffer, WriteableBuffer
+
+zstandard: Optional[ModuleType]
+try:
+    zstandard = importlib.import_module("zstandard")
+except ImportError:  # zstd -- необязательная зависимость
+    zstandard = None
+
+
+CHUNK_SIZE = 1 << 20
+QUEUE_CHUNKS = 8
+
+# Формат определяется по первым байтам, а не по имени: access.log.1 может
+# оказаться сжатым, а access.log.gz -- уже распакованным.
+BZ2_BLOCKS = (b"1AY&SY", b"\x17rE8P\x90")
+
+
+def detect_compression(path: str | Path) -> Optional[str]:
+    with open(path, "rb") as f:
+        head = f.read(10)
+    if head.startswith(b"\x1f\x8b\x08"):
+        return "gzip"
+    if head[:3] == b"BZh" and head[3:4].isdigit() and head[4:] in BZ2_BLOCKS:
+        return "bz2"
+    if head.startswith(b"\x28\xb5\x2f\xfd"):
+        return "zstd"
+    return None
+
+
+def _open_decompressed(path: str | Path, kind: str) -> io.BufferedIOBase:
+    if kind == "gzip":
+        return gzip.open(path, "rb")
+    if kind == "bz2":
+        return bz2.open(path, "rb")
+    if zstandard is None:
+        raise ImportError(
+            f"{path} is zstd-compressed, install 'zstandard' to read it",
+            name="zstandard",
+        )
+    return zstandard.ZstdDecompressor().stream_reader(
+        open(path, "rb"), read_across_frames=True, closefd=True
+    )
+
+
+class _QueueReader(io.RawIOBase):
+    # Сырой поток поверх очереди распакованных кусков. Распаковка идёт в
+    # фоновом потоке (zlib/bz2/zstd отпускают GIL), разбор -- в текущем;
+    # очередь ограничена, так что вперёд распаковывается не больше
+    # QUEUE_CHUNKS * CHUNK_SIZE байт.
+    def __init__(self, source: io.BufferedIOBase) -> None:
+        super().__init__()
+        self._queue: queue.Queue[bytes | Exception] = queue.Queue(QUEUE_CHUNKS)
+        self._stop = threading.Event()
+        self._buf = memoryview(b"")
+        self._eof = False
+        self._thread = threading.Thread(target=self._pump, args=(source,), daemon=True)
+        self._thread.start()
+
+    def _pump(self, source: io.BufferedIOBase) -> None:
+        try:
+            with source:
+                while not self._stop.is_set():
+                    chunk = source.read(CHUNK_SIZE)
+                    self._put(chunk)
+                    if not chunk:
+                        return
+        except Exception as e:  # битый архив -- отдаём ошибку читателю
+            self._put(e)
+
+    def _put(self, item: bytes | Exception) -> None:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b: WriteableBuffer) -> int:
+        if not self._buf:
+            if self._eof:
+                return 0
+            item = self._queue.get()
+            if isinstance(item, Exception):
+                self._eof = True
+                raise item
+            if not item:
+                self._eof = True
+                return 0
+            self._buf = memoryview(item)
+        view = memoryview(b).cast("B")
+        n = min(len(view), len(self._buf))
+        view[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        super().close()
+
+
+def open_log(
+    path: str | Path, encoding: Optional[str] = None, errors: Optional[str] = None
+) -> TextIO:
+    # Текстовый поток как у open(path, "rt"), но gzip/bz2/zstd распаковываются
+    # на лету в фоновом потоке.
+    kind = detect_compression(path)
+    if kind is None:
+        return open(path, "rt", encoding=encoding, errors=errors)
+    raw = _QueueReader(_open_decompressed(path, kind))
+    return io.TextIOWrapper(
+        io.BufferedReader(raw, CHUNK_SIZE), encoding=encoding, errors=errors
+    )
+
+
+def open_binary_log(path: str | Path) -> BinaryIO:
+    # то же для двоичных файлов (filter --format columns)
+    kind = detect_compression(path)
+    if kind is None:
+        return open(path, "rb")
+    return io.BufferedReader(_QueueReader(_open_decompressed(path, kind)), CHUNK_SIZE)
+
+
+# Запись: формат -- по явному имени или по расширению --out
+SUFFIXES = {".gz": "gzip", ".bz2": "bz2", ".zst": "zstd"}
+COMPRESSIONS = ("gzip", "bz2", "zstd")
+
+
+def output_compression(path: str | Path, compression: str = "auto") -> Optional[str]:
+    if compression == "auto":
+        return SUFFIXES.get(Path(path).suffix)
+    return None if compression == "none" else compression
+
+
+def _open_compressor(path: str | Path, kind: str) -> io.BufferedIOBase:
+    if kind == "gzip":
+        # 6, как у gzip(1): 9 заметно медленнее почти без выигрыша
+        return gzip.open(path, "wb", compresslevel=6)
+    if kind == "bz2":
+        return bz2.open(path, "wb")
+    if zstandard is None:
+        raise ImportError(
+            f"writing {path} needs 'zstandard' installed", name="zstandard"
+        )
+    return zstandard.ZstdCompressor().stream_writer(open(path, "wb"), closefd=True)
+
+
+class _QueueWriter(io.RawIOBase):
+    # Обратный к _QueueReader: куски уходят в ограниченную очередь, сжатие и
+    # запись -- в фоновом потоке. Ошибка сжатия всплывает на следующем
+    # write() или на close().
+    def __init__(self, sink: io.BufferedIOBase) -> None:
+        super().__init__()
+        self._queue: queue.Queue[Optional[bytes]] = queue.Queue(QUEUE_CHUNKS)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._drain, args=(sink,), daemon=True)
+        self._thread.start()
+
+    def _drain(self, sink: io.BufferedIOBase) -> None:
+        try:
+            with sink:
+                while (chunk := self._queue.get()) is not None:
+                    sink.write(chunk)
+        except BaseException as e:
+            self._error = e
+            while self._queue.get() is not None:  # не держать пишущего
+                pass
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b: ReadableBuffer) -> int:
+        if self._error is not None:
+            raise self._error
+        chunk = bytes(b)
+        self._queue.put(chunk)
+        return len(chunk)
+
+    def close(self) -> None:
+        if not self.closed:
+            self._queue.put(None)
+            self._thread.join()
+            super().close()
+            if self._error is not None:
+                raise self._error
+
+
+def open_output(path: str | Path, compression: str = "auto") -> TextIO:
+    # Текстовый поток на запись как у open(path, "w"); gzip/bz2/zstd
+    # сжимаются в фоновом потоке, блоками по CHUNK_SIZE
+    if output_compression(path, compression) is None:
+        return open(path, "w", encoding="utf-8", buffering=CHUNK_SIZE)
+    return io.TextIOWrapper(open_binary_output(path, compression), encoding="utf-8")
+
+
+def open_binary_output(path: str | Path, compression: str = "auto") -> BinaryIO:
+    kind = output_compression(path, compression)
+    if kind is None:
+        return open(path, "wb", buffering=CHUNK_SIZE)
+    return io.BufferedWriter(_QueueWriter(_open_compressor(path, kind)), CHUNK_SIZE)
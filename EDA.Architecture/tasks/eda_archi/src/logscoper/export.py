@@ -0,0 +1,127 @@
+from __future__ import annotations
+import json
+import sys
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, Optional, TextIO
+from .cache import STRINGS, LogColumns
+from .compressed import open_binary_log
+from .model import LogEntry
+
+# filter --format: text -- строки для человека; jsonl и columns -- для других
+# программ, чтобы не разбирать вывод регуляркой и strptime ещё раз.
+FORMATS = ("text", "jsonl", "columns")
+CHUNK_LINES = 4096
+QUOTE_CACHE = 1 << 16
+
+# columns: MAGIC, затем блоки по BLOCK_ROWS записей. Блок -- 4 байта длины
+# заголовка (little endian), заголовок JSON и столбцы, как в кэше (.lscache):
+# ts (int64, секунды epoch UTC), status (uint16), bytes_sent (int64,
+# NO_BYTES для "-"), rt (float64, NaN -- нет), строки -- словарь + номера.
+# Пишется потоком: в памяти один блок. Столбцы читаются в array как есть
+# (numpy.frombuffer(batch.rt) -- без копии), поэтому порядок байт должен
+# совпадать с записавшей машиной, как и у кэша. Arrow IPC не используется:
+# формат файла зависел бы от того, стоит ли pyarrow у записавшего, а
+# read_columns должен читать его и без pyarrow.
+COLUMNS_MAGIC = b"LSCOLS\x00\x01"
+BLOCK_ROWS = 1 << 16
+
+
+def write_jsonl(
+    entries: Iterable[LogEntry], out: TextIO, chunk_lines: int = CHUNK_LINES
+) -> int:
+    # Объект на строку; ts -- ISO 8601 со смещением, как в text. Строка
+    # собирается форматированием, без dict и json.dumps на запись: строки
+    # экранируются json-кодировщиком один раз на значение (LRU -- пути и ip
+    # повторяются), числа совпадают с тем, что выдал бы json.dumps.
+    quote = lru_cache(maxsize=QUOTE_CACHE)(json.JSONEncoder(ensure_ascii=False).encode)
+    parts: list[str] = []
+    last_ts: Optional[datetime] = None
+    iso = ""
+    n = 0
+    for e in entries:
+        if e.ts is not last_ts:
+            last_ts, iso = e.ts, e.ts.isoformat()
+        bytes_sent = "null" if e.bytes_sent is None else e.bytes_sent
+        rt = "null" if e.request_time_s is None else repr(e.request_time_s)
+        parts.append(
+            f'{{"ts": "{iso}", "ip": {quote(e.ip)}, "method": {quote(e.method)}, '
+            f'"path": {quote(e.path)}, "status": {e.status}, '
+            f'"bytes_sent": {bytes_sent}, "request_time_s": {rt}}}\n'
+        )
+        if len(parts) >= chunk_lines:
+            out.write("".join(parts))
+            n += len(parts)
+            parts.clear()
+    if parts:
+        out.write("".join(parts))
+        n += len(parts)
+    return n
+
+
+def _write_block(out: BinaryIO, batch: LogColumns) -> None:
+    blobs = batch.blobs()
+    header = {
+        "rows": len(batch),
+        "byteorder": sys.byteorder,
+        "columns": [[name, len(blob)] for name, blob in blobs.items()],
+        "strings": {name: len(getattr(batch, name).values) for name in STRINGS},
+    }
+    raw_header = json.dumps(header).encode()
+    out.write(len(raw_header).to_bytes(4, "little") + raw_header)
+    for blob in blobs.values():
+        out.write(blob)
+
+
+def write_columns(
+    entries: Iterable[LogEntry], out: BinaryIO, block_rows: int = BLOCK_ROWS
+) -> int:
+    out.write(COLUMNS_MAGIC)
+    batch = LogColumns()
+    n = 0
+    for e in entries:
+        try:
+            batch.append(e)
+        except OverflowError:
+            raise ValueError(
+                f"bytes_sent {e.bytes_sent} does not fit the int64 column, "
+                "use --format jsonl or text"
+            ) from None
+        if len(batch) >= block_rows:
+            _write_block(out, batch)
+            n += len(batch)
+            batch = LogColumns()
+    if len(batch):
+        _write_block(out, batch)
+        n += len(batch)
+    return n
+
+
+def read_columns(path: str | Path) -> Iterator[LogColumns]:
+    # Блоки файла filter --format columns (можно сжатый) по одному.
+    # ValueError -- не такой файл или он обрезан/повреждён.
+    with open_binary_log(path) as f:
+        if f.read(len(COLUMNS_MAGIC)) != COLUMNS_MAGIC:
+            raise ValueError(f"{path}: not a logscoper columns file")
+        while size := f.read(4):
+            try:
+                header = json.loads(f.read(int.from_bytes(size, "little")))
+                byteorder = header["byteorder"]
+                blobs = {name: f.read(n) for name, n in header["columns"]}
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"{path}: corrupt block header") from e
+            if any(len(blobs[name]) != n for name, n in header["columns"]):
+                raise ValueError(f"{path}: truncated block")
+            if byteorder != sys.byteorder:
+                raise ValueError(f"{path}: written with {byteorder} byte order")
+            batch = LogColumns.from_blobs(header, blobs)
+            if batch is None:
+                raise ValueError(f"{path}: corrupt block")
+            yield batch
+
+
+def iter_columns_entries(path: str | Path) -> Iterator[LogEntry]:
+    # записи файла columns; ts -- в UTC
+    for batch in read_columns(path):
+        yield from batch
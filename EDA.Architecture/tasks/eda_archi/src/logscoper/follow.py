@@ -0,0 +1,152 @@
+from __future__ import annotations
+import math
+import os
+import re
+from typing import Iterator, Optional
+from .sketch import QuantileSketch
+
+# Окна tail по умолчанию
+WINDOWS = {"1m": 60, "5m": 300, "15m": 900}
+READ_CHUNK = 1 << 20
+
+_WINDOW_RE = re.compile(r"(\d+)([a-z])")
+_UNITS = {"s": 1, "m": 60, "h": 3600}
+# интервалы stats --bucket бывают и в сутки; окна tail -- не длиннее часов
+BUCKET_UNITS = {**_UNITS, "d": 86400}
+
+
+def parse_duration(
+    text: str, what: str = "window", units: dict[str, int] = _UNITS
+) -> int:
+    # "30s", "5m", "1h" -> секунды
+    m = _WINDOW_RE.fullmatch(text.strip())
+    if m is None or m[2] not in units or int(m[1]) == 0:
+        raise ValueError(f"invalid {what} {text.strip()!r}, expected e.g. 30s, 5m, 1h")
+    return int(m[1]) * units[m[2]]
+
+
+def parse_windows(spec: str) -> dict[str, int]:
+    # "1m,5m,15m" -> {"1m": 60, "5m": 300, "15m": 900}
+    return {part.strip(): parse_duration(part) for part in spec.split(",")}
+
+
+class LogFollower:
+    # Растущий лог без повторного чтения: файл держится открытым, poll()
+    # отдаёт строки, дописанные после прошлого вызова; неполная последняя
+    # строка ждёт своего \n. Ротация (по пути уже другой inode) -- старый
+    # файл дочитывается до конца, дальше читается новый с начала.
+    # copytruncate (файл стал короче позиции) -- чтение с начала.
+    def __init__(self, path: str, from_start: bool = False) -> None:
+        self.path = path
+        self._file = open(path, "rb")
+        if not from_start:
+            self._file.seek(0, os.SEEK_END)
+        self._ino = os.fstat(self._file.fileno()).st_ino
+        self._partial = b""
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> LogFollower:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def _read(self) -> Iterator[str]:
+        while True:
+            chunk = self._file.read(READ_CHUNK)
+            if not chunk:
+                return
+            lines = (self._partial + chunk).split(b"\n")
+            self._partial = lines.pop()
+            for raw in lines:
+                yield raw.rstrip(b"\r").decode("utf-8", errors="ignore")
+
+    def poll(self) -> Iterator[str]:
+        yield from self._read()
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return  # старый файл переименован, новый ещё не создан
+        if st.st_ino != self._ino:
+            yield from self._read()  # то, что успели дописать в старый
+            if self._partial:
+                yield self._partial.rstrip(b"\r").decode("utf-8", errors="ignore")
+            self._file.close()
+            self._file = open(self.path, "rb")
+            self._ino = os.fstat(self._file.fileno()).st_ino
+            self._partial = b""
+            yield from self._read()
+        elif st.st_size < self._file.tell():
+            self._file.seek(0)
+            self._partial = b""
+            yield from self._read()
+
+
+class _Slot:
+    __slots__ = ("number", "total", "status", "sketch")
+
+    def __init__(self, number: int) -> None:
+        self.number = number
+        self.total = 0
+        self.status: dict[int, int] = {}
+        self.sketch = QuantileSketch()
+
+
+class RollingWindows:
+    # Скользящие окна по времени записей: кольцо слотов по slot секунд,
+    # в слоте -- счётчики статусов и скетч времён ответа. Запись -- O(1):
+    # она идёт в слот своей секунды, а слот, который кольцо уже обошло,
+    # переиспользуется по номеру без отдельной чистки. Снимок окна сливает
+    # его слоты. Записи старше самого длинного окна отбрасываются.
+    def __init__(self, windows: Optional[dict[str, int]] = None, slot: int = 1) -> None:
+        self.windows = dict(windows or WINDOWS)
+        self.slot = slot
+        self.size = math.ceil(max(self.windows.values()) / slot)
+        self._slots: list[Optional[_Slot]] = [None] * self.size
+        self.latest: Optional[int] = None  # номер самого нового слота
+
+    def add(self, epoch: float, status: int, rt_ms: Optional[float]) -> None:
+        number = int(epoch // self.slot)
+        if self.latest is None or number > self.latest:
+            self.latest = number
+        elif number <= self.latest - self.size:
+            return
+        i = number % self.size
+        s = self._slots[i]
+        if s is None or s.number != number:
+            s = self._slots[i] = _Slot(number)
+        s.total += 1
+        s.status[status] = s.status.get(status, 0) + 1
+        if rt_ms is not None:
+            s.sketch.add(rt_ms)
+
+    def snapshot(self, now: Optional[float] = None) -> dict[str, dict[str, object]]:
+        # Окна отсчитываются от самой новой записи; now (epoch) сдвигает их
+        # дальше, когда лог молчит
+        latest: Optional[float] = self.latest
+        if now is not None:
+            latest = max(latest if latest is not None else -math.inf, now // self.slot)
+        result: dict[str, dict[str, object]] = {}
+        for name, seconds in self.windows.items():
+            total = 0
+            status: dict[int, int] = {}
+            sketch = QuantileSketch()
+            oldest = -math.inf if latest is None else latest - seconds // self.slot
+            for s in self._slots:
+                if s is None or latest is None or not oldest < s.number <= latest:
+                    continue
+                total += s.total
+                for code, n in s.status.items():
+                    status[code] = status.get(code, 0) + n
+                sketch.merge(s.sketch)
+            result[name] = {
+                "total": total,
+                "rps": total / seconds,
+                "status": dict(sorted(status.items())),
+                "rt_avg_ms": sketch.mean(),
+                "rt_p95_ms": sketch.quantile(0.95),
+                "rt_p99_ms": sketch.quantile(0.99),
+            }
+        return result
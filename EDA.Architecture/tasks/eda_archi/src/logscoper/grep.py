@@ -0,0 +1,82 @@
+from __future__ import annotations
+import re
+from functools import lru_cache
+from typing import Optional, Sequence, Union
+
+# --grep: один шаблон строкой или несколько (--grep повторяется, --grep-file)
+Grep = Union[str, Sequence[str]]
+CACHE_SIZE = 1 << 16
+
+# обратные ссылки после склейки указывали бы на чужие группы
+_GROUP_REF_RE = re.compile(r"\\[1-9]|\(\?P=|\(\?\(")
+
+
+def grep_patterns(grep: Optional[Grep]) -> tuple[str, ...]:
+    if not grep:
+        return ()
+    # повторы убираются: счётчики stats -- словарь по шаблону
+    return (grep,) if isinstance(grep, str) else tuple(dict.fromkeys(grep))
+
+
+def _combine(patterns: tuple[str, ...]) -> Optional[re.Pattern[str]]:
+    if len(patterns) == 1:
+        return re.compile(patterns[0])
+    if any(_GROUP_REF_RE.search(p) for p in patterns):
+        return None
+    try:
+        return re.compile("|".join(f"(?:{p})" for p in patterns))
+    except re.error:
+        return None  # повтор имени группы, (?i) не в начале и т.п.
+
+
+class GrepSet:
+    # Несколько --grep за один проход: запись проходит, если путь подходит
+    # хоть под один шаблон. Для отбора шаблоны склеены в одну альтернативу
+    # (?:p1)|(?:p2)|..., и путь проверяется одним search. Какие именно
+    # шаблоны подошли (счётчики stats) -- отдельно по каждому, но один раз на
+    # путь: результат кэшируется (LRU). Если склеить нельзя, отбор идёт по
+    # шаблонам по очереди. В процессы --jobs передаются только шаблоны.
+    __slots__ = ("patterns", "cache_size", "_regexes", "_combined", "matches")
+
+    def __init__(self, patterns: Sequence[str], cache_size: int = CACHE_SIZE) -> None:
+        self.patterns = tuple(patterns)
+        self.cache_size = cache_size
+        # ошибка в шаблоне -- re.error, как у одиночного --grep
+        self._regexes = [re.compile(p) for p in self.patterns]
+        self._combined = _combine(self.patterns)
+        self.matches = lru_cache(maxsize=cache_size)(self._matches)
+
+    def __reduce__(self) -> tuple[type, tuple[object, ...]]:
+        return GrepSet, (self.patterns, self.cache_size)
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def __call__(self, path: str) -> bool:
+        if self._combined is not None:
+            return self._combined.search(path) is not None
+        return any(regex.search(path) for regex in self._regexes)
+
+    def _matches(self, path: str) -> tuple[int, ...]:
+        # номера подошедших шаблонов
+        if self._combined is not None and not self._combined.search(path):
+            return ()
+        return tuple(i for i, r in enumerate(self._regexes) if r.search(path))
+
+
+@lru_cache(maxsize=16)
+def _grep_set(patterns: tuple[str, ...]) -> GrepSet:
+    return GrepSet(patterns)
+
+
+def grep_set(grep: Optional[Grep]) -> Optional[GrepSet]:
+    # один объект на набор шаблонов: фильтр и счётчики делят кэш matches
+    patterns = grep_patterns(grep)
+    return _grep_set(patterns) if patterns else None
+
+
+def read_grep_file(path: str) -> list[str]:
+    # шаблон на строку; пустые строки и строки с "#" в начале пропускаются
+    with open(path, encoding="utf-8") as f:
+        lines = (line.rstrip("\r\n") for line in f)
+        return [line for line in lines if line.strip() and not line.startswith("#")]
@@ -0,0 +1,155 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from operator import attrgetter
+from typing import Any, Callable, Hashable, Optional
+from .model import LogEntry
+from .sketch import QuantileSketch
+from .templates import PathTemplater
+
+# stats --group-by/--bucket: счёт и времена ответа по группам и интервалам
+# времени за тот же проход, что и общие агрегаты. Ячейка на пару
+# (начало интервала, значения измерений) заводится при первой записи и
+# дальше только пополняется (хэш-агрегация); времена ответа в ячейке --
+# скетчем, так что память зависит от числа ячеек, а не записей.
+DIMENSIONS = ("status", "method", "path", "path_template", "ip")
+
+Key = tuple[Hashable, ...]
+
+
+def parse_group_by(spec: str) -> tuple[str, ...]:
+    # "status,method" -> ("status", "method"); повторы убираются
+    dims = tuple(dict.fromkeys(d.strip() for d in spec.split(",") if d.strip()))
+    unknown = [d for d in dims if d not in DIMENSIONS]
+    if unknown or not dims:
+        raise ValueError(
+            f"unknown dimension {', '.join(unknown) or spec!r}, "
+            f"expected some of: {', '.join(DIMENSIONS)}"
+        )
+    return dims
+
+
+@dataclass(frozen=True)
+class GroupBy:
+    dims: tuple[str, ...] = ()
+    bucket_s: Optional[int] = None  # None -- без разбивки по времени
+    # правила для path_template; None -- стандартные
+    rules: Optional[tuple[tuple[str, str], ...]] = None
+
+
+class _Cell:
+    __slots__ = ("count", "rt")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.rt = QuantileSketch()
+
+
+def _template_of(templater: PathTemplater) -> Callable[[LogEntry], Hashable]:
+    return lambda e: templater(e.path)
+
+
+def _key_func(spec: GroupBy) -> Callable[[LogEntry], Key]:
+    getters: list[Callable[[LogEntry], Hashable]] = []
+    for dim in spec.dims:
+        if dim == "path_template":
+            templater = PathTemplater(spec.rules) if spec.rules else PathTemplater()
+            getters.append(_template_of(templater))
+        else:
+            getters.append(attrgetter(dim))
+    if not getters:
+        return lambda e: ()  # только --bucket
+    if len(getters) == 1:
+        (get,) = getters
+        return lambda e: (get(e),)
+    return lambda e: tuple(get(e) for get in getters)
+
+
+class GroupedSeries:
+    # Замыкания не пиклятся: в процессы --jobs и обратно едут spec и ячейки
+    def __init__(self, spec: GroupBy) -> None:
+        self.spec = spec
+        self.cells: dict[tuple[Optional[int], Key], _Cell] = {}
+        self._key = _key_func(spec)
+        self._last_ts: Optional[datetime] = None
+        self._last_bucket: Optional[int] = None
+
+    def __reduce__(self) -> tuple[Callable[..., GroupedSeries], tuple[dict[str, Any]]]:
+        return GroupedSeries.from_dict, (self.to_dict(),)
+
+    def add(self, e: LogEntry) -> None:
+        bucket_s = self.spec.bucket_s
+        if bucket_s is not None and e.ts is not self._last_ts:
+            # записи одной секунды делят datetime
+            self._last_ts = e.ts
+            self._last_bucket = int(e.ts.timestamp()) // bucket_s * bucket_s
+        key = (self._last_bucket, self._key(e))
+        cell = self.cells.get(key)
+        if cell is None:
+            cell = self.cells[key] = _Cell()
+        cell.count += 1
+        if e.request_time_s is not None:
+            cell.rt.add(e.request_time_s * 1000.0)
+
+    def merge(self, other: GroupedSeries) -> GroupedSeries:
+        for key, part in other.cells.items():
+            cell = self.cells.get(key)
+            if cell is None:
+                cell = self.cells[key] = _Cell()
+            cell.count += part.count
+            cell.rt.merge(part.rt)
+        return self
+
+    def rows(self) -> list[dict[str, object]]:
+        # по времени, внутри интервала -- по убыванию счёта
+        items = sorted(
+            self.cells.items(),
+            key=lambda kv: (kv[0][0] or 0, -kv[1].count, tuple(map(str, kv[0][1]))),
+        )
+        rows = []
+        for (bucket, key), cell in items:
+            row: dict[str, object] = {}
+            if bucket is not None:
+                row["bucket"] = datetime.fromtimestamp(bucket, timezone.utc).isoformat()
+            row.update(zip(self.spec.dims, key))
+            row["count"] = cell.count
+            row["rt_avg_ms"] = cell.rt.mean()
+            row["rt_p95_ms"] = cell.rt.quantile(0.95)
+            row["rt_p99_ms"] = cell.rt.quantile(0.99)
+            rows.append(row)
+        return rows
+
+    def to_dict(self) -> dict[str, Any]:
+        # для JSON (stats --state)
+        return {
+            "dims": list(self.spec.dims),
+            "bucket_s": self.spec.bucket_s,
+            "rules": (
+                None if self.spec.rules is None else [list(r) for r in self.spec.rules]
+            ),
+            "cells": [
+                [bucket, list(key), cell.count, cell.rt.to_dict()]
+                for (bucket, key), cell in self.cells.items()
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> GroupedSeries:
+        series = cls(_spec(data))
+        series._load_cells(data["cells"])
+        return series
+
+    def _load_cells(self, cells: list[Any]) -> None:
+        for bucket, key, count, rt in cells:
+            cell = self.cells[(bucket, tuple(key))] = _Cell()
+            cell.count = count
+            cell.rt = QuantileSketch.from_dict(rt)
+
+
+def _spec(data: dict[str, Any]) -> GroupBy:
+    rules = data["rules"]
+    return GroupBy(
+        tuple(data["dims"]),
+        data["bucket_s"],
+        None if rules is None else tuple(tuple(r) for r in rules),
+    )
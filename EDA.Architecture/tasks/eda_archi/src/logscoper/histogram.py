@@ -0,0 +1,100 @@
+from __future__ import annotations
+from array import array
+from collections import Counter
+from typing import Iterable, Iterator, Optional
+
+# hist: счётчики корзин в array по номеру корзины, без строк на каждое
+# значение. Номер считается от q = rt // bucket_ms:
+# - fixed: номер = q, корзины по bucket_ms;
+# - log-linear (HDR, sub_bits задан): первые 2 * 2**sub_bits корзин -- по
+#   одному q, дальше на каждое удвоение q -- 2**sub_bits корзин вдвое шире
+#   предыдущих. Ширина корзины -- не больше 1/2**sub_bits от её начала, а
+#   число корзин растёт как логарифм от максимума, а не линейно.
+# Подписи "от-до" строятся только при выводе. Гистограммы с одной разметкой
+# складываются (merge) -- по файлам и процессам --jobs.
+HDR_SUB_BITS = 4
+# дальше массива номера идут в словарь: одно огромное время ответа при
+# fixed-корзинах не должно раздувать массив
+DENSE_LIMIT = 1 << 20
+
+
+class LatencyHistogram:
+    __slots__ = ("bucket_ms", "sub_bits", "counts", "overflow")
+
+    def __init__(self, bucket_ms: int = 100, sub_bits: Optional[int] = None) -> None:
+        if bucket_ms <= 0:
+            raise ValueError(f"bucket width must be > 0, got {bucket_ms}")
+        if sub_bits is not None and not 0 <= sub_bits <= 16:
+            raise ValueError(f"sub-bucket bits must be in 0..16, got {sub_bits}")
+        self.bucket_ms = bucket_ms
+        self.sub_bits = sub_bits
+        self.counts = array("q")
+        self.overflow: dict[int, int] = {}
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts) + sum(self.overflow.values())
+
+    def __bool__(self) -> bool:
+        return any(self.counts) or bool(self.overflow)
+
+    def index(self, q: int) -> int:
+        # номер корзины по q = rt // bucket_ms
+        if self.sub_bits is None:
+            return q
+        shift = max(0, q.bit_length() - self.sub_bits - 1)
+        return (shift << self.sub_bits) + (q >> shift)
+
+    def bounds(self, i: int) -> tuple[int, int]:
+        # корзина i в мс: [от, до)
+        if self.sub_bits is None:
+            lo, width = i, 1
+        else:
+            shift = max(0, (i >> self.sub_bits) - 1)
+            lo, width = (i - (shift << self.sub_bits)) << shift, 1 << shift
+        return lo * self.bucket_ms, (lo + width) * self.bucket_ms
+
+    def update(self, values_ms: Iterable[float]) -> LatencyHistogram:
+        # частные считаются и подсчитываются в Counter на уровне C; номер
+        # корзины и сложение в массив -- по разу на частное, а не на значение
+        quotients = map(int, map(float(self.bucket_ms).__rfloordiv__, values_ms))
+        for q, n in Counter(quotients).items():
+            self.add_index(self.index(q), n)
+        return self
+
+    def add_index(self, i: int, n: int = 1) -> None:
+        counts = self.counts
+        if i < len(counts):
+            counts[i] += n
+        elif i < DENSE_LIMIT:
+            counts.frombytes(bytes(counts.itemsize * (i + 1 - len(counts))))
+            counts[i] += n
+        else:
+            self.overflow[i] = self.overflow.get(i, 0) + n
+
+    def merge(self, other: LatencyHistogram) -> LatencyHistogram:
+        if (other.bucket_ms, other.sub_bits) != (self.bucket_ms, self.sub_bits):
+            raise ValueError("cannot merge histograms with different buckets")
+        counts = self.counts
+        if len(other.counts) > len(counts):
+            counts.frombytes(bytes(counts.itemsize * (len(other.counts) - len(counts))))
+        for i, n in enumerate(other.counts):
+            if n:
+                counts[i] += n
+        for i, n in other.overflow.items():
+            self.overflow[i] = self.overflow.get(i, 0) + n
+        return self
+
+    def items(self) -> Iterator[tuple[int, int]]:
+        # (номер, счёт) непустых корзин по возрастанию
+        for i, n in enumerate(self.counts):
+            if n:
+                yield i, n
+        yield from sorted(self.overflow.items())
+
+    def labels(self) -> dict[str, int]:
+        buckets: dict[str, int] = {}
+        for i, n in self.items():
+            lo, hi = self.bounds(i)
+            buckets[f"{lo}-{hi}"] = n
+        return buckets
@@ -0,0 +1,114 @@
+from __future__ import annotations
+import re
+from functools import lru_cache
+from typing import Any, Iterable, Iterator, Optional
+from .grep import Grep, grep_patterns
+
+# Разбор регулярки -- внутренний парсер re (до 3.11 -- sre_parse). Это не
+# публичный API: если его устройство в другой версии CPython не совпадёт с
+# ожидаемым, grep_literals отвечает None и префильтр просто выключается.
+try:
+    from re import _constants as _sre, _parser as _sre_parse  # type: ignore[attr-defined]
+except ImportError:  # Python < 3.11
+    import sre_constants as _sre
+    import sre_parse as _sre_parse
+
+# Префильтр --grep по сырой строке. Путь записи -- подстрока строки лога,
+# так что если каждое совпадение регулярки содержит одну из подстрок
+# literals, строку без них можно не разбирать: regex.search(path) на ней
+# заведомо ложен. Сама регулярка после разбора проверяется как раньше.
+#
+# Требование к последовательности -- лучшее из требований её частей:
+# подряд идущих литералов, групп, альтернатив (объединение требований
+# всех веток) и повторов с min >= 1. Где вывести нельзя (классы символов,
+# (?i), необязательные части) -- требования нет, строки идут как есть.
+_REPEATS = {_sre.MAX_REPEAT, _sre.MIN_REPEAT}
+if hasattr(_sre, "POSSESSIVE_REPEAT"):
+    _REPEATS.add(_sre.POSSESSIVE_REPEAT)
+
+Requirement = frozenset[str]
+
+
+def _better(
+    a: Optional[Requirement], b: Optional[Requirement]
+) -> Optional[Requirement]:
+    # лучше то, чья самая короткая подстрока длиннее, затем -- где их меньше
+    if a is None or b is None:
+        return a if b is None else b
+    return max(a, b, key=lambda r: (min(map(len, r)), -len(r)))
+
+
+def _requirement(items: Iterable[tuple[Any, Any]]) -> Optional[Requirement]:
+    best: Optional[Requirement] = None
+    run: list[str] = []
+    for op, av in items:
+        if op == _sre.LITERAL:
+            run.append(chr(av))
+            continue
+        if run:
+            best = _better(best, frozenset(["".join(run)]))
+            run = []
+        if op == _sre.SUBPATTERN:
+            _, add_flags, _, sub = av
+            if not add_flags & re.IGNORECASE:
+                best = _better(best, _requirement(sub))
+        elif op == _sre.BRANCH:
+            branches = [_requirement(branch) for branch in av[1]]
+            known = [r for r in branches if r]
+            if len(known) == len(branches):
+                best = _better(best, frozenset().union(*known))
+        elif op in _REPEATS:
+            lo, _, sub = av
+            if lo >= 1:
+                best = _better(best, _requirement(sub))
+    if run:
+        best = _better(best, frozenset(["".join(run)]))
+    return best
+
+
+@lru_cache(maxsize=16)
+def grep_literals(pattern: str) -> Optional[tuple[str, ...]]:
+    # Подстроки, одна из которых есть в любом совпадении pattern; None --
+    # вывести не удалось. Неверную регулярку оставляем re.compile в фильтре.
+    try:
+        parsed = _sre_parse.parse(pattern)
+        if parsed.state.flags & re.IGNORECASE:
+            return None
+        required = _requirement(parsed)
+    except re.error:
+        return None
+    except (AttributeError, TypeError, ValueError):
+        return None  # парсер re устроен иначе, чем ожидается
+    if not required or "" in required:
+        return None
+    return tuple(sorted(required))
+
+
+@lru_cache(maxsize=16)
+def _set_literals(patterns: tuple[str, ...]) -> Optional[tuple[str, ...]]:
+    # несколько --grep: строка нужна, если в ней подстрока любого шаблона
+    literals: set[str] = set()
+    for pattern in patterns:
+        own = grep_literals(pattern)
+        if own is None:
+            return None
+        literals.update(own)
+    return tuple(sorted(literals)) if literals else None
+
+
+def grep_prefilter(lines: Iterable[str], grep: Optional[Grep]) -> Iterable[str]:
+    literals = _set_literals(grep_patterns(grep))
+    if literals is None:
+        return lines
+    if len(literals) == 1:
+        (literal,) = literals
+        return (line for line in lines if literal in line)
+    return _any_literal(lines, literals)
+
+
+def _any_literal(lines: Iterable[str], literals: tuple[str, ...]) -> Iterator[str]:
+    for line in lines:
+        for literal in literals:
+            if literal in line:
+                yield line
+                break
@@ -0,0 +1,120 @@
+from __future__ import annotations
+import asyncio
+import json
+import random
+import time
+import urllib.request
+from typing import Any, Optional
+
+# Нагрузка для serve по loopback: строки в формате access-лога уходят в
+# TCP/unix (запись с drain -- отправитель чувствует обратное давление
+# сервера) или UDP. С http -- ещё и время, за которое сервер всё разобрал.
+PATHS = ["/", "/login", "/api/items", "/api/users/{}", "/static/app.js"]
+CHUNK_LINES = 500
+
+
+def sample_lines(n: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    lines = []
+    for i in range(n):
+        path = rng.choice(PATHS).format(rng.randrange(1000))
+        status = rng.choices((200, 301, 404, 500), (90, 3, 5, 2))[0]
+        lines.append(
+            f"10.0.{i % 256}.{rng.randrange(256)} - - "
+            f"[10/Oct/2000:13:{i // 60 % 60:02d}:{i % 60:02d} +0000] "
+            f'"GET {path} HTTP/1.1" {status} {rng.randrange(10000)} "-" "load" '
+            f"{rng.expovariate(20):.3f}"
+        )
+    return lines
+
+
+def _chunks(lines: list[str], connections: int) -> list[list[bytes]]:
+    # строки по соединениям, в каждом -- блоки по CHUNK_LINES строк
+    chunks = []
+    for i in range(connections):
+        part = lines[i::connections]
+        blocks = []
+        for start in range(0, len(part), CHUNK_LINES):
+            end = start + CHUNK_LINES
+            blocks.append("".join(f"{line}\n" for line in part[start:end]).encode())
+        chunks.append(blocks)
+    return chunks
+
+
+async def _send_stream(
+    chunks: list[bytes], tcp: Optional[tuple[str, int]], unix: Optional[str]
+) -> None:
+    if unix is not None:
+        _, writer = await asyncio.open_unix_connection(unix)
+    else:
+        assert tcp is not None
+        _, writer = await asyncio.open_connection(*tcp)
+    for chunk in chunks:
+        writer.write(chunk)
+        await writer.drain()
+    writer.close()
+    await writer.wait_closed()
+
+
+async def _send_udp(lines: list[str], udp: tuple[str, int]) -> None:
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(
+        asyncio.DatagramProtocol, remote_addr=udp
+    )
+    try:
+        for i, line in enumerate(lines):
+            transport.sendto(line.encode())
+            if i % 256 == 255:
+                await asyncio.sleep(0)  # не забивать буфер сокета одним рывком
+    finally:
+        transport.close()
+
+
+def _fetch_stats(http: str, sync: bool = False) -> dict[str, Any]:
+    url = f"{http.rstrip('/')}/stats?top=0{'&sync=1' if sync else ''}"
+    with urllib.request.urlopen(url, timeout=60) as response:
+        return json.load(response)
+
+
+async def run_loadgen(
+    lines: list[str],
+    tcp: Optional[tuple[str, int]] = None,
+    udp: Optional[tuple[str, int]] = None,
+    unix: Optional[str] = None,
+    connections: int = 1,
+    http: Optional[str] = None,
+) -> dict[str, Any]:
+    before = None
+    if http:
+        before = await asyncio.to_thread(_fetch_stats, http)
+    start = time.perf_counter()
+    if udp is not None:
+        await asyncio.gather(
+            *(_send_udp(lines[i::connections], udp) for i in range(connections))
+        )
+    else:
+        chunks = _chunks(lines, connections)
+        await asyncio.gather(*(_send_stream(part, tcp, unix) for part in chunks))
+    sent_s = time.perf_counter() - start
+    result: dict[str, Any] = {
+        "lines": len(lines),
+        "send_s": sent_s,
+        "send_lines_per_s": len(lines) / sent_s if sent_s else None,
+    }
+    if http and before is not None:
+        if udp is not None:
+            await asyncio.sleep(0.5)  # датаграммы могут ещё лежать в буфере сокета
+        after = await asyncio.to_thread(_fetch_stats, http, True)
+        ingest_s = time.perf_counter() - start
+        received = after["ingest"]["received"] - before["ingest"]["received"]
+        result.update(
+            ingest_s=ingest_s,
+            ingest_lines_per_s=received / ingest_s if ingest_s else None,
+            received=received,
+            # UDP: lost -- не дошли до сервера (переполнен буфер сокета),
+            # dropped -- дошли, но очередь сервера была полна
+            lost=len(lines) - received,
+            dropped=after["ingest"]["dropped"] - before["ingest"]["dropped"],
+            total=after["total"] - before["total"],
+        )
+    return result
@@ -1,10 +1,12 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from datetime import datetime
-from typing import Optional
+import math
+from array import array
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, Optional, Self
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class LogEntry:
     ip: str
     ts: datetime
@@ -13,3 +15,119 @@ class LogEntry:
     status: int
     bytes_sent: Optional[int]
     request_time_s: Optional[float]
+
+
+NO_BYTES = -(2**63)  # bytes_sent = None
+# request_time_s = None хранится как NaN: в логе rt всегда \d+\.\d+
+
+
+POOL_LIMIT = 1 << 16
+
+
+class StringPool:
+    # Словарь повторяющихся строк: intern отдаёт один объект str на все равные
+    # строки (хэш у него уже посчитан, сравнение в Counter -- по id), code --
+    # номер строки в values. intern перестаёт запоминать новые строки после
+    # limit, чтобы уникальные пути (с id внутри) не копились без конца.
+    __slots__ = ("values", "index", "limit")
+
+    def __init__(self, limit: Optional[int] = POOL_LIMIT) -> None:
+        self.values: list[str] = []
+        self.index: dict[str, int] = {}
+        self.limit = limit
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def code(self, value: str) -> int:
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def intern(self, value: str) -> str:
+        code = self.index.get(value)
+        if code is not None:
+            return self.values[code]
+        if self.limit is not None and len(self.values) >= self.limit:
+            return value
+        return self.values[self.code(value)]
+
+
+@dataclass
+class StringColumn:
+    # codes -- номера строк в pool; limit не нужен: столбцу нужны все строки
+    pool: StringPool = field(default_factory=lambda: StringPool(limit=None))
+    codes: array[int] = field(default_factory=lambda: array("I"))
+
+    @property
+    def values(self) -> list[str]:
+        return self.pool.values
+
+    def add(self, value: str) -> None:
+        self.codes.append(self.pool.code(value))
+
+
+@dataclass
+class LogBatch:
+    # Записи столбцами: ts -- секунды epoch (UTC), status -- uint16,
+    # bytes_sent -- int64 (NO_BYTES для "-"), rt -- float64 (NaN, если нет).
+    # float32 для rt не годится: 0.12 вернулось бы как 0.11999999731779099.
+    # Строки хранятся словарём: уникальные значения + номера в нём, так что
+    # запись занимает ~50 байт против ~150 у LogEntry.
+    # batch[i] и итерация отдают такие же LogEntry, как исходные.
+    ts: array[int] = field(default_factory=lambda: array("q"))
+    status: array[int] = field(default_factory=lambda: array("H"))
+    bytes_sent: array[int] = field(default_factory=lambda: array("q"))
+    rt: array[float] = field(default_factory=lambda: array("d"))
+    ip: StringColumn = field(default_factory=StringColumn)
+    method: StringColumn = field(default_factory=StringColumn)
+    path: StringColumn = field(default_factory=StringColumn)
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def append(self, e: LogEntry) -> None:
+        # OverflowError, если bytes_sent не влезает в int64
+        bytes_sent = NO_BYTES if e.bytes_sent is None else e.bytes_sent
+        rt = math.nan if e.request_time_s is None else e.request_time_s
+        self.bytes_sent.append(bytes_sent)
+        self.ts.append(int(e.ts.timestamp()))
+        self.status.append(e.status)
+        self.rt.append(rt)
+        self.ip.add(e.ip)
+        self.method.add(e.method)
+        self.path.add(e.path)
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[LogEntry]) -> Self:
+        batch = cls()
+        for e in entries:
+            batch.append(e)
+        return batch
+
+    def _entry(self, i: int, ts: datetime) -> LogEntry:
+        b = self.bytes_sent[i]
+        rt = self.rt[i]
+        return LogEntry(
+            ip=self.ip.values[self.ip.codes[i]],
+            ts=ts,
+            method=self.method.values[self.method.codes[i]],
+            path=self.path.values[self.path.codes[i]],
+            status=self.status[i],
+            bytes_sent=None if b == NO_BYTES else b,
+            request_time_s=None if math.isnan(rt) else rt,
+        )
+
+    def __getitem__(self, i: int) -> LogEntry:
+        return self._entry(i, datetime.fromtimestamp(self.ts[i], timezone.utc))
+
+    def __iter__(self) -> Iterator[LogEntry]:
+        # строки одной секунды делят один datetime, как после _parse_ts
+        datetimes: dict[int, datetime] = {}
+        for i, epoch in enumerate(self.ts):
+            ts = datetimes.get(epoch)
+            if ts is None:
+                ts = datetimes[epoch] = datetime.fromtimestamp(epoch, timezone.utc)
+            yield self._entry(i, ts)
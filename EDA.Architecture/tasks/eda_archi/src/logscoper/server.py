@@ -0,0 +1,294 @@
+from __future__ import annotations
+import asyncio
+import importlib
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from types import ModuleType
+from typing import Any, Iterable, Optional
+from .cli import StatsAccumulator, accumulate, apply_filters, parse_line
+from .grep import Grep
+from .templates import PathTemplater
+
+web: Optional[ModuleType]
+try:
+    web = importlib.import_module("aiohttp.web")
+except ImportError:  # aiohttp -- необязательная зависимость, нужна только serve
+    web = None
+
+
+def require_aiohttp() -> ModuleType:
+    if web is None:
+        raise ImportError("serve needs 'aiohttp' installed", name="aiohttp")
+    return web
+
+
+BATCH_SIZE = 1000
+QUEUE_SIZE = 64  # пакетов
+FLUSH_INTERVAL = 0.2  # с, неполный пакет уходит на разбор не позже
+LINE_LIMIT = 1 << 20
+
+# nginx с access_log syslog:server=... шлёт "<190>Oct 10 13:55:36 host nginx: "
+# перед строкой; у голого "<PRI>" заголовок короче
+_SYSLOG_RE = re.compile(
+    r"<\d{1,3}>(?:[A-Z][a-z]{2} [ \d]\d \d\d:\d\d:\d\d \S+ [^\s:\[]+(?:\[\d+\])?: )?"
+)
+
+
+def strip_syslog(line: str) -> str:
+    m = _SYSLOG_RE.match(line)
+    if m is None:
+        return line
+    end = m.end()
+    return line[end:]
+
+
+def parse_batch(
+    lines: list[str],
+    status: Optional[str],
+    grep: Optional[Grep],
+    approx_top: Optional[int],
+    templater: Optional[PathTemplater],
+) -> StatsAccumulator:
+    # Выполняется в пуле: разбор и агрегат пакета, назад едет только агрегат.
+    # Времена ответа -- скетчем: сервер живёт долго, список рос бы без конца.
+    entries = (e for e in map(parse_line, map(strip_syslog, lines)) if e is not None)
+    filtered = apply_filters(entries, status=status, grep=grep, templater=templater)
+    return accumulate(filtered, True, approx_top, grep)
+
+
+def parse_address(text: str) -> tuple[str, int]:
+    host, sep, port = text.rpartition(":")
+    if not sep or not port.isdigit():
+        raise ValueError(f"expected HOST:PORT, got {text!r}")
+    return host or "127.0.0.1", int(port)
+
+
+@dataclass
+class IngestCounters:
+    received: int = 0  # строк принято от источников
+    dropped: int = 0  # строк UDP, выброшенных при полной очереди
+    batches: int = 0  # пакетов разобрано
+
+
+class Ingestor:
+    # Приём строк от многих источников. Строки собираются в пакеты по
+    # batch_size и идут в очередь на queue_size пакетов; jobs обработчиков
+    # отдают пакеты на разбор в пул процессов и сливают агрегаты в один.
+    #
+    # Полная очередь -- обратное давление: потоковый источник (TCP, unix)
+    # ждёт места и не читает сокет, так что отправитель упирается в буфер
+    # ядра. UDP ждать не может, его строки при полной очереди отбрасываются
+    # и считаются в counters.dropped.
+    def __init__(
+        self,
+        jobs: int = 1,
+        batch_size: int = BATCH_SIZE,
+        queue_size: int = QUEUE_SIZE,
+        status: Optional[str] = None,
+        grep: Optional[Grep] = None,
+        approx_top: Optional[int] = None,
+        templater: Optional[PathTemplater] = None,
+        flush_interval: float = FLUSH_INTERVAL,
+    ) -> None:
+        self.jobs = max(1, jobs)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: asyncio.Queue[list[str]] = asyncio.Queue(queue_size)
+        self.acc = accumulate((), True, approx_top, grep)
+        self.counters = IngestCounters()
+        self._filters = (status, grep, approx_top, templater)
+        self._datagrams: list[str] = []
+        self._tasks: list[asyncio.Task[None]] = []
+        # jobs=1 -- разбор в потоке, чтобы не держать цикл событий
+        self._pool = ProcessPoolExecutor(self.jobs) if self.jobs > 1 else None
+
+    async def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.jobs)]
+        self._tasks.append(asyncio.create_task(self._flush_datagrams()))
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+
+    async def put(self, lines: list[str]) -> None:
+        self.counters.received += len(lines)
+        await self.queue.put(lines)
+
+    def offer(self, lines: Iterable[str]) -> None:
+        # строки UDP: копятся до пакета, в очередь -- без ожидания
+        self._datagrams.extend(lines)
+        if len(self._datagrams) >= self.batch_size:
+            self._offer_datagrams()
+
+    def _offer_datagrams(self) -> None:
+        lines, self._datagrams = self._datagrams, []
+        self.counters.received += len(lines)
+        try:
+            self.queue.put_nowait(lines)
+        except asyncio.QueueFull:
+            self.counters.dropped += len(lines)
+
+    async def _flush_datagrams(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self._datagrams:
+                self._offer_datagrams()
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            lines = await self.queue.get()
+            try:
+                part = await loop.run_in_executor(
+                    self._pool, parse_batch, lines, *self._filters
+                )
+                self.acc.merge(part)
+                self.counters.batches += 1
+            finally:
+                self.queue.task_done()
+
+    async def drain(self) -> None:
+        # дождаться разбора всего принятого
+        if self._datagrams:
+            self._offer_datagrams()
+        await self.queue.join()
+
+    async def handle_stream(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        # строки потока по \n; неполный пакет уходит по паузе в потоке
+        lines: list[str] = []
+        try:
+            while True:
+                try:
+                    if lines:
+                        raw = await asyncio.wait_for(
+                            reader.readline(), self.flush_interval
+                        )
+                    else:
+                        raw = await reader.readline()
+                except asyncio.TimeoutError:
+                    await self.put(lines)
+                    lines = []
+                    continue
+                except ValueError:
+                    continue  # строка длиннее LINE_LIMIT уже выброшена
+                if not raw:
+                    break
+                line = raw.decode("utf-8", errors="ignore").rstrip("\r\n")
+                if line:
+                    lines.append(line)
+                if len(lines) >= self.batch_size:
+                    await self.put(lines)
+                    lines = []
+            if lines:
+                await self.put(lines)
+        finally:
+            writer.close()
+
+    def snapshot(self, top: int = 10) -> dict[str, Any]:
+        data = self.acc.result(top)
+        data["ingest"] = {**asdict(self.counters), "queued": self.queue.qsize()}
+        return data
+
+
+class _DatagramIngest(asyncio.DatagramProtocol):
+    def __init__(self, ingestor: Ingestor) -> None:
+        self.ingestor = ingestor
+
+    def datagram_received(self, data: bytes, addr: Any) -> None:
+        text = data.decode("utf-8", errors="ignore")
+        self.ingestor.offer(line for line in text.splitlines() if line)
+
+
+def make_app(ingestor: Ingestor) -> Any:
+    web = require_aiohttp()
+
+    async def stats(request: Any) -> Any:
+        # GET /stats?top=N[&sync=1]: агрегат как у stats --json и счётчики
+        # приёма; sync=1 -- сначала дождаться разбора всего принятого
+        top = request.query.get("top", "10")
+        if not top.isdigit():
+            raise web.HTTPBadRequest(text="top must be a non-negative integer")
+        if request.query.get("sync") in ("1", "true"):
+            await ingestor.drain()
+        return web.json_response(ingestor.snapshot(int(top)))
+
+    async def health(request: Any) -> Any:
+        return web.Response(text="ok")
+
+    app = web.Application()
+    app.router.add_get("/stats", stats)
+    app.router.add_get("/health", health)
+    return app
+
+
+class IngestServer:
+    # Источники (udp/tcp -- (host, port), unix -- путь сокета) и HTTP с
+    # агрегатами поверх одного Ingestor. Порт 0 -- любой свободный, реальные
+    # адреса после start() в addresses.
+    def __init__(
+        self,
+        ingestor: Ingestor,
+        http: tuple[str, int],
+        udp: Optional[tuple[str, int]] = None,
+        tcp: Optional[tuple[str, int]] = None,
+        unix: Optional[str] = None,
+    ) -> None:
+        require_aiohttp()
+        self.ingestor = ingestor
+        self.http, self.udp, self.tcp, self.unix = http, udp, tcp, unix
+        self.addresses: dict[str, Any] = {}
+        self._closers: list[Any] = []
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        await self.ingestor.start()
+        self._closers.append(self.ingestor.close)
+        if self.udp:
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: _DatagramIngest(self.ingestor), local_addr=self.udp
+            )
+            self._closers.append(transport.close)
+            self.addresses["udp"] = transport.get_extra_info("sockname")[:2]
+        if self.tcp:
+            server = await asyncio.start_server(
+                self.ingestor.handle_stream, *self.tcp, limit=LINE_LIMIT
+            )
+            self._closers.append(server.close)
+            self.addresses["tcp"] = server.sockets[0].getsockname()[:2]
+        if self.unix:
+            server = await asyncio.start_unix_server(
+                self.ingestor.handle_stream, self.unix, limit=LINE_LIMIT
+            )
+            self._closers.append(server.close)
+            self.addresses["unix"] = self.unix
+        web = require_aiohttp()
+        runner = web.AppRunner(make_app(self.ingestor))
+        await runner.setup()
+        self._closers.append(runner.cleanup)
+        site = web.TCPSite(runner, *self.http)
+        await site.start()
+        self.addresses["http"] = runner.addresses[0][:2]
+
+    async def close(self) -> None:
+        for close in reversed(self._closers):
+            result = close()
+            if asyncio.iscoroutine(result):
+                await result
+        self._closers = []
+
+
+async def run_server(server: IngestServer) -> None:
+    await server.start()
+    for name, address in server.addresses.items():
+        where = address if isinstance(address, str) else f"{address[0]}:{address[1]}"
+        print(f"{name}: {where}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
@@ -0,0 +1,46 @@
+from __future__ import annotations
+from functools import lru_cache
+from typing import Optional
+
+# Все коды, которые даёт (?P<status>\d{3})
+CODES = 1000
+
+
+def status_matches(code: int, selector: Optional[str]) -> bool:
+    if selector is None:
+        return True
+    filters = [part.strip().lower() for part in selector.split(",") if part.strip()]
+    for f in filters:
+        if len(f) == 3 and f.endswith("xx") and f[0].isdigit():
+            base = int(f[0]) * 100
+            if base <= code < base + 100:
+                return True
+        else:
+            try:
+                if int(f) == code:
+                    return True
+            except ValueError:
+                continue
+    return False
+
+
+class StatusSelector:
+    # --status, разобранный один раз в таблицу по всем трёхзначным кодам:
+    # проверка записи -- один индекс вместо разбора строки селектора.
+    # table -- bytes из 0/1, codes -- множество подходящих кодов.
+    __slots__ = ("selector", "table", "codes")
+
+    def __init__(self, selector: Optional[str] = None) -> None:
+        self.selector = selector
+        self.table = bytes(status_matches(code, selector) for code in range(CODES))
+        self.codes = frozenset(code for code in range(CODES) if self.table[code])
+
+    def __contains__(self, code: int) -> bool:
+        if 0 <= code < CODES:
+            return self.table[code] == 1
+        return status_matches(code, self.selector)
+
+
+@lru_cache(maxsize=16)
+def status_selector(selector: Optional[str]) -> StatusSelector:
+    return StatusSelector(selector)
@@ -0,0 +1,63 @@
+from __future__ import annotations
+import re
+from functools import lru_cache
+from typing import Sequence
+from .model import StringPool
+
+# (регулярка на сегмент пути целиком, заглушка); проверяются по порядку
+DEFAULT_RULES: tuple[tuple[str, str], ...] = (
+    (
+        r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}",
+        "{uuid}",
+    ),
+    (r"\d+", "{id}"),
+    (r"(?=[a-fA-F]*\d)[0-9a-fA-F]{8,}", "{hex}"),
+)
+CACHE_SIZE = 1 << 16
+
+
+def parse_rule(text: str) -> tuple[str, str]:
+    # "REGEX=PLACEHOLDER"; "=" внутри регулярки допустим, делим по последнему
+    pattern, sep, placeholder = text.rpartition("=")
+    if not sep or not pattern:
+        raise ValueError(f"expected REGEX=PLACEHOLDER, got {text!r}")
+    re.compile(pattern)
+    return pattern, placeholder
+
+
+class PathTemplater:
+    # Шаблон пути для группировки: query и fragment отрезаются, сегменты,
+    # целиком подходящие под правило, заменяются заглушкой:
+    # /users/123/orders?page=2 -> /users/{id}/orders. Сырой путь -> шаблон
+    # кэшируется (LRU), равные шаблоны делят один объект str. Неизменённый
+    # путь возвращается как есть. В процессы --jobs передаются только правила.
+    __slots__ = ("rules", "cache_size", "_compiled", "_templates", "template")
+
+    def __init__(
+        self,
+        rules: Sequence[tuple[str, str]] = DEFAULT_RULES,
+        cache_size: int = CACHE_SIZE,
+    ) -> None:
+        self.rules = tuple(rules)
+        self.cache_size = cache_size
+        self._compiled = [(re.compile(p), ph) for p, ph in self.rules]
+        self._templates = StringPool()
+        self.template = lru_cache(maxsize=cache_size)(self._template)
+
+    def __reduce__(self) -> tuple[type, tuple[object, ...]]:
+        return PathTemplater, (self.rules, self.cache_size)
+
+    def __call__(self, path: str) -> str:
+        return self.template(path)
+
+    def _segment(self, segment: str) -> str:
+        if segment:
+            for regex, placeholder in self._compiled:
+                if regex.fullmatch(segment):
+                    return placeholder
+        return segment
+
+    def _template(self, path: str) -> str:
+        base = path.partition("?")[0].partition("#")[0]
+        result = "/".join(map(self._segment, base.split("/")))
+        return path if result == path else self._templates.intern(result)
@@ -0,0 +1,392 @@
+from __future__ import annotations
+import os
+import random
+import time
+import pytest
+from datetime import datetime, timedelta, timezone
+from src.logscoper.cli import (
+    _iter_entries,
+    _iter_indexed_entries,
+    _line_fields,
+    _parse_ts,
+    _regex_fields,
+    apply_filters,
+    cast_to_aggregate,
+    parse_line,
+)
+
+# размер бенчмарка можно поднять: LOGSCOPER_BENCH_LINES=1000000 pytest -s tests/test_bench.py
+BENCH_LINES = int(os.environ.get("LOGSCOPER_BENCH_LINES", "20000"))
+
+
+def make_lines(n: int, seed: int = 0) -> list[str]:
+    rnd = random.Random(seed)
+    base = datetime(2000, 10, 10, 10, 0, 0)
+    paths = [
+        "/",
+        "/api/v1/users/12345/orders?include=items&page=2",
+        "/login",
+        "/static/app.js",
+    ]
+    agent = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+    lines = []
+    for i in range(n):
+        ts = (base + timedelta(seconds=i // 50)).strftime("%d/%b/%Y:%H:%M:%S +0000")
+        tail = rnd.choice(
+            [
+                f' "https://example.com/" "{agent}" 0.120',
+                f' "-" "{agent}" rt=0.250',
+                ' "-" "UA"',
+                " 0.5",
+                "",
+            ]
+        )
+        lines.append(
+            f'10.0.{i % 7}.{i % 255} - - [{ts}] "{rnd.choice(["GET", "POST"])} {rnd.choice(paths)} HTTP/1.1" '
+            f"{rnd.choice([200, 201, 302, 404, 500])} {rnd.choice(['-', '512', '0'])}{tail}"
+        )
+    return lines
+
+
+def _lines_per_sec(func, lines: list[str]) -> tuple[list, float]:
+    start = time.perf_counter()
+    out = [func(line) for line in lines]
+    return out, len(lines) / (time.perf_counter() - start)
+
+
+def test_bench_tokenizer_vs_regex():
+    lines = make_lines(BENCH_LINES)
+    regex_out, regex_lps = _lines_per_sec(_regex_fields, lines)
+    fast_out, fast_lps = _lines_per_sec(_line_fields, lines)
+    print(f"\nregex: {regex_lps:,.0f} lines/s, tokenizer: {fast_lps:,.0f} lines/s")
+    assert fast_out == regex_out
+
+
+def test_bench_cached_timestamps():
+    raws = [fields[1] for fields in map(_regex_fields, make_lines(BENCH_LINES))]
+    _parse_ts.cache_clear()
+    slow_out, slow_lps = _lines_per_sec(
+        lambda raw: datetime.strptime(raw, "%d/%b/%Y:%H:%M:%S %z").astimezone(
+            timezone.utc
+        ),
+        raws,
+    )
+    fast_out, fast_lps = _lines_per_sec(_parse_ts, raws)
+    print(f"\nstrptime: {slow_lps:,.0f} ts/s, cached: {fast_lps:,.0f} ts/s")
+    assert fast_out == slow_out
+
+
+def test_bench_mmap_prefilter(tmp_path):
+    log = tmp_path / "bench.log"
+    log.write_text("\n".join(make_lines(BENCH_LINES)) + "\n")
+    # make_lines пишет 50 строк в секунду: since отрезает первую половину
+    since = datetime(2000, 10, 10, 10, tzinfo=timezone.utc) + timedelta(
+        seconds=BENCH_LINES // 100
+    )
+    for status, since in (("5xx", None), (None, since)):
+        start = time.perf_counter()
+        full = list(apply_filters(_iter_entries(str(log)), since, None, status))
+        full_lps = BENCH_LINES / (time.perf_counter() - start)
+        start = time.perf_counter()
+        entries = _iter_entries(str(log), since, None, status)
+        scanned = list(apply_filters(entries, since, None, status))
+        scan_lps = BENCH_LINES / (time.perf_counter() - start)
+        print(
+            f"\nstatus={status} since={since}: "
+            f"full parse: {full_lps:,.0f} lines/s, mmap prefilter: {scan_lps:,.0f} lines/s"
+        )
+        assert scanned == full
+
+
+def test_bench_time_index(tmp_path):
+    log = tmp_path / "bench.log"
+    log.write_text("\n".join(make_lines(BENCH_LINES)) + "\n")
+    # окно в 1% файла из середины
+    since = datetime(2000, 10, 10, 10, tzinfo=timezone.utc) + timedelta(
+        seconds=BENCH_LINES // 100
+    )
+    until = since + timedelta(seconds=max(1, BENCH_LINES // 5000))
+    start = time.perf_counter()
+    scanned = list(apply_filters(_iter_entries(str(log), since, until), since, until))
+    scan_s = time.perf_counter() - start
+    start = time.perf_counter()
+    list(_iter_indexed_entries(str(log), since, until))  # сборка индекса
+    build_s = time.perf_counter() - start
+    start = time.perf_counter()
+    entries = _iter_indexed_entries(str(log), since, until)
+    indexed = list(apply_filters(entries, since, until))
+    index_s = time.perf_counter() - start
+    print(
+        f"\nmmap prefilter: {scan_s * 1000:.1f} ms, index build: {build_s * 1000:.1f} ms, "
+        f"indexed query: {index_s * 1000:.1f} ms"
+    )
+    assert indexed == scanned
+
+
+def test_bench_numpy_aggregate():
+    pytest.importorskip("numpy")
+    from src.logscoper.columnar import EntryBatch, aggregate
+
+    entries = [parse_line(line) for line in make_lines(BENCH_LINES)]
+    start = time.perf_counter()
+    expected = cast_to_aggregate(entries)
+    python_s = time.perf_counter() - start
+    start = time.perf_counter()
+    got = aggregate(EntryBatch.from_entries(entries))
+    numpy_s = time.perf_counter() - start
+    print(
+        f"\npython: {python_s * 1000:.1f} ms, numpy (with batch build): {numpy_s * 1000:.1f} ms"
+    )
+    assert got == expected
+
+
+def test_bench_batch_memory():
+    import tracemalloc
+    from dataclasses import dataclass
+    from operator import attrgetter
+    from typing import Optional
+    from src.logscoper.model import LogBatch, LogEntry
+
+    @dataclass(frozen=True)
+    class OriginalLogEntry:
+        # LogEntry до __slots__ и интернирования: свои str и datetime у каждой записи
+        ip: str
+        ts: datetime
+        method: str
+        path: str
+        status: int
+        bytes_sent: Optional[int]
+        request_time_s: Optional[float]
+
+    def original_entry(line: str) -> OriginalLogEntry:
+        ip, ts, method, path, status, size, rt = _regex_fields(line)
+        return OriginalLogEntry(
+            ip,
+            datetime.strptime(ts, "%d/%b/%Y:%H:%M:%S %z"),
+            method,
+            path,
+            int(status),
+            None if size == "-" else int(size),
+            None if rt is None else float(rt),
+        )
+
+    lines = make_lines(BENCH_LINES)
+    tracemalloc.start()
+    entries = [original_entry(line) for line in lines]
+    list_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    tracemalloc.start()
+    batch = LogBatch.from_entries(parse_line(line) for line in lines)
+    batch_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(
+        f"\noriginal list[LogEntry]: {list_bytes / len(entries):.0f} B/entry, "
+        f"LogBatch: {batch_bytes / len(batch):.0f} B/entry "
+        f"({list_bytes / batch_bytes:.1f}x)"
+    )
+    fields = attrgetter(*LogEntry.__slots__)
+    assert list(map(fields, batch)) == list(map(fields, entries))
+    # запрос -- сокращение на порядок; столбцы дают ~6x против исходного списка
+    assert batch_bytes * 5 < list_bytes
+
+
+def test_bench_top_paths_high_cardinality():
+    from collections import Counter
+    from src.logscoper.sketch import SpaceSaving
+
+    rnd = random.Random(7)
+    # пути с id: почти каждый уникален, и несколько частых
+    hot = [f"/api/hot/{k}" for k in range(10)]
+    stream = [
+        rnd.choice(hot) if rnd.random() < 0.3 else f"/api/users/{rnd.randrange(10**9)}"
+        for _ in range(BENCH_LINES * 5)
+    ]
+    counts = Counter(stream)
+    start = time.perf_counter()
+    full = counts.most_common()[:10]
+    sort_s = time.perf_counter() - start
+    start = time.perf_counter()
+    heap = counts.most_common(10)
+    heap_s = time.perf_counter() - start
+    sketch = SpaceSaving(1024)
+    for path in stream:
+        sketch.add(path)
+    print(
+        f"\n{len(counts):,} paths: full sort {sort_s * 1000:.1f} ms, "
+        f"heap top-10 {heap_s * 1000:.1f} ms, space-saving keeps {len(sketch):,} counters"
+    )
+    assert heap == full
+    assert {p for p, _ in sketch.top(10)} == set(hot)
+
+
+def test_bench_filter_writer(tmp_path):
+    import tracemalloc
+    from src.logscoper.cli import write_entries
+
+    entries = [e for e in map(parse_line, make_lines(BENCH_LINES)) if e is not None]
+    out = tmp_path / "out.txt"
+    start = time.perf_counter()
+    with open(out, "w", encoding="utf-8") as f:
+        for e in entries:
+            bytes_str = str(e.bytes_sent) if e.bytes_sent is not None else "-"
+            rt_str = "" if e.request_time_s is None else f" rt={e.request_time_s}"
+            print(
+                f"{e.ts.isoformat()} {e.ip} {e.method} {e.path} {e.status} {bytes_str}{rt_str}",
+                file=f,
+            )
+    print_lps = len(entries) / (time.perf_counter() - start)
+    expected = out.read_text()
+    start = time.perf_counter()
+    with open(out, "w", encoding="utf-8") as f:
+        write_entries(iter(entries), f)
+    chunk_lps = len(entries) / (time.perf_counter() - start)
+    assert out.read_text() == expected
+    tracemalloc.start()
+    with open(out, "w", encoding="utf-8") as f:
+        write_entries(iter(entries), f)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(
+        f"\nprint per line: {print_lps:,.0f} lines/s, chunked: {chunk_lps:,.0f} lines/s, "
+        f"peak {peak / 1024:.0f} KiB"
+    )
+    # память -- одна пачка строк, а не весь вывод
+    assert peak < 4 << 20
+
+
+def test_bench_grep_prefilter(tmp_path, monkeypatch):
+    from src.logscoper import cli
+
+    log = tmp_path / "bench.log"
+    log.write_text("\n".join(make_lines(BENCH_LINES)) + "\n")
+    grep = "^/login$"
+    start = time.perf_counter()
+    prefiltered = list(apply_filters(cli._iter_entries(str(log), grep=grep), grep=grep))
+    prefilter_lps = BENCH_LINES / (time.perf_counter() - start)
+    monkeypatch.setattr(cli, "grep_prefilter", lambda lines, grep: lines)
+    start = time.perf_counter()
+    full = list(apply_filters(cli._iter_entries(str(log)), grep=grep))
+    full_lps = BENCH_LINES / (time.perf_counter() - start)
+    print(
+        f"\n--grep {grep}: full parse: {full_lps:,.0f} lines/s, "
+        f"literal prefilter: {prefilter_lps:,.0f} lines/s"
+    )
+    assert prefiltered == full
+
+
+def test_bench_multi_grep(tmp_path):
+    from src.logscoper.cli import _iter_entries
+
+    log = tmp_path / "bench.log"
+    log.write_text("\n".join(make_lines(BENCH_LINES)) + "\n")
+    patterns = ["^/$", "^/login", r"\.js$", "orders", r"users/\d+"]
+    patterns += [f"^/api/v{i}/" for i in range(1, 16)]
+
+    def run(grep):
+        entries = apply_filters(_iter_entries(str(log), grep=grep), grep=grep)
+        return cast_to_aggregate(entries, grep=grep)
+
+    start = time.perf_counter()
+    separate = {p: run(p)["total"] for p in patterns}
+    separate_s = time.perf_counter() - start
+    start = time.perf_counter()
+    combined = run(patterns)
+    combined_s = time.perf_counter() - start
+    print(
+        f"\n{len(patterns)} patterns: one run each {separate_s:.2f} s, "
+        f"one combined pass {combined_s:.2f} s"
+    )
+    assert combined["grep"] == separate
+
+
+def test_bench_group_by(tmp_path):
+    from src.logscoper.groups import GroupBy
+
+    log = tmp_path / "bench.log"
+    log.write_text("\n".join(make_lines(BENCH_LINES)) + "\n")
+    statuses = ["200", "201", "302", "404", "500"]
+
+    start = time.perf_counter()
+    separate = {}
+    for status in statuses:
+        entries = apply_filters(_iter_entries(str(log)), status=status)
+        separate[int(status)] = cast_to_aggregate(entries)["total"]
+    separate_s = time.perf_counter() - start
+    start = time.perf_counter()
+    data = cast_to_aggregate(_iter_entries(str(log)), group_by=GroupBy(("status",), 60))
+    grouped_s = time.perf_counter() - start
+    print(
+        f"\n{len(statuses)} groups: one run each {separate_s:.2f} s, "
+        f"one grouped pass with 1m buckets {grouped_s:.2f} s"
+    )
+    grouped: dict[int, int] = {}
+    for row in data["groups"]:  # type: ignore
+        grouped[row["status"]] = grouped.get(row["status"], 0) + row["count"]
+    assert grouped == separate
+
+
+def test_bench_latency_histogram():
+    from src.logscoper.histogram import LatencyHistogram
+    from .test_histogram import random_times, string_histogram
+
+    values = random_times(BENCH_LINES * 5)
+    start = time.perf_counter()
+    by_string = string_histogram(values, 10)
+    string_s = time.perf_counter() - start
+    start = time.perf_counter()
+    fixed = LatencyHistogram(10).update(values)
+    labels = fixed.labels()
+    fixed_s = time.perf_counter() - start
+    start = time.perf_counter()
+    hdr = LatencyHistogram(1, 4).update(values)
+    hdr_s = time.perf_counter() - start
+    print(
+        f"\n{len(values)} values: string keys {string_s:.2f} s, "
+        f"array fixed {fixed_s:.2f} s, array log-linear {hdr_s:.2f} s "
+        f"({len(labels)} vs {len(hdr.labels())} buckets)"
+    )
+    assert labels == by_string
+
+
+def test_bench_filter_formats(tmp_path):
+    import json
+    from src.logscoper.cli import write_entries
+    from src.logscoper.export import (
+        iter_columns_entries,
+        read_columns,
+        write_columns,
+        write_jsonl,
+    )
+
+    lines = make_lines(BENCH_LINES)
+    entries = [parse_line(line) for line in lines]
+    outputs = {}
+    for name, write, mode in [
+        ("text", write_entries, "w"),
+        ("jsonl", write_jsonl, "w"),
+        ("columns", write_columns, "wb"),
+    ]:
+        outputs[name] = tmp_path / f"out.{name}"
+        start = time.perf_counter()
+        with open(outputs[name], mode) as out:
+            write(entries, out)
+        write_s = time.perf_counter() - start
+        print(
+            f"\n{name}: write {len(entries) / write_s:,.0f} entries/s, "
+            f"{outputs[name].stat().st_size / len(entries):.0f} bytes/entry"
+        )
+    # что стоит прочитать отобранное заново: разбор лога против чтения выгрузки
+    readers = {
+        "parse log lines": lambda: [parse_line(line) for line in lines],
+        "jsonl": lambda: [json.loads(line) for line in open(outputs["jsonl"])],
+        "columns": lambda: list(iter_columns_entries(outputs["columns"])),
+        "columns as arrays": lambda: [
+            rt for batch in read_columns(outputs["columns"]) for rt in batch.rt
+        ],
+    }
+    for name, read in readers.items():
+        start = time.perf_counter()
+        got = read()
+        read_s = time.perf_counter() - start
+        print(f"read {name}: {len(got) / read_s:,.0f} entries/s")
+    assert list(iter_columns_entries(outputs["columns"])) == entries
@@ -0,0 +1,105 @@
+from __future__ import annotations
+import os
+import pytest
+from datetime import datetime, timezone
+from src.logscoper.cache import LogColumns, load_columns, sidecar_path
+from src.logscoper.cli import _iter_cached_entries, _iter_entries, apply_filters, main
+
+LINES = [
+    '127.0.0.1 - - [10/Oct/2000:13:55:36 +0000] "GET /index.html HTTP/1.1" 200 - "-" "UA" 0.120',
+    '127.0.0.1 - - [10/Oct/2000:13:55:37 -0700] "POST /login HTTP/1.1" 302 0',
+    '10.0.0.2 - - [10/Oct/2000:13:55:38 +0000] "GET /привет HTTP/1.1" 404 -5 rt=0.333',
+    "garbage",
+    '10.0.0.2 - - [10/Oct/2000:13:55:39 +0000] "GET /index.html HTTP/1.1" 500 12 "-" "UA" 1.5',
+    '10.0.0.3 - - [10/Oct/2000:13:55:39 +0000] "DELETE / HTTP/1.1" 204 0 0.001',
+]
+
+
+@pytest.fixture
+def log(tmp_path):
+    p = tmp_path / "access.log"
+    p.write_text("\n".join(LINES * 50) + "\n", encoding="utf-8")
+    return p
+
+
+def test_columns_round_trip(log):
+    cols = LogColumns.from_entries(_iter_entries(str(log)))
+    cols.write(sidecar_path(log), os.stat(log))
+    loaded = load_columns(log)
+    assert loaded is not None
+    assert list(_iter_cached_entries(str(log))) == list(_iter_entries(str(log)))
+    assert loaded.path.values == cols.path.values
+    assert len(loaded.path.values) == 4  # словарь, а не по строке на запись
+
+
+@pytest.mark.parametrize(
+    "since, until, status, grep",
+    [
+        (None, None, None, None),
+        (datetime(2000, 10, 10, 13, 55, 37, tzinfo=timezone.utc), None, None, None),
+        (
+            None,
+            datetime(2000, 10, 10, 13, 55, 39, tzinfo=timezone.utc),
+            "2xx,404",
+            None,
+        ),
+        (None, None, "5xx,204", r"^/(index|$)"),
+    ],
+)
+def test_cached_entries_match_filters(log, since, until, status, grep):
+    expected = list(apply_filters(_iter_entries(str(log)), since, until, status, grep))
+    for _ in range(2):  # сборка кэша, затем чтение
+        assert (
+            list(_iter_cached_entries(str(log), since, until, status, grep)) == expected
+        )
+    assert sidecar_path(log).exists()
+
+
+@pytest.mark.parametrize(
+    "command",
+    [
+        ["stats", "--json", "--status", "2xx,4xx"],
+        ["filter", "--grep", "index"],
+        ["hist", "--json", "--bucket-ms", "100"],
+    ],
+)
+def test_cli_cache_matches_plain(log, capsys, command):
+    args = [command[0], "--path", str(log)] + command[1:]
+    assert main(args) == 0
+    expected = capsys.readouterr().out
+    for _ in range(2):
+        assert main(args + ["--cache"]) == 0
+        assert capsys.readouterr().out == expected
+
+
+def test_cache_rebuilt_when_log_changes(log, capsys):
+    assert main(["stats", "--path", str(log), "--cache", "--json"]) == 0
+    capsys.readouterr()
+    with open(log, "a", encoding="utf-8") as f:
+        f.write(LINES[0] + "\n")
+    assert load_columns(log) is None
+    assert main(["stats", "--path", str(log), "--cache"]) == 0
+    assert "Total: 251" in capsys.readouterr().out
+    assert len(load_columns(log)) == 251
+
+
+def test_corrupt_cache_is_ignored(log):
+    expected = list(_iter_entries(str(log)))
+    assert list(_iter_cached_entries(str(log))) == expected
+    data = sidecar_path(log).read_bytes()
+    sidecar_path(log).write_bytes(data[: len(data) // 2])
+    assert load_columns(log) is None
+    assert list(_iter_cached_entries(str(log))) == expected
+
+
+def test_uncacheable_bytes_fall_back(tmp_path):
+    p = tmp_path / "huge.log"
+    p.write_text(
+        '1.1.1.1 - - [10/Oct/2000:13:55:36 +0000] "GET / HTTP/1.1" 200 99999999999999999999\n'
+    )
+    assert [e.bytes_sent for e in _iter_cached_entries(str(p))] == [10**20 - 1]
+    assert not sidecar_path(p).exists()
+
+
+def test_cache_missing_file(tmp_path):
+    assert main(["stats", "--path", str(tmp_path / "nope.log"), "--cache"]) == 2
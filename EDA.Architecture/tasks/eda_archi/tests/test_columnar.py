@@ -0,0 +1,95 @@
+from __future__ import annotations
+import random
+from dataclasses import replace
+import pytest
+from src.logscoper import columnar
+from src.logscoper.cli import (
+    cast_to_aggregate,
+    cast_to_percentile,
+    histogram_ms,
+    main,
+    parse_line,
+)
+from .test_bench import make_lines
+
+np = pytest.importorskip("numpy")
+
+
+@pytest.fixture
+def log(tmp_path):
+    p = tmp_path / "access.log"
+    p.write_text("\n".join(make_lines(3000, seed=3)) + "\ngarbage\n")
+    return p
+
+
+COMMANDS = [
+    ["stats", "--json"],
+    ["stats", "--top", "3", "--status", "2xx,404", "--grep", "api|login"],
+    ["stats", "--json", "--approx-percentiles", "--since", "2000-10-10T10:00:20Z"],
+    ["stats", "--json", "--jobs", "3", "--until", "2000-10-10T10:00:40Z"],
+    ["stats", "--json", "--cache", "--status", "5xx", "--grep", "^/$"],
+    ["stats", "--json", "--index", "--since", "2000-10-10T10:00:30Z"],
+    ["hist", "--json", "--bucket-ms", "7"],
+    ["hist", "--bucket-ms", "100", "--jobs", "2", "--grep", "static"],
+    [
+        "hist",
+        "--json",
+        "--bucket-ms",
+        "3",
+        "--cache",
+        "--until",
+        "2000-10-10T10:00:30Z",
+    ],
+]
+
+
+@pytest.mark.parametrize("command", COMMANDS)
+def test_numpy_engine_matches_python(log, capsys, command):
+    args = [command[0], "--path", str(log)] + command[1:]
+    assert main(args) == 0
+    expected = capsys.readouterr().out
+    for _ in range(2):  # второй раз -- из готового кэша/индекса
+        assert main(args + ["--engine", "numpy"]) == 0
+        assert capsys.readouterr().out == expected
+
+
+def test_numpy_engine_empty_selection(log, capsys):
+    for cmd in (["stats", "--json"], ["hist"]):
+        args = [cmd[0], "--path", str(log), "--status", "999"] + cmd[1:]
+        main(args)
+        expected = capsys.readouterr()
+        main(args + ["--engine", "numpy"])
+        assert capsys.readouterr() == expected
+
+
+def test_histogram_and_percentiles_bit_exact():
+    rnd = random.Random(5)
+    values = [rnd.random() * rnd.choice([1, 1000, 10**6]) for _ in range(5000)]
+    values += [0.0, 100.0, 0.1 * 1000, 2.675 * 1000]
+    array = np.array(values)
+    for bucket in (1, 3, 100, 1000):
+        assert columnar.histogram(array, bucket) == histogram_ms(values, bucket)
+    for p in (0.0, 50.0, 95.0, 99.0, 100.0):
+        assert columnar.percentile(array, p) == cast_to_percentile(values, p)
+
+
+def test_engine_numpy_without_numpy(log, monkeypatch, capsys):
+    monkeypatch.setattr(columnar, "np", None)
+    assert main(["stats", "--path", str(log), "--engine", "numpy"]) == 2
+    assert "numpy" in capsys.readouterr().err
+
+
+def test_engine_numpy_rejects_approx_top(log):
+    args = ["stats", "--path", str(log), "--engine", "numpy", "--approx-top", "50"]
+    with pytest.raises(SystemExit, match="--approx-top"):
+        main(args)
+
+
+def test_aggregate_top_matches_python():
+    rnd = random.Random(5)
+    entries = [parse_line(line) for line in make_lines(2000, seed=5)]
+    entries = [replace(e, path=f"/p{rnd.randrange(40)}") for e in entries]
+    batch = columnar.EntryBatch.from_entries(entries)
+    for top in (None, 0, 1, 7, 40, 100):
+        expected = cast_to_aggregate(entries, top=top)["top_paths"]
+        assert columnar.aggregate(batch, top=top)["top_paths"] == expected
@@ -0,0 +1,123 @@
+from __future__ import annotations
+import bz2
+import io
+import gzip
+import pytest
+from src.logscoper import compressed
+from src.logscoper.cli import main, read_lines
+
+
+def _zstd(data: bytes) -> bytes:
+    zstandard = pytest.importorskip("zstandard")
+    compressor = zstandard.ZstdCompressor()
+    # два фрейма подряд, как после `cat a.zst b.zst`
+    half = len(data) // 2
+    return compressor.compress(data[:half]) + compressor.compress(data[half:])
+
+
+COMPRESSORS = {"gz": gzip.compress, "bz2": bz2.compress, "zst": _zstd}
+
+COMMANDS = [
+    ["stats", "--json", "--top", "20"],
+    ["stats", "--json", "--status", "2xx,5xx", "--jobs", "2"],
+    ["filter", "--status", "2xx", "--since", "2000-10-10T13:55:37Z"],
+    ["hist", "--json", "--bucket-ms", "50"],
+]
+
+
+@pytest.fixture(params=sorted(COMPRESSORS))
+def packed_log(request, sample_log, tmp_path):
+    data = sample_log.read_bytes().replace(b"\n", b"\r\n", 2)
+    plain = tmp_path / "plain.log"
+    plain.write_bytes(data)
+    packed = tmp_path / f"access.log.1.{request.param}"
+    packed.write_bytes(COMPRESSORS[request.param](data))
+    return plain, packed
+
+
+@pytest.mark.parametrize("command", COMMANDS)
+def test_compressed_matches_plain(packed_log, capsys, command):
+    plain, packed = packed_log
+    assert main([command[0], "--path", str(plain)] + command[1:]) == 0
+    expected = capsys.readouterr().out
+    assert main([command[0], "--path", str(packed)] + command[1:]) == 0
+    assert capsys.readouterr().out == expected
+
+
+def test_format_detected_by_magic(sample_log, tmp_path):
+    misnamed = tmp_path / "access.log"
+    misnamed.write_bytes(gzip.compress(sample_log.read_bytes()))
+    plain = tmp_path / "plain.gz"
+    plain.write_bytes(sample_log.read_bytes())
+    assert list(read_lines(misnamed)) == list(read_lines(sample_log))
+    assert list(read_lines(plain)) == list(read_lines(sample_log))
+
+
+def test_early_close_stops_reader(sample_log, tmp_path):
+    log = tmp_path / "big.log.gz"
+    log.write_bytes(gzip.compress(sample_log.read_bytes() * 20000))
+    with compressed.open_log(log) as f:
+        f.readline()
+        pump = f.buffer.raw._thread
+    assert not pump.is_alive()
+
+
+def test_truncated_archive_raises(sample_log, tmp_path):
+    log = tmp_path / "cut.log.gz"
+    log.write_bytes(gzip.compress(sample_log.read_bytes() * 100)[:200])
+    with pytest.raises(EOFError):
+        list(read_lines(log))
+
+
+def test_zstd_without_zstandard(monkeypatch, tmp_path, capsys):
+    log = tmp_path / "access.log.zst"
+    log.write_bytes(b"\x28\xb5\x2f\xfd" + b"\x00" * 16)
+    monkeypatch.setattr(compressed, "zstandard", None)
+    assert main(["stats", "--path", str(log)]) == 2
+    assert "zstandard" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize(
+    "name, compress",
+    [
+        ("out.txt.gz", "auto"),
+        ("out.txt.bz2", "auto"),
+        ("out.txt.zst", "auto"),
+        ("out.dat", "gzip"),
+        ("out.gz", "none"),
+    ],
+)
+def test_filter_compressed_out(sample_log, tmp_path, capsys, name, compress):
+    if name.endswith(".zst"):
+        pytest.importorskip("zstandard")
+    assert main(["filter", "--path", str(sample_log)]) == 0
+    expected = capsys.readouterr().out
+    out = tmp_path / name
+    args = ["filter", "--path", str(sample_log), "--out", str(out)]
+    assert main(args + ["--compress", compress]) == 0
+    assert capsys.readouterr().out == ""
+    # читается обратно тем же open_log, формат -- по сигнатуре
+    assert compressed.detect_compression(out) == compressed.output_compression(
+        out, compress
+    )
+    with compressed.open_log(out) as f:
+        assert f.read() == expected
+
+
+def test_compress_needs_out(sample_log):
+    with pytest.raises(SystemExit, match="--out"):
+        main(["filter", "--path", str(sample_log), "--compress", "gzip"])
+
+
+def test_output_error_surfaces_on_close(tmp_path):
+    class Broken(io.RawIOBase):
+        def writable(self):
+            return True
+
+        def write(self, b):
+            raise OSError("disk full")
+
+    writer = compressed._QueueWriter(Broken())
+    writer.write(b"x")
+    with pytest.raises(OSError, match="disk full"):
+        writer.close()
@@ -0,0 +1,107 @@
+from __future__ import annotations
+import io
+import json
+from dataclasses import replace
+from datetime import datetime
+import pytest
+from src.logscoper.cli import main, parse_line
+from src.logscoper.export import (
+    COLUMNS_MAGIC,
+    iter_columns_entries,
+    read_columns,
+    write_columns,
+    write_jsonl,
+)
+from .test_bench import make_lines
+
+
+@pytest.fixture
+def entries():
+    return [parse_line(line) for line in make_lines(3000, seed=4)]
+
+
+def test_jsonl_round_trip(entries):
+    entries.append(replace(entries[0], path='/a"b\\c/ü\x01', bytes_sent=None))
+    out = io.StringIO()
+    assert write_jsonl(entries, out, chunk_lines=7) == 3001
+    lines = out.getvalue().splitlines()
+    assert len(lines) == 3001
+    for e, line in zip(entries, lines):
+        record = json.loads(line)
+        assert datetime.fromisoformat(record.pop("ts")) == e.ts
+        assert record == {
+            "ip": e.ip,
+            "method": e.method,
+            "path": e.path,
+            "status": e.status,
+            "bytes_sent": e.bytes_sent,
+            "request_time_s": e.request_time_s,
+        }
+
+
+def test_columns_round_trip_in_blocks(tmp_path, entries):
+    path = tmp_path / "out.cols"
+    with open(path, "wb") as f:
+        assert write_columns(entries, f, block_rows=1000) == 3000
+    assert [len(batch) for batch in read_columns(path)] == [1000, 1000, 1000]
+    assert list(iter_columns_entries(path)) == entries
+    empty = tmp_path / "empty.cols"
+    with open(empty, "wb") as f:
+        assert write_columns([], f) == 0
+    assert list(read_columns(empty)) == []
+
+
+def test_columns_reader_rejects_bad_files(tmp_path, entries):
+    path = tmp_path / "out.cols"
+    with open(path, "wb") as f:
+        write_columns(entries[:100], f)
+    data = path.read_bytes()
+    path.write_bytes(data[:-10])
+    with pytest.raises(ValueError, match="truncated"):
+        list(read_columns(path))
+    path.write_bytes(COLUMNS_MAGIC + b"\x05\x00\x00\x00{oops")
+    with pytest.raises(ValueError, match="corrupt"):
+        list(read_columns(path))
+    path.write_text("not columns\n")
+    with pytest.raises(ValueError, match="not a logscoper columns file"):
+        list(read_columns(path))
+
+
+@pytest.fixture
+def log(tmp_path):
+    p = tmp_path / "access.log"
+    p.write_text("\n".join(make_lines(3000, seed=4)) + "\ngarbage\n")
+    return str(p)
+
+
+@pytest.mark.parametrize("out", ["out.cols", "out.cols.gz", "out.cols.bz2"])
+def test_filter_format_columns(log, tmp_path, out, entries):
+    args = ["filter", "--path", log, "--status", "2xx", "--format", "columns"]
+    assert main(args + ["--out", str(tmp_path / out)]) == 0
+    expected = [e for e in entries if 200 <= e.status < 300]
+    assert list(iter_columns_entries(tmp_path / out)) == expected
+
+
+def test_filter_format_jsonl(log, capsys, entries):
+    assert main(["filter", "--path", log, "--format", "jsonl", "--grep", "^/$"]) == 0
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [r["path"] for r in records] == [e.path for e in entries if e.path == "/"]
+
+
+def test_filter_format_columns_to_stdout(log, capsysbinary):
+    assert main(["filter", "--path", log, "--format", "columns"]) == 0
+    assert capsysbinary.readouterr().out.startswith(COLUMNS_MAGIC)
+
+
+def test_filter_format_columns_rejects_bytes_beyond_int64(tmp_path, capsys):
+    log = tmp_path / "huge.log"
+    log.write_text(
+        '1.1.1.1 - - [10/Oct/2000:13:55:36 +0000] "GET / HTTP/1.1" 200 99999999999999999999\n'
+    )
+    args = ["filter", "--path", str(log), "--format"]
+    assert main(args + ["jsonl"]) == 0
+    assert json.loads(capsys.readouterr().out)["bytes_sent"] == 99999999999999999999
+    with pytest.raises(SystemExit, match="int64"):
+        main(args + ["columns", "--out", str(tmp_path / "out.cols")])
+    with pytest.raises(ValueError, match="does not fit"):
+        write_columns([parse_line(log.read_text())], io.BytesIO())
@@ -1,6 +1,7 @@
 from __future__ import annotations
 import pytest
 from src.logscoper.cli import main
+from src.logscoper.status import StatusSelector, status_matches
 from .conftest import collect_lines
 import re
 
@@ -102,3 +103,34 @@ def test_filter_out_file(sample_log, tmp_path, capsys):
     assert capsys.readouterr().out.strip() == ""
     content = out_file.read_text().strip()
     assert "/boom" in content and " 500 " in content
+
+
+@pytest.mark.parametrize(
+    "selector", [None, "", "200", " 2XX , 404 ", "5xx,abc,", "xx,-1,+301", "1000,999"]
+)
+def test_status_selector_matches_parser(selector):
+    compiled = StatusSelector(selector)
+    for code in range(-5, 1005):
+        assert (code in compiled) == status_matches(code, selector)
+    assert compiled.codes == {c for c in range(1000) if status_matches(c, selector)}
+
+
+def test_write_entries_chunks(sample_log, capsys):
+    import io
+    from src.logscoper.cli import _iter_entries, write_entries
+
+    assert main(["filter", "--path", str(sample_log)]) == 0
+    expected = capsys.readouterr().out
+    entries = list(_iter_entries(str(sample_log)))
+
+    class Out(io.StringIO):
+        writes = 0
+
+        def write(self, s):
+            self.writes += 1
+            return super().write(s)
+
+    out = Out()
+    assert write_entries(entries, out, chunk_lines=2) == len(entries)
+    assert out.getvalue() == expected
+    assert out.writes == (len(entries) + 1) // 2
@@ -0,0 +1,111 @@
+from __future__ import annotations
+import json
+import pickle
+import random
+import pytest
+from src.logscoper.cli import main
+from src.logscoper.histogram import DENSE_LIMIT, LatencyHistogram
+
+
+def string_histogram(values_ms, bucket_ms):
+    # прежний histogram_ms: строка-ключ на каждое значение
+    buckets: dict[str, int] = {}
+    for v in values_ms:
+        b = int(v // bucket_ms) * bucket_ms
+        key = f"{b}-{b + bucket_ms}"
+        buckets[key] = buckets.get(key, 0) + 1
+    return dict(sorted(buckets.items(), key=lambda kv: int(kv[0].split("-")[0])))
+
+
+def random_times(n, seed=5):
+    rnd = random.Random(seed)
+    values = [rnd.random() * rnd.choice([1, 1000, 10**5]) for _ in range(n)]
+    return values + [0.0, 100.0, 0.1 * 1000, 2.675 * 1000]
+
+
+@pytest.mark.parametrize("bucket", [1, 3, 100, 1000])
+def test_fixed_buckets_match_string_histogram(bucket):
+    values = random_times(5000)
+    assert LatencyHistogram(bucket).update(values).labels() == string_histogram(
+        values, bucket
+    )
+
+
+@pytest.mark.parametrize("sub_bits", [0, 2, 4, 7])
+def test_hdr_buckets_cover_every_value(sub_bits):
+    hist = LatencyHistogram(1, sub_bits)
+    seen = set()
+    for q in range(1 << 14):
+        i = hist.index(q)
+        lo, hi = hist.bounds(i)
+        assert lo <= q < hi
+        if q >= 2 << sub_bits:
+            assert (hi - lo) * (1 << sub_bits) <= lo
+        seen.add(i)
+    assert seen == set(range(max(seen) + 1))  # номера идут подряд
+
+
+def test_hdr_labels_and_size():
+    values = random_times(5000)
+    hdr = LatencyHistogram(1, 4).update(values)
+    assert hdr.total == len(values)
+    assert len(hdr.counts) < 300 < len(LatencyHistogram(1).update(values).counts)
+    assert list(hdr.labels())[:3] == ["0-1", "1-2", "2-3"]
+    assert sum(hdr.labels().values()) == len(values)
+
+
+def test_merge_pickle_and_overflow():
+    values = random_times(3000)
+    whole = LatencyHistogram(10).update(values)
+    parts = [LatencyHistogram(10).update(values[i::3]) for i in range(3)]
+    merged = pickle.loads(pickle.dumps(parts[0]))
+    for part in parts[1:]:
+        merged.merge(part)
+    assert merged.labels() == whole.labels()
+    with pytest.raises(ValueError, match="different buckets"):
+        merged.merge(LatencyHistogram(10, 4))
+    huge = LatencyHistogram(1).update([5.0, DENSE_LIMIT * 10.0, 5.5])
+    assert len(huge.counts) == 6
+    assert huge.labels() == {"5-6": 2, f"{DENSE_LIMIT * 10}-{DENSE_LIMIT * 10 + 1}": 1}
+    with pytest.raises(ValueError):
+        LatencyHistogram(0)
+
+
+@pytest.fixture
+def rt_log(tmp_path):
+    rnd = random.Random(2)
+    lines = [
+        f'10.0.0.{i % 9} - - [10/Oct/2000:13:55:{i % 60:02d} +0000] "GET /a HTTP/1.1" '
+        f'200 5 "-" "UA" {rnd.expovariate(1 / 0.3):.3f}'
+        for i in range(4000)
+    ]
+    p = tmp_path / "access.log"
+    p.write_text("\n".join(lines) + "\n")
+    return str(p)
+
+
+def hist(capsys, *args):
+    assert main(["hist", "--json", *args]) == 0
+    return json.loads(capsys.readouterr().out)
+
+
+@pytest.mark.parametrize("extra", [["--jobs", "3"], ["--cache"], ["--index"]])
+def test_hist_hdr_same_for_every_source(rt_log, capsys, extra):
+    args = ["--path", rt_log, "--bucket-ms", "1", "--hdr"]
+    plain = hist(capsys, *args)
+    assert sum(plain.values()) == 4000
+    assert hist(capsys, *args, *extra) == plain
+    assert hist(capsys, *args[:-1], "--hdr", "2") != plain
+
+
+def test_hist_hdr_numpy(rt_log, capsys):
+    pytest.importorskip("numpy")
+    args = ["--path", rt_log, "--bucket-ms", "5", "--hdr", "3"]
+    assert hist(capsys, *args, "--engine", "numpy") == hist(capsys, *args)
+
+
+def test_hist_rejects_bad_buckets(rt_log):
+    with pytest.raises(SystemExit, match="--bucket-ms"):
+        main(["hist", "--path", rt_log, "--bucket-ms", "0"])
+    with pytest.raises(SystemExit, match="--hdr"):
+        main(["hist", "--path", rt_log, "--hdr", "40"])
@@ -0,0 +1,167 @@
+from __future__ import annotations
+import os
+import pytest
+from datetime import datetime, timedelta, timezone
+from src.logscoper import cli
+from src.logscoper.cache import TimeIndex, index_path, load_time_index
+from src.logscoper.cli import (
+    _iter_entries,
+    _iter_indexed_entries,
+    _iter_range_entries,
+    apply_filters,
+    build_time_index,
+    main,
+)
+from .test_parser import SINCE, UNTIL, _write_fuzz_log
+
+BASE = datetime(2000, 10, 10, 10, tzinfo=timezone.utc)
+
+
+def _line(i: int, seconds: int) -> str:
+    ts = (BASE + timedelta(seconds=seconds)).strftime("%d/%b/%Y:%H:%M:%S +0000")
+    return f'10.0.0.{i % 9} - - [{ts}] "GET /p{i % 5} HTTP/1.1" {(200, 404, 500)[i % 3]} {i} 0.{i % 97:03d}'
+
+
+@pytest.fixture
+def log(tmp_path):
+    # по строке в секунду, но с опозданиями до 30 с, мусором и переводами \r
+    lines = []
+    for i in range(3000):
+        lines.append(_line(i, i - 30 * (i % 17 == 0)))
+        if i % 250 == 0:
+            lines.append("garbage")
+    lines[1500] += "\r" + _line(1, 5)  # одна запись из начала посреди файла
+    p = tmp_path / "access.log"
+    p.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return p
+
+
+WINDOWS = [
+    (None, 60),
+    (100, 400),
+    (5, 6),
+    (1490, 1520),
+    (2900, None),
+    (5000, None),
+    (None, -10),
+]
+
+
+@pytest.mark.parametrize("since, until", WINDOWS)
+def test_indexed_entries_match_full_scan(log, since, until):
+    since_dt = BASE + timedelta(seconds=since) if since is not None else None
+    until_dt = BASE + timedelta(seconds=until) if until is not None else None
+    expected = list(
+        apply_filters(_iter_entries(str(log)), since_dt, until_dt, "2xx,5xx")
+    )
+    for _ in range(2):  # сборка индекса, затем чтение
+        got = _iter_indexed_entries(str(log), since_dt, until_dt, "2xx,5xx")
+        assert list(apply_filters(got, since_dt, until_dt, "2xx,5xx")) == expected
+    assert index_path(log).exists()
+
+
+def test_index_blocks(log):
+    index = build_time_index(log, every=100)
+    assert len(index) == 31
+    assert index.offsets[0] == 0 and index.end == os.path.getsize(log)
+    epoch = int(BASE.timestamp())
+    # блок с опоздавшей записью шире своего соседа
+    assert index.lo[15] == epoch + 5
+    since, until = epoch + 1000, epoch + 1100
+    (start, end), late = index.ranges(since, until)
+    assert 0 < start and end < index.end
+    # опоздавшая запись с ts=5 затягивает свой блок в любое окно после 5 с
+    assert late == (index.offsets[15], index.offsets[16])
+    assert index.ranges(epoch + 10**6) == []
+
+
+def test_empty_blocks_are_skipped():
+    index = TimeIndex()
+    index.add_block(0, 100, 200)
+    index.add_block(10, 2**63 - 1, -(2**63))
+    index.add_block(20, 300, 400)
+    index.end = 30
+    index.finish()
+    assert index.ranges(150, 350) == [(0, 10), (20, 30)]
+    assert index.ranges() == [(0, 30)]
+
+
+def test_index_rebuilt_when_log_changes(log, capsys):
+    args = ["stats", "--path", str(log), "--since", "2000-10-10T10:50:00Z"]
+    assert main(args + ["--index"]) == 0
+    capsys.readouterr()
+    assert load_time_index(log) is not None
+    with open(log, "a", encoding="utf-8") as f:
+        f.write(_line(0, 3600) + "\n")
+    assert load_time_index(log) is None
+    assert main(args) == 0
+    expected = capsys.readouterr().out
+    assert main(args + ["--index"]) == 0
+    assert capsys.readouterr().out == expected
+    assert load_time_index(log).end == os.path.getsize(log)
+
+
+@pytest.mark.parametrize(
+    "command",
+    [
+        ["stats", "--json", "--jobs", "2"],
+        ["filter", "--grep", "p[12]"],
+        ["hist", "--json", "--bucket-ms", "100"],
+    ],
+)
+def test_cli_index_matches_plain(log, capsys, command):
+    window = ["--since", "2000-10-10T10:10:00Z", "--until", "2000-10-10T10:20:00Z"]
+    args = [command[0], "--path", str(log)] + command[1:] + window
+    assert main(args) == 0
+    expected = capsys.readouterr().out
+    assert main(args + ["--index"]) == 0
+    assert capsys.readouterr().out == expected
+
+
+def test_index_keeps_jobs_without_window(log, capsys, monkeypatch):
+    calls = []
+    parallel_aggregate = cli.parallel_aggregate
+
+    def spy(*args, **kwargs):
+        calls.append(args)
+        return parallel_aggregate(*args, **kwargs)
+
+    monkeypatch.setattr(cli, "parallel_aggregate", spy)
+    args = ["stats", "--json", "--path", str(log), "--jobs", "2"]
+    assert main(args) == 0
+    expected = capsys.readouterr().out
+    # без --since/--until индексу нечего пропускать -- процессы остаются
+    assert main(args + ["--index"]) == 0
+    assert capsys.readouterr().out == expected
+    assert len(calls) == 2
+    assert main(args + ["--index", "--since", "2000-10-10T10:10:00Z"]) == 0
+    assert len(calls) == 2
+
+
+def test_corrupt_index_is_ignored(log):
+    since = BASE + timedelta(seconds=700)
+    expected = list(apply_filters(_iter_entries(str(log)), since))
+    assert (
+        list(apply_filters(_iter_indexed_entries(str(log), since), since)) == expected
+    )
+    data = index_path(log).read_bytes()
+    index_path(log).write_bytes(data[:-5])
+    assert load_time_index(log) is None
+    assert (
+        list(apply_filters(_iter_indexed_entries(str(log), since), since)) == expected
+    )
+
+
+@pytest.mark.parametrize("every", [1, 7, 64])
+def test_fuzz_index_parity(tmp_path, every):
+    log = _write_fuzz_log(tmp_path / "fuzz.log")
+    index = build_time_index(log, every)
+    for since, until in ((SINCE, UNTIL), (None, UNTIL), (SINCE, None)):
+        expected = list(apply_filters(_iter_entries(str(log)), since, until, "2xx"))
+        got = []
+        for start, end in index.ranges(
+            since and since.timestamp(), until and until.timestamp()
+        ):
+            entries = _iter_range_entries(str(log), start, end, since, until, "2xx")
+            got.extend(apply_filters(entries, since, until, "2xx"))
+        assert got == expected
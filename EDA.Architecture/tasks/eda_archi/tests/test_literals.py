@@ -0,0 +1,112 @@
+from __future__ import annotations
+import json
+import random
+import re
+from types import SimpleNamespace
+import pytest
+from src.logscoper import cli, literals
+from src.logscoper.cli import main
+from src.logscoper.literals import grep_literals, grep_prefilter
+from .test_bench import make_lines
+
+
+@pytest.mark.parametrize(
+    "pattern, literals",
+    [
+        (r"^/api/v1/users/\d+", ("/api/v1/users/",)),
+        ("/api|/login", ("api", "login")),  # общий "/" вынесен за альтернативу
+        (r"static/.*\.js$", ("static/",)),
+        ("foo(bar|baz)+qux?", ("foo",)),
+        (r"a{0,3}bcd", ("bcd",)),
+        ("ab(?i:cd)ef", ("ab",)),
+        ("(?i)login", None),
+        ("abc|[de]", None),
+        ("a*", None),
+        ("(", None),
+    ],
+)
+def test_grep_literals(pattern, literals):
+    assert grep_literals(pattern) == literals
+
+
+PATTERNS = [
+    "/api|/login",
+    "users/[0-9]+",
+    "(ab|cd)+e",
+    "a(b|c(d|e))f",
+    "(?:x|y)?z",
+    "a{2,}b",
+    r"(a)\1b",
+    "^/s.*js$",
+    "(?i:ab)c",
+    "a|bc|[cd]e",
+]
+
+
+def test_literals_are_in_every_match():
+    rnd = random.Random(1)
+    paths = [
+        "".join(rnd.choices("abcdexyz/jsu", k=rnd.randrange(12))) for _ in range(20000)
+    ]
+    for pattern in PATTERNS:
+        regex, literals = re.compile(pattern), grep_literals(pattern)
+        for path in paths:
+            if literals is not None and regex.search(path):
+                assert any(literal in path for literal in literals), (pattern, path)
+
+
+def test_unexpected_re_parser_disables_prefilter(monkeypatch):
+    # внутренний парсер re другой версии -- префильтра нет, но и ошибки тоже
+    monkeypatch.setattr(literals, "_sre_parse", SimpleNamespace(parse=lambda p: []))
+    grep_literals.cache_clear()
+    literals._set_literals.cache_clear()
+    try:
+        assert grep_literals("/login") is None
+        lines = ["GET /login", "GET /"]
+        assert list(grep_prefilter(lines, "/login")) == lines
+    finally:
+        grep_literals.cache_clear()
+        literals._set_literals.cache_clear()
+
+
+@pytest.fixture
+def bench_log(tmp_path):
+    log = tmp_path / "bench.log"
+    log.write_text("\n".join(make_lines(3000)) + "\n")
+    return str(log)
+
+
+@pytest.mark.parametrize(
+    "extra",
+    [
+        [],
+        ["--status", "2xx"],
+        ["--jobs", "2"],
+        ["--path-templates"],
+        ["--since", "2000-10-10T10:00:20Z", "--index"],
+    ],
+)
+@pytest.mark.parametrize("grep", ["/login", "users/1234", r"\.js$|/login"])
+def test_prefilter_keeps_results(bench_log, monkeypatch, capsys, grep, extra):
+    args = ["stats", "--json", "--path", bench_log, "--grep", grep, *extra]
+    assert main(args) == 0
+    got = json.loads(capsys.readouterr().out)
+    monkeypatch.setattr(cli, "grep_prefilter", lambda lines, grep: lines)
+    assert main(args) == 0
+    assert got == json.loads(capsys.readouterr().out)
+
+
+def test_prefilter_skips_parsing(bench_log, monkeypatch, capsys):
+    seen = []
+    parse = cli.parse_line
+    monkeypatch.setattr(cli, "parse_line", lambda s: seen.append(s) or parse(s))
+    assert main(["filter", "--path", bench_log, "--grep", "^/login$"]) == 0
+    shown = capsys.readouterr().out.splitlines()
+    assert 0 < len(shown) == len(seen) < 3000
+
+
+def test_templates_disable_prefilter(bench_log, capsys):
+    # "{id}" есть только в шаблоне, не в строке лога
+    args = ["stats", "--json", "--path", bench_log, "--path-templates"]
+    assert main(args + ["--grep", "{id}"]) == 0
+    assert json.loads(capsys.readouterr().out)["total"] > 0
@@ -0,0 +1,85 @@
+from __future__ import annotations
+import dataclasses
+import pytest
+from src.logscoper.cli import _iter_entries, parse_line
+from src.logscoper.model import LogBatch, LogEntry, StringPool
+
+LINES = [
+    '127.0.0.1 - - [10/Oct/2000:13:55:36 +0000] "GET /index.html HTTP/1.1" 200 - "-" "UA" 0.120',
+    '127.0.0.1 - - [10/Oct/2000:13:55:37 -0700] "POST /login HTTP/1.1" 302 0',
+    '10.0.0.2 - - [10/Oct/2000:13:55:38 +0000] "GET /привет HTTP/1.1" 404 -5 rt=0.333',
+    "garbage",
+    '10.0.0.2 - - [10/Oct/2000:13:55:39 +0000] "GET /index.html HTTP/1.1" 500 12 "-" "UA" 1.5',
+    '10.0.0.3 - - [10/Oct/2000:13:55:39 +0000] "DELETE / HTTP/1.1" 204 0 0.001',
+]
+
+
+@pytest.fixture
+def entries(tmp_path):
+    p = tmp_path / "access.log"
+    p.write_text("\n".join(LINES * 3) + "\n", encoding="utf-8")
+    return list(_iter_entries(str(p)))
+
+
+def test_log_entry_has_no_dict(entries):
+    assert "__slots__" in vars(LogEntry)
+    assert not hasattr(entries[0], "__dict__")
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        entries[0].status = 200
+
+
+def test_batch_round_trip(entries):
+    batch = LogBatch.from_entries(entries)
+    assert len(batch) == len(entries)
+    assert list(batch) == entries
+    assert [batch[i] for i in range(len(batch))] == entries
+    assert batch[-1] == entries[-1]
+    assert batch[0].ts.tzinfo is not None
+
+
+def test_batch_interns_strings(entries):
+    batch = LogBatch.from_entries(entries)
+    assert len(batch.path.values) == 4
+    assert len(batch.ip.values) == 3
+    first, second = list(batch)[0], list(batch)[5]
+    assert first.path is second.path
+
+
+def test_batch_overflow_leaves_columns_consistent(entries):
+    batch = LogBatch.from_entries(entries[:2])
+    huge = dataclasses.replace(entries[0], bytes_sent=2**63)
+    with pytest.raises(OverflowError):
+        batch.append(huge)
+    assert list(batch) == entries[:2]
+
+
+def test_empty_batch():
+    assert len(LogBatch()) == 0
+    assert list(LogBatch()) == []
+
+
+def test_string_pool_codes_and_interning():
+    pool = StringPool()
+    a, b = "".join(["/lo", "gin"]), "".join(["/log", "in"])
+    assert a is not b
+    assert pool.intern(a) is pool.intern(b) is a
+    assert [pool.code(v) for v in ("/login", "/", "/login")] == [0, 1, 0]
+    assert pool.values == ["/login", "/"]
+
+
+def test_string_pool_limit():
+    pool = StringPool(limit=2)
+    pool.intern("/a")
+    pool.intern("/b")
+    fresh = "".join(["/", "c"])
+    assert pool.intern(fresh) is fresh
+    assert len(pool) == 2
+    assert pool.intern("".join(["/", "a"])) is pool.values[0]
+
+
+def test_parse_line_interns_fields():
+    first = parse_line(LINES[0])
+    second = parse_line(LINES[0].replace("13:55:36", "13:55:40"))
+    assert first.path is second.path
+    assert first.ip is second.ip
+    assert first.method is second.method
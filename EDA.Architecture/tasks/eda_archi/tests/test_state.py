@@ -0,0 +1,135 @@
+from __future__ import annotations
+import gzip
+import json
+import os
+import pytest
+from src.logscoper import cli
+from src.logscoper.cli import main
+from src.logscoper.state import complete_end
+
+
+def line(i: int) -> str:
+    return (
+        f"10.0.0.{i % 7} - - [10/Oct/2000:10:{i // 60 % 60:02d}:{i % 60:02d} +0000] "
+        f'"GET /p{i % 5} HTTP/1.1" {(200, 404, 500)[i % 3]} 10 "-" "UA" 0.{i % 900 + 100}\n'
+    )
+
+
+def lines(a: int, b: int) -> str:
+    return "".join(line(i) for i in range(a, b))
+
+
+def stats(capsys, *args):
+    assert main(["stats", "--json", *args]) == 0
+    return json.loads(capsys.readouterr().out)
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    # сколько строк разобрано за запуск
+    seen = []
+    parse = cli.parse_line
+    monkeypatch.setattr(cli, "parse_line", lambda s: seen.append(s) or parse(s))
+    return seen
+
+
+def test_state_resumes_from_offset(tmp_path, capsys, parsed):
+    log, full, state = tmp_path / "access.log", tmp_path / "full.log", tmp_path / "st"
+    log.write_text(lines(0, 100))
+    first = stats(capsys, "--path", str(log), "--state", str(state))
+    assert first["total"] == 100
+    with open(log, "a") as f:
+        f.write(lines(100, 130) + line(130)[:20])  # последняя строка не дописана
+    parsed.clear()
+    second = stats(capsys, "--path", str(log), "--state", str(state))
+    assert len(parsed) == 30
+    with open(log, "a") as f:
+        f.write(line(130)[20:])
+    third = stats(capsys, "--path", str(log), "--state", str(state))
+    assert len(parsed) == 31
+
+    full.write_text(lines(0, 131))
+    expected = stats(capsys, "--path", str(full), "--approx-percentiles")
+    assert second["total"] == 130
+    assert third == expected
+    parsed.clear()
+    assert stats(capsys, "--path", str(log), "--state", str(state)) == expected
+    assert parsed == []
+
+
+def test_state_follows_rename_rotation_and_truncation(tmp_path, capsys):
+    log, state = tmp_path / "access.log", str(tmp_path / "st")
+    log.write_text(lines(0, 50))
+    pattern = str(tmp_path / "access.log*")
+    assert stats(capsys, "--path", pattern, "--state", state)["total"] == 50
+    # ротация: хвост старого файла дописан уже после переименования
+    os.rename(log, tmp_path / "access.log.1")
+    with open(tmp_path / "access.log.1", "a") as f:
+        f.write(lines(50, 60))
+    log.write_text(lines(60, 80))
+    assert stats(capsys, "--path", pattern, "--state", state)["total"] == 80
+    # copytruncate
+    os.remove(tmp_path / "access.log.1")
+    log.write_text(lines(80, 85))
+    assert stats(capsys, "--path", pattern, "--state", state)["total"] == 85
+    # сжатая ротация учитывается один раз
+    with gzip.open(tmp_path / "access.log.2.gz", "wt") as f:
+        f.write(lines(85, 90))
+    assert stats(capsys, "--path", pattern, "--state", state)["total"] == 90
+    assert stats(capsys, "--path", pattern, "--state", state)["total"] == 90
+
+
+def test_state_rereads_truncated_log_that_regrew(tmp_path, capsys):
+    log, state = tmp_path / "access.log", str(tmp_path / "st")
+    log.write_text(line(0))
+    assert stats(capsys, "--path", str(log), "--state", state)["total"] == 1
+    # copytruncate, и до следующего запуска лог дорос до прежнего смещения
+    log.write_text(line(1))
+    assert len(line(1)) == len(line(0))
+    assert stats(capsys, "--path", str(log), "--state", state)["total"] == 2
+    # ...или перерос его
+    log.write_text(lines(2, 5))
+    assert stats(capsys, "--path", str(log), "--state", state)["total"] == 5
+    assert stats(capsys, "--path", str(log), "--state", state)["total"] == 5
+
+
+def test_state_with_filters_jobs_and_approx_top(tmp_path, capsys):
+    a, b, state = tmp_path / "a.log", tmp_path / "b.log", str(tmp_path / "st")
+    a.write_text(lines(0, 60))
+    b.write_text(lines(60, 90))
+    args = ["--path", str(a), str(b), "--status", "4xx,5xx", "--jobs", "2"]
+    args += ["--approx-top", "3", "--state", state]
+    assert stats(capsys, *args)["total"] == 60
+    with open(b, "a") as f:
+        f.write(lines(90, 120))
+    data = stats(capsys, *args)
+    assert data["total"] == 80
+    assert data["status"] == {"404": 40, "500": 40}
+    assert len(data["top_paths"]) == 3
+
+
+def test_state_resets_when_options_change(tmp_path, capsys):
+    log, state = tmp_path / "access.log", tmp_path / "st"
+    log.write_text(lines(0, 30))
+    assert stats(capsys, "--path", str(log), "--state", str(state))["total"] == 30
+    data = stats(capsys, "--path", str(log), "--state", str(state), "--status", "2xx")
+    assert data["total"] == 10
+    state.write_text("{broken")
+    assert stats(capsys, "--path", str(log), "--state", str(state))["total"] == 30
+
+
+def test_state_rejects_other_engines(tmp_path):
+    log = tmp_path / "access.log"
+    log.write_text(lines(0, 3))
+    for extra in (["--cache"], ["--index"], ["--engine", "numpy"]):
+        with pytest.raises(SystemExit, match="--state"):
+            main(["stats", "--path", str(log), "--state", str(tmp_path / "st")] + extra)
+
+
+def test_complete_end(tmp_path):
+    p = tmp_path / "x.log"
+    p.write_bytes(b"a\nbb\ncc")
+    size = p.stat().st_size
+    assert complete_end(p, 0, size) == 5
+    assert complete_end(p, 5, size) == 5
+    assert complete_end(p, 0, 4) == 2
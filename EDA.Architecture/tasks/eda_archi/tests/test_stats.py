@@ -1,6 +1,14 @@
 from __future__ import annotations
 import json
-from src.logscoper.cli import main
+import pytest
+from src.logscoper.cli import (
+    cast_to_aggregate,
+    main,
+    parse_line,
+    read_line_range,
+    read_lines,
+    split_ranges,
+)
 
 
 def test_stats_text(sample_log, capsys):
@@ -172,3 +180,103 @@ def test_stats_big_log_sanity(tmp_path, capsys):
     assert isinstance(data["status"], dict)
     assert len(data["top_paths"]) <= 5
     assert (data["rt_avg_ms"] is None) or isinstance(data["rt_avg_ms"], (int, float))
+
+
+def _write_mixed_log(path, n=300):
+    lines = []
+    for i in range(n):
+        ts = f"10/Oct/2000:10:{i // 60 % 60:02d}:{i % 60:02d} +0000"
+        lines.append(
+            f'10.0.0.{i % 9} - - [{ts}] "GET /p{i % 13} HTTP/1.1" {(200, 404, 500)[i % 3]} {i} "-" "UA" 0.{i % 997:03d}'
+        )
+        if i % 50 == 0:
+            lines.append("garbage line")
+    path.write_bytes(
+        ("\r\n".join(lines[:100]) + "\n" + "\n".join(lines[100:])).encode()
+    )
+    return path
+
+
+@pytest.mark.parametrize("jobs", ["2", "3", "7"])
+def test_stats_jobs_matches_sequential(tmp_path, capsys, jobs):
+    log = _write_mixed_log(tmp_path / "mixed.log")
+    args = ["stats", "--path", str(log), "--json", "--top", "20", "--status", "2xx,5xx"]
+    assert main(args) == 0
+    sequential = json.loads(capsys.readouterr().out)
+    assert main(args + ["--jobs", jobs]) == 0
+    assert json.loads(capsys.readouterr().out) == sequential
+
+
+def test_split_ranges_cover_every_line_once(tmp_path):
+    log = _write_mixed_log(tmp_path / "mixed.log")
+    expected = list(read_lines(log))
+    for parts in (1, 2, 5, 64):
+        got = []
+        for start, end in split_ranges(log, parts):
+            got.extend(read_line_range(log, start, end))
+        assert got == expected
+
+
+def test_stats_jobs_missing_file(tmp_path):
+    assert main(["stats", "--path", str(tmp_path / "nope.log"), "--jobs", "4"]) == 2
+
+
+@pytest.mark.parametrize("extra", [[], ["--jobs", "3"]])
+def test_stats_approx_percentiles_within_bound(tmp_path, capsys, extra):
+    log = _write_mixed_log(tmp_path / "mixed.log", n=1000)
+    assert main(["stats", "--path", str(log), "--json"]) == 0
+    exact = json.loads(capsys.readouterr().out)
+    assert (
+        main(["stats", "--path", str(log), "--json", "--approx-percentiles"] + extra)
+        == 0
+    )
+    approx = json.loads(capsys.readouterr().out)
+    assert approx["total"] == exact["total"]
+    assert approx["status"] == exact["status"]
+    assert abs(approx["rt_avg_ms"] - exact["rt_avg_ms"]) < 1e-6
+    for key in ("rt_p95_ms", "rt_p99_ms"):
+        # точная версия интерполирует между соседями, скетч даёт левого +-1%
+        assert approx[key] == pytest.approx(exact[key], rel=0.02)
+
+
+def test_stats_approx_percentiles_no_rt(no_rt_log, capsys):
+    assert (
+        main(["stats", "--path", str(no_rt_log), "--json", "--approx-percentiles"]) == 0
+    )
+    data = json.loads(capsys.readouterr().out)
+    assert data["rt_p95_ms"] is None and data["rt_avg_ms"] is None
+
+
+def test_aggregate_top_matches_full_sort(tmp_path):
+    log = _write_mixed_log(tmp_path / "mixed.log")
+    entries = [e for e in map(parse_line, read_lines(log)) if e]
+    full = cast_to_aggregate(entries)
+    for top in (1, 5, 13, 50):
+        # равные счета на границе -- в порядке первого появления, как в most_common
+        assert cast_to_aggregate(entries, top=top)["top_paths"] == (
+            full["top_paths"][:top]
+        )
+
+
+@pytest.mark.parametrize("extra", [[], ["--jobs", "3"], ["--approx-top", "5"]])
+def test_stats_approx_top(tmp_path, capsys, extra):
+    log = _write_mixed_log(tmp_path / "mixed.log", n=1000)
+    args = ["stats", "--path", str(log), "--json", "--top", "3"]
+    assert main(args) == 0
+    exact = json.loads(capsys.readouterr().out)
+    assert main(args + ["--approx-top"] + extra) == 0
+    approx = json.loads(capsys.readouterr().out)
+    assert approx["total"] == exact["total"]
+    if "5" in extra:
+        # 13 путей в 5 счётчиках: оценки только сверху
+        assert len(approx["top_paths"]) == 3
+        counts = dict(map(tuple, exact["top_paths"]))
+        for path, n in approx["top_paths"]:
+            assert n >= counts.get(path, 0)
+    else:
+        assert approx == exact
+
+
+def test_stats_approx_top_invalid(sample_log):
+    with pytest.raises(SystemExit):
+        main(["stats", "--path", str(sample_log), "--approx-top", "0"])
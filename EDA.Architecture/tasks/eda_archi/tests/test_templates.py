@@ -0,0 +1,98 @@
+from __future__ import annotations
+import json
+import pickle
+import pytest
+from src.logscoper.cli import main
+from src.logscoper.templates import DEFAULT_RULES, PathTemplater, parse_rule
+
+
+@pytest.mark.parametrize(
+    "raw, template",
+    [
+        ("/users/123", "/users/{id}"),
+        ("/users/124/orders?page=2&x=1", "/users/{id}/orders"),
+        ("/o/3f2504e0-4f89-11d3-9a0c-0305e82c3301/items", "/o/{uuid}/items"),
+        ("/blob/deadbeef00c0ffee", "/blob/{hex}"),
+        ("/blob/deadbeef", "/blob/deadbeef"),  # без цифр -- обычное слово
+        ("/v1/static/app.js#top", "/v1/static/app.js"),
+        ("/", "/"),
+        ("", ""),
+    ],
+)
+def test_default_rules(raw, template):
+    assert PathTemplater()(raw) == template
+
+
+def test_unchanged_path_is_returned_as_is():
+    templater = PathTemplater()
+    path = "".join(["/lo", "gin"])
+    assert templater(path) is path
+    assert templater("/users/1") is templater("/users/2")
+
+
+def test_custom_rule_and_pickle():
+    rules = [parse_rule(r"[a-z]+@[a-z.]+=<email>")] + list(DEFAULT_RULES)
+    templater = PathTemplater(rules, cache_size=4)
+    assert templater("/u/bob@example.com/7") == "/u/<email>/{id}"
+    clone = pickle.loads(pickle.dumps(templater))
+    assert clone.rules == templater.rules
+    assert clone("/u/ann@example.org/8") == "/u/<email>/{id}"
+    assert templater.template.cache_info().maxsize == 4
+
+
+def test_parse_rule():
+    assert parse_rule(r"(?=\d)\w+=X") == (r"(?=\d)\w+", "X")
+    for bad in ("nothing", "=X", "[=X"):
+        with pytest.raises(Exception):
+            parse_rule(bad)
+
+
+@pytest.fixture
+def ids_log(tmp_path):
+    lines = [
+        f'10.0.0.{i % 5} - - [10/Oct/2000:10:00:{i % 60:02d} +0000] "GET /users/{i}/orders?page={i % 3} HTTP/1.1" '
+        f'{(200, 404)[i % 2]} 10 "-" "UA" 0.{i % 900 + 100}'
+        for i in range(300)
+    ]
+    lines += [
+        f'10.0.0.9 - - [10/Oct/2000:10:01:00 +0000] "GET /health HTTP/1.1" 200 1 0.00{i}'
+        for i in range(1, 10)
+    ]
+    p = tmp_path / "ids.log"
+    p.write_text("\n".join(lines) + "\n")
+    return p
+
+
+@pytest.mark.parametrize(
+    "extra",
+    [
+        [],
+        ["--jobs", "3"],
+        ["--cache"],
+        ["--engine", "numpy"],
+        ["--cache", "--engine", "numpy"],
+    ],
+)
+def test_stats_groups_by_template(ids_log, capsys, extra):
+    if "numpy" in extra:
+        pytest.importorskip("numpy")
+    args = ["stats", "--path", str(ids_log), "--json", "--path-templates"] + extra
+    assert main(args) == 0
+    data = json.loads(capsys.readouterr().out)
+    assert data["total"] == 309
+    assert data["top_paths"] == [["/users/{id}/orders", 300], ["/health", 9]]
+
+
+def test_hist_selects_template_with_grep(ids_log, capsys):
+    args = ["hist", "--path", str(ids_log), "--json", "--bucket-ms", "1000"]
+    assert main(args + ["--path-templates", "--grep", r"^/users/\{id\}/orders$"]) == 0
+    assert json.loads(capsys.readouterr().out) == {"0-1000": 300}
+    assert main(args + ["--path-rule", r"health=probe", "--grep", "^probe$"]) == 0
+    assert capsys.readouterr().err == "No request_time data found.\n"
+    assert main(args + ["--path-rule", r"health=probe", "--grep", "^/probe$"]) == 0
+    assert json.loads(capsys.readouterr().out) == {"0-1000": 9}
+
+
+def test_invalid_path_rule(ids_log):
+    with pytest.raises(SystemExit, match="--path-rule"):
+        main(["stats", "--path", str(ids_log), "--path-rule", "[=x"])